@@ -1,5 +1,6 @@
-from typing import Optional, List
+from typing import Iterator, Optional, List
 import argparse
+import gzip
 import json
 import glob
 from pathlib import Path
@@ -183,6 +184,80 @@ def print_log_entry(
         print(f"Entries filtered: {filtered_entries}")
 
 
+def print_tool_call_entry(entry: dict, max_content_chars: int = 500) -> None:
+    """Print a tool call record written by the agent's ToolCallLogWriter
+
+    Args:
+        entry: Tool call record with name, args, content and timing information
+        max_content_chars: Number of content characters to show
+    """
+    print("\n=== Tool Call ===")
+    print(f"Tool: {entry['name']}")
+    print(f"Call ID: {entry['tool_call_id']}")
+    print(f"Timestamp: {entry['timestamp']}")
+    if entry.get("duration_ms") is not None:
+        print(f"Duration: {entry['duration_ms']:.1f} ms")
+    print(f"Args: {json.dumps(entry['args'])}")
+
+    content = entry.get("content", "")
+    if "content_ref" in entry:
+        print(f"Content: {entry['content_bytes']} bytes stored in {entry['content_ref']}")
+    if "artifact_ref" in entry:
+        print(f"Artifact: {entry['artifact_bytes']} bytes stored in {entry['artifact_ref']}")
+    if len(content) > max_content_chars:
+        content = content[:max_content_chars] + "..."
+    print(f"Result: {content}")
+
+
+def iter_tool_call_logs(log_dir: str) -> Iterator[dict]:
+    """Stream tool call records from an agent log directory, oldest file first
+
+    Reads the JSONL files and gzip blobs of the agent's ToolCallLogWriter directly,
+    so the script runs without MedRAX installed.
+
+    Args:
+        log_dir: Directory holding tool_calls*.jsonl files
+
+    Yields:
+        dict: One tool call record per line, with out-of-line content loaded
+    """
+    log_path = Path(log_dir)
+    files = sorted(log_path.glob("tool_calls_*.jsonl"))
+    if (log_path / "tool_calls.jsonl").exists():
+        files.append(log_path / "tool_calls.jsonl")
+    if not files:
+        raise FileNotFoundError(f"No tool call logs found in {log_dir}")
+
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if "content_ref" in entry:
+                    with gzip.open(log_path / entry["content_ref"], "rb") as blob:
+                        entry["content"] = blob.read().decode("utf-8")
+                yield entry
+
+
+def print_tool_call_logs(log_dir: str, num_entries: Optional[int] = None) -> None:
+    """Stream and print tool call records from an agent log directory.
+
+    Args:
+        log_dir: Directory holding tool_calls*.jsonl files
+        num_entries: Number of entries to print. If None, prints all entries.
+    """
+    entries_printed = 0
+    for entry in iter_tool_call_logs(log_dir):
+        print_tool_call_entry(entry)
+        print("=" * 50)
+        entries_printed += 1
+        if num_entries and entries_printed >= num_entries:
+            break
+
+    print(f"\nTool calls printed: {entries_printed}")
+
+
 def main() -> None:
     """Main entry point for the script"""
     parser = argparse.ArgumentParser(
@@ -197,9 +272,18 @@ def main() -> None:
         default="gpt4",
         help="Model type to display (default: gpt4)",
     )
+    parser.add_argument(
+        "-t",
+        "--tool_calls",
+        metavar="LOG_DIR",
+        help="Print agent tool call logs from this directory instead of API usage logs",
+    )
     args = parser.parse_args()
 
     try:
+        if args.tool_calls:
+            print_tool_call_logs(args.tool_calls, args.num_entries)
+            return
         print_log_entry(args.log_file, args.num_entries, args.model)
     except FileNotFoundError as e:
         print(f"Error: {e}")
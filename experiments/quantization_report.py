@@ -0,0 +1,159 @@
+"""
+Compare the INT8 classifier and segmenter with their fp32 versions on a validation folder.
+
+Reports per-pathology probability drift (and AUC when labels are given), per-organ
+Dice between fp32 and INT8 masks, and the CPU latency of both.
+
+Usage:
+    python quantization_report.py --images val/ --calibration calib/ \\
+        --labels labels.csv --output quantization_report.json
+
+The labels CSV has a "filename" column and one 0/1 column per pathology; empty cells
+are unknown.
+"""
+
+import argparse
+import csv
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+
+from medrax.models import (
+    QuantizationOptions,
+    acquire_densenet,
+    acquire_pspnet,
+    get_model_registry,
+    mask_dice,
+    probability_drift,
+)
+from medrax.models.preprocessing import classifier_input, read_xray, segmentation_input
+from medrax.models.quantization import calibration_images
+
+ORGANS = [
+    "Left Clavicle", "Right Clavicle", "Left Scapula", "Right Scapula",
+    "Left Lung", "Right Lung", "Left Hilus Pulmonis", "Right Hilus Pulmonis",
+    "Heart", "Aorta", "Facies Diaphragmatica", "Mediastinum", "Weasand", "Spine",
+]
+
+
+def load_labels(path: str, images: List[Path], pathologies: List[str]) -> np.ndarray:
+    """Read a labels CSV into an (images, pathologies) array with NaN for unknown."""
+    labels = np.full((len(images), len(pathologies)), np.nan)
+    rows = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            rows[Path(row["filename"]).name] = row
+    for i, image in enumerate(images):
+        row = rows.get(image.name, {})
+        for j, name in enumerate(pathologies):
+            if row.get(name, "") != "":
+                labels[i, j] = float(row[name])
+    return labels
+
+
+def run(model, inputs: List[torch.Tensor], batch_size: int) -> tuple:
+    """Run a model over inputs, returning stacked outputs and seconds per image."""
+    outputs = []
+    start = time.perf_counter()
+    with torch.inference_mode():
+        for i in range(0, len(inputs), batch_size):
+            outputs.append(model(torch.stack(inputs[i : i + batch_size])))
+    elapsed = time.perf_counter() - start
+    return torch.cat(outputs).numpy(), elapsed / len(inputs)
+
+
+def classification_report(
+    images: List[Path], options: QuantizationOptions, labels: Optional[str], batch_size: int
+) -> Dict:
+    registry = get_model_registry()
+    fp32_key, fp32 = acquire_densenet(device="cpu")
+    int8_key, int8 = acquire_densenet(
+        device="cpu", quantization="int8", quantization_options=options
+    )
+    try:
+        resolution = getattr(fp32, "input_resolution", 224)
+        inputs = [classifier_input(read_xray(p), resolution) for p in images]
+        reference, fp32_latency = run(fp32, inputs, batch_size)
+        quantized, int8_latency = run(int8, inputs, batch_size)
+        pathologies = [p for p in fp32.pathologies if p]
+        columns = [list(fp32.pathologies).index(p) for p in pathologies]
+        truth = load_labels(labels, images, pathologies) if labels else None
+        return {
+            "latency_ms": {"fp32": fp32_latency * 1000, "int8": int8_latency * 1000},
+            "pathologies": probability_drift(
+                reference[:, columns], quantized[:, columns], pathologies, truth
+            ),
+        }
+    finally:
+        registry.release(fp32_key)
+        registry.release(int8_key)
+
+
+def segmentation_report(images: List[Path], options: QuantizationOptions, batch_size: int) -> Dict:
+    registry = get_model_registry()
+    fp32_key, fp32 = acquire_pspnet(device="cpu")
+    int8_key, int8 = acquire_pspnet(device="cpu", quantization="int8", quantization_options=options)
+    try:
+        inputs = [segmentation_input(read_xray(p)) for p in images]
+        reference, fp32_latency = run(fp32, inputs, batch_size)
+        quantized, int8_latency = run(int8, inputs, batch_size)
+        # Logits > 0 is the same as sigmoid > 0.5
+        dice = mask_dice(reference > 0, quantized > 0)
+        return {
+            "latency_ms": {"fp32": fp32_latency * 1000, "int8": int8_latency * 1000},
+            "organs": {
+                organ: {"mean_dice": float(dice[:, i].mean()), "min_dice": float(dice[:, i].min())}
+                for i, organ in enumerate(ORGANS)
+            },
+        }
+    finally:
+        registry.release(fp32_key)
+        registry.release(int8_key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fp32 vs INT8 accuracy report")
+    parser.add_argument("--images", required=True, help="Validation folder of PNG/JPEG X-rays")
+    parser.add_argument("--calibration", required=True, help="Calibration folder of X-rays")
+    parser.add_argument("--labels", default=None, help="Optional labels CSV for per-pathology AUC")
+    parser.add_argument("--cache-dir", default=None, help="Directory of quantized weights")
+    parser.add_argument("--max-images", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--skip-segmentation", action="store_true")
+    parser.add_argument("--output", default="quantization_report.json")
+    args = parser.parse_args()
+
+    options = QuantizationOptions(calibration_dir=args.calibration, cache_dir=args.cache_dir)
+    images = calibration_images(args.images, args.max_images)
+
+    report = {
+        "images": len(images),
+        "classification": classification_report(images, options, args.labels, args.batch_size),
+    }
+    if not args.skip_segmentation:
+        report["segmentation"] = segmentation_report(images, options, args.batch_size)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    classification = report["classification"]
+    worst = max(classification["pathologies"].items(), key=lambda kv: kv[1]["max_abs_drift"])
+    print(f"Wrote {args.output} ({len(images)} images)")
+    print(
+        "Classifier latency: {fp32:.1f} ms fp32, {int8:.1f} ms int8".format(
+            **classification["latency_ms"]
+        )
+    )
+    print(f"Largest probability drift: {worst[0]} ({worst[1]['max_abs_drift']:.4f})")
+    if "segmentation" in report:
+        organs = report["segmentation"]["organs"]
+        lowest = min(organs.items(), key=lambda kv: kv[1]["mean_dice"])
+        print(f"Lowest mean Dice vs fp32: {lowest[0]} ({lowest[1]['mean_dice']:.4f})")
+
+
+if __name__ == "__main__":
+    main()
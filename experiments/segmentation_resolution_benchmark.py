@@ -0,0 +1,145 @@
+"""
+Measure PSPNet latency against mask quality at each supported input resolution.
+
+Runs the segmenter over a folder of X-rays at 256, 384 and 512 and reports, per
+resolution, the latency per image (preprocessing and forward pass) and the per-organ
+Dice of its masks against the 512 masks, so a deployment can pick its trade-off.
+
+Usage:
+    python segmentation_resolution_benchmark.py --images val/ --device cpu \\
+        --output segmentation_resolution.json
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import torch
+
+from medrax.models import (
+    SEGMENTATION_RESOLUTIONS,
+    acquire_pspnet,
+    get_model_registry,
+    mask_dice,
+    pspnet_logits,
+)
+from medrax.models.preprocessing import read_xray, segmentation_input
+from medrax.models.quantization import calibration_images
+from medrax.utils.organ_metrics import align_masks
+
+ORGANS = [
+    "Left Clavicle", "Right Clavicle", "Left Scapula", "Right Scapula",
+    "Left Lung", "Right Lung", "Left Hilus Pulmonis", "Right Hilus Pulmonis",
+    "Heart", "Aorta", "Facies Diaphragmatica", "Mediastinum", "Weasand", "Spine",
+]
+
+# Masks of every resolution are compared on the 512 grid of the center crop
+GRID = (512, 512)
+
+
+def segment(model, image: np.ndarray, resolution: int, device: str) -> tuple:
+    """Segment one X-ray; return its bit-packed masks on the 512 grid and the seconds taken."""
+    start = time.perf_counter()
+    img = segmentation_input(image, resolution)[None].to(device)
+    with torch.inference_mode():
+        logits = pspnet_logits(model, img)[0].cpu()
+    elapsed = time.perf_counter() - start
+    # Logits > 0 is the same as sigmoid > 0.5
+    return align_masks((logits > 0).numpy(), GRID), elapsed
+
+
+def unpack(packed: np.ndarray) -> np.ndarray:
+    """Boolean (14, H, W) masks of a bit-packed mask image."""
+    bits = np.arange(len(ORGANS), dtype=packed.dtype)[:, None, None]
+    return (packed[None] >> bits) & 1 > 0
+
+
+def benchmark(images: List[Path], resolutions: List[int], device: str, warmup: int) -> Dict:
+    registry = get_model_registry()
+    key, model = acquire_pspnet(device=device)
+    try:
+        decoded = [read_xray(p) for p in images]
+        masks: Dict[int, List[np.ndarray]] = {}
+        latencies: Dict[int, List[float]] = {}
+        for resolution in resolutions:
+            for image in decoded[:warmup]:
+                segment(model, image, resolution, device)
+            results = [segment(model, image, resolution, device) for image in decoded]
+            masks[resolution] = [packed for packed, _ in results]
+            latencies[resolution] = [elapsed for _, elapsed in results]
+
+        report = {}
+        for resolution in resolutions:
+            latency = np.array(latencies[resolution]) * 1000
+            dice = np.concatenate(
+                [
+                    mask_dice(unpack(reference)[None], unpack(packed)[None])
+                    for reference, packed in zip(masks[512], masks[resolution])
+                ]
+            )
+            report[str(resolution)] = {
+                "latency_ms": {
+                    "mean": float(latency.mean()),
+                    "p50": float(np.percentile(latency, 50)),
+                    "p95": float(np.percentile(latency, 95)),
+                },
+                "speedup_vs_512": float(np.mean(latencies[512]) / latency.mean() * 1000),
+                "organs": {
+                    organ: {
+                        "mean_dice": float(dice[:, i].mean()),
+                        "min_dice": float(dice[:, i].min()),
+                    }
+                    for i, organ in enumerate(ORGANS)
+                },
+            }
+        return report
+    finally:
+        registry.release(key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Segmentation latency vs Dice per resolution")
+    parser.add_argument("--images", required=True, help="Folder of PNG/JPEG X-rays")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument(
+        "--resolutions",
+        type=int,
+        nargs="+",
+        choices=SEGMENTATION_RESOLUTIONS,
+        default=list(SEGMENTATION_RESOLUTIONS),
+    )
+    parser.add_argument("--max-images", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed images per resolution")
+    parser.add_argument("--output", default="segmentation_resolution.json")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    # 512 is the reference every other resolution is compared with
+    resolutions = sorted(set(args.resolutions) | {512})
+    images = calibration_images(args.images, args.max_images)
+
+    report = {
+        "images": len(images),
+        "device": args.device,
+        "resolutions": benchmark(images, resolutions, args.device, args.warmup),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Wrote {args.output} ({len(images)} images)")
+    for resolution, result in report["resolutions"].items():
+        lowest = min(result["organs"].items(), key=lambda kv: kv[1]["mean_dice"])
+        print(
+            f"{resolution}: {result['latency_ms']['mean']:.1f} ms/image "
+            f"({result['speedup_vs_512']:.2f}x), lowest mean Dice vs 512: "
+            f"{lowest[0]} ({lowest[1]['mean_dice']:.4f})"
+        )
+
+
+if __name__ == "__main__":
+    main()
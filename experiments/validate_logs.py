@@ -1,4 +1,6 @@
 from typing import Dict, List, Tuple, Optional
+import argparse
+import gzip
 import json
 import sys
 import glob
@@ -108,6 +110,66 @@ def analyze_log_file(filename: str) -> Tuple[List[Dict], List[Dict], Dict[str, L
     return no_images, skipped, errors
 
 
+def analyze_tool_call_logs(log_dir: str) -> Tuple[int, List[Dict], Dict[str, List[str]]]:
+    """Stream agent tool call logs and collect failed calls and broken records.
+
+    Args:
+        log_dir: Directory holding tool_calls*.jsonl files written by the agent
+
+    Returns:
+        Tuple containing:
+            - Number of records read
+            - List of tool calls that returned an error
+            - Dict of processing errors by type
+    """
+    log_path = Path(log_dir)
+    files = sorted(log_path.glob("tool_calls_*.jsonl"))
+    if (log_path / "tool_calls.jsonl").exists():
+        files.append(log_path / "tool_calls.jsonl")
+    if not files:
+        print(f"No tool call logs found in {log_dir}")
+        sys.exit(1)
+
+    total = 0
+    failed = []
+    errors = defaultdict(list)
+    for path in files:
+        with open(path, "r") as f:
+            for line_num, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                location = f"{path.name}:{line_num}"
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    errors["json_decode"].append(f"{location}: Invalid JSON")
+                    continue
+
+                total += 1
+                content = entry.get("content", "")
+                if "content_ref" in entry:
+                    try:
+                        with gzip.open(log_path / entry["content_ref"], "rb") as blob:
+                            content = blob.read().decode("utf-8")
+                    except (FileNotFoundError, OSError) as e:
+                        errors["missing_blob"].append(f"{location}: {e}")
+                        continue
+                if "artifact_ref" in entry and not (log_path / entry["artifact_ref"]).exists():
+                    errors["missing_blob"].append(f"{location}: {entry['artifact_ref']}")
+
+                failed_markers = ('"analysis_status":"failed"', "'analysis_status': 'failed'")
+                if any(m in content for m in failed_markers) or "invalid tool" in content:
+                    failed.append(
+                        {
+                            "name": entry.get("name"),
+                            "tool_call_id": entry.get("tool_call_id"),
+                            "timestamp": entry.get("timestamp"),
+                        }
+                    )
+
+    return total, failed, errors
+
+
 def print_results(
     filename: str, no_images: List[Dict], skipped: List[Dict], errors: Dict[str, List[str]]
 ) -> None:
@@ -148,11 +210,31 @@ def print_results(
 
 def main() -> None:
     """Main entry point for log validation script."""
-    # If a file is specified as an argument, use it; otherwise find the latest log
-    if len(sys.argv) > 1:
-        log_file = sys.argv[1]
-    else:
-        log_file = get_latest_log()
+    parser = argparse.ArgumentParser(
+        description="Check API usage logs or agent tool call logs for missing data and errors."
+    )
+    parser.add_argument("log_file", nargs="?", help="Path to the log file (default: latest)")
+    parser.add_argument(
+        "-t",
+        "--tool-calls",
+        metavar="LOG_DIR",
+        help="Validate agent tool call logs from this directory instead of API usage logs",
+    )
+    args = parser.parse_args()
+
+    if args.tool_calls:
+        total, failed, errors = analyze_tool_call_logs(args.tool_calls)
+        print(f"\nTool call records: {total}")
+        print(f"Failed tool calls: {len(failed)}")
+        for entry in failed:
+            print(f"  {entry['timestamp']} {entry['name']} ({entry['tool_call_id']})")
+        for error_type, messages in errors.items():
+            print(f"\n{error_type}:")
+            for msg in messages:
+                print(f"  {msg}")
+        return
+
+    log_file = args.log_file or get_latest_log()
 
     no_images, skipped, errors = analyze_log_file(log_file)
     print_results(log_file, no_images, skipped, errors)
@@ -1,12 +1,51 @@
+import functools
 import re
-import base64
+import uuid
 import gradio as gr
+from dataclasses import dataclass, field
 from pathlib import Path
-import time
 import shutil
-from typing import AsyncGenerator, List, Optional, Tuple
+from typing import AsyncGenerator, List, Optional, Sequence, Set, Tuple
 from gradio import ChatMessage
 
+from medrax.agent.artifacts import tool_result_content, tool_result_output
+from medrax.agent.compaction import IMAGE_PATH_PREFIX
+from medrax.tools.cache import CachedTool
+from medrax.utils import PrefetchJob, Prefetcher, encode_image_for_llm
+from medrax.utils.cache import file_digest
+
+# Tool output keys holding images that are shown in the chat instead of sent to the LLM
+VISUALIZATION_KEYS = ("segmentation_image_path", "visualization_path")
+
+
+def _new_thread_id() -> str:
+    return uuid.uuid4().hex
+
+
+@dataclass
+class SessionState:
+    """
+    State of one browser session, kept in a gr.State so concurrent users stay separate.
+
+    Attributes:
+        thread_id (str): Conversation thread of the agent
+        original_file_path (Optional[str]): Uploaded file passed to tools (.dcm or other)
+        display_file_path (Optional[str]): Viewable image shown in the UI
+        sent_images (Set[str]): Image hashes and paths already sent in the current thread
+        prefetch (Optional[PrefetchJob]): Background analyses of the current upload
+    """
+
+    thread_id: str = field(default_factory=_new_thread_id)
+    original_file_path: Optional[str] = None
+    display_file_path: Optional[str] = None
+    sent_images: Set[str] = field(default_factory=set)
+    prefetch: Optional[PrefetchJob] = None
+
+    def new_thread(self) -> None:
+        """Start a new conversation thread, keeping the current image."""
+        self.thread_id = _new_thread_id()
+        self.sent_images = set()
+
 
 class ChatInterface:
     """
@@ -14,31 +53,58 @@ class ChatInterface:
 
     Handles file uploads, message processing, and chat history management.
     Supports both regular image files and DICOM medical imaging files.
+
+    The instance only holds shared resources (agent, tools, settings). Everything that
+    belongs to one user lives in a SessionState passed to each handler.
+
+    Each image is attached to the LLM conversation once per thread, as a downscaled
+    JPEG copy. Tools always receive the path of the original upload.
+
+    Tools listed in prefetch_tools start on an image as soon as it is uploaded. Their
+    results go to the tool result cache, where the agent's first tool calls find them.
     """
 
-    def __init__(self, agent, tools_dict):
+    def __init__(
+        self,
+        agent,
+        tools_dict,
+        llm_image_max_size: int = 1024,
+        llm_image_quality: int = 85,
+        prefetch_tools: Sequence[str] = (),
+    ):
         """
         Initialize the chat interface.
 
         Args:
             agent: The medical AI agent to handle requests
             tools_dict (dict): Dictionary of available tools for image processing
+            llm_image_max_size (int): Longer side in pixels of the image copy sent to the LLM
+            llm_image_quality (int): JPEG quality of the image copy sent to the LLM
+            prefetch_tools (Sequence[str]): Keys of cached tools in tools_dict to run on
+                each upload before the first question
         """
         self.agent = agent
         self.tools_dict = tools_dict
+        self.llm_image_max_size = llm_image_max_size
+        self.llm_image_quality = llm_image_quality
+
+        self.prefetch_tools = []
+        for name in prefetch_tools:
+            if isinstance(tools_dict.get(name), CachedTool):
+                self.prefetch_tools.append(name)
+            else:
+                print(f"Not prefetching {name}: the tool is not loaded or not cached")
+        self.prefetcher = Prefetcher(max_workers=len(self.prefetch_tools) or 1)
         self.upload_dir = Path("temp")
         self.upload_dir.mkdir(exist_ok=True)
-        self.current_thread_id = None
-        # Separate storage for original and display paths
-        self.original_file_path = None  # For LLM (.dcm or other)
-        self.display_file_path = None  # For UI (always viewable format)
 
-    def handle_upload(self, file_path: str) -> str:
+    def handle_upload(self, file_path: str, session: SessionState) -> str:
         """
         Handle new file upload and set appropriate paths.
 
         Args:
             file_path (str): Path to the uploaded file
+            session (SessionState): State of the uploading session
 
         Returns:
             str: Display path for UI, or None if no file uploaded
@@ -47,25 +113,47 @@ class ChatInterface:
             return None
 
         source = Path(file_path)
-        timestamp = int(time.time())
 
-        # Save original file with proper suffix
+        # Save original file with proper suffix; the unique name keeps sessions apart
         suffix = source.suffix.lower()
-        saved_path = self.upload_dir / f"upload_{timestamp}{suffix}"
+        saved_path = self.upload_dir / f"upload_{uuid.uuid4().hex}{suffix}"
         shutil.copy2(file_path, saved_path)  # Use file_path directly instead of source
-        self.original_file_path = str(saved_path)
+        session.original_file_path = str(saved_path)
 
         # Handle DICOM conversion for display only
         if suffix == ".dcm":
             output, _ = self.tools_dict["DicomProcessorTool"]._run(str(saved_path))
-            self.display_file_path = output["image_path"]
+            session.display_file_path = output["image_path"]
         else:
-            self.display_file_path = str(saved_path)
+            session.display_file_path = str(saved_path)
+
+        # The new image replaces the old one: drop its analyses that have not started
+        if session.prefetch is not None:
+            session.prefetch.cancel()
+        session.prefetch = self._start_prefetch(session.original_file_path)
+
+        return session.display_file_path
 
-        return self.display_file_path
+    def _start_prefetch(self, image_path: str) -> Optional[PrefetchJob]:
+        """
+        Run the prefetch tools on an image in the background.
+
+        Args:
+            image_path (str): Path the agent will pass to the tools
+
+        Returns:
+            Optional[PrefetchJob]: Handle to the running analyses, or None if none are configured
+        """
+        if not self.prefetch_tools:
+            return None
+        tasks = {
+            name: functools.partial(self.tools_dict[name].invoke, {"image_path": image_path})
+            for name in self.prefetch_tools
+        }
+        return self.prefetcher.submit(tasks)
 
     def add_message(
-        self, message: str, display_image: str, history: List[dict]
+        self, message: str, display_image: str, history: List[dict], session: SessionState
     ) -> Tuple[List[dict], gr.Textbox]:
         """
         Add a new message to the chat history.
@@ -74,48 +162,51 @@ class ChatInterface:
             message (str): Text message to add
             display_image (str): Path to image being displayed
             history (List[dict]): Current chat history
+            session (SessionState): State of the sending session
 
         Returns:
             Tuple[List[dict], gr.Textbox]: Updated history and textbox component
         """
-        image_path = self.original_file_path or display_image
+        image_path = session.original_file_path or display_image
         if image_path is not None:
             history.append({"role": "user", "content": {"path": image_path}})
         if message is not None:
             history.append({"role": "user", "content": message})
         return history, gr.Textbox(value=message, interactive=False)
 
-    async def process_message(
-        self, message: str, display_image: Optional[str], chat_history: List[ChatMessage]
-    ) -> AsyncGenerator[Tuple[List[ChatMessage], Optional[str], str], None]:
+    def _image_messages(self, image_path: str, session: SessionState) -> List[dict]:
         """
-        Process a message and generate responses.
+        Build the messages that introduce an image to the LLM, unless the thread has
+        already seen it.
+
+        The path is announced whenever it is new to the thread, so tools can be called
+        on it. The pixels are attached only for content the thread has not seen yet.
 
         Args:
-            message (str): User message to process
-            display_image (Optional[str]): Path to currently displayed image
-            chat_history (List[ChatMessage]): Current chat history
+            image_path (str): Path to the original upload
+            session (SessionState): Session whose current thread the messages are sent to
 
-        Yields:
-            Tuple[List[ChatMessage], Optional[str], str]: Updated chat history, display path, and empty string
+        Returns:
+            List[dict]: Messages to prepend to the user's text, possibly empty
         """
-        chat_history = chat_history or []
-
-        # Initialize thread if needed
-        if not self.current_thread_id:
-            self.current_thread_id = str(time.time())
-
+        sent = session.sent_images
         messages = []
-        image_path = self.original_file_path or display_image
 
-        if image_path is not None:
+        if image_path not in sent:
             # Send path for tools
-            messages.append({"role": "user", "content": f"image_path: {image_path}"})
-
-            # Load and encode image for multimodal
-            with open(image_path, "rb") as img_file:
-                img_base64 = base64.b64encode(img_file.read()).decode("utf-8")
-
+            messages.append({"role": "user", "content": f"{IMAGE_PATH_PREFIX}{image_path}"})
+            sent.add(image_path)
+
+        # DICOM files are sent through their converted display image
+        llm_image_path = image_path
+        if Path(image_path).suffix.lower() == ".dcm" and session.display_file_path:
+            llm_image_path = session.display_file_path
+
+        digest = file_digest(llm_image_path)
+        if digest not in sent:
+            img_base64 = encode_image_for_llm(
+                llm_image_path, max_size=self.llm_image_max_size, quality=self.llm_image_quality
+            )
             messages.append(
                 {
                     "role": "user",
@@ -127,32 +218,77 @@ class ChatInterface:
                     ],
                 }
             )
+            sent.add(digest)
+
+        return messages
+
+    @staticmethod
+    def _visualization_paths(tool_result) -> List[str]:
+        """
+        Get the paths of visualizations in a tool output.
+
+        Args:
+            tool_result: Output part of a tool result artifact
+
+        Returns:
+            List[str]: Paths of existing visualization images
+        """
+        if not isinstance(tool_result, dict):
+            return []
+        return [
+            tool_result[key]
+            for key in VISUALIZATION_KEYS
+            if isinstance(tool_result.get(key), str) and Path(tool_result[key]).is_file()
+        ]
+
+    async def process_message(
+        self,
+        message: str,
+        display_image: Optional[str],
+        chat_history: List[ChatMessage],
+        session: SessionState,
+    ) -> AsyncGenerator[Tuple[List[ChatMessage], Optional[str], str], None]:
+        """
+        Process a message and generate responses.
+
+        Args:
+            message (str): User message to process
+            display_image (Optional[str]): Path to currently displayed image
+            chat_history (List[ChatMessage]): Current chat history
+            session (SessionState): State of the sending session
+
+        Yields:
+            Tuple[List[ChatMessage], Optional[str], str]: Updated chat history, display path, and empty string
+        """
+        chat_history = chat_history or []
+
+        messages = []
+        image_path = session.original_file_path or display_image
+
+        if image_path is not None:
+            messages.extend(self._image_messages(image_path, session))
 
         if message is not None:
             messages.append({"role": "user", "content": [{"type": "text", "text": message}]})
 
         try:
-            for event in self.agent.workflow.stream(
-                {"messages": messages}, {"configurable": {"thread_id": self.current_thread_id}}
-            ):
+            async for event in self.agent.astream(messages, thread_id=session.thread_id):
                 if isinstance(event, dict):
                     if "process" in event:
                         content = event["process"]["messages"][-1].content
                         if content:
                             content = re.sub(r"temp/[^\s]*", "", content)
                             chat_history.append(ChatMessage(role="assistant", content=content))
-                            yield chat_history, self.display_file_path, ""
+                            yield chat_history, session.display_file_path, ""
 
                     elif "execute" in event:
                         for message in event["execute"]["messages"]:
                             tool_name = message.name
-                            tool_result = eval(message.content)[0]
+                            tool_result = tool_result_output(message.artifact)
 
                             if tool_result:
                                 metadata = {"title": f"🖼️ Image from tool: {tool_name}"}
-                                formatted_result = " ".join(
-                                    line.strip() for line in str(tool_result).splitlines()
-                                ).strip()
+                                formatted_result = tool_result_content(tool_result)
                                 metadata["description"] = formatted_result
                                 chat_history.append(
                                     ChatMessage(
@@ -164,16 +300,22 @@ class ChatInterface:
 
                             # For image_visualizer, use display path
                             if tool_name == "image_visualizer":
-                                self.display_file_path = tool_result["image_path"]
+                                session.display_file_path = tool_result["image_path"]
                                 chat_history.append(
                                     ChatMessage(
                                         role="assistant",
-                                        # content=gr.Image(value=self.display_file_path),
-                                        content={"path": self.display_file_path},
+                                        # content=gr.Image(value=session.display_file_path),
+                                        content={"path": session.display_file_path},
                                     )
                                 )
 
-                            yield chat_history, self.display_file_path, ""
+                            # Visualizations are not sent to the LLM; show them directly
+                            for path in self._visualization_paths(tool_result):
+                                chat_history.append(
+                                    ChatMessage(role="assistant", content={"path": path})
+                                )
+
+                            yield chat_history, session.display_file_path, ""
 
         except Exception as e:
             chat_history.append(
@@ -181,23 +323,45 @@ class ChatInterface:
                     role="assistant", content=f"❌ Error: {str(e)}", metadata={"title": "Error"}
                 )
             )
-            yield chat_history, self.display_file_path
-
-
-def create_demo(agent, tools_dict):
+            yield chat_history, session.display_file_path, ""
+
+
+def create_demo(
+    agent,
+    tools_dict,
+    llm_image_max_size=1024,
+    llm_image_quality=85,
+    concurrency_limit=1,
+    max_queue_size=None,
+    prefetch_tools=(),
+):
     """
     Create a Gradio demo interface for the medical AI agent.
 
+    Each browser session gets its own SessionState, so several users can share one
+    process. Requests beyond concurrency_limit wait in a queue that shows each user
+    their position.
+
     Args:
         agent: The medical AI agent to handle requests
         tools_dict (dict): Dictionary of available tools for image processing
+        llm_image_max_size (int): Longer side in pixels of the image copy sent to the LLM
+        llm_image_quality (int): JPEG quality of the image copy sent to the LLM
+        concurrency_limit (int): Agent turns processed at the same time. Set it to the
+            number of model replicas; tool calls to a single model are serialized anyway
+        max_queue_size (int, optional): Maximum number of waiting requests. None is unbounded
+        prefetch_tools (Sequence[str]): Keys of cached tools to run on each upload in the background
 
     Returns:
         gr.Blocks: Gradio Blocks interface
     """
-    interface = ChatInterface(agent, tools_dict)
+    interface = ChatInterface(
+        agent, tools_dict, llm_image_max_size, llm_image_quality, prefetch_tools=prefetch_tools
+    )
 
     with gr.Blocks(theme=gr.themes.Soft()) as demo:
+        session = gr.State(lambda: SessionState())
+
         with gr.Column():
             gr.Markdown(
                 """
@@ -247,33 +411,48 @@ def create_demo(agent, tools_dict):
                         new_thread_btn = gr.Button("New Thread")
 
         # Event handlers
-        def clear_chat():
-            interface.original_file_path = None
-            interface.display_file_path = None
-            return [], None
+        def clear_chat(state: SessionState):
+            state.original_file_path = None
+            state.display_file_path = None
+            return [], None, state
 
-        def new_thread():
-            interface.current_thread_id = str(time.time())
-            return [], interface.display_file_path
+        def new_thread(state: SessionState):
+            state.new_thread()
+            return [], state.display_file_path, state
 
-        def handle_file_upload(file):
-            return interface.handle_upload(file.name)
+        def handle_file_upload(file, state: SessionState):
+            return interface.handle_upload(file.name, state), state
 
         chat_msg = txt.submit(
-            interface.add_message, inputs=[txt, image_display, chatbot], outputs=[chatbot, txt]
+            interface.add_message,
+            inputs=[txt, image_display, chatbot, session],
+            outputs=[chatbot, txt],
+            queue=False,
         )
         bot_msg = chat_msg.then(
             interface.process_message,
-            inputs=[txt, image_display, chatbot],
+            inputs=[txt, image_display, chatbot, session],
             outputs=[chatbot, image_display, txt],
+            concurrency_limit=concurrency_limit,
+            concurrency_id="agent",
+            show_progress="full",
         )
-        bot_msg.then(lambda: gr.Textbox(interactive=True), None, [txt])
+        bot_msg.then(lambda: gr.Textbox(interactive=True), None, [txt], queue=False)
 
-        upload_button.upload(handle_file_upload, inputs=upload_button, outputs=image_display)
+        upload_button.upload(
+            handle_file_upload, inputs=[upload_button, session], outputs=[image_display, session]
+        )
 
-        dicom_upload.upload(handle_file_upload, inputs=dicom_upload, outputs=image_display)
+        dicom_upload.upload(
+            handle_file_upload, inputs=[dicom_upload, session], outputs=[image_display, session]
+        )
 
-        clear_btn.click(clear_chat, outputs=[chatbot, image_display])
-        new_thread_btn.click(new_thread, outputs=[chatbot, image_display])
+        clear_btn.click(
+            clear_chat, inputs=session, outputs=[chatbot, image_display, session], queue=False
+        )
+        new_thread_btn.click(
+            new_thread, inputs=session, outputs=[chatbot, image_display, session], queue=False
+        )
 
+    demo.queue(default_concurrency_limit=None, max_size=max_queue_size)
     return demo
@@ -26,7 +26,24 @@ def initialize_agent(
     model="chatgpt-4o-latest",
     temperature=0.7,
     top_p=0.95,
-    openai_kwargs={}
+    openai_kwargs={},
+    parallel_tools=False,
+    max_parallel_tools=4,
+    inference_workers=None,
+    cache_tool_results=True,
+    tool_cache_dir=None,
+    tool_cache_max_bytes=256 * 1024 * 1024,
+    max_context_tokens=None,
+    checkpoint_db=None,
+    max_threads=None,
+    thread_ttl_s=None,
+    model_backend="torch",
+    onnx_options=None,
+    model_quantization=None,
+    quantization_options=None,
+    classifier_ensemble=None,
+    render_options=None,
+    segmentation_resolution=512,
 ):
     """Initialize the MedRAX agent with specified tools and configuration.
 
@@ -40,23 +57,82 @@ def initialize_agent(
         temperature (float, optional): Temperature for the model. Defaults to 0.7.
         top_p (float, optional): Top P for the model. Defaults to 0.95.
         openai_kwargs (dict, optional): Additional keyword arguments for OpenAI API, such as API key and base URL.
+        parallel_tools (bool, optional): Run the tool calls of one turn concurrently. Defaults to False.
+        max_parallel_tools (int, optional): Maximum number of concurrent tool calls. Defaults to 4.
+        inference_workers (int, optional): Threads of the shared executor that runs model inference
+            for async tool calls. Defaults to None, which keeps the executor default.
+        cache_tool_results (bool, optional): Serve repeated tool calls on the same image from a
+            content-addressed result cache. Defaults to True.
+        tool_cache_dir (str, optional): Directory for the on-disk cache tier that survives restarts.
+            Defaults to None (memory only).
+        tool_cache_max_bytes (int, optional): Byte budget of the in-memory cache. Defaults to 256 MiB.
+        max_context_tokens (int, optional): Token budget of the conversation sent to the LLM. Older
+            images and tool results are compacted to fit it. Defaults to None (no compaction).
+        checkpoint_db (str, optional): SQLite file for conversation state, which then survives restarts
+            and does not grow process memory. Requires `medrax[sqlite]`. Defaults to None (in memory).
+        max_threads (int, optional): With checkpoint_db, keep at most this many threads. Defaults to None.
+        thread_ttl_s (float, optional): With checkpoint_db, evict threads idle for this many seconds.
+            Defaults to None. Setting either without checkpoint_db raises a ValueError.
+        model_backend (str, optional): Runtime of the classifier and segmentation tools. "onnx" exports
+            them to ONNX once and runs them with ONNX Runtime on the CPU (`medrax[onnx]`). Defaults to "torch".
+        onnx_options (OnnxOptions, optional): Thread and cache settings of the onnx backend.
+        model_quantization (str, optional): "int8" runs the classifier and segmentation tools with
+            static INT8 quantization on the CPU, calibrated once on quantization_options.calibration_dir.
+            Defaults to None.
+        quantization_options (QuantizationOptions, optional): Calibration and cache settings of INT8
+            quantization.
+        classifier_ensemble (List[str], optional): DenseNet weights names the classifier tool runs as
+            an ensemble in one call, e.g. ["densenet121-res224-all", "densenet121-res224-nih"].
+            Defaults to None (single model).
+        render_options (RenderOptions, optional): Resolution, format and backend ("pil" or
+            "matplotlib") of the segmentation and grounding visualizations. Defaults to None,
+            which renders 1024 px PNGs with NumPy/PIL.
+        segmentation_resolution (int, optional): Input size of the segmentation tool, 256, 384 or
+            512. Lower sizes are faster on the CPU with coarser mask edges. Defaults to 512.
 
     Returns:
         Tuple[Agent, Dict[str, BaseTool]]: Initialized agent and dictionary of tool instances
     """
+    if not checkpoint_db and (max_threads is not None or thread_ttl_s is not None):
+        raise ValueError("max_threads and thread_ttl_s require checkpoint_db")
+
     prompts = load_prompts_from_file(prompt_file)
+    if inference_workers:
+        configure_inference_executor(inference_workers)
     prompt = prompts["MEDICAL_ASSISTANT"]
+    # ONNX Runtime and INT8 kernels run on the CPU whatever device the other tools use
+    backend_device = "cpu" if model_backend == "onnx" or model_quantization else device
+    backend_kwargs = dict(
+        backend=model_backend,
+        onnx_options=onnx_options,
+        quantization=model_quantization,
+        quantization_options=quantization_options,
+    )
 
     all_tools = {
-        "ChestXRayClassifierTool": lambda: ChestXRayClassifierTool(device=device),
-        "ChestXRaySegmentationTool": lambda: ChestXRaySegmentationTool(device=device),
+        "ChestXRayClassifierTool": lambda: ChestXRayClassifierTool(
+            device=backend_device, ensemble_weights=classifier_ensemble, **backend_kwargs
+        ),
+        "ChestXRaySegmentationTool": lambda: ChestXRaySegmentationTool(
+            device=backend_device,
+            render_options=render_options,
+            resolution=segmentation_resolution,
+            **backend_kwargs,
+        ),
+        "ChestXRayMeasurementTool": lambda: ChestXRayMeasurementTool(
+            device=backend_device, resolution=segmentation_resolution, **backend_kwargs
+        ),
         "LlavaMedTool": lambda: LlavaMedTool(cache_dir=model_dir, device=device, load_in_8bit=True),
         "XRayVQATool": lambda: XRayVQATool(cache_dir=model_dir, device=device),
         "ChestXRayReportGeneratorTool": lambda: ChestXRayReportGeneratorTool(
             cache_dir=model_dir, device=device
         ),
         "XRayPhraseGroundingTool": lambda: XRayPhraseGroundingTool(
-            cache_dir=model_dir, temp_dir=temp_dir, load_in_8bit=True, device=device
+            cache_dir=model_dir,
+            temp_dir=temp_dir,
+            load_in_8bit=True,
+            device=device,
+            render_options=render_options,
         ),
         "ChestXRayGeneratorTool": lambda: ChestXRayGeneratorTool(
             model_path=f"{model_dir}/roentgen", temp_dir=temp_dir, device=device
@@ -72,7 +148,18 @@ def initialize_agent(
         if tool_name in all_tools:
             tools_dict[tool_name] = all_tools[tool_name]()
 
-    checkpointer = MemorySaver()
+    if cache_tool_results:
+        tool_cache = ToolResultCache(max_memory_bytes=tool_cache_max_bytes, disk_dir=tool_cache_dir)
+        tools_dict = cache_tools(tools_dict, tool_cache)
+
+    if checkpoint_db:
+        from medrax.agent.checkpoint import BoundedSqliteSaver
+
+        checkpointer = BoundedSqliteSaver(
+            checkpoint_db, max_threads=max_threads, thread_ttl_s=thread_ttl_s
+        )
+    else:
+        checkpointer = MemorySaver()
     model = ChatOpenAI(model=model, temperature=temperature, top_p=top_p, **openai_kwargs)
     agent = Agent(
         model,
@@ -81,6 +168,9 @@ def initialize_agent(
         log_dir="logs",
         system_prompt=prompt,
         checkpointer=checkpointer,
+        parallel_tools=parallel_tools,
+        max_parallel_tools=max_parallel_tools,
+        max_context_tokens=max_context_tokens,
     )
 
     print("Agent initialized")
@@ -101,6 +191,7 @@ if __name__ == "__main__":
         "DicomProcessorTool",
         "ChestXRayClassifierTool",
         "ChestXRaySegmentationTool",
+        "ChestXRayMeasurementTool",
         "ChestXRayReportGeneratorTool",
         "XRayVQATool",
         # "LlavaMedTool",
@@ -127,6 +218,14 @@ if __name__ == "__main__":
         top_p=0.95,
         openai_kwargs=openai_kwargs
     )
-    demo = create_demo(agent, tools_dict)
+    # One agent turn at a time per set of loaded models; raise with more replicas
+    demo = create_demo(
+        agent,
+        tools_dict,
+        concurrency_limit=1,
+        max_queue_size=32,
+        # Tools the agent almost always calls first; run them while the user is typing
+        prefetch_tools=["ChestXRayClassifierTool", "ChestXRaySegmentationTool"],
+    )
 
     demo.launch(server_name="0.0.0.0", server_port=8585, share=True)
@@ -1 +1,2 @@
 from .agent import AgentState, Agent
+from .tool_log import ToolCallLogWriter, iter_tool_call_logs
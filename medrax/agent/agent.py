@@ -1,15 +1,23 @@
-import json
+import asyncio
 import operator
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 from datetime import datetime
-from typing import List, Dict, Any, TypedDict, Annotated, Optional
+from typing import List, Dict, Any, TypedDict, Annotated, Optional, AsyncIterator
 
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import AnyMessage, SystemMessage, ToolMessage
 from langchain_core.language_models import BaseLanguageModel
+from langchain_core.runnables import RunnableLambda
 from langchain_core.tools import BaseTool
 
+from medrax.agent.artifacts import tool_result_artifact, tool_result_content
+from medrax.agent.compaction import compact_messages, model_token_counter
+from medrax.agent.tool_log import ToolCallLogWriter
+from medrax.utils.inference import model_lock
+
 _ = load_dotenv()
 
 
@@ -22,7 +30,9 @@ class ToolCallLog(TypedDict):
         tool_call_id (str): The unique identifier for the tool call.
         name (str): The name of the tool that was called.
         args (Any): The arguments passed to the tool.
-        content (str): The content or result of the tool call.
+        content (str): The result summary sent to the LLM.
+        artifact (Any): The full result returned by the tool.
+        duration_ms (float): Wall time of the tool call in milliseconds.
     """
 
     timestamp: str
@@ -30,6 +40,8 @@ class ToolCallLog(TypedDict):
     name: str
     args: Any
     content: str
+    artifact: Any
+    duration_ms: float
 
 
 class AgentState(TypedDict):
@@ -50,6 +62,10 @@ class Agent:
     A class representing an agent that processes requests and executes tools based on
     language model responses.
 
+    The workflow supports both the synchronous (invoke/stream) and the asynchronous
+    (ainvoke/astream) LangGraph APIs. On the async path the LLM is called with ainvoke
+    and tools run through their _arun, which moves model inference off the event loop.
+
     Attributes:
         model (BaseLanguageModel): The language model used for processing.
         tools (Dict[str, BaseTool]): A dictionary of available tools.
@@ -58,6 +74,10 @@ class Agent:
         workflow (StateGraph): The compiled workflow for the agent's processing.
         log_tools (bool): Whether to log tool calls.
         log_path (Path): Path to save tool call logs.
+        log_writer (ToolCallLogWriter): Background JSONL sink for tool call logs.
+        parallel_tools (bool): Whether tool calls of one turn run concurrently.
+        max_parallel_tools (int): Maximum number of tool calls running at the same time.
+        max_context_tokens (Optional[int]): Token budget of the history sent to the LLM.
     """
 
     def __init__(
@@ -68,6 +88,10 @@ class Agent:
         system_prompt: str = "",
         log_tools: bool = True,
         log_dir: Optional[str] = "logs",
+        parallel_tools: bool = False,
+        max_parallel_tools: int = 4,
+        max_context_tokens: Optional[int] = None,
+        tool_content_chars: int = 2000,
     ):
         """
         Initialize the Agent.
@@ -79,18 +103,40 @@ class Agent:
             system_prompt (str, optional): System instructions. Defaults to "".
             log_tools (bool, optional): Whether to log tool calls. Defaults to True.
             log_dir (str, optional): Directory to save logs. Defaults to 'logs'.
+            parallel_tools (bool, optional): Run the tool calls of one turn concurrently
+                on a bounded thread pool. Defaults to False.
+            max_parallel_tools (int, optional): Size of the tool thread pool. Defaults to 4.
+            max_context_tokens (int, optional): Token budget of the messages sent to the
+                LLM. Older images, tool results and turns are compacted to fit it; the
+                stored thread state is left intact. Defaults to None (no compaction).
+            tool_content_chars (int, optional): Length old tool results are truncated
+                to during compaction. Defaults to 2000.
         """
         self.system_prompt = system_prompt
         self.log_tools = log_tools
+        self.parallel_tools = parallel_tools
+        self.max_parallel_tools = max_parallel_tools
+        self.max_context_tokens = max_context_tokens
+        self.tool_content_chars = tool_content_chars
+        self._count_tokens = model_token_counter(model)
+        # Created here rather than on first use so concurrent turns share one pool;
+        # its threads only start when tools run in parallel
+        self._tool_executor = ThreadPoolExecutor(
+            max_workers=max_parallel_tools, thread_name_prefix="medrax-tool"
+        )
 
         if self.log_tools:
             self.log_path = Path(log_dir or "logs")
-            self.log_path.mkdir(exist_ok=True)
+            self.log_writer = ToolCallLogWriter(self.log_path)
 
         # Define the agent workflow
         workflow = StateGraph(AgentState)
-        workflow.add_node("process", self.process_request)
-        workflow.add_node("execute", self.execute_tools)
+        workflow.add_node(
+            "process", RunnableLambda(self.process_request, afunc=self.aprocess_request)
+        )
+        workflow.add_node(
+            "execute", RunnableLambda(self.execute_tools, afunc=self.aexecute_tools)
+        )
         workflow.add_conditional_edges(
             "process", self.has_tool_calls, {True: "execute", False: END}
         )
@@ -111,12 +157,44 @@ class Agent:
         Returns:
             Dict[str, List[AnyMessage]]: A dictionary containing the model's response.
         """
-        messages = state["messages"]
-        if self.system_prompt:
-            messages = [SystemMessage(content=self.system_prompt)] + messages
-        response = self.model.invoke(messages)
+        response = self.model.invoke(self._prepare_messages(state["messages"]))
         return {"messages": [response]}
 
+    async def aprocess_request(self, state: AgentState) -> Dict[str, List[AnyMessage]]:
+        """
+        Asynchronously process the request using the language model.
+
+        Args:
+            state (AgentState): The current state of the agent.
+
+        Returns:
+            Dict[str, List[AnyMessage]]: A dictionary containing the model's response.
+        """
+        response = await self.model.ainvoke(self._prepare_messages(state["messages"]))
+        return {"messages": [response]}
+
+    def _prepare_messages(self, messages: List[AnyMessage]) -> List[AnyMessage]:
+        """
+        Build the message list sent to the LLM: the system prompt followed by the
+        history, compacted to max_context_tokens if a budget is set.
+
+        Args:
+            messages (List[AnyMessage]): The thread's conversation history.
+
+        Returns:
+            List[AnyMessage]: Messages to pass to the language model.
+        """
+        system = [SystemMessage(content=self.system_prompt)] if self.system_prompt else []
+        if self.max_context_tokens is not None:
+            messages = compact_messages(
+                messages,
+                self.max_context_tokens,
+                self._count_tokens,
+                reserved_tokens=self._count_tokens(system) if system else 0,
+                tool_content_chars=self.tool_content_chars,
+            )
+        return system + messages
+
     def has_tool_calls(self, state: AgentState) -> bool:
         """
         Check if the response contains any tool calls.
@@ -134,6 +212,10 @@ class Agent:
         """
         Execute tool calls from the model's response.
 
+        When parallel_tools is enabled and the model requested more than one tool,
+        the calls run concurrently on a bounded thread pool. Calls to the same tool
+        are still serialized, and the returned messages keep the order of the calls.
+
         Args:
             state (AgentState): The current state of the agent.
 
@@ -141,33 +223,132 @@ class Agent:
             Dict[str, List[ToolMessage]]: A dictionary containing tool execution results.
         """
         tool_calls = state["messages"][-1].tool_calls
-        results = []
 
-        for call in tool_calls:
-            print(f"Executing tool: {call}")
-            if call["name"] not in self.tools:
-                print("\n....invalid tool....")
-                result = "invalid tool, please retry"
-            else:
-                result = self.tools[call["name"]].invoke(call["args"])
-
-            results.append(
-                ToolMessage(
-                    tool_call_id=call["id"],
-                    name=call["name"],
-                    args=call["args"],
-                    content=str(result),
-                )
-            )
+        if self.parallel_tools and len(tool_calls) > 1:
+            results = list(self._tool_executor.map(self._run_tool_call, tool_calls))
+        else:
+            results = [self._run_tool_call(call) for call in tool_calls]
+
+        self._save_tool_calls(results)
+        print("Returning to model processing!")
+
+        return {"messages": results}
+
+    async def aexecute_tools(self, state: AgentState) -> Dict[str, List[ToolMessage]]:
+        """
+        Asynchronously execute tool calls from the model's response.
+
+        When parallel_tools is enabled, the calls of one turn are awaited together with
+        asyncio.gather. The returned messages keep the order of the calls.
+
+        Args:
+            state (AgentState): The current state of the agent.
+
+        Returns:
+            Dict[str, List[ToolMessage]]: A dictionary containing tool execution results.
+        """
+        tool_calls = state["messages"][-1].tool_calls
+
+        if self.parallel_tools and len(tool_calls) > 1:
+            results = list(await asyncio.gather(*(self._arun_tool_call(c) for c in tool_calls)))
+        else:
+            results = [await self._arun_tool_call(call) for call in tool_calls]
 
         self._save_tool_calls(results)
         print("Returning to model processing!")
 
         return {"messages": results}
 
+    async def astream(
+        self, messages: List[Any], thread_id: str, **kwargs: Any
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream workflow events for new messages without blocking the event loop.
+
+        Args:
+            messages (List[Any]): New messages to add to the thread.
+            thread_id (str): Identifier of the conversation thread.
+            **kwargs (Any): Extra arguments passed to the compiled workflow's astream.
+
+        Yields:
+            Dict[str, Any]: Workflow events keyed by node name.
+        """
+        async for event in self.workflow.astream(
+            {"messages": messages}, {"configurable": {"thread_id": thread_id}}, **kwargs
+        ):
+            yield event
+
+    def _run_tool_call(self, call: Dict[str, Any]) -> ToolMessage:
+        """
+        Run a single tool call and wrap its result in a ToolMessage.
+
+        Args:
+            call (Dict[str, Any]): The tool call emitted by the model.
+
+        Returns:
+            ToolMessage: The tool result, with the wall time of the call in its
+                response metadata.
+        """
+        print(f"Executing tool: {call}")
+        start_time = time.perf_counter()
+
+        if call["name"] not in self.tools:
+            print("\n....invalid tool....")
+            result = "invalid tool, please retry"
+        else:
+            tool = self.tools[call["name"]]
+            with model_lock(tool):
+                result = tool.invoke(call["args"])
+
+        return self._tool_message(call, result, start_time)
+
+    async def _arun_tool_call(self, call: Dict[str, Any]) -> ToolMessage:
+        """
+        Asynchronously run a single tool call through the tool's _arun.
+
+        Args:
+            call (Dict[str, Any]): The tool call emitted by the model.
+
+        Returns:
+            ToolMessage: The tool result, with the wall time of the call in its
+                response metadata.
+        """
+        print(f"Executing tool: {call}")
+        start_time = time.perf_counter()
+
+        if call["name"] not in self.tools:
+            print("\n....invalid tool....")
+            result = "invalid tool, please retry"
+        else:
+            result = await self.tools[call["name"]].ainvoke(call["args"])
+
+        return self._tool_message(call, result, start_time)
+
+    def _tool_message(self, call: Dict[str, Any], result: Any, start_time: float) -> ToolMessage:
+        """
+        Wrap a tool result in a ToolMessage that records the call's wall time.
+
+        The LLM sees a compact JSON summary as the message content. The full result is
+        kept as the message artifact for the UI and the logs.
+        """
+        duration_ms = (time.perf_counter() - start_time) * 1000
+        print(f"Tool {call['name']} finished in {duration_ms:.1f} ms")
+
+        return ToolMessage(
+            tool_call_id=call["id"],
+            name=call["name"],
+            args=call["args"],
+            content=tool_result_content(result),
+            artifact=tool_result_artifact(result),
+            response_metadata={"duration_ms": duration_ms},
+        )
+
     def _save_tool_calls(self, tool_calls: List[ToolMessage]) -> None:
         """
-        Save tool calls to a JSON file with timestamp-based naming.
+        Queue tool calls for the background log writer.
+
+        Records are serialized and appended to a rotating JSONL file off the request
+        thread; artifacts are passed as they are.
 
         Args:
             tool_calls (List[ToolMessage]): List of tool calls to save.
@@ -175,9 +356,6 @@ class Agent:
         if not self.log_tools:
             return
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = self.log_path / f"tool_calls_{timestamp}.json"
-
         logs: List[ToolCallLog] = []
         for call in tool_calls:
             log_entry = {
@@ -185,9 +363,10 @@ class Agent:
                 "name": call.name,
                 "args": call.args,
                 "content": call.content,
+                "artifact": call.artifact,
+                "duration_ms": call.response_metadata.get("duration_ms"),
                 "timestamp": datetime.now().isoformat(),
             }
             logs.append(log_entry)
 
-        with open(filename, "w") as f:
-            json.dump(logs, f, indent=4)
+        self.log_writer.write_many(logs)
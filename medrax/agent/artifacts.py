@@ -0,0 +1,214 @@
+import json
+import re
+from typing import Any, List
+
+import numpy as np
+
+# Output keys that are only useful to the UI. They are kept in the ToolMessage artifact
+# but never sent to the LLM.
+ARTIFACT_ONLY_KEYS = frozenset(
+    {
+        "segmentation_image_path",
+        "visualization_path",
+        "mask",
+        "masks",
+        "error_traceback",
+    }
+)
+
+FLOAT_DIGITS = 4
+# Attempts at shortening a summary before it is replaced by a size note
+MAX_SHRINK_STEPS = 64
+# Markers of dropped list items and object entries
+MORE_PREFIX = "... "
+MORE_KEY = "..."
+
+
+def tool_result_content(result: Any, max_chars: int = 8000) -> str:
+    """
+    Build the compact JSON text the LLM sees for a tool result.
+
+    Tools return `(output, metadata)` tuples whose full payload is kept as the
+    ToolMessage artifact for the UI. The LLM gets a JSON summary instead of a Python
+    repr: NumPy values become plain numbers, floats are rounded, arrays and UI-only
+    items (visualization paths, masks, tracebacks) are left out.
+
+    Args:
+        result (Any): The raw tool result.
+        max_chars (int, optional): Maximum length of the summary. Longer summaries are
+            shortened structurally (long strings cut, list and object tails dropped, each
+            with a marker) so they stay valid JSON. Defaults to 8000.
+
+    Returns:
+        str: JSON text for the ToolMessage content.
+    """
+    if isinstance(result, str):
+        return result
+
+    if isinstance(result, tuple) and len(result) == 2:
+        output, metadata = result
+        payload = {"output": _compact(output), "metadata": _compact(metadata)}
+    else:
+        payload = _compact(result)
+
+    return _fit(payload, max_chars)
+
+
+def tool_result_artifact(result: Any) -> Any:
+    """
+    Make a tool result safe to store as a ToolMessage artifact.
+
+    The artifact is saved with the rest of the conversation by the checkpointer, whose
+    serializer handles arrays but not NumPy scalars. Those are turned into plain
+    Python numbers; everything else is kept as is.
+
+    Args:
+        result (Any): The raw tool result.
+
+    Returns:
+        Any: The result with NumPy scalars replaced.
+    """
+    if isinstance(result, dict):
+        return {key: tool_result_artifact(item) for key, item in result.items()}
+    if isinstance(result, (list, tuple)):
+        return type(result)(tool_result_artifact(item) for item in result)
+    if isinstance(result, np.generic):
+        return result.item()
+    return result
+
+
+def tool_result_log(artifact: Any) -> str:
+    """
+    Serialize a tool result artifact as JSON text for the tool call log.
+
+    The text is stored like `content`, so the log writer moves large artifacts (masks,
+    metric tables, DICOM metadata) into blobs instead of inlining them. NumPy values
+    become plain numbers and lists; other objects that JSON cannot hold, such as paths,
+    are written as strings.
+
+    Args:
+        artifact (Any): The ToolMessage artifact.
+
+    Returns:
+        str: JSON text of the artifact.
+    """
+    return json.dumps(tool_result_artifact(artifact), ensure_ascii=False, default=_to_json)
+
+
+def _to_json(value: Any) -> Any:
+    """JSON value of an object json.dumps cannot serialize."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def tool_result_output(artifact: Any) -> Any:
+    """
+    Get the output part of a tool result artifact.
+
+    Args:
+        artifact (Any): The ToolMessage artifact.
+
+    Returns:
+        Any: The first element of an `(output, metadata)` tuple, or the artifact itself.
+    """
+    if isinstance(artifact, (tuple, list)) and len(artifact) == 2:
+        return artifact[0]
+    return artifact
+
+
+def _compact(value: Any) -> Any:
+    """Convert a value to JSON-friendly, LLM-relevant data."""
+    if isinstance(value, dict):
+        return {
+            str(key): _compact(item)
+            for key, item in value.items()
+            if key not in ARTIFACT_ONLY_KEYS and not isinstance(item, np.ndarray)
+        }
+    if isinstance(value, (list, tuple)):
+        return [_compact(item) for item in value if not isinstance(item, np.ndarray)]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        return round(value, FLOAT_DIGITS)
+    return value
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _fit(payload: Any, max_chars: int) -> str:
+    """Serialize a payload, shortening its largest parts until it fits max_chars."""
+    content = _dumps(payload)
+    original = len(content)
+    for _ in range(MAX_SHRINK_STEPS):
+        if len(content) <= max_chars:
+            return content
+        payload = _shrink(payload, len(content) - max_chars)
+        content = _dumps(payload)
+    if len(content) <= max_chars:
+        return content
+    return _dumps({"truncated": f"result of {original} characters omitted"})
+
+
+def _shrink(value: Any, excess: int) -> Any:
+    """Shorten the largest part of a JSON value by about excess characters."""
+    if isinstance(value, str):
+        if len(value) <= 32:
+            return value
+        keep = max(len(value) - excess - 32, 16)
+        return f"{value[:keep]}... [truncated {len(value) - keep} characters]"
+
+    if isinstance(value, dict):
+        omitted = _omitted(value.get(MORE_KEY), "entries")
+        items = [(k, item) for k, item in value.items() if not (k == MORE_KEY and omitted)]
+        sizes = [len(_dumps({key: item})) - 1 for key, item in items]
+    elif isinstance(value, list):
+        omitted = _omitted(value[-1] if value else None, "items")
+        if omitted:
+            value = value[:-1]
+        items = list(enumerate(value))
+        sizes = [len(_dumps(item)) + 1 for item in value]
+    else:
+        return value
+    if not items:
+        return value
+
+    largest = max(range(len(items)), key=sizes.__getitem__)
+    # Shorten the largest part in place when it stands out, or when it is a large entry of
+    # a small object whose keys are all worth keeping; otherwise drop the tail
+    stands_out = sizes[largest] * len(items) >= 2 * sum(sizes)
+    few_keys = isinstance(value, dict) and len(items) <= 16 and sizes[largest] > 64
+    if stands_out or few_keys or len(items) == 1:
+        key, item = items[largest]
+        shrunk = _shrink(item, excess if stands_out else min(excess, sizes[largest] // 2))
+        if shrunk is not item:
+            if isinstance(value, dict):
+                return {**value, key: shrunk}
+            return value[:key] + [shrunk] + value[key + 1 :] + _more_items(omitted)
+
+    # Drop items from the end, with room for the marker, keeping at least one
+    keep, dropped = len(items), 0
+    while keep > 1 and dropped < excess + 32:
+        keep -= 1
+        dropped += sizes[keep]
+    omitted += len(items) - keep
+    if isinstance(value, dict):
+        return {**dict(items[:keep]), MORE_KEY: f"{omitted} more entries"}
+    return value[:keep] + _more_items(omitted)
+
+
+def _more_items(omitted: int) -> List[str]:
+    """Marker ending a list whose last items were dropped."""
+    return [f"{MORE_PREFIX}{omitted} more items"] if omitted else []
+
+
+def _omitted(marker: Any, kind: str) -> int:
+    """Number of dropped items recorded by a marker of an earlier step, or 0."""
+    if not isinstance(marker, str):
+        return 0
+    match = re.fullmatch(rf"(?:{re.escape(MORE_PREFIX)})?(\d+) more {kind}", marker)
+    return int(match.group(1)) if match else 0
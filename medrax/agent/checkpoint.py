@@ -0,0 +1,516 @@
+"""
+SQLite-backed conversation checkpointer with bounded storage.
+
+Requires the optional `langgraph-checkpoint-sqlite` package:
+
+    pip install "medrax[sqlite]"
+"""
+
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from medrax.utils.cache import LRUCache
+
+BLOB_MARKER = "medrax-blob:"
+_BLOB_REF = re.compile(rb"medrax-blob:([0-9a-f]{64})")
+
+
+class SqliteBlobStore:
+    """
+    Content-addressed store for large strings (e.g. base64 images) in a SQLite table.
+
+    Each distinct value is stored once, however many checkpoints refer to it. Recently
+    read values are kept in a byte-bounded in-memory LRU.
+
+    Attributes:
+        conn (sqlite3.Connection): Connection used only for the blob table.
+        cache (LRUCache): In-memory cache of decoded values.
+    """
+
+    def __init__(self, path: Union[str, Path], cache_bytes: int = 64 * 1024 * 1024):
+        """
+        Open the blob table.
+
+        Args:
+            path (Union[str, Path]): SQLite database file.
+            cache_bytes (int, optional): Byte budget of the read cache. Defaults to 64 MiB.
+        """
+        self.conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "digest TEXT PRIMARY KEY, data BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+        self.cache = LRUCache(cache_bytes, sizeof=len)
+        self._lock = threading.Lock()
+
+    def put(self, value: Union[str, bytes]) -> str:
+        """
+        Store a value and return its digest.
+
+        Args:
+            value (Union[str, bytes]): The value to store; strings are stored as UTF-8.
+
+        Returns:
+            str: SHA-256 hex digest identifying the value.
+        """
+        data = value.encode("utf-8") if isinstance(value, str) else value
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self.cache:
+            with self._lock:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO blobs (digest, data, created_at) VALUES (?, ?, ?)",
+                    (digest, data, time.time()),
+                )
+                self.conn.commit()
+            self.cache.put(digest, value, nbytes=len(data))
+        return digest
+
+    def get(self, digest: str) -> str:
+        """
+        Load a string value by digest.
+
+        Args:
+            digest (str): Digest returned by put.
+
+        Returns:
+            str: The stored value.
+
+        Raises:
+            KeyError: If the blob does not exist.
+        """
+        value = self._get(digest)
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+            self.cache.put(digest, value, nbytes=len(value))
+        return value
+
+    def get_bytes(self, digest: str) -> bytes:
+        """
+        Load a value by digest as bytes.
+
+        Args:
+            digest (str): Digest returned by put.
+
+        Returns:
+            bytes: The stored data.
+
+        Raises:
+            KeyError: If the blob does not exist.
+        """
+        value = self._get(digest)
+        return value.encode("utf-8") if isinstance(value, str) else value
+
+    def _get(self, digest: str) -> Union[str, bytes]:
+        """Load a value from the cache, or its raw data from the table."""
+        value = self.cache.get(digest)
+        if value is not None:
+            return value
+
+        with self._lock:
+            row = self.conn.execute("SELECT data FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            raise KeyError(digest)
+        data = bytes(row[0])
+        self.cache.put(digest, data, nbytes=len(data))
+        return data
+
+    def sweep(self, referenced: Set[str], min_age_s: float) -> int:
+        """
+        Delete blobs that no checkpoint refers to.
+
+        Args:
+            referenced (Set[str]): Digests still in use.
+            min_age_s (float): Blobs younger than this are kept, since the checkpoint
+                that refers to them may not be committed yet.
+
+        Returns:
+            int: Number of deleted blobs.
+        """
+        cutoff = time.time() - min_age_s
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT digest FROM blobs WHERE created_at < ?", (cutoff,)
+            ).fetchall()
+            orphans = [(digest,) for (digest,) in rows if digest not in referenced]
+            self.conn.executemany("DELETE FROM blobs WHERE digest = ?", orphans)
+            self.conn.commit()
+        for (digest,) in orphans:
+            self.cache.pop(digest)
+        return len(orphans)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number and total size of stored blobs."""
+        with self._lock:
+            count, nbytes = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM blobs"
+            ).fetchone()
+        return {"blobs": count, "blob_bytes": nbytes}
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+class BlobSerializer(JsonPlusSerializer):
+    """
+    Checkpoint serializer that stores large strings out of line.
+
+    Strings longer than inline_limit bytes (typically base64 image data) are moved to a
+    SqliteBlobStore and replaced by a short reference before serialization, and put
+    back on load. ToolMessage artifacts (metric tables, masks, report metadata) are
+    serialized on their own and stored the same way when they exceed inline_limit.
+    Because LangGraph writes the full message list into every checkpoint, this keeps
+    one copy of each image and artifact per database instead of one per checkpoint.
+    """
+
+    def __init__(self, store: SqliteBlobStore, inline_limit: int = 64 * 1024, **kwargs: Any):
+        """
+        Initialize the serializer.
+
+        Args:
+            store (SqliteBlobStore): Where large strings are stored.
+            inline_limit (int, optional): Size in bytes above which strings are stored
+                out of line. Defaults to 64 KiB.
+            **kwargs (Any): Passed to JsonPlusSerializer.
+        """
+        super().__init__(**kwargs)
+        self.store = store
+        self.inline_limit = inline_limit
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        return super().dumps_typed(self._externalize(obj))
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        return self._restore(super().loads_typed(data))
+
+    def _externalize(self, obj: Any) -> Any:
+        return _map_strings(obj, self._store_if_large, self._store_artifact_if_large)
+
+    def _restore(self, obj: Any) -> Any:
+        return _map_strings(obj, self._load_if_ref, self._load_artifact_if_ref)
+
+    def _store_artifact_if_large(self, artifact: Any) -> Any:
+        if _is_artifact_ref(artifact):
+            return artifact
+        type_, data = super().dumps_typed(artifact)
+        if len(data) <= self.inline_limit:
+            return artifact
+        return f"{BLOB_MARKER}{self.store.put(data)}:{type_}"
+
+    def _load_artifact_if_ref(self, artifact: Any) -> Any:
+        if not _is_artifact_ref(artifact):
+            return artifact
+        digest, type_ = artifact[len(BLOB_MARKER) :].split(":", 1)
+        return super().loads_typed((type_, self.store.get_bytes(digest)))
+
+    def _store_if_large(self, value: str) -> str:
+        if len(value) <= self.inline_limit:
+            return value
+        return BLOB_MARKER + self.store.put(value)
+
+    def _load_if_ref(self, value: str) -> str:
+        if value.startswith(BLOB_MARKER) and len(value) == len(BLOB_MARKER) + 64:
+            return self.store.get(value[len(BLOB_MARKER) :])
+        return value
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """
+    SQLite checkpointer for long-running deployments.
+
+    Compared to MemorySaver, conversation state lives in a local database file instead
+    of process memory and survives restarts. Storage is bounded:
+
+    - At most max_threads threads are kept; the least recently used are evicted.
+    - Threads idle for longer than thread_ttl_s are evicted.
+    - Large message content (images) is stored once per content hash, not per checkpoint.
+    - A background task periodically evicts expired threads, deletes unreferenced
+      content and vacuums the database.
+
+    Both the sync and the async LangGraph APIs are supported; async calls run the
+    SQLite work in a worker thread.
+
+    Attributes:
+        path (Path): The database file.
+        max_threads (Optional[int]): Maximum number of stored threads.
+        thread_ttl_s (Optional[float]): Idle time after which a thread is evicted.
+        maintenance_interval_s (Optional[float]): Seconds between background maintenance runs.
+        blobs (SqliteBlobStore): Out-of-line storage of large content.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_threads: Optional[int] = None,
+        thread_ttl_s: Optional[float] = None,
+        inline_limit: int = 64 * 1024,
+        blob_cache_bytes: int = 64 * 1024 * 1024,
+        maintenance_interval_s: Optional[float] = 600,
+    ):
+        """
+        Open (or create) the checkpoint database and start background maintenance.
+
+        Args:
+            path (Union[str, Path]): SQLite database file. Must be a file, not ":memory:".
+            max_threads (int, optional): Maximum number of stored threads. Defaults to None
+                (unbounded).
+            thread_ttl_s (float, optional): Idle time in seconds after which a thread is
+                evicted. Defaults to None (never).
+            inline_limit (int, optional): Message content above this many bytes is stored
+                out of line. Defaults to 64 KiB.
+            blob_cache_bytes (int, optional): Memory budget for recently read content.
+                Defaults to 64 MiB.
+            maintenance_interval_s (float, optional): Seconds between maintenance runs.
+                Defaults to 600. None disables the background task.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_threads = max_threads
+        self.thread_ttl_s = thread_ttl_s
+        self.maintenance_interval_s = maintenance_interval_s
+        self.blobs = SqliteBlobStore(self.path, cache_bytes=blob_cache_bytes)
+
+        conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        super().__init__(conn, serde=BlobSerializer(self.blobs, inline_limit))
+
+        self._stop = threading.Event()
+        self._maintenance_thread: Optional[threading.Thread] = None
+        if maintenance_interval_s:
+            self._maintenance_thread = threading.Thread(
+                target=self._maintenance_loop, name="medrax-checkpoint-maintenance", daemon=True
+            )
+            self._maintenance_thread.start()
+
+    def setup(self) -> None:
+        """Create the checkpoint tables plus the thread activity table."""
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS thread_activity ("
+            "thread_id TEXT PRIMARY KEY, last_used REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint, mark its thread as used and enforce max_threads."""
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = str(config["configurable"]["thread_id"])
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT INTO thread_activity (thread_id, last_used) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET last_used = excluded.last_used",
+                (thread_id, time.time()),
+            )
+        if self.max_threads is not None:
+            self._evict_threads(self._excess_threads())
+        return saved
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete all checkpoints, writes and activity records of a thread."""
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    def run_maintenance(self) -> Dict[str, int]:
+        """
+        Evict expired threads, delete unreferenced content and reclaim free space.
+
+        Called periodically by the background task; can also be called directly.
+
+        Returns:
+            Dict[str, int]: Number of evicted threads and deleted blobs.
+        """
+        evicted = self._evict_threads(self._expired_threads())
+        if self.max_threads is not None:
+            evicted += self._evict_threads(self._excess_threads())
+
+        deleted_blobs = self.blobs.sweep(self._referenced_blobs(), min_age_s=300)
+
+        with self.cursor() as cur:
+            page_count = cur.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = cur.execute("PRAGMA freelist_count").fetchone()[0]
+        if page_count and free_pages / page_count > 0.25:
+            with self.lock:
+                self.conn.execute("VACUUM")
+        with self.blobs._lock:
+            self.blobs.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        return {"evicted_threads": evicted, "deleted_blobs": deleted_blobs}
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of stored threads, content blobs and the database size."""
+        with self.cursor(transaction=False) as cur:
+            threads = cur.execute("SELECT COUNT(*) FROM thread_activity").fetchone()[0]
+        return {
+            "threads": threads,
+            **self.blobs.stats(),
+            "db_bytes": self.path.stat().st_size if self.path.exists() else 0,
+        }
+
+    def close(self) -> None:
+        """Stop background maintenance and close the database connections."""
+        self._stop.set()
+        if self._maintenance_thread is not None:
+            self._maintenance_thread.join()
+        with self.lock:
+            self.conn.close()
+        self.blobs.close()
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def _excess_threads(self) -> Iterable[str]:
+        with self.cursor(transaction=False) as cur:
+            rows = cur.execute(
+                "SELECT thread_id FROM thread_activity ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+                (self.max_threads,),
+            ).fetchall()
+        return [thread_id for (thread_id,) in rows]
+
+    def _expired_threads(self) -> Iterable[str]:
+        if self.thread_ttl_s is None:
+            return []
+        with self.cursor(transaction=False) as cur:
+            rows = cur.execute(
+                "SELECT thread_id FROM thread_activity WHERE last_used < ?",
+                (time.time() - self.thread_ttl_s,),
+            ).fetchall()
+        return [thread_id for (thread_id,) in rows]
+
+    def _evict_threads(self, thread_ids: Iterable[str]) -> int:
+        count = 0
+        for thread_id in thread_ids:
+            self.delete_thread(thread_id)
+            count += 1
+        return count
+
+    def _referenced_blobs(self) -> Set[str]:
+        """Collect the digests referenced by any stored checkpoint or write."""
+        referenced: Set[str] = set()
+        with self.cursor(transaction=False) as cur:
+            for (data,) in cur.execute("SELECT checkpoint FROM checkpoints"):
+                referenced.update(d.decode() for d in _BLOB_REF.findall(data or b""))
+            for (data,) in cur.execute("SELECT value FROM writes"):
+                referenced.update(d.decode() for d in _BLOB_REF.findall(data or b""))
+        return referenced
+
+    def _maintenance_loop(self) -> None:
+        while not self._stop.wait(self.maintenance_interval_s):
+            try:
+                self.run_maintenance()
+            except Exception as e:
+                print(f"Checkpoint maintenance failed: {e}")
+
+
+def _is_artifact_ref(value: Any) -> bool:
+    """Check for an artifact reference, "medrax-blob:<digest>:<serialization type>"."""
+    return (
+        isinstance(value, str)
+        and value.startswith(BLOB_MARKER)
+        and value[len(BLOB_MARKER) + 64 : len(BLOB_MARKER) + 65] == ":"
+    )
+
+
+def _map_strings(
+    obj: Any, func: Callable[[str], str], artifact_func: Optional[Callable[[Any], Any]] = None
+) -> Any:
+    """
+    Apply func to every string in nested dicts, lists, tuples and message contents,
+    and artifact_func to the artifact of every message that has one.
+
+    Containers are only copied when something inside them changed.
+    """
+    if isinstance(obj, str):
+        return func(obj)
+    if isinstance(obj, BaseMessage):
+        update = {}
+        content = _map_strings(obj.content, func, artifact_func)
+        if content is not obj.content:
+            update["content"] = content
+        artifact = getattr(obj, "artifact", None)
+        if artifact_func is not None and artifact is not None:
+            mapped_artifact = artifact_func(artifact)
+            if mapped_artifact is not artifact:
+                update["artifact"] = mapped_artifact
+        return obj.model_copy(update=update) if update else obj
+    if type(obj) is dict:
+        mapped = {key: _map_strings(value, func, artifact_func) for key, value in obj.items()}
+        return obj if all(mapped[k] is obj[k] for k in obj) else mapped
+    if type(obj) in (list, tuple):
+        mapped = [_map_strings(value, func, artifact_func) for value in obj]
+        if all(a is b for a, b in zip(mapped, obj)):
+            return obj
+        return type(obj)(mapped)
+    return obj
@@ -0,0 +1,225 @@
+import json
+from typing import Any, Callable, Dict, List, Sequence
+
+from langchain_core.messages import AnyMessage, HumanMessage, ToolMessage
+
+IMAGE_PLACEHOLDER = "[image omitted: shown again later in this conversation]"
+CARRIED_IMAGES_TEXT = "Images shared earlier in this conversation:"
+IMAGE_PATH_PREFIX = "image_path: "
+APPROX_IMAGE_TOKENS = 1000
+
+TokenCounter = Callable[[Sequence[AnyMessage]], int]
+
+
+def approximate_token_count(messages: Sequence[AnyMessage]) -> int:
+    """
+    Estimate the token count of messages without a tokenizer.
+
+    Uses roughly four characters per token for text and a fixed cost per image block.
+
+    Args:
+        messages (Sequence[AnyMessage]): Messages to measure.
+
+    Returns:
+        int: Estimated number of tokens.
+    """
+    total = 0
+    for message in messages:
+        content = message.content
+        if isinstance(content, str):
+            total += len(content) // 4 + 4
+            continue
+        for block in content:
+            if isinstance(block, dict) and block.get("type") == "image_url":
+                total += APPROX_IMAGE_TOKENS
+            else:
+                total += len(str(block)) // 4
+        total += 4
+    return total
+
+
+def model_token_counter(model: Any) -> TokenCounter:
+    """
+    Build a token counter that uses the model's own tokenizer when it has one.
+
+    Args:
+        model (Any): The (unbound) chat model, e.g. ChatOpenAI.
+
+    Returns:
+        TokenCounter: Function mapping messages to a token count.
+    """
+
+    def count(messages: Sequence[AnyMessage]) -> int:
+        try:
+            return model.get_num_tokens_from_messages(list(messages))
+        except Exception:
+            return approximate_token_count(messages)
+
+    return count
+
+
+def compact_messages(
+    messages: List[AnyMessage],
+    max_tokens: int,
+    count_tokens: TokenCounter,
+    reserved_tokens: int = 0,
+    tool_content_chars: int = 2000,
+) -> List[AnyMessage]:
+    """
+    Shrink a conversation history to fit a token budget before it is sent to the LLM.
+
+    The latest turn (from the last user message on) is always kept unchanged. Older
+    turns are compacted in stages until the history fits:
+
+    1. Image blocks repeated later in the conversation are replaced with a short
+       text reference.
+    2. ToolMessage contents are truncated to tool_content_chars.
+    3. Whole turns are dropped, oldest first.
+
+    The interface sends each image once per thread, so the last copy of every image
+    is never replaced. When its turn is dropped, the image moves to a user message
+    in front of the remaining history; these images are dropped last, oldest first.
+    The "image_path: ..." notes of dropped turns move there too and are always kept,
+    since tools can only be called on an upload whose path the LLM still sees.
+
+    Turns are dropped as a unit, so every tool call keeps its tool result. The input
+    list and its messages are not modified.
+
+    Args:
+        messages (List[AnyMessage]): Conversation history, without the system prompt.
+        max_tokens (int): Token budget for the returned messages plus reserved_tokens.
+        count_tokens (TokenCounter): Function that counts the tokens of a message list.
+        reserved_tokens (int, optional): Tokens already used, e.g. by the system prompt.
+        tool_content_chars (int, optional): Length old tool results are truncated to.
+
+    Returns:
+        List[AnyMessage]: Messages that fit the budget, or only the latest turn if
+            even that does not fit.
+    """
+    budget = max_tokens - reserved_tokens
+    if count_tokens(messages) <= budget:
+        return messages
+
+    turns = _split_turns(messages)
+    history, latest = turns[:-1], turns[-1]
+
+    def flatten(old_turns: List[List[AnyMessage]]) -> List[AnyMessage]:
+        return [m for turn in old_turns for m in turn] + latest
+
+    # Images whose last copy is in a turn: kept there, and carried along if it is dropped
+    last_turn = {}
+    for index, turn in enumerate(turns):
+        for block in _image_blocks(turn):
+            last_turn[_image_id(block)] = index
+
+    history = [
+        [_strip_images(m, lambda b: last_turn[_image_id(b)] != index) for m in turn]
+        for index, turn in enumerate(history)
+    ]
+    if count_tokens(flatten(history)) <= budget:
+        return flatten(history)
+
+    history = [[_truncate_tool_result(m, tool_content_chars) for m in turn] for turn in history]
+
+    # Count each turn once and subtract the turns that are dropped
+    turn_tokens = [count_tokens(turn) for turn in history]
+    total = sum(turn_tokens) + count_tokens(latest)
+    paths: List[str] = []
+    carried: List[Any] = []
+    carried_tokens: List[int] = []
+    while history and total > budget:
+        dropped = history.pop(0)
+        total -= turn_tokens.pop(0)
+        for note in _image_path_notes(dropped):
+            if note not in paths:
+                paths.append(note)
+                total += count_tokens([HumanMessage(content=note)])
+        for block in _image_blocks(dropped):
+            carried.append(block)
+            carried_tokens.append(count_tokens([HumanMessage(content=[block])]))
+            total += carried_tokens[-1]
+    while carried and total > budget:
+        carried.pop(0)
+        total -= carried_tokens.pop(0)
+
+    if not paths and not carried:
+        return flatten(history)
+    content: List[Any] = [{"type": "text", "text": note} for note in paths]
+    if carried:
+        content += [{"type": "text", "text": CARRIED_IMAGES_TEXT}, *carried]
+    return [HumanMessage(content=content)] + flatten(history)
+
+
+def _split_turns(messages: List[AnyMessage]) -> List[List[AnyMessage]]:
+    """Group messages into turns, each starting at a run of user messages."""
+    turns: List[List[AnyMessage]] = []
+    previous_is_human = False
+    for message in messages:
+        is_human = isinstance(message, HumanMessage)
+        if not turns or (is_human and not previous_is_human):
+            turns.append([])
+        turns[-1].append(message)
+        previous_is_human = is_human
+    return turns or [[]]
+
+
+def _image_blocks(turn: List[AnyMessage]) -> List[Any]:
+    """Image blocks of a turn, in order."""
+    return [
+        block
+        for message in turn
+        if not isinstance(message.content, str)
+        for block in message.content
+        if _is_image_block(block)
+    ]
+
+
+def _image_path_notes(turn: List[AnyMessage]) -> List[str]:
+    """The "image_path: ..." notes of a turn's user messages, in order."""
+    notes = []
+    for message in turn:
+        if not isinstance(message, HumanMessage):
+            continue
+        if isinstance(message.content, str):
+            texts = [message.content]
+        else:
+            texts = [b.get("text", "") for b in message.content if isinstance(b, dict)]
+        notes += [text for text in texts if text.startswith(IMAGE_PATH_PREFIX)]
+    return notes
+
+
+def _image_id(block: Dict[str, Any]) -> str:
+    """Identity of an image block; copies of one image have the same id."""
+    return json.dumps(block, sort_keys=True, default=str)
+
+
+def _strip_images(message: AnyMessage, strip: Callable[[Any], bool]) -> AnyMessage:
+    """Replace the image blocks selected by strip with a text reference."""
+    if isinstance(message.content, str):
+        return message
+    if not any(_is_image_block(block) and strip(block) for block in message.content):
+        return message
+
+    content = [
+        {"type": "text", "text": IMAGE_PLACEHOLDER}
+        if _is_image_block(block) and strip(block)
+        else block
+        for block in message.content
+    ]
+    return message.model_copy(update={"content": content})
+
+
+def _truncate_tool_result(message: AnyMessage, max_chars: int) -> AnyMessage:
+    """Truncate the content of an old ToolMessage."""
+    if not isinstance(message, ToolMessage) or not isinstance(message.content, str):
+        return message
+    if len(message.content) <= max_chars:
+        return message
+
+    omitted = len(message.content) - max_chars
+    content = f"{message.content[:max_chars]}... [truncated {omitted} characters]"
+    return message.model_copy(update={"content": content})
+
+
+def _is_image_block(block: Any) -> bool:
+    return isinstance(block, dict) and block.get("type") in ("image_url", "image")
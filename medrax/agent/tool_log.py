@@ -0,0 +1,253 @@
+import atexit
+import gzip
+import hashlib
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from medrax.agent.artifacts import tool_result_log
+
+ACTIVE_LOG_NAME = "tool_calls.jsonl"
+BLOB_DIR_NAME = "blobs"
+# Text fields of a record that are stored as blobs when they are large
+OUT_OF_LINE_FIELDS = ("content", "artifact")
+
+
+class ToolCallLogWriter:
+    """
+    Append-only JSONL sink for tool call logs.
+
+    Records are queued on the calling thread and written in batches by a background
+    thread, so logging never sits on the response path. The active file is
+    `tool_calls.jsonl`; it is rotated to `tool_calls_<timestamp>.jsonl` once it exceeds
+    a size limit or gets older than a time limit. A raw `artifact` is serialized to JSON
+    text on the background thread too. Large `content` and `artifact` payloads (e.g.
+    base64 visualizations, masks) are gzip-compressed into `blobs/` and replaced by a
+    reference.
+
+    Attributes:
+        log_dir (Path): Directory that holds the log files.
+        max_bytes (int): Size at which the active file is rotated.
+        rotate_interval_s (Optional[float]): Age at which the active file is rotated.
+        flush_interval_s (float): Maximum time a record waits before it is written.
+        batch_size (int): Number of records that triggers an early flush.
+        inline_content_limit (int): Content or artifacts larger than this many bytes are stored
+            out of line.
+    """
+
+    def __init__(
+        self,
+        log_dir: Union[str, Path],
+        max_bytes: int = 50 * 1024 * 1024,
+        rotate_interval_s: Optional[float] = 24 * 60 * 60,
+        flush_interval_s: float = 1.0,
+        batch_size: int = 64,
+        inline_content_limit: int = 16 * 1024,
+    ):
+        """
+        Initialize the writer and start its background thread.
+
+        Args:
+            log_dir (Union[str, Path]): Directory that holds the log files.
+            max_bytes (int, optional): Rotation size in bytes. Defaults to 50 MiB.
+            rotate_interval_s (float, optional): Rotation age in seconds. Defaults to one day.
+                None disables time-based rotation.
+            flush_interval_s (float, optional): Flush interval in seconds. Defaults to 1.0.
+            batch_size (int, optional): Records per early flush. Defaults to 64.
+            inline_content_limit (int, optional): Inline content limit in bytes. Defaults to 16 KiB.
+        """
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.rotate_interval_s = rotate_interval_s
+        self.flush_interval_s = flush_interval_s
+        self.batch_size = batch_size
+        self.inline_content_limit = inline_content_limit
+
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._opened_at = time.time()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._worker, name="medrax-tool-log", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def active_path(self) -> Path:
+        """Path of the file currently being appended to."""
+        return self.log_dir / ACTIVE_LOG_NAME
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """
+        Queue a record for writing. Never blocks on file I/O or serialization.
+
+        Args:
+            record (Dict[str, Any]): A JSON-serializable log record, except that
+                `artifact` may be a raw tool result artifact. Neither may be modified
+                after the call.
+        """
+        if not self._closed:
+            self._queue.put(record)
+
+    def write_many(self, records: List[Dict[str, Any]]) -> None:
+        """Queue several records for writing."""
+        for record in records:
+            self.write(record)
+
+    def flush(self) -> None:
+        """Block until every record queued so far has been written."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Flush pending records and stop the background thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _worker(self) -> None:
+        """Collect records into batches and append them to the active file."""
+        while True:
+            batch: List[Dict[str, Any]] = []
+            stop = False
+            try:
+                item = self._queue.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                continue
+
+            deadline = time.monotonic() + self.flush_interval_s
+            while True:
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+            try:
+                if batch:
+                    self._write_batch(batch)
+            except Exception as e:
+                print(f"Failed to write tool call logs: {e}")
+            finally:
+                for _ in range(len(batch) + int(stop)):
+                    self._queue.task_done()
+
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        self._maybe_rotate()
+        lines = [json.dumps(self._externalize(record), default=str) for record in batch]
+        with open(self.active_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def _externalize(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Serialize artifacts and move large content and artifacts into compressed,
+        content-addressed blobs."""
+        for key in OUT_OF_LINE_FIELDS:
+            text = record.get(key)
+            if text is None:
+                continue
+            if not isinstance(text, str):
+                record = {**record, key: tool_result_log(text)}
+                text = record[key]
+            data = text.encode("utf-8")
+            if len(data) <= self.inline_content_limit:
+                continue
+
+            digest = hashlib.sha256(data).hexdigest()
+            blob_dir = self.log_dir / BLOB_DIR_NAME
+            blob_dir.mkdir(exist_ok=True)
+            blob_path = blob_dir / f"{digest}.txt.gz"
+            if not blob_path.exists():
+                tmp_path = blob_path.with_suffix(".tmp")
+                with gzip.open(tmp_path, "wb") as f:
+                    f.write(data)
+                tmp_path.replace(blob_path)
+
+            record = dict(record)
+            del record[key]
+            record[f"{key}_ref"] = f"{BLOB_DIR_NAME}/{blob_path.name}"
+            record[f"{key}_bytes"] = len(data)
+        return record
+
+    def _maybe_rotate(self) -> None:
+        """Rotate the active file when it is too large or too old."""
+        path = self.active_path
+        if not path.exists():
+            self._opened_at = time.time()
+            return
+
+        too_large = path.stat().st_size >= self.max_bytes
+        too_old = (
+            self.rotate_interval_s is not None
+            and time.time() - self._opened_at >= self.rotate_interval_s
+        )
+        if not (too_large or too_old):
+            return
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        path.replace(self.log_dir / f"tool_calls_{timestamp}.jsonl")
+        self._opened_at = time.time()
+
+
+def iter_tool_call_logs(
+    log_dir: Union[str, Path], load_content: bool = True
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream tool call records from a log directory, oldest file first.
+
+    Reads rotated `tool_calls_*.jsonl` files and the active file line by line, so
+    memory use does not grow with the log size.
+
+    Args:
+        log_dir (Union[str, Path]): Directory written by ToolCallLogWriter.
+        load_content (bool, optional): Inline out-of-line content and artifacts from
+            their blobs.
+            Defaults to True.
+
+    Yields:
+        Dict[str, Any]: One tool call record per line.
+    """
+    log_dir = Path(log_dir)
+    files = sorted(log_dir.glob("tool_calls_*.jsonl"))
+    if (log_dir / ACTIVE_LOG_NAME).exists():
+        files.append(log_dir / ACTIVE_LOG_NAME)
+
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if load_content:
+                    for key in OUT_OF_LINE_FIELDS:
+                        if f"{key}_ref" in record:
+                            record[key] = load_blob(log_dir, record[f"{key}_ref"])
+                yield record
+
+
+def load_blob(log_dir: Union[str, Path], content_ref: str) -> str:
+    """
+    Read out-of-line content referenced by a log record.
+
+    Args:
+        log_dir (Union[str, Path]): Directory written by ToolCallLogWriter.
+        content_ref (str): The record's `content_ref` or `artifact_ref` value.
+
+    Returns:
+        str: The decompressed content.
+    """
+    with gzip.open(Path(log_dir) / content_ref, "rb") as f:
+        return f.read().decode("utf-8")
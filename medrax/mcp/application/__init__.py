@@ -9,7 +9,9 @@ from medrax.mcp.application.services import (
     ClassificationService,
     VQAService,
     SegmentationService,
+    MeasurementService,
     DicomService,
+    PrefetchService,
     MedRAXServiceContainer,
 )
 
@@ -17,6 +19,8 @@ __all__ = [
     "ClassificationService",
     "VQAService",
     "SegmentationService",
+    "MeasurementService",
     "DicomService",
+    "PrefetchService",
     "MedRAXServiceContainer",
 ]
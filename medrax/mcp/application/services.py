@@ -6,8 +6,10 @@ They handle image ID resolution, validation, and result formatting.
 """
 
 import base64
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Sequence
 
 from medrax.mcp.domain.entities import (
     AnalysisStatus,
@@ -26,6 +28,88 @@ from medrax.mcp.infrastructure.vqa import VQAWrapper
 from medrax.mcp.infrastructure.segmentation import SegmentationWrapper
 from medrax.mcp.infrastructure.dicom import DicomWrapper
 from medrax.mcp.infrastructure.image_storage import InMemoryImageStorage
+from medrax.models import OnnxOptions, QuantizationOptions
+from medrax.utils.prefetch import Prefetcher, PrefetchJob
+from medrax.utils.render import RenderOptions
+from medrax.utils.rle import MASK_FORMATS, MASK_RESOLUTIONS
+
+
+class PrefetchService:
+    """
+    Service for speculative pre-analysis of registered images.
+    
+    Starts default-parameter analyses (e.g. classification) in the background as soon
+    as an image is registered. Services ask it for a result before running a model,
+    and wait for an analysis that is already in progress instead of repeating it.
+    """
+    
+    def __init__(
+        self,
+        analyses: Dict[str, Callable[[str], Dict[str, Any]]],
+        max_workers: int = 1,
+        max_images: int = 32,
+    ):
+        """
+        Initialize the prefetch service.
+        
+        Args:
+            analyses: Analysis name -> function computing it for an image ID
+            max_workers: Number of analyses running at the same time
+            max_images: Number of images whose results are kept
+        """
+        self._analyses = analyses
+        self._max_images = max_images
+        self._prefetcher = Prefetcher(max_workers=max_workers)
+        self._jobs: "OrderedDict[str, PrefetchJob]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @property
+    def analyses(self) -> List[str]:
+        """Names of the prefetched analyses."""
+        return list(self._analyses)
+    
+    def start(self, image_id: str) -> None:
+        """
+        Start all analyses for a newly registered image.
+        
+        Analyses of earlier images that have not started yet are cancelled, so the
+        newest image is always analyzed next.
+        
+        Args:
+            image_id: ID of the registered image
+        """
+        tasks = {
+            name: (lambda analyze=analyze: analyze(image_id))
+            for name, analyze in self._analyses.items()
+        }
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel()
+            self._jobs[image_id] = self._prefetcher.submit(tasks)
+            while len(self._jobs) > self._max_images:
+                self._jobs.popitem(last=False)
+    
+    def get(self, name: str, image_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a prefetched result, waiting if the analysis is running.
+        
+        Args:
+            name: Analysis name
+            image_id: ID of the image
+            
+        Returns:
+            The result, or None if it was not prefetched, was cancelled or failed
+        """
+        with self._lock:
+            job = self._jobs.get(image_id)
+        return job.result(name) if job else None
+    
+    def cancel(self, image_id: str) -> None:
+        """Cancel pending analyses of an image and forget its results."""
+        with self._lock:
+            job = self._jobs.pop(image_id, None)
+        if job:
+            job.cancel()
 
 
 class ClassificationService:
@@ -39,9 +123,11 @@ class ClassificationService:
         self,
         classifier: ClassifierWrapper,
         image_storage: InMemoryImageStorage,
+        prefetch: Optional[PrefetchService] = None,
     ):
         self._classifier = classifier
         self._storage = image_storage
+        self._prefetch = prefetch
     
     def classify(
         self,
@@ -52,6 +138,9 @@ class ClassificationService:
         """
         Classify chest X-ray by image ID.
         
+        Calls with default parameters are served from the prefetch service if the
+        image was pre-analyzed.
+        
         Args:
             image_id: ID of the uploaded image
             pathologies: Optional filter for specific pathologies
@@ -60,22 +149,25 @@ class ClassificationService:
         Returns:
             Dictionary with classification results
         """
+        if self._prefetch and pathologies is None and threshold == 0.5:
+            prefetched = self._prefetch.get("classification", image_id)
+            if prefetched is not None:
+                return prefetched
+        return self.compute(image_id, pathologies, threshold)
+    
+    def compute(
+        self,
+        image_id: str,
+        pathologies: Optional[List[str]] = None,
+        threshold: float = 0.5,
+    ) -> Dict[str, Any]:
+        """Run the classifier, bypassing prefetched results. Arguments as in classify."""
         # Resolve image path
         image_path = self._storage.get_path(image_id)
         if image_path is None:
             raise ImageNotFoundError(image_id=image_id)
         
-        # Validate pathologies if specified
-        if pathologies:
-            supported = set(self._classifier.supported_pathologies)
-            invalid = [p for p in pathologies if p not in supported]
-            if invalid:
-                raise ValidationError(
-                    field="pathologies",
-                    message=f"Unsupported pathologies: {invalid}. "
-                            f"Supported: {list(supported)}",
-                    value=invalid,
-                )
+        self._validate_pathologies(pathologies)
         
         # Run classification
         result = self._classifier.classify(
@@ -86,6 +178,93 @@ class ClassificationService:
         
         return result.to_dict()
     
+    def classify_batch(
+        self,
+        image_ids: List[str],
+        pathologies: Optional[List[str]] = None,
+        threshold: float = 0.5,
+        batch_size: int = 16,
+    ) -> Dict[str, Any]:
+        """
+        Classify many chest X-rays by image ID.
+        
+        Unknown IDs and unreadable images are reported per image; the rest of
+        the batch is still classified.
+        
+        Args:
+            image_ids: IDs of the uploaded images
+            pathologies: Optional filter for specific pathologies
+            threshold: Confidence threshold for positive findings
+            batch_size: Maximum number of images per forward pass
+            
+        Returns:
+            Dictionary with one result per image, in input order, and counts
+        """
+        if not image_ids:
+            raise ValidationError(
+                field="image_ids",
+                message="At least one image ID is required",
+            )
+        if batch_size < 1:
+            raise ValidationError(
+                field="batch_size",
+                message="Batch size must be at least 1",
+                value=batch_size,
+            )
+        self._validate_pathologies(pathologies)
+        
+        # Resolve image paths, keeping unknown IDs as per-image errors
+        results: List[Optional[Dict[str, Any]]] = [None] * len(image_ids)
+        positions, image_paths = [], []
+        for i, image_id in enumerate(image_ids):
+            image_path = self._storage.get_path(image_id)
+            if image_path is None:
+                error = ImageNotFoundError(image_id=image_id)
+                results[i] = {
+                    "image_id": image_id,
+                    "status": AnalysisStatus.FAILED.value,
+                    "error": error.message,
+                }
+                continue
+            positions.append(i)
+            image_paths.append(image_path)
+        
+        # Run classification
+        if image_paths:
+            batch = self._classifier.classify_batch(
+                image_paths=image_paths,
+                pathologies=pathologies,
+                threshold=threshold,
+                batch_size=batch_size,
+            )
+            for i, result in zip(positions, batch):
+                entry = {"image_id": image_ids[i], **result.to_dict()}
+                if result.error:
+                    entry["error"] = result.error
+                results[i] = entry
+        
+        completed = sum(r["status"] == AnalysisStatus.COMPLETED.value for r in results)
+        return {
+            "results": results,
+            "total": len(results),
+            "completed": completed,
+            "failed": len(results) - completed,
+        }
+    
+    def _validate_pathologies(self, pathologies: Optional[List[str]]) -> None:
+        """Raise ValidationError for pathologies the classifier does not support."""
+        if not pathologies:
+            return
+        supported = set(self._classifier.supported_pathologies)
+        invalid = [p for p in pathologies if p not in supported]
+        if invalid:
+            raise ValidationError(
+                field="pathologies",
+                message=f"Unsupported pathologies: {invalid}. "
+                        f"Supported: {list(supported)}",
+                value=invalid,
+            )
+    
     @property
     def supported_pathologies(self) -> List[str]:
         """List of supported pathologies."""
@@ -165,25 +344,57 @@ class SegmentationService:
         self,
         segmenter: SegmentationWrapper,
         image_storage: InMemoryImageStorage,
+        prefetch: Optional[PrefetchService] = None,
     ):
         self._segmenter = segmenter
         self._storage = image_storage
+        self._prefetch = prefetch
     
     def segment(
         self,
         image_id: str,
         organs: Optional[List[str]] = None,
+        return_masks: bool = False,
+        mask_format: str = "rle",
+        mask_resolution: str = "original",
+        threshold: float = 0.5,
     ) -> Dict[str, Any]:
         """
         Segment anatomical structures in chest X-ray.
         
+        Calls for all organs with default settings are served from the prefetch
+        service if the image was pre-analyzed. Other calls on an image segmented
+        before reuse its model output (see ForwardCache).
+        
         Args:
             image_id: ID of the uploaded image
             organs: Optional filter for specific organs
+            return_masks: Whether to include the masks of the requested organs
+            mask_format: "rle" (COCO RLE per organ) or "npz" (bit-packed file)
+            mask_resolution: "original" image or "model" input resolution
+            threshold: Probability above which a pixel belongs to an organ
             
         Returns:
             Dictionary with segmentation results
         """
+        if self._prefetch and organs is None and not return_masks and threshold == 0.5:
+            prefetched = self._prefetch.get("segmentation", image_id)
+            if prefetched is not None:
+                return prefetched
+        return self.compute(
+            image_id, organs, return_masks, mask_format, mask_resolution, threshold
+        )
+    
+    def compute(
+        self,
+        image_id: str,
+        organs: Optional[List[str]] = None,
+        return_masks: bool = False,
+        mask_format: str = "rle",
+        mask_resolution: str = "original",
+        threshold: float = 0.5,
+    ) -> Dict[str, Any]:
+        """Run the segmentation model, bypassing prefetched results. Arguments as in segment."""
         # Resolve image path
         image_path = self._storage.get_path(image_id)
         if image_path is None:
@@ -200,11 +411,34 @@ class SegmentationService:
                             f"Supported: {list(supported)}",
                     value=invalid,
                 )
+        if return_masks:
+            if mask_format not in MASK_FORMATS:
+                raise ValidationError(
+                    field="mask_format",
+                    message=f"Unsupported mask format. Supported: {list(MASK_FORMATS)}",
+                    value=mask_format,
+                )
+            if mask_resolution not in MASK_RESOLUTIONS:
+                raise ValidationError(
+                    field="mask_resolution",
+                    message=f"Unsupported mask resolution. Supported: {list(MASK_RESOLUTIONS)}",
+                    value=mask_resolution,
+                )
+        if not 0.0 < threshold < 1.0:
+            raise ValidationError(
+                field="threshold",
+                message="Threshold must be between 0 and 1",
+                value=threshold,
+            )
         
         # Run segmentation
         result = self._segmenter.segment(
             image_path=image_path,
             organs=organs,
+            return_masks=return_masks,
+            mask_format=mask_format,
+            mask_resolution=mask_resolution,
+            threshold=threshold,
         )
         
         return result.to_dict()
@@ -215,6 +449,70 @@ class SegmentationService:
         return self._segmenter.supported_organs
 
 
+class MeasurementService:
+    """
+    Service for cardiothoracic measurements.
+    
+    Orchestrates the segmentation wrapper with image storage. Images converted
+    from DICOM are measured with the PixelSpacing recorded at conversion.
+    """
+    
+    def __init__(
+        self,
+        segmenter: SegmentationWrapper,
+        image_storage: InMemoryImageStorage,
+    ):
+        self._segmenter = segmenter
+        self._storage = image_storage
+    
+    def measure(
+        self,
+        image_id: str,
+        pixel_spacing: Optional[Sequence[float]] = None,
+        threshold: float = 0.5,
+    ) -> Dict[str, Any]:
+        """
+        Measure heart, lungs, mediastinum and diaphragm of a chest X-ray.
+        
+        Args:
+            image_id: ID of the uploaded image
+            pixel_spacing: (row, column) pixel size in mm; defaults to the DICOM
+                PixelSpacing of images from process_dicom
+            threshold: Probability above which a pixel belongs to an organ
+            
+        Returns:
+            Dictionary with measurement results
+        """
+        entity = self._storage.get(image_id)
+        if entity is None:
+            raise ImageNotFoundError(image_id=image_id)
+        
+        if pixel_spacing is None:
+            pixel_spacing = entity.metadata.get("pixel_spacing")
+        if pixel_spacing is not None:
+            if len(pixel_spacing) != 2 or min(pixel_spacing) <= 0:
+                raise ValidationError(
+                    field="pixel_spacing",
+                    message="Pixel spacing must be two positive values (row, column) in mm",
+                    value=pixel_spacing,
+                )
+            pixel_spacing = (float(pixel_spacing[0]), float(pixel_spacing[1]))
+        if not 0.0 < threshold < 1.0:
+            raise ValidationError(
+                field="threshold",
+                message="Threshold must be between 0 and 1",
+                value=threshold,
+            )
+        
+        result = self._segmenter.measure(
+            image_path=entity.path,
+            pixel_spacing=pixel_spacing,
+            threshold=threshold,
+        )
+        
+        return result.to_dict()
+
+
 class DicomService:
     """
     Service for DICOM file processing.
@@ -258,8 +556,10 @@ class DicomService:
             window_width=window_width,
         )
         
-        # Store the processed image
+        # Store the processed image, keeping its spacing for measurements
         entity = self._storage.store(output_path)
+        if metadata.pixel_spacing is not None:
+            entity.metadata["pixel_spacing"] = metadata.pixel_spacing
         
         # Read and encode image for return
         with open(output_path, "rb") as f:
@@ -303,6 +603,15 @@ class MedRAXServiceContainer:
         device: Optional[str] = None,
         temp_dir: Optional[Path] = None,
         lazy_load: bool = True,
+        prefetch: Sequence[str] = (),
+        max_batch_size: int = 16,
+        max_batch_latency_ms: float = 5.0,
+        backend: str = "torch",
+        onnx_options: Optional[OnnxOptions] = None,
+        quantization: Optional[str] = None,
+        quantization_options: Optional[QuantizationOptions] = None,
+        render_options: Optional[RenderOptions] = None,
+        segmentation_resolution: int = 512,
     ):
         """
         Initialize the service container.
@@ -311,8 +620,26 @@ class MedRAXServiceContainer:
             device: Device for model inference (cuda/cpu/mps)
             temp_dir: Directory for temporary files
             lazy_load: If True, models are loaded on first use
+            prefetch: Analyses to start in the background when an image is
+                registered ("classification", "segmentation")
+            max_batch_size: Maximum number of concurrent classifications per forward pass
+            max_batch_latency_ms: Maximum time a classification waits for others to batch with
+            backend: Runtime of the classifier and segmenter ("torch", or "onnx" on the CPU)
+            onnx_options: Thread and cache settings of the onnx backend
+            quantization: "int8" to run the classifier and segmenter with INT8 kernels on the CPU
+            quantization_options: Calibration and cache settings of INT8 quantization
+            render_options: Resolution, format and backend of segmentation visualizations
+            segmentation_resolution: Input size of the segmenter (256, 384 or 512)
         """
         self._device = device
+        self._max_batch_size = max_batch_size
+        self._max_batch_latency_ms = max_batch_latency_ms
+        self._backend = backend
+        self._onnx_options = onnx_options
+        self._quantization = quantization
+        self._quantization_options = quantization_options
+        self._render_options = render_options
+        self._segmentation_resolution = segmentation_resolution
         self._temp_dir = temp_dir or Path("temp")
         self._temp_dir.mkdir(exist_ok=True)
         self._lazy_load = lazy_load
@@ -320,10 +647,29 @@ class MedRAXServiceContainer:
         # Shared dependencies
         self._image_storage = InMemoryImageStorage()
         
+        prefetchable = {
+            "classification": lambda image_id: self.classification.compute(image_id),
+            "segmentation": lambda image_id: self.segmentation.compute(image_id),
+        }
+        unknown = [name for name in prefetch if name not in prefetchable]
+        if unknown:
+            raise ValidationError(
+                field="prefetch",
+                message=f"Unsupported analyses: {unknown}. Supported: {list(prefetchable)}",
+                value=unknown,
+            )
+        self._prefetch_service: Optional[PrefetchService] = None
+        if prefetch:
+            self._prefetch_service = PrefetchService(
+                {name: prefetchable[name] for name in prefetch}
+            )
+        
         # Service instances (lazy loaded if lazy_load=True)
         self._classification_service: Optional[ClassificationService] = None
         self._vqa_service: Optional[VQAService] = None
         self._segmentation_service: Optional[SegmentationService] = None
+        self._measurement_service: Optional[MeasurementService] = None
+        self._segmenter: Optional[SegmentationWrapper] = None
         self._dicom_service: Optional[DicomService] = None
         
         if not lazy_load:
@@ -334,6 +680,7 @@ class MedRAXServiceContainer:
         _ = self.classification
         _ = self.vqa
         _ = self.segmentation
+        _ = self.measurements
         _ = self.dicom
     
     @property
@@ -341,14 +688,28 @@ class MedRAXServiceContainer:
         """Get the image storage instance."""
         return self._image_storage
     
+    @property
+    def prefetch(self) -> Optional[PrefetchService]:
+        """Get the prefetch service, or None if prefetching is disabled."""
+        return self._prefetch_service
+    
     @property
     def classification(self) -> ClassificationService:
         """Get the classification service (lazy loaded)."""
         if self._classification_service is None:
-            wrapper = ClassifierWrapper(device=self._device)
+            wrapper = ClassifierWrapper(
+                device=self._device,
+                max_batch_size=self._max_batch_size,
+                max_latency_ms=self._max_batch_latency_ms,
+                backend=self._backend,
+                onnx_options=self._onnx_options,
+                quantization=self._quantization,
+                quantization_options=self._quantization_options,
+            )
             self._classification_service = ClassificationService(
                 classifier=wrapper,
                 image_storage=self._image_storage,
+                prefetch=self._prefetch_service,
             )
         return self._classification_service
     
@@ -364,19 +725,42 @@ class MedRAXServiceContainer:
         return self._vqa_service
     
     @property
-    def segmentation(self) -> SegmentationService:
-        """Get the segmentation service (lazy loaded)."""
-        if self._segmentation_service is None:
-            wrapper = SegmentationWrapper(
+    def segmenter(self) -> SegmentationWrapper:
+        """Get the segmentation wrapper shared by segmentation and measurements."""
+        if self._segmenter is None:
+            self._segmenter = SegmentationWrapper(
                 device=self._device,
                 temp_dir=self._temp_dir,
+                backend=self._backend,
+                onnx_options=self._onnx_options,
+                quantization=self._quantization,
+                quantization_options=self._quantization_options,
+                render_options=self._render_options,
+                resolution=self._segmentation_resolution,
             )
+        return self._segmenter
+    
+    @property
+    def segmentation(self) -> SegmentationService:
+        """Get the segmentation service (lazy loaded)."""
+        if self._segmentation_service is None:
             self._segmentation_service = SegmentationService(
-                segmenter=wrapper,
+                segmenter=self.segmenter,
                 image_storage=self._image_storage,
+                prefetch=self._prefetch_service,
             )
         return self._segmentation_service
     
+    @property
+    def measurements(self) -> MeasurementService:
+        """Get the measurement service (lazy loaded)."""
+        if self._measurement_service is None:
+            self._measurement_service = MeasurementService(
+                segmenter=self.segmenter,
+                image_storage=self._image_storage,
+            )
+        return self._measurement_service
+    
     @property
     def dicom(self) -> DicomService:
         """Get the DICOM service."""
@@ -392,6 +776,8 @@ class MedRAXServiceContainer:
         """
         Register an image file and return its ID.
         
+        Starts the configured prefetch analyses in the background.
+        
         Args:
             image_path: Path to the image file
             
@@ -399,4 +785,6 @@ class MedRAXServiceContainer:
             Generated image ID
         """
         entity = self._image_storage.store(Path(image_path))
+        if self._prefetch_service:
+            self._prefetch_service.start(entity.id)
         return entity.id
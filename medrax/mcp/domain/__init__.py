@@ -15,6 +15,7 @@ from medrax.mcp.domain.entities import (
     AnalysisResult,
     ClassificationResult,
     SegmentationResult,
+    MeasurementResult,
     VQAResult,
     DicomMetadata,
 )
@@ -37,6 +38,7 @@ __all__ = [
     "AnalysisResult",
     "ClassificationResult",
     "SegmentationResult",
+    "MeasurementResult",
     "VQAResult",
     "DicomMetadata",
     # Protocols
@@ -186,11 +186,15 @@ class SegmentationResult(AnalysisResult):
         organs: Dict mapping organ name to its metrics
         visualization_path: Path to segmentation overlay image
         organs_segmented: List of successfully segmented organs
+        masks: Requested masks, as COCO RLE per organ or the path of an .npz file
+        forward_cached: Whether the model output was reused from an earlier call
     """
     organs: Dict[str, Dict[str, Any]] = field(default_factory=dict)
     visualization_path: Optional[str] = None
     visualization_base64: Optional[str] = None
     organs_segmented: List[str] = field(default_factory=list)
+    masks: Optional[Dict[str, Any]] = None
+    forward_cached: bool = False
     
     # Standard 14 organs from PSPNet
     SUPPORTED_ORGANS: tuple = (
@@ -205,11 +209,44 @@ class SegmentationResult(AnalysisResult):
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for MCP response."""
-        return {
+        result = {
             "status": self.status.value,
             "organs_segmented": self.organs_segmented,
             "organ_metrics": self.organs,
             "visualization": self.visualization_base64,
+            "forward_cached": self.forward_cached,
+            "processing_time_ms": self.processing_time_ms,
+            "timestamp": self.timestamp.isoformat(),
+        }
+        if self.masks is not None:
+            result["masks"] = self.masks
+        return result
+
+
+@dataclass
+class MeasurementResult(AnalysisResult):
+    """
+    Result from cardiothoracic measurements on segmentation masks.
+    
+    Attributes:
+        measurements: Cardiothoracic ratio, lung fields, mediastinal width and diaphragm
+        pixel_spacing: (row, column) pixel size in mm used for distances and areas
+        pixel_spacing_assumed: Whether the spacing is a default instead of from DICOM
+        forward_cached: Whether the model output was reused from an earlier call
+    """
+    measurements: Dict[str, Any] = field(default_factory=dict)
+    pixel_spacing: Optional[Tuple[float, float]] = None
+    pixel_spacing_assumed: bool = True
+    forward_cached: bool = False
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for MCP response."""
+        return {
+            "status": self.status.value,
+            "measurements": self.measurements,
+            "pixel_spacing_mm": list(self.pixel_spacing) if self.pixel_spacing else None,
+            "pixel_spacing_assumed": self.pixel_spacing_assumed,
+            "forward_cached": self.forward_cached,
             "processing_time_ms": self.processing_time_ms,
             "timestamp": self.timestamp.isoformat(),
         }
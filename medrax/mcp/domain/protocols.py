@@ -7,13 +7,14 @@ Using Protocol (structural subtyping) for flexibility.
 
 from abc import abstractmethod
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Protocol, runtime_checkable
+from typing import Any, Dict, List, Optional, Protocol, Sequence, Tuple, runtime_checkable
 
 from medrax.mcp.domain.entities import (
     ClassificationResult,
     DicomMetadata,
     GroundingResult,
     ImageEntity,
+    MeasurementResult,
     ReportGenerationResult,
     SegmentationResult,
     VQAResult,
@@ -44,6 +45,28 @@ class ClassifierProtocol(Protocol):
         """
         ...
     
+    @abstractmethod
+    def classify_batch(
+        self,
+        image_paths: Sequence[Path],
+        pathologies: Optional[List[str]] = None,
+        threshold: float = 0.5,
+        batch_size: int = 16,
+    ) -> List[ClassificationResult]:
+        """
+        Classify many chest X-rays, isolating per-image errors.
+        
+        Args:
+            image_paths: Paths to the chest X-ray images
+            pathologies: Optional list of specific pathologies to check
+            threshold: Confidence threshold for positive findings
+            batch_size: Maximum number of images per forward pass
+            
+        Returns:
+            One ClassificationResult per image, in input order
+        """
+        ...
+    
     @property
     @abstractmethod
     def supported_pathologies(self) -> List[str]:
@@ -91,6 +114,10 @@ class SegmentationProtocol(Protocol):
         self,
         image_path: Path,
         organs: Optional[List[str]] = None,
+        return_masks: bool = False,
+        mask_format: str = "rle",
+        mask_resolution: str = "original",
+        threshold: float = 0.5,
     ) -> SegmentationResult:
         """
         Segment anatomical structures in chest X-ray.
@@ -98,12 +125,37 @@ class SegmentationProtocol(Protocol):
         Args:
             image_path: Path to the chest X-ray image
             organs: Optional list of specific organs to segment
+            return_masks: Whether to include the masks of the requested organs
+            mask_format: "rle" (COCO RLE per organ) or "npz" (bit-packed file)
+            mask_resolution: "original" image or "model" input resolution
+            threshold: Probability above which a pixel belongs to an organ
             
         Returns:
             SegmentationResult with organ masks and metrics
         """
         ...
     
+    @abstractmethod
+    def measure(
+        self,
+        image_path: Path,
+        pixel_spacing: Optional[Tuple[float, float]] = None,
+        threshold: float = 0.5,
+    ) -> MeasurementResult:
+        """
+        Derive cardiothoracic measurements from the segmentation masks.
+        
+        Args:
+            image_path: Path to the chest X-ray image
+            pixel_spacing: (row, column) pixel size in mm, e.g. DICOM PixelSpacing
+            threshold: Probability above which a pixel belongs to an organ
+            
+        Returns:
+            MeasurementResult with cardiothoracic ratio, lung fields, mediastinum
+            and diaphragm measurements
+        """
+        ...
+    
     @property
     @abstractmethod
     def supported_organs(self) -> List[str]:
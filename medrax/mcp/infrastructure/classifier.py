@@ -4,29 +4,38 @@ Classifier Wrapper - Wraps DenseNet-121 chest X-ray classifier
 Implements ClassifierProtocol from domain layer.
 """
 
+import threading
 import time
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence
 
 import torch
-import torchvision
-import skimage.io
 import torchxrayvision as xrv
 
 from medrax.mcp.domain.entities import AnalysisStatus, ClassificationResult
 from medrax.mcp.domain.exceptions import ImageNotFoundError, ModelError
+from medrax.models import (
+    ModelKey,
+    OnnxOptions,
+    QuantizationOptions,
+    acquire_densenet,
+    get_model_registry,
+)
+from medrax.models.preprocessing import load_classifier_input
+from medrax.utils.batching import MicroBatcher, load_batches
+from medrax.utils.inference import model_lock
 
 
 class ClassifierWrapper:
     """
     Wrapper for TorchXRayVision DenseNet classifier.
     
-    Implements ClassifierProtocol for use in MCP tools.
+    Implements ClassifierProtocol for use in MCP tools. Concurrent classify
+    calls are grouped into batched forward passes by a MicroBatcher.
     
     Attributes:
         model: The DenseNet model instance
         device: Device to run inference on
-        transform: Image preprocessing transforms
     """
     
     # 18 pathologies from TorchXRayVision
@@ -42,6 +51,12 @@ class ClassifierWrapper:
         self,
         model_name: str = "densenet121-res224-all",
         device: Optional[str] = None,
+        max_batch_size: int = 16,
+        max_latency_ms: float = 5.0,
+        backend: str = "torch",
+        onnx_options: Optional[OnnxOptions] = None,
+        quantization: Optional[str] = None,
+        quantization_options: Optional[QuantizationOptions] = None,
     ):
         """
         Initialize the classifier wrapper.
@@ -49,11 +64,27 @@ class ClassifierWrapper:
         Args:
             model_name: Model weights to load
             device: Device to run on (cuda/cpu/mps)
+            max_batch_size: Maximum number of concurrent classify calls per forward pass
+            max_latency_ms: Maximum time a classify call waits for others to batch with
+            backend: "torch", or "onnx" for ONNX Runtime on the CPU
+            onnx_options: Thread and cache settings of the onnx backend
+            quantization: "int8" for static INT8 quantization on the CPU
+            quantization_options: Calibration and cache settings of INT8 quantization
         """
         self._model_name = model_name
-        self._device = self._get_device(device)
+        self._backend = backend
+        self._onnx_options = onnx_options
+        self._quantization = quantization
+        self._quantization_options = quantization_options
+        # ONNX Runtime and INT8 kernels run on the CPU, so do not pick an accelerator for them
+        cpu_only = backend == "onnx" or quantization is not None
+        self._device = self._get_device(device or ("cpu" if cpu_only else None))
+        self._max_batch_size = max_batch_size
+        self._max_latency_ms = max_latency_ms
         self._model = None
-        self._transform = None
+        self._model_key: Optional[ModelKey] = None
+        self._batcher: Optional[MicroBatcher] = None
+        self._init_lock = threading.Lock()
         self._initialized = False
     
     def _get_device(self, device: Optional[str]) -> torch.device:
@@ -71,20 +102,38 @@ class ClassifierWrapper:
         if self._initialized:
             return
         
-        try:
-            self._model = xrv.models.DenseNet(weights=self._model_name)
-            self._model.eval()
-            self._model = self._model.to(self._device)
-            self._transform = torchvision.transforms.Compose([
-                xrv.datasets.XRayCenterCrop()
-            ])
-            self._initialized = True
-        except Exception as e:
-            raise ModelError(
-                model_name=self._model_name,
-                message=f"Failed to initialize classifier: {e}",
-                original_error=e,
-            )
+        with self._init_lock:
+            if self._initialized:
+                return
+            try:
+                # Shared with the LangChain tool using the same weights and device
+                self._model_key, self._model = acquire_densenet(
+                    self._model_name,
+                    self._device,
+                    backend=self._backend,
+                    onnx_options=self._onnx_options,
+                    quantization=self._quantization,
+                    quantization_options=self._quantization_options,
+                )
+                self._initialized = True
+            except Exception as e:
+                raise ModelError(
+                    model_name=self._model_name,
+                    message=f"Failed to initialize classifier: {e}",
+                    original_error=e,
+                )
+    
+    def _get_batcher(self) -> MicroBatcher:
+        """Start the micro-batching worker on first use."""
+        with self._init_lock:
+            if self._batcher is None:
+                self._batcher = MicroBatcher(
+                    self._forward_batch,
+                    max_batch_size=self._max_batch_size,
+                    max_latency_ms=self._max_latency_ms,
+                    name="medrax-classifier-batch",
+                )
+            return self._batcher
     
     @property
     def supported_pathologies(self) -> List[str]:
@@ -96,34 +145,54 @@ class ClassifierWrapper:
         """Name of the model."""
         return self._model_name
     
-    def _process_image(self, image_path: Path) -> torch.Tensor:
+    @property
+    def batching_stats(self) -> Dict[str, float]:
+        """Micro-batching metrics (batch fill, queue wait) of classify calls."""
+        if self._batcher is None:
+            return {}
+        return self._batcher.stats()
+    
+    def _load_image(self, image_path: Path) -> torch.Tensor:
         """
-        Load and preprocess image for inference.
+        Load and preprocess image on the CPU.
         
         Args:
             image_path: Path to the image file
             
         Returns:
-            Preprocessed tensor ready for model
+            Preprocessed tensor of shape (1, H, W), without batch dimension
         """
-        img = skimage.io.imread(str(image_path))
-        img = xrv.datasets.normalize(img, 255)
-        
-        # Convert to grayscale if needed
-        if len(img.shape) > 2:
-            img = img[:, :, 0]
-        
-        # Add channel dimension
-        img = img[None, :, :]
-        
-        # Apply transforms
-        img = self._transform(img)
-        
-        # Convert to tensor and add batch dimension
-        img = torch.from_numpy(img).unsqueeze(0)
-        img = img.to(self._device)
+        # Resize to the model resolution here rather than in the model, so images
+        # of different sizes can be stacked into one batch. Decoding and resizing
+        # are shared with the other analyses of the same image.
+        return load_classifier_input(
+            image_path, getattr(self._model, "input_resolution", 224)
+        )
+    
+    def _forward_batch(self, images: List[torch.Tensor]) -> List[List[float]]:
+        """
+        Run one forward pass over preprocessed images and return their probabilities.
         
-        return img
+        Holds the model lock, which the LangChain classifier tool sharing the same
+        registry model also takes, so the two never run the model at once.
+        """
+        with model_lock(self), torch.inference_mode():
+            preds = self._model(torch.stack(images).to(self._device)).cpu()
+        return preds.numpy().tolist()
+    
+    def _filter_pathologies(
+        self,
+        probabilities: List[float],
+        pathologies: Optional[List[str]],
+    ) -> Dict[str, float]:
+        """Map model outputs to pathology names, keeping the requested ones."""
+        all_pathologies = dict(zip(xrv.datasets.default_pathologies, probabilities))
+        if pathologies:
+            all_pathologies = {
+                k: v for k, v in all_pathologies.items()
+                if k in pathologies
+            }
+        return all_pathologies
     
     def classify(
         self,
@@ -134,6 +203,9 @@ class ClassifierWrapper:
         """
         Classify chest X-ray for pathologies.
         
+        The image is preprocessed in the calling thread, then queued for the next
+        batched forward pass together with concurrent calls.
+        
         Args:
             image_path: Path to the chest X-ray image
             pathologies: Optional list of specific pathologies to check
@@ -153,23 +225,11 @@ class ClassifierWrapper:
         
         try:
             # Preprocess and run inference
-            img = self._process_image(image_path)
+            img = self._load_image(image_path)
+            preds = self._get_batcher().submit(img).result()
             
-            with torch.inference_mode():
-                preds = self._model(img).cpu()[0]
-            
-            # Build results dictionary
-            all_pathologies = dict(zip(
-                xrv.datasets.default_pathologies,
-                preds.numpy().tolist()
-            ))
-            
-            # Filter to requested pathologies if specified
-            if pathologies:
-                all_pathologies = {
-                    k: v for k, v in all_pathologies.items()
-                    if k in pathologies
-                }
+            # Build results dictionary, filtered to requested pathologies
+            all_pathologies = self._filter_pathologies(preds, pathologies)
             
             processing_time = (time.perf_counter() - start_time) * 1000
             
@@ -191,9 +251,79 @@ class ClassifierWrapper:
                 image_path=str(image_path),
             )
     
+    def classify_batch(
+        self,
+        image_paths: Sequence[Path],
+        pathologies: Optional[List[str]] = None,
+        threshold: float = 0.5,
+        batch_size: int = 16,
+        num_workers: int = 4,
+    ) -> List[ClassificationResult]:
+        """
+        Classify many chest X-rays with batched forward passes.
+        
+        Images are decoded on worker threads while the previous batch runs through
+        the model. These batches are already full, so they bypass the micro-batching
+        queue used by classify. Errors are isolated: a missing or unreadable image gives a failed
+        result for that image only, a failed forward pass fails only its batch.
+        
+        Args:
+            image_paths: Paths to the chest X-ray images
+            pathologies: Optional list of specific pathologies to check
+            threshold: Confidence threshold for positive findings
+            batch_size: Maximum number of images per forward pass
+            num_workers: Number of threads decoding images
+            
+        Returns:
+            One ClassificationResult per image, in input order
+        """
+        self._ensure_initialized()
+        
+        def load(image_path: Path) -> torch.Tensor:
+            if not image_path.exists():
+                raise ImageNotFoundError(image_path=str(image_path))
+            return self._load_image(image_path)
+        
+        def failed(image_path: Path, error: Exception) -> ClassificationResult:
+            return ClassificationResult(
+                status=AnalysisStatus.FAILED,
+                error=str(error),
+                image_path=str(image_path),
+            )
+        
+        results: List[Optional[ClassificationResult]] = [None] * len(image_paths)
+        
+        for batch in load_batches(image_paths, load, batch_size, num_workers):
+            for i, error in batch.errors.items():
+                results[i] = failed(image_paths[i], error)
+            if not batch.items:
+                continue
+            
+            start_time = time.perf_counter()
+            try:
+                preds = self._forward_batch(batch.items)
+            except Exception as e:
+                for i in batch.indices:
+                    results[i] = failed(image_paths[i], e)
+                continue
+            
+            # Forward time is shared by the images of a batch
+            processing_time = (time.perf_counter() - start_time) * 1000 / len(batch.items)
+            for i, image_preds in zip(batch.indices, preds):
+                results[i] = ClassificationResult(
+                    status=AnalysisStatus.COMPLETED,
+                    pathologies=self._filter_pathologies(image_preds, pathologies),
+                    model_name=self._model_name,
+                    threshold=threshold,
+                    image_path=str(image_paths[i]),
+                    processing_time_ms=processing_time,
+                )
+        
+        return results
+    
     def __del__(self):
         """Cleanup model resources."""
-        if self._model is not None:
-            del self._model
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
+        if getattr(self, "_batcher", None) is not None:
+            self._batcher.shutdown(wait=False)
+        if getattr(self, "_model_key", None) is not None:
+            get_model_registry().release(self._model_key)
@@ -5,23 +5,31 @@ Implements SegmentationProtocol from domain layer.
 """
 
 import base64
-import io
 import time
 import uuid
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 import torch
-import torchvision
-import skimage.io
-import skimage.measure
-import skimage.transform
-import matplotlib.pyplot as plt
-import torchxrayvision as xrv
 
-from medrax.mcp.domain.entities import AnalysisStatus, SegmentationResult
+from medrax.mcp.domain.entities import AnalysisStatus, MeasurementResult, SegmentationResult
 from medrax.mcp.domain.exceptions import ImageNotFoundError, ModelError
+from medrax.models import (
+    ModelKey,
+    OnnxOptions,
+    QuantizationOptions,
+    acquire_pspnet,
+    check_segmentation_resolution,
+    get_model_registry,
+    pspnet_outputs,
+)
+from medrax.models.preprocessing import get_preprocess_cache
+from medrax.utils.inference import model_lock
+from medrax.utils.measurements import chest_measurements
+from medrax.utils.organ_metrics import OrganStats, organ_stats
+from medrax.utils.render import RenderOptions, render_masks
+from medrax.utils.rle import export_masks
 
 
 class SegmentationWrapper:
@@ -61,6 +69,12 @@ class SegmentationWrapper:
         device: Optional[str] = None,
         temp_dir: Optional[Path] = None,
         pixel_spacing_mm: float = 0.2,
+        backend: str = "torch",
+        onnx_options: Optional[OnnxOptions] = None,
+        quantization: Optional[str] = None,
+        quantization_options: Optional[QuantizationOptions] = None,
+        render_options: Optional[RenderOptions] = None,
+        resolution: int = 512,
     ):
         """
         Initialize the segmentation wrapper.
@@ -69,13 +83,29 @@ class SegmentationWrapper:
             device: Device to run on (cuda/cpu/mps)
             temp_dir: Directory for temporary files
             pixel_spacing_mm: Pixel spacing for area calculations
+            backend: "torch", or "onnx" for ONNX Runtime on the CPU
+            onnx_options: Thread and cache settings of the onnx backend
+            quantization: "int8" for static INT8 quantization on the CPU
+            quantization_options: Calibration and cache settings of INT8 quantization
+            render_options: Resolution, format and backend of the visualization
+            resolution: Model input size (256, 384 or 512); lower is faster on the CPU
+                with coarser mask edges. The onnx backend runs at 512 only.
         """
-        self._device = self._get_device(device)
+        check_segmentation_resolution(resolution, backend)
+        self._backend = backend
+        self._onnx_options = onnx_options
+        self._quantization = quantization
+        self._quantization_options = quantization_options
+        # ONNX Runtime and INT8 kernels run on the CPU, so do not pick an accelerator for them
+        cpu_only = backend == "onnx" or quantization is not None
+        self._device = self._get_device(device or ("cpu" if cpu_only else None))
         self._temp_dir = temp_dir or Path("temp")
         self._temp_dir.mkdir(exist_ok=True)
         self._pixel_spacing_mm = pixel_spacing_mm
+        self._render_options = render_options or RenderOptions()
+        self._resolution = resolution
         self._model = None
-        self._transform = None
+        self._model_key: Optional[ModelKey] = None
         self._initialized = False
     
     def _get_device(self, device: Optional[str]) -> torch.device:
@@ -87,19 +117,19 @@ class SegmentationWrapper:
         return torch.device("cpu")
     
     def _ensure_initialized(self) -> None:
-        """Lazy initialization of model and transforms."""
+        """Lazy initialization of the model."""
         if self._initialized:
             return
         
         try:
-            self._model = xrv.baseline_models.chestx_det.PSPNet()
-            self._model = self._model.to(self._device)
-            self._model.eval()
-            
-            self._transform = torchvision.transforms.Compose([
-                xrv.datasets.XRayCenterCrop(),
-                xrv.datasets.XRayResizer(512)
-            ])
+            # Shared with the LangChain tool on the same device
+            self._model_key, self._model = acquire_pspnet(
+                self._device,
+                backend=self._backend,
+                onnx_options=self._onnx_options,
+                quantization=self._quantization,
+                quantization_options=self._quantization_options,
+            )
             
             self._initialized = True
         except Exception as e:
@@ -114,132 +144,88 @@ class SegmentationWrapper:
         """List of organs this segmenter supports."""
         return self.SUPPORTED_ORGANS.copy()
     
-    def _align_mask_to_original(
-        self,
-        mask: np.ndarray,
-        original_shape: tuple,
-    ) -> np.ndarray:
-        """Align mask from transformed space back to original image."""
-        orig_h, orig_w = original_shape
-        crop_size = min(orig_h, orig_w)
-        crop_top = (orig_h - crop_size) // 2
-        crop_left = (orig_w - crop_size) // 2
-        
-        resized_mask = skimage.transform.resize(
-            mask, (crop_size, crop_size),
-            order=0, preserve_range=True, anti_aliasing=False
-        )
-        
-        full_mask = np.zeros(original_shape)
-        full_mask[crop_top:crop_top + crop_size, crop_left:crop_left + crop_size] = resized_mask
-        
-        return full_mask
-    
-    def _compute_organ_metrics(
+    def _organ_metrics(
         self,
-        mask: np.ndarray,
-        original_img: np.ndarray,
+        stats: OrganStats,
+        image_shape: Tuple[int, int],
         confidence: float,
-    ) -> Optional[Dict[str, Any]]:
-        """Compute comprehensive metrics for a single organ mask."""
-        if mask.shape != original_img.shape:
-            mask = self._align_mask_to_original(mask, original_img.shape)
-        
-        props = skimage.measure.regionprops(mask.astype(int))
-        if not props:
-            return None
-        
-        props = props[0]
-        area_cm2 = mask.sum() * (self._pixel_spacing_mm / 10) ** 2
-        
-        img_height, img_width = mask.shape
-        cy, cx = props.centroid
-        
-        organ_pixels = original_img[mask > 0]
-        mean_intensity = organ_pixels.mean() if len(organ_pixels) > 0 else 0
-        std_intensity = organ_pixels.std() if len(organ_pixels) > 0 else 0
+    ) -> Dict[str, Any]:
+        """Build the metrics of one organ from its measured geometry and intensity."""
+        img_height, img_width = image_shape
+        cy, cx = stats.centroid
+        min_y, min_x, max_y, max_x = stats.bbox
         
         return {
-            "area_pixels": int(mask.sum()),
-            "area_cm2": float(area_cm2),
-            "centroid": [float(cy), float(cx)],
-            "bbox": list(map(int, props.bbox)),
-            "width": int(props.bbox[3] - props.bbox[1]),
-            "height": int(props.bbox[2] - props.bbox[0]),
-            "aspect_ratio": float(
-                (props.bbox[2] - props.bbox[0]) / max(1, props.bbox[3] - props.bbox[1])
-            ),
+            "area_pixels": stats.area_pixels,
+            "area_cm2": float(stats.area_pixels * (self._pixel_spacing_mm / 10) ** 2),
+            "centroid": [cy, cx],
+            "bbox": list(stats.bbox),
+            "width": max_x - min_x,
+            "height": max_y - min_y,
+            "aspect_ratio": float((max_y - min_y) / max(1, max_x - min_x)),
             "relative_position": {
                 "top": cy / img_height,
                 "left": cx / img_width,
             },
-            "mean_intensity": float(mean_intensity),
-            "std_intensity": float(std_intensity),
+            "mean_intensity": stats.mean_intensity,
+            "std_intensity": stats.std_intensity,
             "confidence_score": float(confidence),
         }
     
     def _create_visualization(
         self,
         original_img: np.ndarray,
-        pred_masks: torch.Tensor,
-        organ_indices: List[int],
+        masks: np.ndarray,
         organ_names: List[str],
+        centroids: Dict[str, Tuple[float, float]],
     ) -> str:
         """Create visualization and return as base64."""
-        fig, ax = plt.subplots(figsize=(10, 10))
-        ax.imshow(
-            original_img, cmap="gray",
-            extent=[0, original_img.shape[1], original_img.shape[0], 0]
+        image = render_masks(
+            original_img,
+            masks,
+            organ_names,
+            self._render_options,
+            centroids=centroids,
+            title="Anatomical Segmentation",
         )
+        return base64.b64encode(image).decode("utf-8")
+    
+    def _outputs(self, image_path: Path) -> Tuple[torch.Tensor, bool]:
+        """
+        Model output for an image, from the forward cache shared with the LangChain tools.
         
-        colors = plt.cm.rainbow(np.linspace(0, 1, len(organ_indices)))
-        
-        for idx, (organ_idx, color, name) in enumerate(zip(organ_indices, colors, organ_names)):
-            mask = pred_masks[0, organ_idx].cpu().numpy()
-            if mask.sum() > 0:
-                if mask.shape != original_img.shape:
-                    mask = self._align_mask_to_original(mask, original_img.shape)
-                
-                rgba_color = list(color[:3]) + [0.3]
-                overlay = np.zeros((*original_img.shape, 4))
-                overlay[mask > 0] = rgba_color
-                ax.imshow(
-                    overlay,
-                    extent=[0, original_img.shape[1], original_img.shape[0], 0]
-                )
-                
-                # Add label
-                props = skimage.measure.regionprops(mask.astype(int))
-                if props:
-                    cy, cx = props[0].centroid
-                    ax.annotate(
-                        name, (cx, cy),
-                        color=color, fontsize=8, ha='center',
-                        bbox=dict(boxstyle="round,pad=0.3", fc="white", alpha=0.7)
-                    )
-        
-        ax.axis("off")
-        ax.set_title("Anatomical Segmentation")
-        
-        # Convert to base64
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", bbox_inches="tight", dpi=150)
-        buf.seek(0)
-        plt.close(fig)
-        
-        return base64.b64encode(buf.getvalue()).decode("utf-8")
+        Runs under the model lock, so the wrapper and the tools never run the shared
+        model at once.
+        """
+        with model_lock(self):
+            return pspnet_outputs(
+                self._model, self._model_key, image_path, self._resolution, self._device
+            )
     
     def segment(
         self,
         image_path: Path,
         organs: Optional[List[str]] = None,
+        return_masks: bool = False,
+        mask_format: str = "rle",
+        mask_resolution: str = "original",
+        threshold: float = 0.5,
     ) -> SegmentationResult:
         """
         Segment anatomical structures in chest X-ray.
         
+        The model predicts all organs at once; its output is kept per image, so
+        later calls for other organs or thresholds on the same image do not run it again.
+        
         Args:
             image_path: Path to the chest X-ray image
             organs: Optional list of specific organs to segment
+            threshold: Probability above which a pixel belongs to an organ
+            return_masks: Whether to include the masks of the requested organs
+            mask_format: "rle" for COCO RLE per organ, "npz" for a bit-packed
+                .npz file in the temp directory
+            mask_resolution: "original" image or "model" (center crop at the model
+                input size) resolution
             
         Returns:
             SegmentationResult with organ masks and metrics
@@ -252,20 +238,11 @@ class SegmentationWrapper:
         self._ensure_initialized()
         
         try:
-            # Load image
-            original_img = skimage.io.imread(str(image_path))
-            if len(original_img.shape) > 2:
-                original_img = original_img[:, :, 0]
+            # Load image; decoding and preprocessing are shared with other analyses
+            original_img = get_preprocess_cache().decode(image_path)
             
-            # Preprocess
-            img = xrv.datasets.normalize(original_img, 255)
-            img = img[None, :, :]
-            img = self._transform(img)
-            img = torch.from_numpy(img).unsqueeze(0).to(self._device)
-            
-            # Run inference
-            with torch.inference_mode():
-                pred = self._model(img)
+            # Run inference, or reuse the output of an earlier call on this image
+            logits, forward_cached = self._outputs(image_path)
             
             # Determine organs to process
             if organs:
@@ -275,25 +252,41 @@ class SegmentationWrapper:
                 organ_indices = list(range(14))
                 organ_names = self.SUPPORTED_ORGANS
             
-            # Compute metrics for each organ
+            # Measure all organs in one pass
+            probs = torch.sigmoid(logits[organ_indices])
+            masks = (probs > threshold).numpy()
+            confidences = probs.amax(dim=(1, 2)).tolist()
             organ_metrics = {}
             organs_segmented = []
             
-            for organ_idx, organ_name in zip(organ_indices, organ_names):
-                mask = pred[0, organ_idx].cpu().numpy()
-                confidence = float(mask.max())
-                
-                if mask.sum() > 0:
-                    metrics = self._compute_organ_metrics(mask, original_img, confidence)
-                    if metrics:
-                        organ_metrics[organ_name] = metrics
-                        organs_segmented.append(organ_name)
+            for organ_name, stats, confidence in zip(
+                organ_names, organ_stats(masks, original_img), confidences
+            ):
+                if stats is not None:
+                    organ_metrics[organ_name] = self._organ_metrics(
+                        stats, original_img.shape, confidence
+                    )
+                    organs_segmented.append(organ_name)
             
             # Create visualization
             visualization_base64 = self._create_visualization(
-                original_img, pred, organ_indices, organ_names
+                original_img,
+                masks,
+                organ_names,
+                {name: organ_metrics[name]["centroid"] for name in organs_segmented},
             )
             
+            mask_output = None
+            if return_masks:
+                mask_output = export_masks(
+                    masks,
+                    organ_names,
+                    original_img.shape,
+                    mask_format=mask_format,
+                    resolution=mask_resolution,
+                    npz_path=self._temp_dir / f"segmentation_masks_{uuid.uuid4().hex[:8]}.npz",
+                )
+            
             processing_time = (time.perf_counter() - start_time) * 1000
             
             return SegmentationResult(
@@ -301,6 +294,8 @@ class SegmentationWrapper:
                 organs=organ_metrics,
                 organs_segmented=organs_segmented,
                 visualization_base64=visualization_base64,
+                masks=mask_output,
+                forward_cached=forward_cached,
                 processing_time_ms=processing_time,
             )
             
@@ -312,9 +307,64 @@ class SegmentationWrapper:
                 error=str(e),
             )
     
+    def measure(
+        self,
+        image_path: Path,
+        pixel_spacing: Optional[Tuple[float, float]] = None,
+        threshold: float = 0.5,
+    ) -> MeasurementResult:
+        """
+        Derive cardiothoracic measurements from the segmentation masks.
+        
+        Uses the same cached model output as segment, so measuring an image that
+        was segmented before does not run the model again.
+        
+        Args:
+            image_path: Path to the chest X-ray image
+            pixel_spacing: (row, column) pixel size in mm, e.g. DICOM PixelSpacing;
+                the wrapper's pixel_spacing_mm is assumed when not given
+            threshold: Probability above which a pixel belongs to an organ
+            
+        Returns:
+            MeasurementResult with cardiothoracic ratio, lung fields, mediastinum
+            and diaphragm measurements
+        """
+        start_time = time.perf_counter()
+        
+        if not image_path.exists():
+            raise ImageNotFoundError(image_path=str(image_path))
+        
+        self._ensure_initialized()
+        
+        try:
+            original_img = get_preprocess_cache().decode(image_path)
+            logits, forward_cached = self._outputs(image_path)
+            spacing = pixel_spacing or (self._pixel_spacing_mm, self._pixel_spacing_mm)
+            measurements = chest_measurements(
+                (torch.sigmoid(logits) > threshold).numpy(),
+                self.SUPPORTED_ORGANS,
+                original_img.shape,
+                spacing,
+            )
+            # Reported once, on the result
+            del measurements["pixel_spacing_mm"], measurements["pixel_spacing_assumed"]
+            
+            return MeasurementResult(
+                status=AnalysisStatus.COMPLETED,
+                measurements=measurements,
+                pixel_spacing=spacing,
+                pixel_spacing_assumed=pixel_spacing is None,
+                forward_cached=forward_cached,
+                processing_time_ms=(time.perf_counter() - start_time) * 1000,
+            )
+            
+        except Exception as e:
+            return MeasurementResult(
+                status=AnalysisStatus.FAILED,
+                error=str(e),
+            )
+    
     def __del__(self):
         """Cleanup model resources."""
-        if self._model is not None:
-            del self._model
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
+        if getattr(self, "_model_key", None) is not None:
+            get_model_registry().release(self._model_key)
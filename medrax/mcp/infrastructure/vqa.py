@@ -9,10 +9,10 @@ from pathlib import Path
 from typing import Any, List, Optional
 
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
-
 from medrax.mcp.domain.entities import AnalysisStatus, VQAResult
 from medrax.mcp.domain.exceptions import ImageNotFoundError, ModelError
+from medrax.models import ModelKey, acquire_chexagent, get_model_registry
+from medrax.utils.inference import model_lock
 
 
 class VQAWrapper:
@@ -48,6 +48,7 @@ class VQAWrapper:
         self._dtype = dtype
         self._cache_dir = cache_dir
         self._model = None
+        self._model_key: Optional[ModelKey] = None
         self._tokenizer = None
         self._initialized = False
     
@@ -65,27 +66,10 @@ class VQAWrapper:
             return
         
         try:
-            # Workaround for transformers version check
-            import transformers
-            original_version = transformers.__version__
-            transformers.__version__ = "4.40.0"
-            
-            self._tokenizer = AutoTokenizer.from_pretrained(
-                self._model_name,
-                trust_remote_code=True,
-                cache_dir=self._cache_dir,
-            )
-            
-            self._model = AutoModelForCausalLM.from_pretrained(
-                self._model_name,
-                device_map=self._device,
-                trust_remote_code=True,
-                cache_dir=self._cache_dir,
+            # Shared with the LangChain tool using the same weights, device and dtype
+            self._model_key, (self._tokenizer, self._model) = acquire_chexagent(
+                self._model_name, self._device, self._dtype, self._cache_dir
             )
-            self._model = self._model.to(dtype=self._dtype)
-            self._model.eval()
-            
-            transformers.__version__ = original_version
             self._initialized = True
             
         except Exception as e:
@@ -148,7 +132,7 @@ class VQAWrapper:
             ).to(device=self._device)
             
             # Generate response
-            with torch.inference_mode():
+            with model_lock(self), torch.inference_mode():
                 output = self._model.generate(
                     input_ids,
                     do_sample=False,
@@ -185,9 +169,5 @@ class VQAWrapper:
     
     def __del__(self):
         """Cleanup model resources."""
-        if self._model is not None:
-            del self._model
-        if self._tokenizer is not None:
-            del self._tokenizer
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
+        if getattr(self, "_model_key", None) is not None:
+            get_model_registry().release(self._model_key)
@@ -4,6 +4,7 @@ MCP Tools - FastMCP tool definitions
 These tools are exposed via MCP protocol and orchestrate application services.
 """
 
+import asyncio
 from typing import Any, Dict, List, Optional
 
 from medrax.mcp.application.services import MedRAXServiceContainer
@@ -35,6 +36,7 @@ def register_tools(app, services: MedRAXServiceContainer) -> None:
             - image_id: Unique identifier for the registered image
             - format: Detected image format
             - message: Success message
+            - prefetching: Analyses already started in the background
         """
         try:
             image_id = services.register_image(image_path)
@@ -44,6 +46,7 @@ def register_tools(app, services: MedRAXServiceContainer) -> None:
                 "image_id": image_id,
                 "format": entity.format.value if entity else "unknown",
                 "message": f"Image registered successfully. Use image_id '{image_id}' for analysis.",
+                "prefetching": services.prefetch.analyses if services.prefetch else [],
             }
         except MedRAXError as e:
             return {"error": e.message, "details": e.details}
@@ -81,7 +84,9 @@ def register_tools(app, services: MedRAXServiceContainer) -> None:
             - processing_time_ms: Analysis time
         """
         try:
-            return services.classification.classify(
+            # Off the event loop, so concurrent calls can share a forward pass
+            return await asyncio.to_thread(
+                services.classification.classify,
                 image_id=image_id,
                 pathologies=pathologies,
                 threshold=threshold,
@@ -91,6 +96,46 @@ def register_tools(app, services: MedRAXServiceContainer) -> None:
         except Exception as e:
             return {"error": str(e)}
     
+    @app.tool()
+    async def classify_cxr_batch(
+        image_ids: List[str],
+        pathologies: Optional[List[str]] = None,
+        threshold: float = 0.5,
+        batch_size: int = 16,
+    ) -> Dict[str, Any]:
+        """
+        Classify many chest X-rays at once, e.g. to triage a worklist.
+        
+        Runs the same DenseNet-121 model as classify_cxr on batches of images,
+        which is much faster than classifying images one by one. An image that
+        cannot be found or read fails on its own without affecting the others.
+        
+        Args:
+            image_ids: IDs of registered chest X-ray images
+            pathologies: Optional list to filter specific pathologies
+            threshold: Confidence threshold (0-1) for positive findings
+            batch_size: Number of images per model forward pass
+            
+        Returns:
+            Dictionary with:
+            - results: One classify_cxr result per image, in input order, with image_id
+            - total: Number of images
+            - completed: Number of images classified
+            - failed: Number of images that failed (see each result's error)
+        """
+        try:
+            return await asyncio.to_thread(
+                services.classification.classify_batch,
+                image_ids=image_ids,
+                pathologies=pathologies,
+                threshold=threshold,
+                batch_size=batch_size,
+            )
+        except MedRAXError as e:
+            return {"error": e.message, "details": e.details}
+        except Exception as e:
+            return {"error": str(e)}
+    
     @app.tool()
     async def ask_cxr_expert(
         image_ids: List[str],
@@ -136,6 +181,10 @@ def register_tools(app, services: MedRAXServiceContainer) -> None:
     async def segment_anatomy(
         image_id: str,
         organs: Optional[List[str]] = None,
+        return_masks: bool = False,
+        mask_format: str = "rle",
+        mask_resolution: str = "original",
+        threshold: float = 0.5,
     ) -> Dict[str, Any]:
         """
         Segment anatomical structures in a chest X-ray.
@@ -157,12 +206,23 @@ def register_tools(app, services: MedRAXServiceContainer) -> None:
         Args:
             image_id: ID of a registered chest X-ray image
             organs: Optional list to filter specific organs
+            return_masks: Also return the mask of each requested organ
+            mask_format: "rle" for COCO run-length encoding per organ (compressed
+                "counts" string, column-major as in pycocotools), or "npz" for a
+                bit-packed NumPy file on the server (bit k of "packed" is organ k)
+            mask_resolution: "original" image size, or "model" for the center square
+                crop at the server's segmentation input size (512x512 by default)
+            threshold: Probability above which a pixel belongs to an organ (default 0.5)
             
         Returns:
             Dictionary with:
             - organs_segmented: List of successfully segmented organs
             - organ_metrics: Detailed metrics for each organ (area, position, etc.)
             - visualization: Base64-encoded overlay image
+            - masks: With return_masks, {format, resolution, size, image_size} plus
+              "masks" (organ name to RLE) or "path" (the .npz file)
+            - forward_cached: True if the model output was reused from an earlier
+              call on the same image (e.g. for other organs or another threshold)
             - processing_time_ms: Analysis time
             
         Note: Area calculations are approximate unless the input was DICOM
@@ -172,6 +232,54 @@ def register_tools(app, services: MedRAXServiceContainer) -> None:
             return services.segmentation.segment(
                 image_id=image_id,
                 organs=organs,
+                return_masks=return_masks,
+                mask_format=mask_format,
+                mask_resolution=mask_resolution,
+                threshold=threshold,
+            )
+        except MedRAXError as e:
+            return {"error": e.message, "details": e.details}
+        except Exception as e:
+            return {"error": str(e)}
+    
+    @app.tool()
+    async def measure_chest(
+        image_id: str,
+        pixel_spacing_mm: Optional[List[float]] = None,
+        threshold: float = 0.5,
+    ) -> Dict[str, Any]:
+        """
+        Measure heart size and chest geometry from the anatomical segmentation.
+        
+        Computed deterministically from the segment_anatomy masks; an image that
+        was already segmented is measured without running the model again.
+        
+        Args:
+            image_id: ID of a registered chest X-ray image
+            pixel_spacing_mm: Optional (row, column) pixel size in mm. Images from
+                process_dicom use their DICOM PixelSpacing; otherwise 0.2 mm is assumed
+            threshold: Probability above which a pixel belongs to an organ (default 0.5)
+            
+        Returns:
+            Dictionary with:
+            - measurements:
+              - cardiothoracic_ratio: Heart width / inner thoracic width (PA films)
+              - cardiac_width_mm, thoracic_width_mm, mediastinal_width_mm
+              - cardiomegaly_suggested: True if the ratio is above 0.5
+              - lungs: Area (cm²), width and height (mm) per lung, and their symmetry
+              - diaphragm: Top row of each hemidiaphragm dome, their height
+                difference (mm) and the higher side
+            - pixel_spacing_mm: Spacing used for distances and areas
+            - pixel_spacing_assumed: True if no DICOM or given spacing was available
+            - forward_cached: True if the segmentation model output was reused
+            - processing_time_ms: Analysis time
+        """
+        try:
+            return await asyncio.to_thread(
+                services.measurements.measure,
+                image_id=image_id,
+                pixel_spacing=pixel_spacing_mm,
+                threshold=threshold,
             )
         except MedRAXError as e:
             return {"error": e.message, "details": e.details}
@@ -16,12 +16,14 @@ Usage:
 import argparse
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Sequence
 
 from medrax.mcp.application.services import MedRAXServiceContainer
 from medrax.mcp.presentation.tools import register_tools
 from medrax.mcp.presentation.prompts import register_prompts
 from medrax.mcp.presentation.resources import register_resources
+from medrax.models import OnnxOptions, QuantizationOptions
+from medrax.utils.render import RenderOptions
 
 # Configure logging
 logging.basicConfig(
@@ -36,6 +38,17 @@ def create_mcp_app(
     device: Optional[str] = None,
     temp_dir: Optional[Path] = None,
     lazy_load: bool = True,
+    prefetch: Sequence[str] = (),
+    max_batch_size: int = 16,
+    max_batch_latency_ms: float = 5.0,
+    backend: str = "torch",
+    onnx_threads: int = 0,
+    quantization: Optional[str] = None,
+    calibration_dir: Optional[Path] = None,
+    render_backend: str = "pil",
+    render_max_size: Optional[int] = 1024,
+    render_format: str = "png",
+    segmentation_resolution: int = 512,
 ):
     """
     Create and configure the MedRAX MCP server application.
@@ -45,6 +58,17 @@ def create_mcp_app(
         device: Device for model inference (cuda/cpu/mps)
         temp_dir: Directory for temporary files
         lazy_load: If True, models are loaded on first use
+        prefetch: Analyses to start in the background when an image is registered
+        max_batch_size: Maximum number of concurrent classifications per forward pass
+        max_batch_latency_ms: Maximum time a classification waits for others to batch with
+        backend: Runtime of the classifier and segmenter ("torch", or "onnx" on the CPU)
+        onnx_threads: ONNX Runtime intra-op threads (0 = all cores)
+        quantization: "int8" to run the classifier and segmenter with INT8 kernels on the CPU
+        calibration_dir: Folder of X-rays to calibrate INT8 activation ranges on
+        render_backend: Renderer of segmentation visualizations ("pil" or "matplotlib")
+        render_max_size: Longer side of visualizations in pixels (None = original size)
+        render_format: Image format of visualizations ("png", "jpeg" or "webp")
+        segmentation_resolution: Input size of the segmenter (256, 384 or 512)
         
     Returns:
         Configured FastMCP application instance
@@ -64,6 +88,19 @@ def create_mcp_app(
         device=device,
         temp_dir=temp_dir,
         lazy_load=lazy_load,
+        prefetch=prefetch,
+        max_batch_size=max_batch_size,
+        max_batch_latency_ms=max_batch_latency_ms,
+        backend=backend,
+        onnx_options=OnnxOptions(intra_op_threads=onnx_threads),
+        quantization=quantization,
+        quantization_options=QuantizationOptions(
+            calibration_dir=str(calibration_dir) if calibration_dir else None
+        ),
+        render_options=RenderOptions(
+            backend=render_backend, max_size=render_max_size, image_format=render_format
+        ),
+        segmentation_resolution=segmentation_resolution,
     )
     
     # Register all components
@@ -104,6 +141,74 @@ def main():
         action="store_true",
         help="Load all models at startup instead of on first use"
     )
+    parser.add_argument(
+        "--prefetch",
+        nargs="*",
+        choices=["classification", "segmentation"],
+        default=[],
+        help="Analyses to run in the background as soon as an image is registered"
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=16,
+        help="Maximum number of concurrent classifications grouped into one forward pass"
+    )
+    parser.add_argument(
+        "--max-batch-latency-ms",
+        type=float,
+        default=5.0,
+        help="Maximum time a classification waits for others to batch with"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["torch", "onnx"],
+        default="torch",
+        help="Runtime for the classifier and segmenter; onnx exports them once and runs on the CPU"
+    )
+    parser.add_argument(
+        "--onnx-threads",
+        type=int,
+        default=0,
+        help="ONNX Runtime intra-op threads (0 = all cores)"
+    )
+    parser.add_argument(
+        "--quantize",
+        choices=["int8"],
+        default=None,
+        help="Run the classifier and segmenter with static INT8 quantization on the CPU"
+    )
+    parser.add_argument(
+        "--calibration-dir",
+        type=Path,
+        default=None,
+        help="Folder of representative X-rays to calibrate INT8 quantization on"
+    )
+    parser.add_argument(
+        "--render-backend",
+        choices=["pil", "matplotlib"],
+        default="pil",
+        help="Renderer of segmentation visualizations; matplotlib is the previous, slower renderer"
+    )
+    parser.add_argument(
+        "--render-max-size",
+        type=int,
+        default=1024,
+        help="Longer side of segmentation visualizations in pixels (0 = original size)"
+    )
+    parser.add_argument(
+        "--render-format",
+        choices=["png", "jpeg", "webp"],
+        default="png",
+        help="Image format of segmentation visualizations"
+    )
+    parser.add_argument(
+        "--segmentation-resolution",
+        type=int,
+        choices=[256, 384, 512],
+        default=512,
+        help="Segmenter input size; lower is faster on the CPU with coarser mask edges"
+    )
     parser.add_argument(
         "--transport",
         choices=["stdio", "sse"],
@@ -119,6 +224,17 @@ def main():
         device=args.device,
         temp_dir=args.temp_dir,
         lazy_load=not args.eager_load,
+        prefetch=args.prefetch,
+        max_batch_size=args.max_batch_size,
+        max_batch_latency_ms=args.max_batch_latency_ms,
+        backend=args.backend,
+        onnx_threads=args.onnx_threads,
+        quantization=args.quantize,
+        calibration_dir=args.calibration_dir,
+        render_backend=args.render_backend,
+        render_max_size=args.render_max_size or None,
+        render_format=args.render_format,
+        segmentation_resolution=args.segmentation_resolution,
     )
     
     # Run server
@@ -0,0 +1,21 @@
+"""Shared model loading for the LangChain tools and MCP wrappers."""
+
+from .registry import ModelKey, ModelRegistry, get_model_registry
+from .onnx_backend import OnnxModel, OnnxOptions, OnnxParityError, load_onnx_model
+from .quantization import (
+    QuantizationOptions,
+    load_quantized_model,
+    mask_dice,
+    probability_drift,
+    quantize_modules,
+)
+from .preprocessing import PreprocessCache, get_preprocess_cache
+from .forward_cache import ForwardCache, get_forward_cache, pspnet_outputs
+from .loaders import (
+    SEGMENTATION_RESOLUTIONS,
+    acquire_chexagent,
+    acquire_densenet,
+    acquire_pspnet,
+    check_segmentation_resolution,
+    pspnet_logits,
+)
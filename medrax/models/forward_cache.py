@@ -0,0 +1,114 @@
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Tuple, Union
+
+import torch
+
+from medrax.models.loaders import pspnet_logits
+from medrax.models.preprocessing import load_segmentation_input
+from medrax.models.registry import ModelKey
+from medrax.utils.cache import LRUCache, file_digest
+
+DEFAULT_FORWARD_CACHE_BYTES = 128 * 1024 * 1024
+
+
+def _nbytes(value: torch.Tensor) -> int:
+    return value.numel() * value.element_size()
+
+
+class ForwardCache:
+    """
+    Per-image cache of raw model outputs, keyed by image content and model identity.
+
+    Meant for models whose output covers every query at once, like PSPNet, which
+    predicts all 14 organs in one pass: a later request for another organ subset or
+    threshold on the same image is answered from the stored output instead of running
+    the model again. Outputs are kept on the CPU as float16 under one LRU byte budget.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_FORWARD_CACHE_BYTES):
+        """
+        Initialize the cache.
+
+        Args:
+        max_bytes (int, optional): Budget of all cached outputs. Defaults to 128 MiB.
+        """
+        self._entries = LRUCache(max_bytes, sizeof=_nbytes)
+
+    def outputs(
+        self,
+        image_path: Union[str, Path],
+        model: Hashable,
+        compute: Callable[[], torch.Tensor],
+    ) -> Tuple[torch.Tensor, bool]:
+        """
+        Get a model's output for an image, running the model at most once.
+
+        Args:
+        image_path (Union[str, Path]): Path to the image the output is for.
+        model (Hashable): Identity of the model and of every setting that changes its
+            output, e.g. (ModelKey, input size).
+        compute (Callable[[], torch.Tensor]): Function that runs the model.
+
+        Returns:
+        Tuple[torch.Tensor, bool]: A new float32 CPU tensor the caller may modify, and
+            whether it was served from the cache.
+        """
+        value, cached = self._entries.get_or_compute(
+            (file_digest(str(image_path)), model),
+            lambda: compute().detach().to("cpu", torch.float16),
+        )
+        return value.float(), cached
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and memory usage."""
+        return self._entries.stats()
+
+
+_forward_cache = ForwardCache()
+
+
+def get_forward_cache() -> ForwardCache:
+    """
+    Get the process-wide forward-pass cache.
+
+    Returns:
+    ForwardCache: The cache shared by all tools and MCP wrappers.
+    """
+    return _forward_cache
+
+
+def pspnet_outputs(
+    model: Any,
+    model_key: ModelKey,
+    image_path: Union[str, Path],
+    resolution: int = 512,
+    device: Any = "cpu",
+) -> Tuple[torch.Tensor, bool]:
+    """
+    Get the PSPNet logits of all 14 organs for an image through the forward cache.
+
+    The segmentation tool, the MCP segmentation wrapper and the measurement tools all
+    read the same entry, so whichever runs first pays for the forward pass.
+
+    Args:
+    model (Any): Model from acquire_pspnet.
+    model_key (ModelKey): Its registry key.
+    image_path (Union[str, Path]): Path to a PNG or JPEG image.
+    resolution (int, optional): Model input size. Defaults to 512.
+    device (Any, optional): Device the model runs on. Defaults to "cpu".
+
+    Returns:
+    Tuple[torch.Tensor, bool]: float32 CPU logits of shape (14, resolution, resolution),
+        and whether they were served from the cache.
+    """
+
+    def compute() -> torch.Tensor:
+        img = load_segmentation_input(image_path, resolution).unsqueeze(0).to(device)
+        with torch.inference_mode():
+            return pspnet_logits(model, img)[0]
+
+    return get_forward_cache().outputs(image_path, (model_key, f"pspnet-{resolution}"), compute)
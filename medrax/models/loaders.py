@@ -0,0 +1,239 @@
+from typing import Any, Optional, Tuple
+
+import torch
+
+from medrax.models.onnx_backend import OnnxOptions, load_onnx_model
+from medrax.models.quantization import QuantizationOptions, load_quantized_model
+from medrax.models.registry import ModelKey, get_model_registry
+
+DENSENET_DEFAULT = "densenet121-res224-all"
+PSPNET_ID = "chestx_det-pspnet"
+CHEXAGENT_DEFAULT = "StanfordAIMI/CheXagent-2-3b"
+BACKENDS = ("torch", "onnx")
+QUANTIZATIONS = (None, "int8")
+# PSPNet input sizes; each keeps the 6x6 pyramid pooling grid whole at stride 8
+SEGMENTATION_RESOLUTIONS = (256, 384, 512)
+
+# Submodules quantized to INT8. The PSPNet pyramid pooling resizes with shapes read at
+# run time, so FX cannot trace it and it stays in fp32.
+DENSENET_QUANTIZED_MODULES = ("features",)
+PSPNET_QUANTIZED_MODULES = tuple(
+    f"model.{name}"
+    for name in (
+        "convbnrelu1_1",
+        "convbnrelu1_2",
+        "convbnrelu1_3",
+        "res_block2",
+        "res_block3",
+        "res_block4",
+        "res_block5",
+        "pyramid_pooling",
+        "cbr_final",
+        "classification",
+    )
+)
+
+
+def _check_backend(backend: str, key: ModelKey) -> None:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "onnx" and key.device != "cpu":
+        raise ValueError(f"The onnx backend runs on the CPU, got device {key.device!r}")
+    if key.quantization not in QUANTIZATIONS:
+        raise ValueError(
+            f"Unknown quantization {key.quantization!r}, expected one of {QUANTIZATIONS}"
+        )
+    if key.quantization and (backend != "torch" or key.device != "cpu"):
+        raise ValueError("INT8 quantization runs with the torch backend on the CPU")
+
+
+def acquire_densenet(
+    model_name: str = DENSENET_DEFAULT,
+    device: Any = "cuda",
+    backend: str = "torch",
+    onnx_options: Optional[OnnxOptions] = None,
+    quantization: Optional[str] = None,
+    quantization_options: Optional[QuantizationOptions] = None,
+) -> Tuple[ModelKey, Any]:
+    """
+    Get the shared TorchXRayVision DenseNet classifier, loading it on first use.
+
+    Args:
+    model_name (str, optional): DenseNet weights name. Defaults to "densenet121-res224-all".
+    device (Any, optional): Device to run on. Defaults to "cuda".
+    backend (str, optional): "torch", or "onnx" for ONNX Runtime on the CPU. Defaults to "torch".
+    onnx_options (OnnxOptions, optional): Settings of the onnx backend.
+    quantization (str, optional): "int8" for static INT8 quantization on the CPU. Defaults to None.
+    quantization_options (QuantizationOptions, optional): Calibration and cache settings of
+        INT8 quantization.
+
+    Returns:
+    Tuple[ModelKey, Any]: Registry key to release the model with, and the model in eval mode.
+    """
+    key = ModelKey.create(model_name, device, quantization=quantization, backend=backend)
+    _check_backend(backend, key)
+
+    def load():
+        import torchxrayvision as xrv
+
+        model = xrv.models.DenseNet(weights=model_name)
+        if quantization:
+            from medrax.models.preprocessing import classifier_input, read_xray
+
+            resolution = getattr(model, "input_resolution", 224)
+            return load_quantized_model(
+                model_name,
+                model,
+                DENSENET_QUANTIZED_MODULES,
+                (1, resolution, resolution),
+                lambda path: classifier_input(read_xray(path), resolution),
+                quantization_options or QuantizationOptions(),
+            )
+        if backend == "onnx":
+            resolution = getattr(model, "input_resolution", 224)
+            return load_onnx_model(
+                model_name,
+                model,
+                (1, resolution, resolution),
+                onnx_options,
+                attributes=("input_resolution", "pathologies", "targets"),
+            )
+        return model.to(key.device).eval()
+
+    return key, get_model_registry().acquire(key, load)
+
+
+def acquire_pspnet(
+    device: Any = "cuda",
+    backend: str = "torch",
+    onnx_options: Optional[OnnxOptions] = None,
+    quantization: Optional[str] = None,
+    quantization_options: Optional[QuantizationOptions] = None,
+) -> Tuple[ModelKey, Any]:
+    """
+    Get the shared ChestX-Det PSPNet segmentation model, loading it on first use.
+
+    Args:
+    device (Any, optional): Device to run on. Defaults to "cuda".
+    backend (str, optional): "torch", or "onnx" for ONNX Runtime on the CPU. Defaults to "torch".
+    onnx_options (OnnxOptions, optional): Settings of the onnx backend.
+    quantization (str, optional): "int8" for static INT8 quantization on the CPU. Defaults to None.
+    quantization_options (QuantizationOptions, optional): Calibration and cache settings of
+        INT8 quantization.
+
+    Returns:
+    Tuple[ModelKey, Any]: Registry key to release the model with, and the model in eval mode.
+    """
+    key = ModelKey.create(PSPNET_ID, device, quantization=quantization, backend=backend)
+    _check_backend(backend, key)
+
+    def load():
+        import torchxrayvision as xrv
+
+        model = xrv.baseline_models.chestx_det.PSPNet()
+        if quantization:
+            from medrax.models.preprocessing import read_xray, segmentation_input
+
+            return load_quantized_model(
+                PSPNET_ID,
+                model,
+                PSPNET_QUANTIZED_MODULES,
+                (1, 512, 512),
+                lambda path: segmentation_input(read_xray(path)),
+                quantization_options or QuantizationOptions(),
+            )
+        if backend == "onnx":
+            return load_onnx_model(
+                PSPNET_ID, model, (1, 512, 512), onnx_options, attributes=("targets",)
+            )
+        return model.to(key.device).eval()
+
+    return key, get_model_registry().acquire(key, load)
+
+
+def check_segmentation_resolution(resolution: int, backend: str = "torch") -> None:
+    """
+    Validate a PSPNet input size for a backend.
+
+    Args:
+    resolution (int): Input size the model runs at.
+    backend (str, optional): "torch" or "onnx". Defaults to "torch".
+
+    Raises:
+    ValueError: If the size is unsupported, or not 512 with the onnx backend, whose graph
+        is exported at 512.
+    """
+    if resolution not in SEGMENTATION_RESOLUTIONS:
+        raise ValueError(
+            f"Unsupported segmentation resolution {resolution!r}, "
+            f"expected one of {SEGMENTATION_RESOLUTIONS}"
+        )
+    if backend == "onnx" and resolution != 512:
+        raise ValueError("The onnx backend runs the segmenter at resolution 512 only")
+
+
+def pspnet_logits(model: Any, img: torch.Tensor) -> torch.Tensor:
+    """
+    Run PSPNet at the resolution of its input.
+
+    TorchXRayVision's PSPNet resizes every input back to 512 before the network, so
+    smaller inputs call the inner network directly with the same normalization; the
+    logits then cover the input grid, which align_masks maps onto the image.
+
+    Args:
+    model (Any): Model from acquire_pspnet.
+    img (torch.Tensor): Batch of shape (N, 1, S, S) from segmentation_input, with S in
+        SEGMENTATION_RESOLUTIONS.
+
+    Returns:
+    torch.Tensor: Logits of shape (N, 14, S, S).
+    """
+    if img.shape[-1] == 512:
+        return model(img)
+    x = (img.repeat(1, 3, 1, 1) + 1024) / 2048
+    return model.model(model.transform(x))
+
+
+def acquire_chexagent(
+    model_name: str = CHEXAGENT_DEFAULT,
+    device: Any = "cuda",
+    dtype: torch.dtype = torch.bfloat16,
+    cache_dir: Optional[str] = None,
+) -> Tuple[ModelKey, Tuple[Any, Any]]:
+    """
+    Get the shared CheXagent tokenizer and model, loading them on first use.
+
+    The cache directory only says where weights are downloaded to, so it is not part
+    of the model identity.
+
+    Args:
+    model_name (str, optional): HuggingFace model name. Defaults to "StanfordAIMI/CheXagent-2-3b".
+    device (Any, optional): Device to run on. Defaults to "cuda".
+    dtype (torch.dtype, optional): Weight dtype. Defaults to torch.bfloat16.
+    cache_dir (str, optional): Directory to cache downloaded weights. Defaults to None.
+
+    Returns:
+    Tuple[ModelKey, Tuple[Any, Any]]: Registry key to release the model with, and the
+        (tokenizer, model) pair.
+    """
+    key = ModelKey.create(model_name, device, dtype)
+
+    def load():
+        import transformers
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        # CheXagent's remote code checks for this transformers version
+        original_version = transformers.__version__
+        transformers.__version__ = "4.40.0"
+        try:
+            tokenizer = AutoTokenizer.from_pretrained(
+                model_name, trust_remote_code=True, cache_dir=cache_dir
+            )
+            model = AutoModelForCausalLM.from_pretrained(
+                model_name, device_map=key.device, trust_remote_code=True, cache_dir=cache_dir
+            )
+        finally:
+            transformers.__version__ = original_version
+        return tokenizer, model.to(dtype=dtype).eval()
+
+    return key, get_model_registry().acquire(key, load)
@@ -0,0 +1,223 @@
+import hashlib
+import inspect
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import torch
+
+DEFAULT_ONNX_CACHE_DIR = Path.home() / ".cache" / "medrax" / "onnx"
+ONNX_OPSET = 17
+
+
+class OnnxParityError(RuntimeError):
+    """Raised when an exported ONNX graph does not reproduce the PyTorch outputs."""
+
+
+@dataclass
+class OnnxOptions:
+    """
+    Settings of the ONNX Runtime backend.
+
+    Models are shared through the model registry, so the options of the first caller
+    that loads a model apply to everyone sharing it.
+
+    Attributes:
+    cache_dir (Optional[str]): Directory of exported graphs. Defaults to ~/.cache/medrax/onnx.
+    intra_op_threads (int): Threads used inside one operator; 0 lets ONNX Runtime choose.
+    inter_op_threads (int): Threads running independent operators; 0 lets ONNX Runtime choose.
+    parity_atol (float): Largest absolute output difference to PyTorch accepted at export.
+    """
+
+    cache_dir: Optional[str] = None
+    intra_op_threads: int = 0
+    inter_op_threads: int = 0
+    parity_atol: float = 1e-4
+
+
+class OnnxModel:
+    """
+    Runs an exported model with ONNX Runtime behind the call interface of a torch module.
+
+    Takes and returns torch tensors, so tool code calling `model(img)` works unchanged.
+    Attributes of the source model the tools read, such as `input_resolution`, are
+    copied over.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 0,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Open an inference session on the CPU.
+
+        Args:
+        path (Path): The exported ONNX graph.
+        intra_op_threads (int, optional): Threads used inside one operator. Defaults to 0 (auto).
+        inter_op_threads (int, optional): Threads running independent operators. Defaults to 0 (auto).
+        attributes (Dict[str, Any], optional): Attributes to expose, copied from the torch model.
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        if inter_op_threads > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+
+        self.path = Path(path)
+        self.session = ort.InferenceSession(
+            str(self.path), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_name = self.session.get_inputs()[0].name
+        for name, value in (attributes or {}).items():
+            setattr(self, name, value)
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        inputs = {self._input_name: x.detach().cpu().numpy().astype(np.float32, copy=False)}
+        return torch.from_numpy(self.session.run(None, inputs)[0])
+
+    def eval(self) -> "OnnxModel":
+        return self
+
+    def to(self, *args: Any, **kwargs: Any) -> "OnnxModel":
+        return self
+
+
+def weights_digest(model: torch.nn.Module) -> str:
+    """
+    Hash the parameters and buffers of a model.
+
+    Args:
+    model (torch.nn.Module): The model.
+
+    Returns:
+    str: SHA-256 hex digest over the state dict names, shapes and values.
+    """
+    digest = hashlib.sha256()
+    for name, tensor in model.state_dict().items():
+        array = tensor.detach().cpu().contiguous().numpy()
+        digest.update(f"{name}:{array.dtype}:{array.shape};".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def export_onnx(model: torch.nn.Module, example_input: torch.Tensor, path: Path) -> None:
+    """
+    Export a model to ONNX with a dynamic batch dimension.
+
+    Args:
+    model (torch.nn.Module): The model, on the CPU and in eval mode.
+    example_input (torch.Tensor): Input used to trace the model.
+    path (Path): Output file.
+    """
+    kwargs: Dict[str, Any] = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # The TorchScript exporter needs no extra dependencies and handles these models
+        kwargs["dynamo"] = False
+
+    with torch.inference_mode():
+        torch.onnx.export(
+            model,
+            (example_input,),
+            str(path),
+            input_names=["input"],
+            output_names=["output"],
+            dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+            opset_version=ONNX_OPSET,
+            **kwargs,
+        )
+
+
+def check_parity(
+    model: torch.nn.Module, onnx_model: OnnxModel, example_input: torch.Tensor, atol: float
+) -> float:
+    """
+    Compare the outputs of a torch model and its ONNX export.
+
+    Args:
+    model (torch.nn.Module): The source model.
+    onnx_model (OnnxModel): The exported model.
+    example_input (torch.Tensor): Input to compare on.
+    atol (float): Largest accepted absolute difference.
+
+    Returns:
+    float: The largest absolute difference.
+
+    Raises:
+    OnnxParityError: If the difference exceeds atol.
+    """
+    with torch.inference_mode():
+        expected = model(example_input).cpu().numpy()
+    actual = onnx_model(example_input).numpy()
+    max_diff = float(np.abs(expected - actual).max())
+    if not max_diff <= atol:
+        raise OnnxParityError(
+            f"ONNX output differs from PyTorch by {max_diff:.3g} (tolerance {atol:.3g})"
+        )
+    return max_diff
+
+
+def load_onnx_model(
+    model_id: str,
+    model: torch.nn.Module,
+    input_shape: tuple,
+    options: Optional[OnnxOptions] = None,
+    attributes: Sequence[str] = (),
+) -> OnnxModel:
+    """
+    Get an ONNX Runtime session for a torch model, exporting it on first use.
+
+    Exported graphs are cached on disk under the model id and a hash of the weights,
+    so changed weights are exported again. A new export is only kept if it matches
+    the PyTorch outputs on a random batch of two images.
+
+    Args:
+    model_id (str): Model name, used in the cache file name.
+    model (torch.nn.Module): The torch model; moved to the CPU for export.
+    input_shape (tuple): Shape of one input without the batch dimension, e.g. (1, 224, 224).
+    options (OnnxOptions, optional): Backend settings. Defaults to OnnxOptions().
+    attributes (Sequence[str], optional): Torch model attributes to copy, if present.
+
+    Returns:
+    OnnxModel: The inference session.
+
+    Raises:
+    OnnxParityError: If a new export does not match the PyTorch outputs.
+    """
+    options = options or OnnxOptions()
+    cache_dir = Path(options.cache_dir).expanduser() if options.cache_dir else DEFAULT_ONNX_CACHE_DIR
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    model = model.cpu().eval()
+    copied = {name: getattr(model, name) for name in attributes if hasattr(model, name)}
+    safe_id = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_id)
+    path = cache_dir / f"{safe_id}-{weights_digest(model)[:16]}.onnx"
+
+    def session(graph: Path) -> OnnxModel:
+        return OnnxModel(graph, options.intra_op_threads, options.inter_op_threads, copied)
+
+    if path.exists():
+        return session(path)
+
+    # Inputs in the [-1024, 1024] range the xrv models expect
+    generator = torch.Generator().manual_seed(0)
+    example_input = torch.rand((2, *input_shape), generator=generator) * 2048 - 1024
+
+    tmp_path = path.with_name(f"{path.stem}.{uuid.uuid4().hex}.tmp")
+    try:
+        export_onnx(model, example_input, tmp_path)
+        check_parity(model, session(tmp_path), example_input, options.parity_atol)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    return session(path)
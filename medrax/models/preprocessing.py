@@ -0,0 +1,257 @@
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+
+import numpy as np
+import skimage.io
+import torch
+import torchxrayvision as xrv
+from PIL import Image
+
+from medrax.utils.cache import LRUCache, file_digest
+
+DEFAULT_PREPROCESS_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def decode_xray(image_path: Union[str, Path]) -> np.ndarray:
+    """
+    Decode a chest X-ray file to its raw grayscale pixels.
+
+    Args:
+    image_path (Union[str, Path]): Path to a PNG or JPEG image.
+
+    Returns:
+    np.ndarray: Pixels of shape (H, W) in the file's dtype, usually uint8.
+    """
+    img = skimage.io.imread(str(image_path))
+    if len(img.shape) > 2:
+        img = img[:, :, 0]
+    return img
+
+
+def decode_rgb(image_path: Union[str, Path]) -> np.ndarray:
+    """
+    Decode an image file to RGB pixels, as PIL's convert("RGB") does.
+
+    Args:
+    image_path (Union[str, Path]): Path to a PNG or JPEG image.
+
+    Returns:
+    np.ndarray: uint8 pixels of shape (H, W, 3).
+    """
+    with Image.open(image_path) as img:
+        return np.asarray(img.convert("RGB"))
+
+
+def normalize_xray(image: np.ndarray) -> np.ndarray:
+    """
+    Scale raw 8-bit pixels into the value range the TorchXRayVision models expect.
+
+    Args:
+    image (np.ndarray): Output of decode_xray.
+
+    Returns:
+    np.ndarray: float32 image of shape (H, W), scaled to [-1024, 1024].
+    """
+    return xrv.datasets.normalize(image, 255).astype(np.float32, copy=False)
+
+
+def read_xray(image_path: Union[str, Path]) -> np.ndarray:
+    """
+    Decode a chest X-ray into the value range the TorchXRayVision models expect.
+
+    Args:
+    image_path (Union[str, Path]): Path to a PNG or JPEG image.
+
+    Returns:
+    np.ndarray: Grayscale image of shape (H, W), scaled to [-1024, 1024].
+    """
+    return normalize_xray(decode_xray(image_path))
+
+
+def classifier_input(image: np.ndarray, resolution: int = 224) -> torch.Tensor:
+    """
+    Prepare a decoded X-ray for the DenseNet classifier.
+
+    Center-crops to a square and resizes to the model resolution with the same
+    interpolation TorchXRayVision applies inside the model.
+
+    Args:
+    image (np.ndarray): Output of read_xray.
+    resolution (int, optional): Model input resolution. Defaults to 224.
+
+    Returns:
+    torch.Tensor: Tensor of shape (1, resolution, resolution).
+    """
+    img = torch.from_numpy(xrv.datasets.XRayCenterCrop()(image[None, :, :]))
+    if img.shape[-1] != resolution:
+        img = torch.nn.functional.interpolate(
+            img[None], size=(resolution, resolution), mode="bilinear", antialias=True
+        )[0]
+    return img
+
+
+def segmentation_input(image: np.ndarray, size: int = 512) -> torch.Tensor:
+    """
+    Prepare a decoded X-ray for the PSPNet segmentation model.
+
+    Args:
+    image (np.ndarray): Output of read_xray.
+    size (int, optional): Model input size. Defaults to 512.
+
+    Returns:
+    torch.Tensor: Tensor of shape (1, size, size).
+    """
+    img = xrv.datasets.XRayCenterCrop()(image[None, :, :])
+    img = xrv.datasets.XRayResizer(size)(img)
+    return torch.from_numpy(img)
+
+
+def _nbytes(value: Union[np.ndarray, torch.Tensor]) -> int:
+    return int(value.nbytes)
+
+
+class PreprocessCache:
+    """
+    Shared cache of decoded X-rays and model inputs, keyed by image content.
+
+    A study analysed by several models is hashed once and decoded once; each model's
+    input tensor is computed once per image and kept as float16 (or float32 when a
+    model needs it exact), then upcast to float32 on use. Entries are evicted least
+    recently used under one byte budget.
+
+    Concurrent requests for the same entry (e.g. classification and segmentation
+    prefetched together) wait for one computation instead of repeating it.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_PREPROCESS_CACHE_BYTES):
+        """
+        Initialize the cache.
+
+        Args:
+        max_bytes (int, optional): Budget of all decoded images and model inputs. Defaults to 256 MiB.
+        """
+        self._entries = LRUCache(max_bytes, sizeof=_nbytes)
+
+    def decode(self, image_path: Union[str, Path]) -> np.ndarray:
+        """
+        Get the raw grayscale pixels of an image, decoding the file at most once.
+
+        Args:
+        image_path (Union[str, Path]): Path to a PNG or JPEG image.
+
+        Returns:
+        np.ndarray: Read-only pixels of shape (H, W), as returned by decode_xray.
+        """
+
+        def load() -> np.ndarray:
+            img = decode_xray(image_path)
+            img.flags.writeable = False
+            return img
+
+        return self._entries.get_or_compute((file_digest(str(image_path)), "decoded"), load)[0]
+
+    def decode_rgb(self, image_path: Union[str, Path]) -> np.ndarray:
+        """
+        Get the RGB pixels of an image, decoding the file at most once.
+
+        Args:
+        image_path (Union[str, Path]): Path to a PNG or JPEG image.
+
+        Returns:
+        np.ndarray: Read-only pixels of shape (H, W, 3), as returned by decode_rgb.
+        """
+
+        def load() -> np.ndarray:
+            img = decode_rgb(image_path)
+            img.flags.writeable = False
+            return img
+
+        return self._entries.get_or_compute((file_digest(str(image_path)), "rgb"), load)[0]
+
+    def model_input(
+        self,
+        image_path: Union[str, Path],
+        name: str,
+        transform: Callable[[np.ndarray], torch.Tensor],
+        image: Optional[np.ndarray] = None,
+        dtype: torch.dtype = torch.float16,
+    ) -> torch.Tensor:
+        """
+        Get a model input for an image, computing it at most once.
+
+        Args:
+        image_path (Union[str, Path]): Path to a PNG or JPEG image.
+        name (str): Identity of the transform, including every setting that changes
+            its output, e.g. "densenet-224".
+        transform (Callable[[np.ndarray], torch.Tensor]): Function turning the raw pixels
+            from decode into the model input.
+        image (Optional[np.ndarray]): Pixels of image_path from decode, for callers that
+            derive several inputs from one image. Decoded on a miss if not given.
+        dtype (torch.dtype, optional): Dtype the input is kept in. Defaults to float16;
+            float32 keeps the input exact for models sensitive to rounding.
+
+        Returns:
+        torch.Tensor: A new float32 tensor the caller may modify.
+        """
+        value, _ = self._entries.get_or_compute(
+            (file_digest(str(image_path)), name),
+            lambda: transform(image if image is not None else self.decode(image_path)).to(dtype),
+        )
+        return value.to(torch.float32, copy=True)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and memory usage."""
+        return self._entries.stats()
+
+
+_preprocess_cache = PreprocessCache()
+
+
+def get_preprocess_cache() -> PreprocessCache:
+    """
+    Get the process-wide preprocessing cache.
+
+    Returns:
+    PreprocessCache: The cache shared by all tools and MCP wrappers.
+    """
+    return _preprocess_cache
+
+
+def load_classifier_input(image_path: Union[str, Path], resolution: int = 224) -> torch.Tensor:
+    """
+    Get the DenseNet input of an image through the shared preprocessing cache.
+
+    Args:
+    image_path (Union[str, Path]): Path to a PNG or JPEG image.
+    resolution (int, optional): Model input resolution. Defaults to 224.
+
+    Returns:
+    torch.Tensor: float32 tensor of shape (1, resolution, resolution).
+    """
+    return get_preprocess_cache().model_input(
+        image_path,
+        f"densenet-{resolution}",
+        lambda img: classifier_input(normalize_xray(img), resolution),
+    )
+
+
+def load_segmentation_input(image_path: Union[str, Path], size: int = 512) -> torch.Tensor:
+    """
+    Get the PSPNet input of an image through the shared preprocessing cache.
+
+    Args:
+    image_path (Union[str, Path]): Path to a PNG or JPEG image.
+    size (int, optional): Model input size. Defaults to 512.
+
+    Returns:
+    torch.Tensor: float32 tensor of shape (1, size, size).
+    """
+    return get_preprocess_cache().model_input(
+        image_path,
+        f"pspnet-{size}",
+        lambda img: segmentation_input(normalize_xray(img), size),
+    )
@@ -0,0 +1,265 @@
+import copy
+import hashlib
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+from medrax.models.onnx_backend import weights_digest
+from medrax.utils.cache import file_digest
+
+DEFAULT_QUANTIZED_CACHE_DIR = Path.home() / ".cache" / "medrax" / "quantized"
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg")
+
+
+@dataclass
+class QuantizationOptions:
+    """
+    Settings of INT8 post-training static quantization.
+
+    Attributes:
+    calibration_dir (Optional[str]): Folder of representative X-rays used to calibrate
+        activation ranges. Required the first time a model is quantized.
+    cache_dir (Optional[str]): Directory of quantized weights. Defaults to ~/.cache/medrax/quantized.
+    max_calibration_images (int): Number of calibration images used, in file name order.
+    batch_size (int): Calibration batch size.
+    """
+
+    calibration_dir: Optional[str] = None
+    cache_dir: Optional[str] = None
+    max_calibration_images: int = 64
+    batch_size: int = 8
+
+
+def quantization_engine() -> str:
+    """Pick the best quantized kernel library available on this CPU."""
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            return engine
+    raise RuntimeError(f"No INT8 quantization engine available, found {engines}")
+
+
+def calibration_images(directory: str, limit: int) -> List[Path]:
+    """
+    List the calibration images of a folder.
+
+    Args:
+    directory (str): Folder with PNG or JPEG images.
+    limit (int): Maximum number of images.
+
+    Returns:
+    List[Path]: Up to limit images, in file name order.
+    """
+    paths = sorted(
+        p for p in Path(directory).expanduser().iterdir() if p.suffix.lower() in IMAGE_SUFFIXES
+    )
+    if not paths:
+        raise ValueError(f"No calibration images (PNG/JPEG) found in {directory}")
+    return paths[:limit]
+
+
+def quantize_modules(
+    model: torch.nn.Module,
+    module_names: Sequence[str],
+    example_input: torch.Tensor,
+    calibration_batches: Iterable[torch.Tensor] = (),
+) -> List[str]:
+    """
+    Replace submodules of a model with INT8 versions, in place.
+
+    Each submodule is quantized with FX graph mode static quantization: observers are
+    inserted, the calibration batches are run through the whole model, and the observed
+    submodules are converted to quantized kernels. Submodules that FX cannot trace
+    (data-dependent shapes, Python control flow) are left in fp32.
+
+    Without calibration batches the observers keep their initial state. This is only
+    useful to rebuild the module structure before loading a quantized state dict.
+
+    Args:
+    model (torch.nn.Module): The fp32 model on the CPU, in eval mode.
+    module_names (Sequence[str]): Dotted names of the submodules to quantize.
+    example_input (torch.Tensor): A model input, used to trace the submodules.
+    calibration_batches (Iterable[torch.Tensor], optional): Model inputs to calibrate on.
+
+    Returns:
+    List[str]: Names of the submodules that were quantized.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = quantization_engine()
+    torch.backends.quantized.engine = engine
+    qconfig_mapping = get_default_qconfig_mapping(engine)
+
+    # Capture the input each submodule sees, to trace it with
+    submodule_inputs: Dict[str, tuple] = {}
+    hooks = [
+        model.get_submodule(name).register_forward_pre_hook(
+            lambda module, args, name=name: submodule_inputs.setdefault(name, args)
+        )
+        for name in module_names
+    ]
+    try:
+        with torch.no_grad():
+            model(example_input)
+    finally:
+        for hook in hooks:
+            hook.remove()
+
+    prepared = {}
+    for name in module_names:
+        try:
+            prepared[name] = prepare_fx(
+                copy.deepcopy(model.get_submodule(name)), qconfig_mapping, submodule_inputs[name]
+            )
+        except Exception:
+            continue
+        _set_submodule(model, name, prepared[name])
+
+    with torch.no_grad():
+        for batch in calibration_batches:
+            model(batch)
+
+    for name, module in prepared.items():
+        _set_submodule(model, name, convert_fx(module))
+    return list(prepared)
+
+
+def load_quantized_model(
+    model_id: str,
+    model: torch.nn.Module,
+    module_names: Sequence[str],
+    input_shape: tuple,
+    preprocess: Callable[[Path], torch.Tensor],
+    options: QuantizationOptions,
+) -> torch.nn.Module:
+    """
+    Get an INT8 version of a model, calibrating it on first use.
+
+    Quantized weights are cached on disk under the model id, a hash of the fp32
+    weights and a hash of the calibration images, so a new calibration set or new
+    weights give a new quantized model.
+
+    Args:
+    model_id (str): Model name, used in the cache file name.
+    model (torch.nn.Module): The fp32 model; quantized in place on the CPU.
+    module_names (Sequence[str]): Dotted names of the submodules to quantize.
+    input_shape (tuple): Shape of one input without the batch dimension.
+    preprocess (Callable[[Path], torch.Tensor]): Function turning an image file into a
+        model input of input_shape.
+    options (QuantizationOptions): Calibration and cache settings.
+
+    Returns:
+    torch.nn.Module: The model with its submodules quantized.
+    """
+    if not options.calibration_dir:
+        raise ValueError("INT8 quantization needs QuantizationOptions.calibration_dir")
+
+    model = model.cpu().eval()
+    images = calibration_images(options.calibration_dir, options.max_calibration_images)
+    calibration = hashlib.sha256("".join(file_digest(p) for p in images).encode()).hexdigest()
+
+    cache_dir = Path(options.cache_dir).expanduser() if options.cache_dir else DEFAULT_QUANTIZED_CACHE_DIR
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    safe_id = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_id)
+    path = cache_dir / (
+        f"{safe_id}-{weights_digest(model)[:16]}-{calibration[:16]}-{quantization_engine()}-int8.pt"
+    )
+
+    example_input = torch.zeros((1, *input_shape))
+    if path.exists():
+        cached = torch.load(path, map_location="cpu", weights_only=False)
+        quantize_modules(model, cached["quantized_modules"], example_input)
+        model.load_state_dict(cached["state_dict"])
+        return model
+
+    def batches() -> Iterable[torch.Tensor]:
+        for start in range(0, len(images), options.batch_size):
+            yield torch.stack([preprocess(p) for p in images[start : start + options.batch_size]])
+
+    quantized = quantize_modules(model, module_names, example_input, batches())
+    if not quantized:
+        raise RuntimeError(f"None of {list(module_names)} could be quantized")
+
+    tmp_path = path.with_name(f"{path.stem}.{uuid.uuid4().hex}.tmp")
+    try:
+        torch.save({"quantized_modules": quantized, "state_dict": model.state_dict()}, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return model
+
+
+def probability_drift(
+    reference: np.ndarray,
+    quantized: np.ndarray,
+    names: Sequence[str],
+    labels: Optional[np.ndarray] = None,
+) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    Compare per-class probabilities of a quantized model with the fp32 model.
+
+    Args:
+    reference (np.ndarray): fp32 probabilities, shape (images, classes).
+    quantized (np.ndarray): INT8 probabilities, same shape.
+    names (Sequence[str]): Class names, e.g. pathologies.
+    labels (np.ndarray, optional): Ground truth of shape (images, classes) with 0/1 and
+        NaN for unknown. Adds the AUC of both models where both classes occur.
+
+    Returns:
+    Dict[str, Dict[str, Optional[float]]]: Per class: mean and max absolute drift, and
+        auc_fp32, auc_int8 and auc_delta (None without labels or with a single class).
+    """
+    from sklearn.metrics import roc_auc_score
+
+    report = {}
+    drift = np.abs(np.asarray(quantized) - np.asarray(reference))
+    for i, name in enumerate(names):
+        entry = {
+            "mean_abs_drift": float(drift[:, i].mean()),
+            "max_abs_drift": float(drift[:, i].max()),
+            "auc_fp32": None,
+            "auc_int8": None,
+            "auc_delta": None,
+        }
+        if labels is not None:
+            known = ~np.isnan(labels[:, i])
+            truth = labels[known, i]
+            if len(np.unique(truth)) == 2:
+                entry["auc_fp32"] = float(roc_auc_score(truth, reference[known, i]))
+                entry["auc_int8"] = float(roc_auc_score(truth, quantized[known, i]))
+                entry["auc_delta"] = entry["auc_int8"] - entry["auc_fp32"]
+        report[name] = entry
+    return report
+
+
+def mask_dice(reference: np.ndarray, quantized: np.ndarray) -> np.ndarray:
+    """
+    Compute the Dice overlap between fp32 and INT8 masks, per image and class.
+
+    Args:
+    reference (np.ndarray): Boolean masks of shape (images, classes, H, W).
+    quantized (np.ndarray): Boolean masks, same shape.
+
+    Returns:
+    np.ndarray: Dice of shape (images, classes); 1.0 where both masks are empty.
+    """
+    reference = np.asarray(reference, dtype=bool)
+    quantized = np.asarray(quantized, dtype=bool)
+    intersection = (reference & quantized).sum(axis=(-2, -1))
+    total = reference.sum(axis=(-2, -1)) + quantized.sum(axis=(-2, -1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dice = 2 * intersection / total
+    return np.where(total == 0, 1.0, dice)
+
+
+def _set_submodule(model: torch.nn.Module, name: str, module: torch.nn.Module) -> None:
+    parent_name, _, child_name = name.rpartition(".")
+    parent = model.get_submodule(parent_name) if parent_name else model
+    setattr(parent, child_name, module)
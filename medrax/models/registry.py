@@ -0,0 +1,161 @@
+import gc
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import torch
+
+
+class ModelKey(NamedTuple):
+    """
+    Identity of a loaded model instance.
+
+    Two callers asking for the same key share one instance.
+
+    Attributes:
+    model_id (str): Weights name, e.g. "densenet121-res224-all" or a HuggingFace repo.
+    device (str): Normalized device string, e.g. "cpu" or "cuda".
+    dtype (Optional[str]): Weight dtype, e.g. "torch.bfloat16", or None for the default.
+    quantization (Optional[str]): Quantization scheme, e.g. "int8", or None.
+    backend (str): Inference runtime, "torch" or "onnx".
+    """
+
+    model_id: str
+    device: str
+    dtype: Optional[str] = None
+    quantization: Optional[str] = None
+    backend: str = "torch"
+
+    @classmethod
+    def create(
+        cls,
+        model_id: str,
+        device: Any,
+        dtype: Any = None,
+        quantization: Optional[str] = None,
+        backend: str = "torch",
+    ) -> "ModelKey":
+        """
+        Build a key, normalizing the device and dtype.
+
+        Args:
+        model_id (str): Weights name.
+        device (Any): Device as a string or torch.device.
+        dtype (Any, optional): Weight dtype as a torch.dtype or string. Defaults to None.
+        quantization (str, optional): Quantization scheme. Defaults to None.
+        backend (str, optional): Inference runtime. Defaults to "torch".
+
+        Returns:
+        ModelKey: The normalized key.
+        """
+        return cls(
+            model_id=model_id,
+            device=str(torch.device(device)),
+            dtype=str(dtype) if dtype is not None else None,
+            quantization=quantization,
+            backend=backend,
+        )
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.model: Any = None
+        self.refs = 0
+
+
+class ModelRegistry:
+    """
+    Process-wide, reference-counted store of loaded models.
+
+    LangChain tools and MCP wrappers that use the same weights on the same device
+    share one instance instead of loading their own copy. A model is loaded by the
+    first acquire of its key and unloaded when the last holder releases it.
+
+    Loading is serialized per key, so two callers asking for the same model at the
+    same time load it once, while different models can load in parallel.
+    """
+
+    def __init__(self):
+        self._entries: Dict[ModelKey, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: ModelKey, loader: Callable[[], Any]) -> Any:
+        """
+        Get the model for a key, loading it if no one holds it yet.
+
+        Every acquire must be paired with a release of the same key.
+
+        Args:
+        key (ModelKey): Identity of the model.
+        loader (Callable[[], Any]): Function loading the model, called at most once
+            per key while it is held.
+
+        Returns:
+        Any: The shared model instance.
+        """
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+            entry.refs += 1
+
+        try:
+            with entry.lock:
+                if entry.model is None:
+                    entry.model = loader()
+                return entry.model
+        except BaseException:
+            self.release(key)
+            raise
+
+    def release(self, key: ModelKey) -> None:
+        """
+        Drop one reference to a model, unloading it when none are left.
+
+        Args:
+        key (ModelKey): Identity of the model.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refs -= 1
+            if entry.refs > 0:
+                return
+            del self._entries[key]
+
+        entry.model = None
+        gc.collect()
+        if key.device.startswith("cuda") and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def refcount(self, key: ModelKey) -> int:
+        """Get the number of holders of a model."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.refs if entry else 0
+
+    def loaded(self) -> List[Dict[str, Any]]:
+        """
+        List the loaded models and their holders.
+
+        Returns:
+        List[Dict[str, Any]]: One dict per model with the key fields and "refs".
+        """
+        with self._lock:
+            return [
+                {**key._asdict(), "refs": entry.refs}
+                for key, entry in self._entries.items()
+                if entry.model is not None
+            ]
+
+
+_registry = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    """
+    Get the process-wide model registry.
+
+    Returns:
+    ModelRegistry: The registry shared by all tools and MCP wrappers.
+    """
+    return _registry
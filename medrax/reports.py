@@ -0,0 +1,146 @@
+"""
+Batch draft report generation over a worklist of chest X-rays.
+
+Generates findings and impression for every study of a folder or manifest with
+batched ViT-BERT generate calls, and writes one JSONL line per study as soon as
+its batch finishes. Each line lists its "sections_generated". Rerunning with the
+same output file skips the studies whose completed reports already cover the
+requested sections, so an interrupted run resumes where it stopped and a run for
+more sections redoes only the studies that lack them.
+
+Usage:
+    medrax-reports --images /data/worklist --output reports.jsonl --device cuda
+    medrax-reports --manifest tonight.txt --output reports.jsonl --batch-size 16
+"""
+
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from medrax.models.quantization import IMAGE_SUFFIXES
+
+logger = logging.getLogger(__name__)
+
+
+def worklist(images: Optional[str] = None, manifest: Optional[str] = None) -> List[str]:
+    """
+    List the studies to report on.
+
+    Args:
+    images (Optional[str]): Folder searched recursively for PNG and JPEG images.
+    manifest (Optional[str]): Text file with one image path per line. Relative paths
+        are resolved against the manifest's folder; blank lines and lines starting
+        with "#" are ignored.
+
+    Returns:
+    List[str]: Image paths, in file name order for a folder and file order for a manifest.
+    """
+    if manifest is not None:
+        root = Path(manifest).expanduser().parent
+        paths = []
+        for line in Path(manifest).expanduser().read_text().splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                paths.append(str(root / Path(line).expanduser()))
+        return paths
+
+    if images is None:
+        raise ValueError("Either images or manifest is required")
+    return sorted(
+        str(p) for p in Path(images).expanduser().rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES
+    )
+
+
+def completed_studies(output: Path) -> Dict[str, Set[str]]:
+    """
+    Read the sections already reported for each study in a JSONL output.
+
+    A line cut off by an interrupted run is removed, so new lines can be appended.
+    Failed studies are not returned and are retried on resume.
+
+    Args:
+    output (Path): JSONL file written by a previous run; may not exist.
+
+    Returns:
+    Dict[str, Set[str]]: Sections of the completed reports, by image path.
+    """
+    if not output.exists():
+        return {}
+
+    data = output.read_bytes()
+    if data and not data.endswith(b"\n"):
+        data = data[: data.rfind(b"\n") + 1]
+        with open(output, "r+b") as f:
+            f.truncate(len(data))
+
+    done: Dict[str, Set[str]] = {}
+    for line in data.decode().splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if record.get("analysis_status") == "completed":
+            sections = record.get("sections_generated", [])
+            done.setdefault(record["image_path"], set()).update(sections)
+    return done
+
+
+def main(argv: Optional[List[str]] = None):
+    """Main entry point for batch report generation."""
+    parser = argparse.ArgumentParser(description="Draft chest X-ray reports for a worklist")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--images", help="Folder of PNG/JPEG X-rays, searched recursively")
+    source.add_argument("--manifest", help="Text file with one image path per line")
+    parser.add_argument("--output", required=True, type=Path, help="JSONL file of reports")
+    parser.add_argument(
+        "--sections",
+        nargs="+",
+        choices=["findings", "impression"],
+        default=["findings", "impression"],
+    )
+    parser.add_argument("--batch-size", type=int, default=8, help="Images per generate call")
+    parser.add_argument("--num-workers", type=int, default=4, help="Image decoding threads")
+    parser.add_argument("--device", default="cuda")
+    parser.add_argument("--model-dir", default="/model-weights", help="Model weights cache")
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Overwrite the output instead of skipping studies it already has",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.no_resume and args.output.exists():
+        args.output.unlink()
+    studies = worklist(args.images, args.manifest)
+    done = completed_studies(args.output)
+    pending = [p for p in studies if not done.get(p, set()).issuperset(args.sections)]
+    logger.info(f"{len(studies)} studies, {len(studies) - len(pending)} already reported")
+    if not pending:
+        return
+
+    from medrax.tools.report_generation import ChestXRayReportGeneratorTool
+
+    tool = ChestXRayReportGeneratorTool(cache_dir=args.model_dir, device=args.device)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    failed = 0
+    with open(args.output, "a") as f:
+        results = tool.generate_reports(
+            pending, args.sections, batch_size=args.batch_size, num_workers=args.num_workers
+        )
+        for n, (report, metadata) in enumerate(results, 1):
+            f.write(json.dumps({**metadata, "report": report}) + "\n")
+            f.flush()
+            failed += metadata["analysis_status"] != "completed"
+            if n % 50 == 0 or n == len(pending):
+                elapsed = time.perf_counter() - start
+                logger.info(f"{n}/{len(pending)} studies ({n / elapsed:.2f}/s), {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,11 @@
 from .classification import *
 from .report_generation import *
 from .segmentation import *
+from .measurements import *
 from .xray_vqa import *
 from .llava_med import *
 from .grounding import *
 from .generation import *
 from .dicom import *
 from .utils import *
+from .cache import *
@@ -0,0 +1,342 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+from pathlib import Path
+import asyncio
+import hashlib
+import json
+import os
+import pickle
+import threading
+import uuid
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForToolRun,
+    CallbackManagerForToolRun,
+)
+from langchain_core.tools import BaseTool
+
+from medrax.utils.cache import LRUCache, file_digest, pickled_size
+from medrax.utils.inference import model_lock, run_inference
+
+# Tool arguments that refer to input images. They are keyed by content, not by path.
+IMAGE_ARGS = ("image_path", "image_paths", "dicom_path")
+
+
+class ToolResultCache:
+    """Content-addressed cache for deterministic tool results.
+
+    Results are keyed by (tool name, tool configuration fingerprint, normalized arguments,
+    SHA-256 of the input images), so a renamed upload of the same study still hits and a
+    tool reconfigured with other weights or settings does not. Entries live in an in-memory LRU
+    bounded by a byte budget and, optionally, in an on-disk tier that survives restarts.
+
+    Attributes:
+        memory (LRUCache): The in-memory tier.
+        disk_dir (Optional[Path]): Directory of the on-disk tier, or None if disabled.
+        max_disk_bytes (Optional[int]): Size limit of the on-disk tier.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 256 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        max_disk_bytes: Optional[int] = 2 * 1024 * 1024 * 1024,
+    ):
+        """Initialize the cache.
+
+        Args:
+            max_memory_bytes: Byte budget of the in-memory LRU. Defaults to 256 MiB.
+            disk_dir: Directory for the on-disk tier. Defaults to None (memory only).
+            max_disk_bytes: Byte budget of the on-disk tier. None means unbounded.
+        """
+        self.memory = LRUCache(max_memory_bytes)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_disk_bytes = max_disk_bytes
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def make_key(self, tool_name: str, args: Dict[str, Any], fingerprint: Any = None) -> str:
+        """Build the cache key for a tool call.
+
+        Args:
+            tool_name: Name of the tool.
+            args: Normalized tool arguments, with defaults filled in.
+            fingerprint: JSON-serializable configuration of the tool that changes its
+                results, e.g. model keys and resolution. Defaults to None.
+
+        Returns:
+            str: Hex digest identifying the call.
+
+        Raises:
+            FileNotFoundError: If an input image does not exist.
+        """
+        keyed_args = dict(args)
+        for arg in IMAGE_ARGS:
+            value = keyed_args.get(arg)
+            if isinstance(value, str):
+                keyed_args[arg] = file_digest(value)
+            elif isinstance(value, (list, tuple)):
+                keyed_args[arg] = [file_digest(path) for path in value]
+
+        payload = json.dumps([tool_name, fingerprint, keyed_args], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, tool_name: str, key: str) -> Optional[Any]:
+        """Look up a result in memory, then on disk.
+
+        Args:
+            tool_name: Name of the tool, used for the per-tool counters.
+            key: Key from make_key.
+
+        Returns:
+            The cached result, or None on a miss.
+        """
+        result = self.memory.get(key)
+        if result is None and self.disk_dir:
+            result = self._read_disk(key)
+            if result is not None:
+                self.memory.put(key, result)
+
+        self._count(tool_name, "hits" if result is not None else "misses")
+        return result
+
+    def put(self, key: str, result: Any) -> None:
+        """Store a result in memory and, if enabled, on disk.
+
+        Args:
+            key: Key from make_key.
+            result: The tool result to store.
+        """
+        nbytes = pickled_size(result)
+        self.memory.put(key, result, nbytes=nbytes)
+        if self.disk_dir:
+            self._write_disk(key, result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters per tool and memory usage."""
+        with self._lock:
+            per_tool = {name: dict(counts) for name, counts in self._counters.items()}
+        return {
+            "hits": sum(c.get("hits", 0) for c in per_tool.values()),
+            "misses": sum(c.get("misses", 0) for c in per_tool.values()),
+            "per_tool": per_tool,
+            "memory": self.memory.stats(),
+        }
+
+    def clear(self) -> None:
+        """Remove all entries from both tiers."""
+        self.memory.clear()
+        if self.disk_dir:
+            for path in self.disk_dir.glob("*.pkl"):
+                path.unlink(missing_ok=True)
+
+    def _count(self, tool_name: str, counter: str) -> None:
+        with self._lock:
+            counts = self._counters.setdefault(tool_name, {"hits": 0, "misses": 0})
+            counts[counter] += 1
+
+    def _read_disk(self, key: str) -> Optional[Any]:
+        path = self.disk_dir / f"{key}.pkl"
+        try:
+            with open(path, "rb") as f:
+                result = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(path)
+        return result
+
+    def _write_disk(self, key: str, result: Any) -> None:
+        path = self.disk_dir / f"{key}.pkl"
+        tmp_path = self.disk_dir / f".{key}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        if self.max_disk_bytes is not None:
+            self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        """Delete the least recently used files until the disk tier fits its budget."""
+        entries = []
+        for path in self.disk_dir.glob("*.pkl"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+class CachedTool(BaseTool):
+    """Tool wrapper that serves repeated calls from a ToolResultCache.
+
+    The wrapper exposes the wrapped tool's name, description and argument schema, so
+    the LLM sees no difference. Failed results are never cached, and cached results
+    whose output files were deleted are recomputed.
+
+    Entries are keyed by the tool's `cache_fingerprint` (or its `model_key` if it has
+    none), so results computed under another configuration are never served, including
+    from the on-disk tier after a restart.
+    """
+
+    name: str = "cached_tool"
+    description: str = ""
+    tool: BaseTool = None
+    cache: Any = None
+
+    def __init__(self, tool: BaseTool, cache: ToolResultCache):
+        """Wrap a tool with a result cache."""
+        super().__init__(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            return_direct=tool.return_direct,
+            tool=tool,
+            cache=cache,
+        )
+
+    def _normalize_args(self, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Map positional arguments to schema fields and fill in defaults."""
+        fields = list(self.tool.args_schema.model_fields)
+        kwargs = {**dict(zip(fields, args)), **kwargs}
+        return self.tool.args_schema(**kwargs).model_dump()
+
+    def _lookup(self, kwargs: Dict[str, Any]) -> Tuple[Optional[str], Optional[Any]]:
+        """Return the cache key and the cached result, if any."""
+        try:
+            key = self.cache.make_key(self.name, kwargs, tool_fingerprint(self.tool))
+        except (FileNotFoundError, OSError):
+            return None, None
+
+        result = self.cache.get(self.name, key)
+        if result is None or not _outputs_exist(result):
+            return key, None
+        return key, _mark_cached(result, kwargs)
+
+    def _store(self, key: Optional[str], result: Any) -> None:
+        if key is not None and _is_success(result):
+            self.cache.put(key, result)
+
+    def _run(
+        self,
+        *args: Any,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Return the cached result or run the wrapped tool and cache its result."""
+        kwargs = self._normalize_args(args, kwargs)
+        key, cached = self._lookup(kwargs)
+        if cached is not None:
+            return cached
+        return self._compute(key, kwargs)
+
+    async def _arun(
+        self,
+        *args: Any,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Async version of _run. Cache I/O and inference run off the event loop."""
+        kwargs = self._normalize_args(args, kwargs)
+        key, cached = await asyncio.to_thread(self._lookup, kwargs)
+        if cached is not None:
+            return cached
+        return await run_inference(self._compute, key, kwargs)
+
+    def _compute(self, key: Optional[str], kwargs: Dict[str, Any]) -> Any:
+        """Run the wrapped tool under its model lock and cache the result."""
+        with model_lock(self.tool):
+            # A prefetch or a concurrent call may have stored the result while we waited
+            if key is not None and key in self.cache.memory:
+                _, cached = self._lookup(kwargs)
+                if cached is not None:
+                    return cached
+            result = self.tool._run(**kwargs)
+        self._store(key, result)
+        return result
+
+
+def cache_tools(
+    tools: Dict[str, BaseTool],
+    cache: ToolResultCache,
+    exclude: Iterable[str] = (),
+) -> Dict[str, BaseTool]:
+    """Wrap cacheable tools with a result cache.
+
+    Tools whose `cacheable` attribute is False (e.g. non-deterministic generators) and
+    tools listed in `exclude` are returned unchanged.
+
+    Args:
+        tools: Mapping of tool key to tool instance, as built by initialize_agent.
+        cache: The shared result cache.
+        exclude: Tool keys or tool names that should not be cached.
+
+    Returns:
+        Dict[str, BaseTool]: The same mapping with cacheable tools wrapped.
+    """
+    exclude = set(exclude)
+    wrapped = {}
+    for key, tool in tools.items():
+        if key in exclude or tool.name in exclude or not getattr(tool, "cacheable", True):
+            wrapped[key] = tool
+        else:
+            wrapped[key] = CachedTool(tool, cache)
+    return wrapped
+
+
+def tool_fingerprint(tool: BaseTool) -> Any:
+    """Configuration of a tool that its cached results depend on.
+
+    Args:
+        tool: The wrapped tool.
+
+    Returns:
+        The tool's `cache_fingerprint`, else its `model_key`, else None.
+    """
+    fingerprint = getattr(tool, "cache_fingerprint", None)
+    if fingerprint is None:
+        fingerprint = getattr(tool, "model_key", None)
+    return fingerprint
+
+
+def _is_success(result: Any) -> bool:
+    """Check that a tool result is not an error result."""
+    if not isinstance(result, tuple) or len(result) != 2:
+        return False
+    output, metadata = result
+    if isinstance(output, dict) and "error" in output:
+        return False
+    if isinstance(metadata, dict) and metadata.get("analysis_status") == "failed":
+        return False
+    return True
+
+
+def _outputs_exist(result: Any) -> bool:
+    """Check that files referenced by a cached output (e.g. visualizations) still exist."""
+    output = result[0] if isinstance(result, tuple) else result
+    if not isinstance(output, dict):
+        return True
+    for key, value in output.items():
+        if key.endswith("_path") and isinstance(value, str) and not Path(value).exists():
+            return False
+    return True
+
+
+def _mark_cached(result: Any, kwargs: Dict[str, Any]) -> Any:
+    """Flag a cached result in its metadata and point it at the current input path."""
+    output, metadata = result
+    if not isinstance(metadata, dict):
+        return result
+    metadata = {**metadata, "cached": True}
+    for arg in IMAGE_ARGS:
+        if arg in metadata and arg in kwargs:
+            metadata[arg] = kwargs[arg]
+    return output, metadata
@@ -1,9 +1,8 @@
-from typing import Dict, Optional, Tuple, Type
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
 from pydantic import BaseModel, Field
 
-import skimage.io
 import torch
-import torchvision
 import torchxrayvision as xrv
 
 from langchain_core.callbacks import (
@@ -12,6 +11,17 @@ from langchain_core.callbacks import (
 )
 from langchain_core.tools import BaseTool
 
+from medrax.models import (
+    ModelKey,
+    OnnxOptions,
+    QuantizationOptions,
+    acquire_densenet,
+    get_model_registry,
+)
+from medrax.models.preprocessing import load_classifier_input
+from medrax.utils.batching import load_batches
+from medrax.utils.inference import model_lock, run_inference
+
 
 class ChestXRayInput(BaseModel):
     """Input for chest X-ray analysis tools. Only supports JPG or PNG images."""
@@ -33,6 +43,10 @@ class ChestXRayClassifierTool(BaseTool):
 
     The output values represent the probability (from 0 to 1) of each condition being present in the image.
     A higher value indicates a higher likelihood of the condition being present.
+
+    In ensemble mode several DenseNet weight sets (e.g. -all, -nih, -chex, -mimic_ch) run
+    concurrently over the same preprocessed batch. The output is the mean probability over
+    the models that predict each pathology, and the metadata holds each model's probabilities.
     """
 
     name: str = "chest_xray_classifier"
@@ -46,17 +60,90 @@ class ChestXRayClassifierTool(BaseTool):
         "Higher values indicate a higher likelihood of the condition being present."
     )
     args_schema: Type[BaseModel] = ChestXRayInput
-    model: xrv.models.DenseNet = None
+    model: Any = None
+    model_key: Optional[ModelKey] = None
+    ensemble: Optional[Dict[str, Any]] = None
+    ensemble_keys: List[ModelKey] = []
+    executor: Any = None
     device: Optional[str] = "cuda"
-    transform: torchvision.transforms.Compose = None
 
-    def __init__(self, model_name: str = "densenet121-res224-all", device: Optional[str] = "cuda"):
+    def __init__(
+        self,
+        model_name: str = "densenet121-res224-all",
+        device: Optional[str] = "cuda",
+        ensemble_weights: Optional[Sequence[str]] = None,
+        backend: str = "torch",
+        onnx_options: Optional[OnnxOptions] = None,
+        quantization: Optional[str] = None,
+        quantization_options: Optional[QuantizationOptions] = None,
+    ):
+        """Load the classifier.
+
+        Args:
+            model_name (str): DenseNet weights name.
+            device (Optional[str]): Device to run on.
+            ensemble_weights (Optional[Sequence[str]]): DenseNet weights names to run as an
+                ensemble, e.g. ["densenet121-res224-all", "densenet121-res224-nih"]. The first
+                one replaces model_name. Defaults to None (single model).
+            backend (str): "torch", or "onnx" to run an exported graph with ONNX Runtime
+                (CPU only, requires `medrax[onnx]`).
+            onnx_options (Optional[OnnxOptions]): Thread and cache settings of the onnx backend.
+            quantization (Optional[str]): "int8" for static INT8 quantization (CPU only).
+            quantization_options (Optional[QuantizationOptions]): Calibration and cache settings
+                of INT8 quantization.
+        """
         super().__init__()
-        self.model = xrv.models.DenseNet(weights=model_name)
-        self.model.eval()
         self.device = torch.device(device) if device else "cuda"
-        self.model = self.model.to(self.device)
-        self.transform = torchvision.transforms.Compose([xrv.datasets.XRayCenterCrop()])
+        weights = list(dict.fromkeys(ensemble_weights or [model_name]))
+        # Shared with other tools and MCP wrappers using the same weights and device
+        keys, models = [], {}
+        try:
+            for name in weights:
+                key, models[name] = acquire_densenet(
+                    name,
+                    self.device,
+                    backend=backend,
+                    onnx_options=onnx_options,
+                    quantization=quantization,
+                    quantization_options=quantization_options,
+                )
+                keys.append(key)
+        except Exception:
+            for key in keys:
+                get_model_registry().release(key)
+            raise
+        self.ensemble_keys = keys
+        self.model_key, self.model = keys[0], models[weights[0]]
+
+        if len(models) > 1:
+            self.ensemble = models
+            self.executor = ThreadPoolExecutor(
+                max_workers=len(models), thread_name_prefix="medrax-ensemble"
+            )
+
+    @property
+    def cache_fingerprint(self) -> List[ModelKey]:
+        """Configuration the results depend on: the weights, device and runtime of each model."""
+        return self.ensemble_keys
+
+    def _load_image(self, image_path: str) -> torch.Tensor:
+        """
+        Load and preprocess one chest X-ray image on the CPU.
+
+        Args:
+            image_path (str): The file path to the chest X-ray image.
+
+        Returns:
+            torch.Tensor: The preprocessed image of shape (1, H, W), without batch dimension.
+
+        Raises:
+            FileNotFoundError: If the specified image file does not exist.
+            ValueError: If the image cannot be properly loaded or processed.
+        """
+        # Resize to the model resolution here rather than in the model, so images of
+        # different sizes can be stacked into one batch. Decoding and resizing are
+        # shared with the other tools analysing the same image.
+        return load_classifier_input(image_path, getattr(self.model, "input_resolution", 224))
 
     def _process_image(self, image_path: str) -> torch.Tensor:
         """
@@ -75,19 +162,72 @@ class ChestXRayClassifierTool(BaseTool):
             FileNotFoundError: If the specified image file does not exist.
             ValueError: If the image cannot be properly loaded or processed.
         """
-        img = skimage.io.imread(image_path)
-        img = xrv.datasets.normalize(img, 255)
-
-        if len(img.shape) > 2:
-            img = img[:, :, 0]
+        return self._load_image(image_path).unsqueeze(0).to(self.device)
+
+    def _forward(self, model: Any, batch: torch.Tensor) -> List[Dict[str, float]]:
+        """Run one model over a batch and name its outputs, skipping unsupported heads."""
+        with torch.inference_mode():
+            preds = model(batch.to(self.device)).cpu().numpy()
+        pathologies = getattr(model, "pathologies", xrv.datasets.default_pathologies)
+        return [
+            {name: float(p) for name, p in zip(pathologies, image_preds) if name}
+            for image_preds in preds
+        ]
+
+    def _predict(self, batch: torch.Tensor) -> List[Dict[str, Dict[str, float]]]:
+        """
+        Run the model, or every ensemble model concurrently, over a batch.
 
-        img = img[None, :, :]
-        img = self.transform(img)
-        img = torch.from_numpy(img).unsqueeze(0)
+        Callers hold model_lock(self), which covers every model of the ensemble, since
+        other tools and MCP wrappers may share them through the model registry.
 
-        img = img.to(self.device)
+        Args:
+            batch (torch.Tensor): Preprocessed images of shape (N, 1, H, W).
 
-        return img
+        Returns:
+            List[Dict[str, Dict[str, float]]]: Per image, the probabilities of each weights name.
+        """
+        if self.ensemble is None:
+            return [{self.model_key.model_id: probs} for probs in self._forward(self.model, batch)]
+
+        futures = {
+            name: self.executor.submit(self._forward, model, batch)
+            for name, model in self.ensemble.items()
+        }
+        per_model = {name: future.result() for name, future in futures.items()}
+        return [
+            {name: preds[i] for name, preds in per_model.items()} for i in range(len(batch))
+        ]
+
+    def _completed(
+        self, image_path: str, per_model: Dict[str, Dict[str, float]]
+    ) -> Tuple[Dict[str, float], Dict]:
+        metadata = {
+            "image_path": image_path,
+            "analysis_status": "completed",
+            "note": "Probabilities range from 0 to 1, with higher values indicating higher likelihood of the condition.",
+        }
+        if self.ensemble is None:
+            return next(iter(per_model.values())), metadata
+
+        # Average each pathology over the models that predict it
+        predictions: Dict[str, List[float]] = {}
+        for probs in per_model.values():
+            for name, p in probs.items():
+                predictions.setdefault(name, []).append(p)
+        output = {name: sum(ps) / len(ps) for name, ps in predictions.items()}
+        metadata["ensemble"] = {
+            "aggregation": "mean",
+            "weights": list(per_model),
+            "per_model": per_model,
+        }
+        return output, metadata
+
+    def _failed(self, image_path: str, error: Exception) -> Tuple[Dict[str, str], Dict]:
+        return {"error": str(error)}, {
+            "image_path": image_path,
+            "analysis_status": "failed",
+        }
 
     def _run(
         self,
@@ -110,22 +250,52 @@ class ChestXRayClassifierTool(BaseTool):
         """
         try:
             img = self._process_image(image_path)
+            return self._completed(image_path, self._predict(img)[0])
+        except Exception as e:
+            return self._failed(image_path, e)
 
-            with torch.inference_mode():
-                preds = self.model(img).cpu()[0]
+    def classify_batch(
+        self,
+        image_paths: Sequence[str],
+        batch_size: int = 16,
+        num_workers: int = 4,
+    ) -> List[Tuple[Dict[str, float], Dict]]:
+        """Classify many chest X-ray images with batched forward passes.
 
-            output = dict(zip(xrv.datasets.default_pathologies, preds.numpy()))
-            metadata = {
-                "image_path": image_path,
-                "analysis_status": "completed",
-                "note": "Probabilities range from 0 to 1, with higher values indicating higher likelihood of the condition.",
-            }
-            return output, metadata
-        except Exception as e:
-            return {"error": str(e)}, {
-                "image_path": image_path,
-                "analysis_status": "failed",
-            }
+        Images are decoded and preprocessed on worker threads while the previous batch
+        runs through the model. Each batch is one DenseNet forward pass, under the same
+        model lock as the agent's tool calls and the MCP wrapper. An image that cannot
+        be loaded fails on its own; a failed forward pass fails only its batch.
+
+        Args:
+            image_paths (Sequence[str]): Paths to the chest X-ray image files.
+            batch_size (int): Maximum number of images per forward pass. Defaults to 16.
+            num_workers (int): Number of threads decoding images. Defaults to 4.
+
+        Returns:
+            List[Tuple[Dict[str, float], Dict]]: One (output, metadata) result per image,
+                in input order, in the same format as `_run`.
+        """
+        results: List[Optional[Tuple[Dict, Dict]]] = [None] * len(image_paths)
+
+        for batch in load_batches(image_paths, self._load_image, batch_size, num_workers):
+            for i, error in batch.errors.items():
+                results[i] = self._failed(image_paths[i], error)
+            if not batch.items:
+                continue
+
+            try:
+                with model_lock(self):
+                    preds = self._predict(torch.stack(batch.items))
+            except Exception as e:
+                for i in batch.indices:
+                    results[i] = self._failed(image_paths[i], e)
+                continue
+
+            for i, per_model in zip(batch.indices, preds):
+                results[i] = self._completed(image_paths[i], per_model)
+
+        return results
 
     async def _arun(
         self,
@@ -134,9 +304,8 @@ class ChestXRayClassifierTool(BaseTool):
     ) -> Tuple[Dict[str, float], Dict]:
         """Asynchronously classify the chest X-ray image for multiple pathologies.
 
-        This method currently calls the synchronous version, as the model inference
-        is not inherently asynchronous. For true asynchronous behavior, consider
-        using a separate thread or process.
+        The model inference runs on the shared inference executor, so the event loop
+        stays free while the DenseNet forward pass runs.
 
         Args:
             image_path (str): The path to the chest X-ray image file.
@@ -150,4 +319,12 @@ class ChestXRayClassifierTool(BaseTool):
         Raises:
             Exception: If there's an error processing the image or during classification.
         """
-        return self._run(image_path)
+        return await run_inference(self._run, image_path, lock_owner=self)
+
+    def __del__(self):
+        """Release the shared models."""
+        if getattr(self, "executor", None) is not None:
+            self.executor.shutdown(wait=False)
+        if getattr(self, "model_key", None) is not None:
+            for key in self.ensemble_keys:
+                get_model_registry().release(key)
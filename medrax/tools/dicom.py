@@ -9,6 +9,8 @@ from pydantic import BaseModel, Field
 from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
 from langchain_core.tools import BaseTool
 
+from medrax.utils.inference import run_inference
+
 
 class DicomProcessorInput(BaseModel):
     """Input schema for the DICOM Processor Tool."""
@@ -32,6 +34,7 @@ class DicomProcessorTool(BaseTool):
         "Output: Path to processed image file and DICOM metadata."
     )
     args_schema: Type[BaseModel] = DicomProcessorInput
+    cacheable: bool = False
     temp_dir: Path = None
 
     def __init__(self, temp_dir: Optional[str] = None):
@@ -148,5 +151,5 @@ class DicomProcessorTool(BaseTool):
         window_width: Optional[float] = None,
         run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
     ) -> Tuple[Dict[str, str], Dict]:
-        """Async version of _run."""
-        return self._run(dicom_path, window_center, window_width)
+        """Async version of _run, executed on the shared inference executor."""
+        return await run_inference(self._run, dicom_path, window_center, window_width)
@@ -8,6 +8,8 @@ from diffusers import StableDiffusionPipeline
 from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
 from langchain_core.tools import BaseTool
 
+from medrax.utils.inference import run_inference
+
 
 class ChestXRayGeneratorInput(BaseModel):
     """Input schema for the Chest X-Ray Generator Tool."""
@@ -47,6 +49,7 @@ class ChestXRayGeneratorTool(BaseTool):
     )
     args_schema: Type[BaseModel] = ChestXRayGeneratorInput
 
+    cacheable: bool = False
     model: StableDiffusionPipeline = None
     device: torch.device = None
     temp_dir: Path = None
@@ -138,5 +141,7 @@ class ChestXRayGeneratorTool(BaseTool):
         width: int = 512,
         run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
     ) -> Tuple[Dict[str, str], Dict]:
-        """Async version of _run."""
-        return self._run(prompt, num_inference_steps, guidance_scale, height, width)
\ No newline at end of file
+        """Async version of _run, executed on the shared inference executor."""
+        return await run_inference(
+            self._run, prompt, num_inference_steps, guidance_scale, height, width, lock_owner=self
+        )
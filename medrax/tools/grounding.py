@@ -2,7 +2,7 @@ from typing import Dict, List, Optional, Tuple, Type, Any
 from pathlib import Path
 import uuid
 import tempfile
-import matplotlib.pyplot as plt
+import numpy as np
 import torch
 from PIL import Image
 from pydantic import BaseModel, Field
@@ -14,6 +14,9 @@ from langchain_core.callbacks import (
 )
 from langchain_core.tools import BaseTool
 
+from medrax.utils.inference import run_inference
+from medrax.utils.render import RenderOptions, render_boxes
+
 
 class XRayPhraseGroundingInput(BaseModel):
     """Input schema for the XRay Phrase Grounding Tool. Only supports JPG or PNG images."""
@@ -52,6 +55,9 @@ class XRayPhraseGroundingTool(BaseTool):
     processor: Any = None
     device: str = "cuda"
     temp_dir: Path = None
+    render_options: Optional[RenderOptions] = None
+    model_path: str = "microsoft/maira-2"
+    quantization: Optional[str] = None
 
     def __init__(
         self,
@@ -61,10 +67,14 @@ class XRayPhraseGroundingTool(BaseTool):
         load_in_4bit: bool = False,
         load_in_8bit: bool = False,
         device: Optional[str] = "cuda",
+        render_options: Optional[RenderOptions] = None,
     ):
         """Initialize the XRay Phrase Grounding Tool."""
         super().__init__()
         self.device = torch.device(device) if device else "cuda"
+        self.render_options = render_options or RenderOptions()
+        self.model_path = model_path
+        self.quantization = "4bit" if load_in_4bit else "8bit" if load_in_8bit else None
 
         # Setup quantization config
         if load_in_4bit:
@@ -99,35 +109,27 @@ class XRayPhraseGroundingTool(BaseTool):
         self.temp_dir = Path(temp_dir if temp_dir else tempfile.mkdtemp())
         self.temp_dir.mkdir(exist_ok=True)
 
+    @property
+    def cache_fingerprint(self) -> Dict[str, Any]:
+        """Configuration the results depend on: model, quantization, device and overlay."""
+        return {
+            "model_path": self.model_path,
+            "quantization": self.quantization,
+            "device": str(self.device),
+            "render_options": self.render_options,
+        }
+
     def _visualize_bboxes(
         self, image: Image.Image, bboxes: List[Tuple[float, float, float, float]], phrase: str
     ) -> str:
         """Create and save visualization of multiple bounding boxes on the image."""
-        plt.figure(figsize=(12, 12))
-        plt.imshow(image, cmap="gray")
-
-        for bbox in bboxes:
-            x1, y1, x2, y2 = bbox
-            width = x2 - x1
-            height = y2 - y1
-
-            plt.gca().add_patch(
-                plt.Rectangle(
-                    (x1 * image.width, y1 * image.height),
-                    width * image.width,
-                    height * image.height,
-                    fill=False,
-                    color="red",
-                    linewidth=2,
-                )
-            )
-
-        plt.title(f"Located: {phrase}", pad=20)
-        plt.axis("off")
+        rendered = render_boxes(
+            np.asarray(image), bboxes, self.render_options, title=f"Located: {phrase}"
+        )
 
-        viz_path = self.temp_dir / f"grounding_{uuid.uuid4().hex[:8]}.png"
-        plt.savefig(viz_path, bbox_inches="tight", dpi=150)
-        plt.close()
+        viz_name = f"grounding_{uuid.uuid4().hex[:8]}{self.render_options.extension}"
+        viz_path = self.temp_dir / viz_name
+        viz_path.write_bytes(rendered)
 
         return str(viz_path)
 
@@ -245,7 +247,10 @@ class XRayPhraseGroundingTool(BaseTool):
         self,
         image_path: str,
         phrase: str,
+        max_new_tokens: int = 300,
         run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
     ) -> Tuple[Dict[str, Any], Dict]:
-        """Asynchronous version of _run."""
-        return self._run(image_path, phrase, run_manager)
+        """Asynchronous version of _run, executed on the shared inference executor."""
+        return await run_inference(
+            self._run, image_path, phrase, max_new_tokens, lock_owner=self
+        )
@@ -21,6 +21,7 @@ from medrax.llava.constants import (
     DEFAULT_IM_START_TOKEN,
     DEFAULT_IM_END_TOKEN,
 )
+from medrax.utils.inference import run_inference
 
 
 class LlavaMedInput(BaseModel):
@@ -52,6 +53,8 @@ class LlavaMedTool(BaseTool):
     model: Any = None
     image_processor: Any = None
     context_len: int = 200000
+    model_path: str = "microsoft/llava-med-v1.5-mistral-7b"
+    quantization: Optional[str] = None
 
     def __init__(
         self,
@@ -65,6 +68,8 @@ class LlavaMedTool(BaseTool):
         **kwargs,
     ):
         super().__init__()
+        self.model_path = model_path
+        self.quantization = "4bit" if load_in_4bit else "8bit" if load_in_8bit else None
         self.tokenizer, self.model, self.image_processor, self.context_len = load_pretrained_model(
             model_path=model_path,
             model_base=None,
@@ -79,6 +84,15 @@ class LlavaMedTool(BaseTool):
         )
         self.model.eval()
 
+    @property
+    def cache_fingerprint(self) -> Dict[str, Any]:
+        """Configuration the answers depend on: model, weight dtype and quantization."""
+        return {
+            "model_path": self.model_path,
+            "dtype": str(self.model.dtype),
+            "quantization": self.quantization,
+        }
+
     def _process_input(
         self, question: str, image_path: Optional[str] = None
     ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
@@ -168,9 +182,8 @@ class LlavaMedTool(BaseTool):
     ) -> Tuple[str, Dict]:
         """Asynchronously answer a medical question, optionally based on an input image.
 
-        This method currently calls the synchronous version, as the model inference
-        is not inherently asynchronous. For true asynchronous behavior, consider
-        using a separate thread or process.
+        The model inference runs on the shared inference executor, so the event loop
+        stays free while LLaVA-Med generates.
 
         Args:
             question (str): The medical question to answer.
@@ -183,4 +196,4 @@ class LlavaMedTool(BaseTool):
         Raises:
             Exception: If there's an error processing the input or generating the answer.
         """
-        return self._run(question, image_path)
+        return await run_inference(self._run, question, image_path, lock_owner=self)
@@ -0,0 +1,147 @@
+from typing import Any, Dict, Optional, Tuple, Type
+
+import torch
+import traceback
+
+from pydantic import BaseModel, Field
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForToolRun,
+    CallbackManagerForToolRun,
+)
+from langchain_core.tools import BaseTool
+
+from medrax.models import (
+    ModelKey,
+    OnnxOptions,
+    QuantizationOptions,
+    acquire_pspnet,
+    check_segmentation_resolution,
+    get_model_registry,
+    pspnet_outputs,
+)
+from medrax.models.preprocessing import get_preprocess_cache
+from medrax.utils.inference import run_inference
+from medrax.utils.measurements import PSPNET_ORGANS, chest_measurements, pixel_spacing_from_dicom
+
+
+class ChestXRayMeasurementInput(BaseModel):
+    """Input schema for the Chest X-ray Measurement Tool."""
+
+    image_path: str = Field(..., description="Path to the chest X-ray image file (JPG or PNG)")
+    dicom_path: Optional[str] = Field(
+        None,
+        description="Original DICOM file the image was converted from, if any. Its PixelSpacing "
+        "gives measurements in true millimetres instead of an assumed 0.2 mm per pixel.",
+    )
+
+
+class ChestXRayMeasurementTool(BaseTool):
+    """Tool for cardiothoracic measurements derived from the segmentation masks.
+
+    Computes the cardiothoracic ratio, lung-field areas and symmetry, mediastinal width
+    and hemidiaphragm heights directly from the PSPNet masks. The model output is shared
+    with the segmentation tool through the forward cache, so measuring an image that was
+    already segmented (or segmenting one that was measured) does not run the model again.
+    """
+
+    name: str = "chest_xray_measurements"
+    description: str = (
+        "Measures a chest X-ray from its anatomical segmentation: cardiothoracic ratio "
+        "(heart width over inner thoracic width; above 0.5 suggests cardiomegaly on PA films), "
+        "left/right lung areas, sizes and symmetry, mediastinal width, and the height of each "
+        "hemidiaphragm dome. Prefer this over reasoning about segmentation metrics to assess "
+        "heart size. Distances are only exact when the DICOM file is given; "
+        "otherwise 0.2 mm per pixel is assumed and ratios remain valid."
+    )
+    args_schema: Type[BaseModel] = ChestXRayMeasurementInput
+
+    model: Any = None
+    model_key: Optional[ModelKey] = None
+    device: Optional[str] = "cuda"
+    resolution: int = 512
+
+    def __init__(
+        self,
+        device: Optional[str] = "cuda",
+        backend: str = "torch",
+        onnx_options: Optional[OnnxOptions] = None,
+        quantization: Optional[str] = None,
+        quantization_options: Optional[QuantizationOptions] = None,
+        resolution: int = 512,
+    ):
+        """Initialize the measurement tool with the shared segmentation model.
+
+        Args:
+            device (Optional[str]): Device to run on.
+            backend (str): "torch", or "onnx" to run an exported graph with ONNX Runtime.
+            onnx_options (Optional[OnnxOptions]): Thread and cache settings of the onnx backend.
+            quantization (Optional[str]): "int8" for static INT8 quantization (CPU only).
+            quantization_options (Optional[QuantizationOptions]): Calibration and cache settings
+                of INT8 quantization.
+            resolution (int): Model input size, 256, 384 or 512. Use the segmentation tool's
+                setting to share its cached model outputs.
+        """
+        check_segmentation_resolution(resolution, backend)
+        super().__init__()
+        self.device = torch.device(device) if device else "cuda"
+        self.resolution = resolution
+        self.model_key, self.model = acquire_pspnet(
+            self.device,
+            backend=backend,
+            onnx_options=onnx_options,
+            quantization=quantization,
+            quantization_options=quantization_options,
+        )
+
+    @property
+    def cache_fingerprint(self) -> Dict[str, Any]:
+        """Configuration the results depend on: the segmentation model and its resolution."""
+        return {"model_key": self.model_key, "resolution": self.resolution}
+
+    def _run(
+        self,
+        image_path: str,
+        dicom_path: Optional[str] = None,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> Tuple[Dict[str, Any], Dict]:
+        """Measure the chest X-ray at image_path."""
+        try:
+            pixel_spacing = pixel_spacing_from_dicom(dicom_path) if dicom_path else None
+            image = get_preprocess_cache().decode(image_path)
+            logits, forward_cached = pspnet_outputs(
+                self.model, self.model_key, image_path, self.resolution, self.device
+            )
+            output = chest_measurements(
+                (logits > 0).numpy(), PSPNET_ORGANS, image.shape, pixel_spacing
+            )
+
+            metadata = {
+                "image_path": image_path,
+                "dicom_path": dicom_path,
+                "original_size": image.shape,
+                "model_size": tuple(logits.shape[-2:]),
+                "forward_cached": forward_cached,
+                "analysis_status": "completed",
+            }
+            return output, metadata
+
+        except Exception as e:
+            return {"error": str(e)}, {
+                "image_path": image_path,
+                "analysis_status": "failed",
+                "error_traceback": traceback.format_exc(),
+            }
+
+    async def _arun(
+        self,
+        image_path: str,
+        dicom_path: Optional[str] = None,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+    ) -> Tuple[Dict[str, Any], Dict]:
+        """Async version of _run, executed on the shared inference executor."""
+        return await run_inference(self._run, image_path, dicom_path, lock_owner=self)
+
+    def __del__(self):
+        """Release the shared model."""
+        if getattr(self, "model_key", None) is not None:
+            get_model_registry().release(self.model_key)
@@ -1,6 +1,10 @@
-from typing import Any, Dict, Optional, Tuple, Type
+import functools
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Literal, Optional, Sequence, Tuple, Type
 from pydantic import BaseModel, Field
 
+import numpy as np
 import torch
 
 from langchain_core.callbacks import (
@@ -9,7 +13,9 @@ from langchain_core.callbacks import (
 )
 from langchain_core.tools import BaseTool
 
-from PIL import Image
+from medrax.models.preprocessing import get_preprocess_cache
+from medrax.utils.batching import load_batches
+from medrax.utils.inference import run_inference
 
 from transformers import (
     BertTokenizer,
@@ -18,6 +24,9 @@ from transformers import (
     GenerationConfig,
 )
 
+# Report sections, in report order
+REPORT_SECTIONS = ("findings", "impression")
+
 
 class ChestXRayInput(BaseModel):
     """Input for chest X-ray analysis tools. Only supports JPG or PNG images."""
@@ -27,6 +36,16 @@ class ChestXRayInput(BaseModel):
     )
 
 
+class ChestXRayReportInput(ChestXRayInput):
+    """Input for the report generator, with the report sections to generate."""
+
+    sections: Optional[List[Literal["findings", "impression"]]] = Field(
+        None,
+        description="Report sections to generate. Defaults to both findings and impression; "
+        'ask for ["impression"] alone when only the clinical conclusion is needed.',
+    )
+
+
 class ChestXRayReportGeneratorTool(BaseTool):
     """Tool that generates comprehensive chest X-ray reports with both findings and impressions.
 
@@ -38,6 +57,9 @@ class ChestXRayReportGeneratorTool(BaseTool):
     The tool uses:
     - Findings model: Generates detailed observations of all visible structures
     - Impression model: Provides concise clinical interpretation and key diagnoses
+
+    The image is decoded once for both models, and the two sections are generated
+    concurrently on a small per-tool thread pool (each on its own CUDA stream on GPU).
     """
 
     name: str = "chest_xray_report_generator"
@@ -48,7 +70,7 @@ class ChestXRayReportGeneratorTool(BaseTool):
         "observations and key clinical conclusions."
     )
     device: Optional[str] = "cuda"
-    args_schema: Type[BaseModel] = ChestXRayInput
+    args_schema: Type[BaseModel] = ChestXRayReportInput
     findings_model: VisionEncoderDecoderModel = None
     impression_model: VisionEncoderDecoderModel = None
     findings_tokenizer: BertTokenizer = None
@@ -56,6 +78,8 @@ class ChestXRayReportGeneratorTool(BaseTool):
     findings_processor: ViTImageProcessor = None
     impression_processor: ViTImageProcessor = None
     generation_args: Dict[str, Any] = None
+    generation_configs: Dict[str, GenerationConfig] = None
+    executor: Any = None
 
     def __init__(self, cache_dir: str = "/model-weights", device: Optional[str] = "cuda"):
         """Initialize the ChestXRayReportGeneratorTool with both findings and impression models."""
@@ -95,9 +119,55 @@ class ChestXRayReportGeneratorTool(BaseTool):
             "use_cache": True,
             "beam_width": 2,
         }
+        self.generation_configs = {
+            "findings": self._generation_config(self.findings_model, self.findings_tokenizer),
+            "impression": self._generation_config(
+                self.impression_model, self.impression_tokenizer
+            ),
+        }
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="medrax-report")
+
+    @property
+    def cache_fingerprint(self) -> Dict[str, Any]:
+        """Configuration the reports depend on: the device and the generation arguments."""
+        return {"device": str(self.device), "generation_args": self.generation_args}
+
+    def _generation_config(
+        self, model: VisionEncoderDecoderModel, tokenizer: BertTokenizer
+    ) -> GenerationConfig:
+        """Build the generation config of one model from generation_args.
+
+        Args:
+            model: The model the config is for.
+            tokenizer: The tokenizer of the model.
+
+        Returns:
+            GenerationConfig: Config passed to every generate call of the model.
+        """
+        return GenerationConfig(
+            **{
+                **self.generation_args,
+                "bos_token_id": model.config.bos_token_id,
+                "eos_token_id": model.config.eos_token_id,
+                "pad_token_id": model.config.pad_token_id,
+                "decoder_start_token_id": tokenizer.cls_token_id,
+            }
+        )
+
+    def _section(
+        self, section: str
+    ) -> Tuple[ViTImageProcessor, VisionEncoderDecoderModel, BertTokenizer]:
+        """Processor, model and tokenizer of a report section."""
+        if section == "findings":
+            return self.findings_processor, self.findings_model, self.findings_tokenizer
+        return self.impression_processor, self.impression_model, self.impression_tokenizer
 
     def _process_image(
-        self, image_path: str, processor: ViTImageProcessor, model: VisionEncoderDecoderModel
+        self,
+        image_path: str,
+        processor: ViTImageProcessor,
+        model: VisionEncoderDecoderModel,
+        image: Optional[np.ndarray] = None,
     ) -> torch.Tensor:
         """Process the input image for a specific model.
 
@@ -105,113 +175,195 @@ class ChestXRayReportGeneratorTool(BaseTool):
             image_path (str): Path to the input image.
             processor: Image processor for the specific model.
             model: The model to process the image for.
+            image (Optional[np.ndarray]): RGB pixels of image_path, shared by both models.
 
         Returns:
             torch.Tensor: Processed image tensor ready for model input.
         """
-        image = Image.open(image_path).convert("RGB")
-        pixel_values = processor(image, return_tensors="pt").pixel_values
-
         expected_size = model.config.encoder.image_size
-        actual_size = pixel_values.shape[-1]
-
-        if expected_size != actual_size:
-            pixel_values = torch.nn.functional.interpolate(
-                pixel_values,
-                size=(expected_size, expected_size),
-                mode="bilinear",
-                align_corners=False,
-            )
 
-        pixel_values = pixel_values.to(self.device)
-
-        return pixel_values
+        def transform(rgb: np.ndarray) -> torch.Tensor:
+            pixel_values = processor(rgb, return_tensors="pt").pixel_values
+            if pixel_values.shape[-1] != expected_size:
+                pixel_values = torch.nn.functional.interpolate(
+                    pixel_values,
+                    size=(expected_size, expected_size),
+                    mode="bilinear",
+                    align_corners=False,
+                )
+            return pixel_values
+
+        # Processors with the same settings share one cached tensor per image. The input is
+        # the PIL RGB conversion the models were trained on, kept in float32 so it is exact
+        cache = get_preprocess_cache()
+        if image is None:
+            image = cache.decode_rgb(image_path)
+        settings = hashlib.sha1(processor.to_json_string().encode()).hexdigest()[:12]
+        pixel_values = cache.model_input(
+            image_path,
+            f"vit-{expected_size}-{settings}",
+            transform,
+            image=image,
+            dtype=torch.float32,
+        )
+        return pixel_values.to(self.device)
 
-    def _generate_report_section(
-        self, pixel_values: torch.Tensor, model: VisionEncoderDecoderModel, tokenizer: BertTokenizer
-    ) -> str:
-        """Generate a report section using the specified model.
+    def _generate_report_section(self, pixel_values: torch.Tensor, section: str) -> List[str]:
+        """Generate a report section using its model.
 
         Args:
-            pixel_values: Processed image tensor.
-            model: The model to use for generation.
-            tokenizer: The tokenizer for the model.
+            pixel_values: Processed image tensor, one image or a batch.
+            section: "findings" or "impression".
 
         Returns:
-            str: Generated text for the report section.
+            List[str]: Generated text of the section for each image.
         """
-        generation_config = GenerationConfig(
-            **{
-                **self.generation_args,
-                "bos_token_id": model.config.bos_token_id,
-                "eos_token_id": model.config.eos_token_id,
-                "pad_token_id": model.config.pad_token_id,
-                "decoder_start_token_id": tokenizer.cls_token_id,
-            }
-        )
+        _, model, tokenizer = self._section(section)
+        with torch.inference_mode():
+            if pixel_values.is_cuda:
+                # Each section runs on its own stream so the two decoders overlap on the GPU
+                stream = torch.cuda.Stream(device=pixel_values.device)
+                stream.wait_stream(torch.cuda.current_stream(pixel_values.device))
+                with torch.cuda.stream(stream):
+                    generated_ids = model.generate(
+                        pixel_values, generation_config=self.generation_configs[section]
+                    )
+                stream.synchronize()
+            else:
+                generated_ids = model.generate(
+                    pixel_values, generation_config=self.generation_configs[section]
+                )
 
-        generated_ids = model.generate(pixel_values, generation_config=generation_config)
+        return tokenizer.batch_decode(generated_ids, skip_special_tokens=True)
+
+    def _sections(self, sections: Optional[Sequence[str]]) -> List[str]:
+        """Requested sections in report order, both by default."""
+        sections = [s for s in REPORT_SECTIONS if s in (sections or REPORT_SECTIONS)]
+        if not sections:
+            raise ValueError('sections must include "findings" or "impression"')
+        return sections
+
+    def _load_inputs(self, image_path: str, sections: List[str]) -> Dict[str, torch.Tensor]:
+        """Decode an image once and derive the pixel tensor of every section from it."""
+        image = get_preprocess_cache().decode_rgb(image_path)
+        pixels = {}
+        for section in sections:
+            processor, model, _ = self._section(section)
+            pixels[section] = self._process_image(image_path, processor, model, image)
+        return pixels
+
+    def _generate(self, pixels: Dict[str, torch.Tensor]) -> Dict[str, List[str]]:
+        """Generate the sections concurrently, each for every image of its pixel batch."""
+        futures = {
+            section: self.executor.submit(self._generate_report_section, values, section)
+            for section, values in pixels.items()
+        }
+        return {section: future.result() for section, future in futures.items()}
 
-        return tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
+    def _completed(self, image_path: str, texts: Dict[str, str]) -> Tuple[str, Dict]:
+        """Format the generated sections of one image as a report with its metadata."""
+        report = "CHEST X-RAY REPORT\n\n" + "\n\n".join(
+            f"{section.upper()}:\n{text}" for section, text in texts.items()
+        )
+        metadata = {
+            "image_path": image_path,
+            "analysis_status": "completed",
+            "sections_generated": list(texts),
+        }
+        return report, metadata
+
+    def _failed(self, image_path: str, error: Exception) -> Tuple[str, Dict]:
+        """Result of an image whose report could not be generated."""
+        return f"Error generating report: {str(error)}", {
+            "image_path": image_path,
+            "analysis_status": "failed",
+            "error": str(error),
+        }
 
     def _run(
         self,
         image_path: str,
+        sections: Optional[List[str]] = None,
         run_manager: Optional[CallbackManagerForToolRun] = None,
     ) -> Tuple[str, Dict]:
-        """Generate a comprehensive chest X-ray report containing both findings and impression.
+        """Generate a chest X-ray report containing findings and/or impression.
 
         Args:
             image_path (str): The path to the chest X-ray image file.
+            sections (Optional[List[str]]): Sections to generate, in report order by default
+                both "findings" and "impression".
             run_manager (Optional[CallbackManagerForToolRun]): The callback manager.
 
         Returns:
-            Tuple[str, Dict]: A tuple containing the complete report and metadata.
+            Tuple[str, Dict]: A tuple containing the report and metadata.
         """
         try:
-            # Process image for both models
-            findings_pixels = self._process_image(
-                image_path, self.findings_processor, self.findings_model
-            )
-            impression_pixels = self._process_image(
-                image_path, self.impression_processor, self.impression_model
-            )
-
-            # Generate both sections
-            with torch.inference_mode():
-                findings_text = self._generate_report_section(
-                    findings_pixels, self.findings_model, self.findings_tokenizer
-                )
-                impression_text = self._generate_report_section(
-                    impression_pixels, self.impression_model, self.impression_tokenizer
-                )
+            # Decode once; both processors derive their tensors from the same pixels
+            pixels = self._load_inputs(image_path, self._sections(sections))
+            texts = self._generate(pixels)
+            return self._completed(image_path, {s: t[0] for s, t in texts.items()})
 
-            # Combine into formatted report
-            report = (
-                "CHEST X-RAY REPORT\n\n"
-                f"FINDINGS:\n{findings_text}\n\n"
-                f"IMPRESSION:\n{impression_text}"
-            )
-
-            metadata = {
-                "image_path": image_path,
-                "analysis_status": "completed",
-                "sections_generated": ["findings", "impression"],
-            }
+        except Exception as e:
+            return self._failed(image_path, e)
 
-            return report, metadata
+    def generate_reports(
+        self,
+        image_paths: Sequence[str],
+        sections: Optional[Sequence[str]] = None,
+        batch_size: int = 8,
+        num_workers: int = 4,
+    ) -> Iterator[Tuple[str, Dict]]:
+        """Generate reports for many chest X-rays with batched generate calls.
+
+        Images are decoded and preprocessed on worker threads while the previous batch
+        is generated. Each batch is one generate call per section, with the findings
+        and impression models running concurrently; the decoders pad their outputs to
+        the longest text of the batch. Results are yielded as soon as their batch
+        finishes, so callers can stream them. An image that cannot be loaded fails on
+        its own; a failed generate call fails only its batch.
 
-        except Exception as e:
-            return f"Error generating report: {str(e)}", {
-                "image_path": image_path,
-                "analysis_status": "failed",
-                "error": str(e),
-            }
+        Args:
+            image_paths (Sequence[str]): Paths to the chest X-ray image files.
+            sections (Optional[Sequence[str]]): Sections to generate, both by default.
+            batch_size (int): Maximum number of images per generate call. Defaults to 8.
+            num_workers (int): Number of threads decoding images. Defaults to 4.
+
+        Yields:
+            Tuple[str, Dict]: One (report, metadata) result per image, in input order,
+                in the same format as `_run`, with the text of each generated section
+                under its name in the metadata.
+        """
+        sections = self._sections(sections)
+        load = functools.partial(self._load_inputs, sections=sections)
+
+        for batch in load_batches(image_paths, load, batch_size, num_workers):
+            results = {i: self._failed(image_paths[i], e) for i, e in batch.errors.items()}
+            if batch.items:
+                try:
+                    texts = self._generate(
+                        {s: torch.cat([item[s] for item in batch.items]) for s in sections}
+                    )
+                    for n, i in enumerate(batch.indices):
+                        image_texts = {s: texts[s][n] for s in sections}
+                        report, metadata = self._completed(image_paths[i], image_texts)
+                        results[i] = report, {**metadata, **image_texts}
+                except Exception as e:
+                    for i in batch.indices:
+                        results[i] = self._failed(image_paths[i], e)
+
+            for i in sorted(results):
+                yield results[i]
 
     async def _arun(
         self,
         image_path: str,
+        sections: Optional[List[str]] = None,
         run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
     ) -> Tuple[str, Dict]:
-        """Asynchronously generate a comprehensive chest X-ray report."""
-        return self._run(image_path)
+        """Asynchronously generate a chest X-ray report on the inference executor."""
+        return await run_inference(self._run, image_path, sections, lock_owner=self)
+
+    def __del__(self):
+        """Stop the section generation threads."""
+        if getattr(self, "executor", None) is not None:
+            self.executor.shutdown(wait=False)
@@ -5,12 +5,6 @@ import tempfile
 
 import numpy as np
 import torch
-import torchvision
-import torchxrayvision as xrv
-import matplotlib.pyplot as plt
-import skimage.io
-import skimage.measure
-import skimage.transform
 import traceback
 
 from pydantic import BaseModel, Field
@@ -20,6 +14,21 @@ from langchain_core.callbacks import (
 )
 from langchain_core.tools import BaseTool
 
+from medrax.models import (
+    ModelKey,
+    OnnxOptions,
+    QuantizationOptions,
+    acquire_pspnet,
+    check_segmentation_resolution,
+    get_model_registry,
+    pspnet_outputs,
+)
+from medrax.models.preprocessing import get_preprocess_cache
+from medrax.utils.organ_metrics import OrganStats, organ_stats
+from medrax.utils.render import RenderOptions, render_masks
+from medrax.utils.rle import MASK_FORMATS, MASK_RESOLUTIONS, export_masks
+from medrax.utils.inference import run_inference
+
 
 class ChestXRaySegmentationInput(BaseModel):
     """Input schema for the Chest X-ray Segmentation Tool."""
@@ -76,22 +85,71 @@ class ChestXRaySegmentationTool(BaseTool):
     args_schema: Type[BaseModel] = ChestXRaySegmentationInput
 
     model: Any = None
+    model_key: Optional[ModelKey] = None
     device: Optional[str] = "cuda"
-    transform: Any = None
     pixel_spacing_mm: float = 0.2
     temp_dir: Path = Path("temp")
     organ_map: Dict[str, int] = None
+    render_options: Optional[RenderOptions] = None
+    mask_format: Optional[str] = None
+    mask_resolution: str = "original"
+    resolution: int = 512
 
-    def __init__(self, device: Optional[str] = "cuda", temp_dir: Optional[Path] = Path("temp")):
-        """Initialize the segmentation tool with model and temporary directory."""
+    def __init__(
+        self,
+        device: Optional[str] = "cuda",
+        temp_dir: Optional[Path] = Path("temp"),
+        backend: str = "torch",
+        onnx_options: Optional[OnnxOptions] = None,
+        quantization: Optional[str] = None,
+        quantization_options: Optional[QuantizationOptions] = None,
+        render_options: Optional[RenderOptions] = None,
+        mask_format: Optional[str] = None,
+        mask_resolution: str = "original",
+        resolution: int = 512,
+    ):
+        """Initialize the segmentation tool with model and temporary directory.
+
+        Args:
+            device (Optional[str]): Device to run on.
+            temp_dir (Optional[Path]): Directory for visualizations.
+            backend (str): "torch", or "onnx" to run an exported graph with ONNX Runtime
+                (CPU only, requires `medrax[onnx]`).
+            onnx_options (Optional[OnnxOptions]): Thread and cache settings of the onnx backend.
+            quantization (Optional[str]): "int8" for static INT8 quantization (CPU only).
+            quantization_options (Optional[QuantizationOptions]): Calibration and cache settings
+                of INT8 quantization.
+            render_options (Optional[RenderOptions]): Resolution, format and backend of the
+                saved overlay.
+            mask_format (Optional[str]): Also return the masks, as "rle" (COCO RLE per organ)
+                or "npz" (bit-packed file next to the overlay). Defaults to None.
+            mask_resolution (str): "original" image or "model" input resolution of the masks.
+            resolution (int): Model input size, 256, 384 or 512. Lower sizes are faster on the
+                CPU at the cost of coarser mask edges. The onnx backend runs at 512 only.
+        """
+        check_segmentation_resolution(resolution, backend)
+        if mask_format is not None and mask_format not in MASK_FORMATS:
+            raise ValueError(
+                f"Unsupported mask format: {mask_format}. Supported: {list(MASK_FORMATS)}"
+            )
+        if mask_resolution not in MASK_RESOLUTIONS:
+            raise ValueError(
+                f"Unsupported mask resolution: {mask_resolution}. "
+                f"Supported: {list(MASK_RESOLUTIONS)}"
+            )
         super().__init__()
-        self.model = xrv.baseline_models.chestx_det.PSPNet()
         self.device = torch.device(device) if device else "cuda"
-        self.model = self.model.to(self.device)
-        self.model.eval()
-
-        self.transform = torchvision.transforms.Compose(
-            [xrv.datasets.XRayCenterCrop(), xrv.datasets.XRayResizer(512)]
+        self.render_options = render_options or RenderOptions()
+        self.mask_format = mask_format
+        self.mask_resolution = mask_resolution
+        self.resolution = resolution
+        # Shared with the MCP segmentation wrapper on the same device
+        self.model_key, self.model = acquire_pspnet(
+            self.device,
+            backend=backend,
+            onnx_options=onnx_options,
+            quantization=quantization,
+            quantization_options=quantization_options,
         )
 
         self.temp_dir = temp_dir if isinstance(temp_dir, Path) else Path(temp_dir)
@@ -115,113 +173,65 @@ class ChestXRaySegmentationTool(BaseTool):
             "Spine": 13,
         }
 
-    def _align_mask_to_original(
-        self, mask: np.ndarray, original_shape: Tuple[int, int]
-    ) -> np.ndarray:
-        """
-        Align a mask from the transformed (cropped/resized) space back to the full original image.
-        Assumes that the transform does a center crop to a square of side = min(original height, width)
-        and then resizes to (512,512).
-        """
-        orig_h, orig_w = original_shape
-        crop_size = min(orig_h, orig_w)
-        crop_top = (orig_h - crop_size) // 2
-        crop_left = (orig_w - crop_size) // 2
-
-        # Resize mask (from 512x512) to the cropped region size
-        resized_mask = skimage.transform.resize(
-            mask, (crop_size, crop_size), order=0, preserve_range=True, anti_aliasing=False
-        )
-        full_mask = np.zeros(original_shape)
-        full_mask[crop_top : crop_top + crop_size, crop_left : crop_left + crop_size] = resized_mask
-        return full_mask
-
-    def _compute_organ_metrics(
-        self, mask: np.ndarray, original_img: np.ndarray, confidence: float
-    ) -> Optional[OrganMetrics]:
-        """Compute comprehensive metrics for a single organ mask."""
-        # Align mask to the original image coordinates if needed
-        if mask.shape != original_img.shape:
-            mask = self._align_mask_to_original(mask, original_img.shape)
-
-        props = skimage.measure.regionprops(mask.astype(int))
-        if not props:
-            return None
-
-        props = props[0]
-        area_cm2 = mask.sum() * (self.pixel_spacing_mm / 10) ** 2
-
-        img_height, img_width = mask.shape
-        cy, cx = props.centroid
+    def _organ_metrics(
+        self, stats: OrganStats, image_shape: Tuple[int, int], confidence: float
+    ) -> OrganMetrics:
+        """Build the metrics of one organ from its measured geometry and intensity."""
+        img_height, img_width = image_shape
+        cy, cx = stats.centroid
+        min_y, min_x, max_y, max_x = stats.bbox
         relative_pos = {
             "top": cy / img_height,
             "left": cx / img_width,
             "center_dist": np.sqrt(((cy / img_height - 0.5) ** 2 + (cx / img_width - 0.5) ** 2)),
         }
 
-        organ_pixels = original_img[mask > 0]
-        mean_intensity = organ_pixels.mean() if len(organ_pixels) > 0 else 0
-        std_intensity = organ_pixels.std() if len(organ_pixels) > 0 else 0
-
         return OrganMetrics(
-            area_pixels=int(mask.sum()),
-            area_cm2=float(area_cm2),
-            centroid=(float(cy), float(cx)),
-            bbox=tuple(map(int, props.bbox)),
-            width=int(props.bbox[3] - props.bbox[1]),
-            height=int(props.bbox[2] - props.bbox[0]),
-            aspect_ratio=float(
-                (props.bbox[2] - props.bbox[0]) / max(1, props.bbox[3] - props.bbox[1])
-            ),
+            area_pixels=stats.area_pixels,
+            area_cm2=float(stats.area_pixels * (self.pixel_spacing_mm / 10) ** 2),
+            centroid=stats.centroid,
+            bbox=stats.bbox,
+            width=max_x - min_x,
+            height=max_y - min_y,
+            aspect_ratio=float((max_y - min_y) / max(1, max_x - min_x)),
             relative_position=relative_pos,
-            mean_intensity=float(mean_intensity),
-            std_intensity=float(std_intensity),
+            mean_intensity=stats.mean_intensity,
+            std_intensity=stats.std_intensity,
             confidence_score=float(confidence),
         )
 
     def _save_visualization(
-        self, original_img: np.ndarray, pred_masks: torch.Tensor, organ_indices: List[int]
+        self, original_img: np.ndarray, masks: np.ndarray, organs: List[str]
     ) -> str:
         """Save visualization of original image with segmentation masks overlaid."""
-        plt.figure(figsize=(10, 10))
-        plt.imshow(
-            original_img, cmap="gray", extent=[0, original_img.shape[1], original_img.shape[0], 0]
+        image = render_masks(
+            original_img,
+            masks,
+            organs,
+            self.render_options,
+            legend=True,
+            title="Segmentation Overlay",
         )
 
-        # Generate color palette for organs
-        colors = plt.cm.rainbow(np.linspace(0, 1, len(organ_indices)))
-
-        # Process and overlay each organ mask
-        for idx, (organ_idx, color) in enumerate(zip(organ_indices, colors)):
-            mask = pred_masks[0, organ_idx].cpu().numpy()
-            if mask.sum() > 0:
-                # Align the mask to the original image coordinates
-                if mask.shape != original_img.shape:
-                    mask = self._align_mask_to_original(mask, original_img.shape)
-
-                # Create a colored overlay with transparency
-                colored_mask = np.zeros((*original_img.shape, 4))
-                colored_mask[mask > 0] = (*color[:3], 0.3)
-                plt.imshow(
-                    colored_mask, extent=[0, original_img.shape[1], original_img.shape[0], 0]
-                )
-
-                # Add legend entry for the organ
-                organ_name = list(self.organ_map.keys())[
-                    list(self.organ_map.values()).index(organ_idx)
-                ]
-                plt.plot([], [], color=color, label=organ_name, linewidth=3)
-
-        plt.title("Segmentation Overlay")
-        plt.legend(bbox_to_anchor=(1.05, 1), loc="upper left")
-        plt.axis("off")
-
-        save_path = self.temp_dir / f"segmentation_{uuid.uuid4().hex[:8]}.png"
-        plt.savefig(save_path, bbox_inches="tight", dpi=300)
-        plt.close()
+        save_path = (
+            self.temp_dir / f"segmentation_{uuid.uuid4().hex[:8]}{self.render_options.extension}"
+        )
+        save_path.write_bytes(image)
 
         return str(save_path)
 
+    @property
+    def cache_fingerprint(self) -> Dict[str, Any]:
+        """Configuration the results depend on: model, resolution, overlay and mask settings."""
+        return {
+            "model_key": self.model_key,
+            "resolution": self.resolution,
+            "pixel_spacing_mm": self.pixel_spacing_mm,
+            "render_options": self.render_options,
+            "mask_format": self.mask_format,
+            "mask_resolution": self.mask_resolution,
+        }
+
     def _run(
         self,
         image_path: str,
@@ -241,50 +251,54 @@ class ChestXRaySegmentationTool(BaseTool):
                 organ_indices = list(self.organ_map.values())
                 organs = list(self.organ_map.keys())
 
-            # Load and process image
-            original_img = skimage.io.imread(image_path)
-            if len(original_img.shape) > 2:
-                original_img = original_img[:, :, 0]
-
-            img = xrv.datasets.normalize(original_img, 255)
-            img = img[None, ...]
-            img = self.transform(img)
-            img = torch.from_numpy(img)
-            img = img.to(self.device)
+            # Load image; decoding and preprocessing are shared with other tools
+            original_img = get_preprocess_cache().decode(image_path)
 
-            # Generate predictions
-            with torch.no_grad():
-                pred = self.model(img)
-            pred_probs = torch.sigmoid(pred)
-            pred_masks = (pred_probs > 0.5).float()
+            # All organs are predicted at once and kept per image, so another subset of
+            # organs on the same image is served without running the model again
+            logits, forward_cached = pspnet_outputs(
+                self.model, self.model_key, image_path, self.resolution, self.device
+            )
+            pred_probs = torch.sigmoid(logits[organ_indices])
+            masks = (pred_probs > 0.5).numpy()
 
             # Save visualization
-            viz_path = self._save_visualization(original_img, pred_masks, organ_indices)
+            viz_path = self._save_visualization(original_img, masks, organs)
 
-            # Compute metrics for selected organs
+            # Compute metrics for all selected organs in one pass
             results = {}
-            for idx, organ_name in zip(organ_indices, organs):
-                mask = pred_masks[0, idx].cpu().numpy()
-                if mask.sum() > 0:
-                    metrics = self._compute_organ_metrics(
-                        mask, original_img, float(pred_probs[0, idx].mean().cpu())
+            confidences = [float(probs.mean()) for probs in pred_probs]
+            for organ_name, stats, confidence in zip(
+                organs, organ_stats(masks, original_img), confidences
+            ):
+                if stats is not None:
+                    results[organ_name] = self._organ_metrics(
+                        stats, original_img.shape, confidence
                     )
-                    if metrics:
-                        results[organ_name] = metrics
 
             output = {
                 "segmentation_image_path": viz_path,
                 "metrics": {organ: metrics.dict() for organ, metrics in results.items()},
             }
+            if self.mask_format:
+                output["masks"] = export_masks(
+                    masks,
+                    organs,
+                    original_img.shape,
+                    mask_format=self.mask_format,
+                    resolution=self.mask_resolution,
+                    npz_path=Path(viz_path).with_suffix(".npz"),
+                )
 
             metadata = {
                 "image_path": image_path,
                 "segmentation_image_path": viz_path,
                 "original_size": original_img.shape,
-                "model_size": tuple(img.shape[-2:]),
+                "model_size": tuple(logits.shape[-2:]),
                 "pixel_spacing_mm": self.pixel_spacing_mm,
                 "requested_organs": organs,
                 "processed_organs": list(results.keys()),
+                "forward_cached": forward_cached,
                 "analysis_status": "completed",
             }
 
@@ -305,5 +319,10 @@ class ChestXRaySegmentationTool(BaseTool):
         organs: Optional[List[str]] = None,
         run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
     ) -> Tuple[Dict[str, Any], Dict]:
-        """Async version of _run."""
-        return self._run(image_path, organs)
+        """Async version of _run, executed on the shared inference executor."""
+        return await run_inference(self._run, image_path, organs, lock_owner=self)
+
+    def __del__(self):
+        """Release the shared model."""
+        if getattr(self, "model_key", None) is not None:
+            get_model_registry().release(self.model_key)
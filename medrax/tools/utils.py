@@ -37,6 +37,7 @@ class ImageVisualizerTool(BaseTool):
         "Output: Dict with image path and metadata."
     )
     args_schema: Type[BaseModel] = ImageVisualizerInput
+    cacheable: bool = False
 
     def _display_image(
         self,
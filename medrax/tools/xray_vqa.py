@@ -11,6 +11,9 @@ from langchain_core.callbacks import (
 )
 from langchain_core.tools import BaseTool
 
+from medrax.models import ModelKey, acquire_chexagent, get_model_registry
+from medrax.utils.inference import run_inference
+
 
 class XRayVQAToolInput(BaseModel):
     """Input schema for the CheXagent Tool."""
@@ -42,6 +45,7 @@ class XRayVQATool(BaseTool):
     dtype: torch.dtype = torch.bfloat16
     tokenizer: Optional[AutoTokenizer] = None
     model: Optional[AutoModelForCausalLM] = None
+    model_key: Optional[ModelKey] = None
 
     def __init__(
         self,
@@ -62,32 +66,14 @@ class XRayVQATool(BaseTool):
         """
         super().__init__(**kwargs)
 
-        # Dangerous code, but works for now
-        import transformers
-
-        original_transformers_version = transformers.__version__
-        transformers.__version__ = "4.40.0"
-
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         self.dtype = dtype
         self.cache_dir = cache_dir
 
-        # Load tokenizer and model
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            model_name,
-            trust_remote_code=True,
-            cache_dir=cache_dir,
-        )
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            device_map=self.device,
-            trust_remote_code=True,
-            cache_dir=cache_dir,
+        # Load tokenizer and model, shared with the MCP VQA wrapper
+        self.model_key, (self.tokenizer, self.model) = acquire_chexagent(
+            model_name, self.device, self.dtype, cache_dir
         )
-        self.model = self.model.to(dtype=self.dtype)
-        self.model.eval()
-
-        transformers.__version__ = original_transformers_version
 
     def _generate_response(self, image_paths: List[str], prompt: str, max_new_tokens: int) -> str:
         """Generate response using CheXagent model.
@@ -182,5 +168,12 @@ class XRayVQATool(BaseTool):
         max_new_tokens: int = 512,
         run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
     ) -> Tuple[Dict[str, Any], Dict]:
-        """Async version of _run."""
-        return self._run(image_paths, prompt, max_new_tokens)
+        """Async version of _run, executed on the shared inference executor."""
+        return await run_inference(
+            self._run, image_paths, prompt, max_new_tokens, lock_owner=self
+        )
+
+    def __del__(self):
+        """Release the shared model."""
+        if getattr(self, "model_key", None) is not None:
+            get_model_registry().release(self.model_key)
@@ -1 +1,9 @@
 from .utils import load_prompts_from_file
+from .inference import (
+    configure_inference_executor,
+    get_inference_executor,
+    model_lock,
+    run_inference,
+)
+from .image import encode_image_for_llm
+from .prefetch import Prefetcher, PrefetchJob
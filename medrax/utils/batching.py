@@ -0,0 +1,226 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+@dataclass
+class LoadedBatch:
+    """
+    One batch of inputs prepared by load_batches.
+
+    Attributes:
+    indices (List[int]): Positions of the loaded items in the input sequence.
+    items (List[Any]): Loaded items, in the same order as indices.
+    errors (Dict[int, Exception]): Inputs of this batch that failed to load, by position.
+    """
+
+    indices: List[int] = field(default_factory=list)
+    items: List[Any] = field(default_factory=list)
+    errors: Dict[int, Exception] = field(default_factory=dict)
+
+
+def load_batches(
+    sources: Sequence[Any],
+    load: Callable[[Any], Any],
+    batch_size: int,
+    num_workers: int = 4,
+) -> Iterator[LoadedBatch]:
+    """
+    Load inputs on worker threads and yield them in batches, in input order.
+
+    The next batch is decoded while the caller runs the model on the current one, so
+    at most two batches are in memory at a time. An input that fails to load is
+    reported in the batch's errors and does not affect the other inputs.
+
+    Args:
+    sources (Sequence[Any]): Inputs to load, e.g. image paths.
+    load (Callable[[Any], Any]): Function loading one input, e.g. decode and preprocess.
+    batch_size (int): Maximum number of inputs per batch.
+    num_workers (int, optional): Number of loader threads. Defaults to 4.
+
+    Yields:
+    LoadedBatch: The loaded items and load errors of each batch.
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, num_workers), thread_name_prefix="medrax-preprocess"
+    ) as executor:
+
+        def submit(start: int) -> List[Tuple[int, Future]]:
+            stop = min(start + batch_size, len(sources))
+            return [(i, executor.submit(load, sources[i])) for i in range(start, stop)]
+
+        pending = submit(0)
+        start = 0
+        while pending:
+            start += batch_size
+            upcoming = submit(start)
+
+            batch = LoadedBatch()
+            for i, future in pending:
+                try:
+                    item = future.result()
+                except Exception as e:
+                    batch.errors[i] = e
+                    continue
+                batch.indices.append(i)
+                batch.items.append(item)
+            yield batch
+
+            pending = upcoming
+
+
+class MicroBatcher:
+    """
+    Groups concurrent single-item requests into batches for one model.
+
+    Callers submit one item each and wait on the returned future. A worker thread
+    takes the first waiting request, collects more for up to max_latency_ms or until
+    max_batch_size items are queued, and processes them with one call. Requests that
+    arrive while a batch runs are queued and go into the next batch, so under load
+    batches fill up without any extra wait.
+
+    Attributes:
+    max_batch_size (int): Maximum number of items processed in one call.
+    max_latency_ms (float): Maximum time the first request of a batch waits for others.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 16,
+        max_latency_ms: float = 5.0,
+        name: str = "medrax-microbatch",
+    ):
+        """
+        Start the batching worker.
+
+        Args:
+        process_batch (Callable[[List[Any]], Sequence[Any]]): Function computing the
+            results of a list of items, one result per item in the same order.
+        max_batch_size (int, optional): Maximum batch size. Defaults to 16.
+        max_latency_ms (float, optional): Maximum wait for a batch to fill. Defaults to 5.0.
+        name (str, optional): Name of the worker thread.
+        """
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, got {max_batch_size}")
+        self.max_batch_size = max_batch_size
+        self.max_latency_ms = max_latency_ms
+        self._process_batch = process_batch
+        self._queue: "queue.Queue[Optional[Tuple[Any, Future, float]]]" = queue.Queue()
+        self._closed = False
+        self._submit_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._queue_wait_ms = 0.0
+        self._max_queue_wait_ms = 0.0
+
+        self._worker = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        """
+        Queue one item for the next batch.
+
+        Args:
+        item (Any): The item, e.g. a preprocessed image tensor.
+
+        Returns:
+        Future: Resolves to the item's result, or to the exception of its batch.
+        """
+        future: Future = Future()
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher has been shut down")
+            self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get batching metrics since the batcher was created.
+
+        Returns:
+        Dict[str, float]: Number of batches and requests, mean batch size, mean batch
+            fill (mean size / max_batch_size) and mean and maximum queue wait in ms.
+        """
+        with self._stats_lock:
+            batches, requests = self._batches, self._requests
+            mean_size = requests / batches if batches else 0.0
+            return {
+                "batches": batches,
+                "requests": requests,
+                "mean_batch_size": mean_size,
+                "mean_batch_fill": mean_size / self.max_batch_size,
+                "mean_queue_wait_ms": self._queue_wait_ms / requests if requests else 0.0,
+                "max_queue_wait_ms": self._max_queue_wait_ms,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop accepting requests. Requests already queued are still processed.
+
+        Args:
+        wait (bool, optional): Wait for the worker to finish. Defaults to True.
+        """
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        if wait:
+            self._worker.join()
+
+    def _loop(self) -> None:
+        stopping = False
+        while not stopping:
+            request = self._queue.get()
+            if request is None:
+                return
+
+            batch = [request]
+            deadline = time.perf_counter() + self.max_latency_ms / 1000
+            while len(batch) < self.max_batch_size:
+                try:
+                    request = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+
+            self._run(batch)
+
+    def _run(self, batch: List[Tuple[Any, Future, float]]) -> None:
+        start = time.perf_counter()
+        batch = [request for request in batch if request[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        waits_ms = [(start - submitted) * 1000 for _, _, submitted in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += len(batch)
+            self._queue_wait_ms += sum(waits_ms)
+            self._max_queue_wait_ms = max(self._max_queue_wait_ms, *waits_ms)
+
+        try:
+            results = self._process_batch([item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"process_batch returned {len(results)} results for {len(batch)} items"
+                )
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,207 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_DIGEST_CHUNK_SIZE = 1 << 20
+_DIGEST_MEMO_SIZE = 1024
+
+_digest_memo: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_digest_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    """
+    Compute the SHA-256 digest of a file's content.
+
+    Digests are memoized by (absolute path, size, mtime), so repeated calls on an
+    unchanged file do not re-read it. Two files with the same bytes get the same
+    digest regardless of their names.
+
+    Args:
+    path (str): Path to the file.
+
+    Returns:
+    str: Hex digest of the file content.
+
+    Raises:
+    FileNotFoundError: If the file does not exist.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        digest = _digest_memo.get(memo_key)
+        if digest is not None:
+            _digest_memo.move_to_end(memo_key)
+            return digest
+
+    hasher = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(_DIGEST_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+
+    with _digest_lock:
+        _digest_memo[memo_key] = digest
+        while len(_digest_memo) > _DIGEST_MEMO_SIZE:
+            _digest_memo.popitem(last=False)
+    return digest
+
+
+def pickled_size(value: Any) -> int:
+    """
+    Estimate the memory footprint of a value by its pickled size.
+
+    Args:
+    value (Any): The value to measure.
+
+    Returns:
+    int: Size of the pickled value in bytes.
+    """
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache bounded by a total byte budget.
+
+    Attributes:
+        max_bytes (int): Maximum total size of all entries.
+        current_bytes (int): Current total size of all entries.
+        hits (int): Number of successful lookups.
+        misses (int): Number of failed lookups.
+        evictions (int): Number of entries evicted to stay within the budget.
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Optional[Callable[[Any], int]] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes (int): Maximum total size of all entries in bytes.
+            sizeof (Callable[[Any], int], optional): Function that returns the size of a
+                value in bytes. Defaults to the pickled size.
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sizeof = sizeof or pickled_size
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, threading.Lock] = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a value and mark it as most recently used.
+
+        Args:
+            key (Hashable): The cache key.
+            default (Any, optional): Value returned on a miss. Defaults to None.
+
+        Returns:
+            Any: The cached value, or default on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: Optional[int] = None) -> bool:
+        """
+        Store a value, evicting least recently used entries to stay within the budget.
+
+        Args:
+            key (Hashable): The cache key.
+            value (Any): The value to store.
+            nbytes (int, optional): Size of the value. Computed with sizeof if omitted.
+
+        Returns:
+            bool: False if the value alone exceeds the budget and was not stored.
+        """
+        nbytes = self._sizeof(value) if nbytes is None else nbytes
+        with self._lock:
+            self._discard(key)
+            if nbytes > self.max_bytes:
+                return False
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+            return True
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Look up a value, computing and storing it on a miss.
+
+        Concurrent calls for the same key wait for one computation instead of
+        repeating it; calls for different keys do not block each other.
+
+        Args:
+            key (Hashable): The cache key.
+            compute (Callable[[], Any]): Function that produces the value on a miss.
+
+        Returns:
+            Tuple[Any, bool]: The value, and whether it was served from the cache.
+        """
+        with self._lock:
+            key_lock = self._pending.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                value = self.get(key)
+                hit = value is not None
+                if not hit:
+                    value = compute()
+                    self.put(key, value)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+        return value, hit
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry and return its value, or default if it is not cached."""
+        with self._lock:
+            entry = self._discard(key)
+            return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and memory usage."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _discard(self, key: Hashable) -> Optional[Tuple[Any, int]]:
+        """Remove an entry without locking. The caller must hold the lock."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+        return entry
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
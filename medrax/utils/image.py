@@ -0,0 +1,37 @@
+import base64
+import io
+
+import numpy as np
+from PIL import Image
+
+
+def encode_image_for_llm(image_path: str, max_size: int = 1024, quality: int = 85) -> str:
+    """
+    Encode an image as a base64 JPEG for a multimodal LLM message.
+
+    The image is downscaled so its longer side is at most max_size and re-encoded as
+    JPEG. The file on disk is not modified, so tools keep working on the original.
+
+    Args:
+        image_path (str): Path to a PNG/JPEG image.
+        max_size (int, optional): Maximum length of the longer side in pixels.
+            Defaults to 1024. None or 0 keeps the original resolution.
+        quality (int, optional): JPEG quality (1-95). Defaults to 85.
+
+    Returns:
+        str: Base64-encoded JPEG data.
+    """
+    with Image.open(image_path) as img:
+        if img.mode in ("I", "I;16", "F"):
+            # 16-bit/float X-rays: rescale to 8-bit instead of clipping
+            pixels = np.asarray(img, dtype=np.float32)
+            pixels = (pixels - pixels.min()) / max(float(np.ptp(pixels)), 1e-6) * 255
+            img = Image.fromarray(pixels.astype(np.uint8))
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        if max_size and max(img.size) > max_size:
+            img.thumbnail((max_size, max_size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality, optimize=True)
+
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
@@ -0,0 +1,179 @@
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple, Union
+
+from medrax.models.registry import ModelKey
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_workers: int = 4
+_executor_lock = threading.Lock()
+
+# Locks of registry models by key, and of other owners by id until they are collected
+_model_locks: Dict[ModelKey, threading.Lock] = {}
+_object_locks: Dict[int, threading.Lock] = {}
+# Locks over several registry models, e.g. of an ensemble, by their sorted keys
+_group_locks: Dict[Tuple[ModelKey, ...], "_ModelGroupLock"] = {}
+_model_locks_lock = threading.Lock()
+# Event loop locks in front of each model lock, per running loop
+_async_locks: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def configure_inference_executor(max_workers: int) -> None:
+    """
+    Set the number of worker threads of the shared inference executor.
+
+    Replaces the current executor. Calls already submitted to the old executor
+    finish on it.
+
+    Args:
+    max_workers (int): Maximum number of inference calls running at the same time.
+    """
+    global _executor, _executor_workers
+    with _executor_lock:
+        old_executor = _executor
+        _executor_workers = max_workers
+        _executor = None
+    if old_executor is not None:
+        old_executor.shutdown(wait=False)
+
+
+def get_inference_executor() -> ThreadPoolExecutor:
+    """
+    Get the process-wide executor used for blocking model inference.
+
+    Returns:
+    ThreadPoolExecutor: The shared inference executor, created on first use.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_executor_workers, thread_name_prefix="medrax-inference"
+            )
+        return _executor
+
+
+class _ModelGroupLock:
+    """Locks of several registry models, taken together in key order."""
+
+    def __init__(self, locks: Sequence[threading.Lock]):
+        self._locks = list(locks)
+
+    def __enter__(self) -> "_ModelGroupLock":
+        for lock in self._locks:
+            lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        for lock in reversed(self._locks):
+            lock.release()
+
+
+def _lock_keys(owner: Any) -> Tuple[ModelKey, ...]:
+    """Models a lock owner stands for: the registry models it runs, in a stable order."""
+    if isinstance(owner, ModelKey):
+        return (owner,)
+    ensemble = getattr(owner, "ensemble_keys", None) or ()
+    if len(ensemble) > 1 and all(isinstance(key, ModelKey) for key in ensemble):
+        return tuple(sorted(set(ensemble), key=repr))
+    key = getattr(owner, "model_key", None) or getattr(owner, "_model_key", None)
+    return (key,) if isinstance(key, ModelKey) else ()
+
+
+def _key_lock(key: ModelKey) -> threading.Lock:
+    lock = _model_locks.get(key)
+    if lock is None:
+        lock = _model_locks[key] = threading.Lock()
+    return lock
+
+
+def model_lock(owner: Any) -> Union[threading.Lock, _ModelGroupLock]:
+    """
+    Get the lock that serializes inference calls on one model.
+
+    Models are shared between tools and MCP wrappers through the model registry, so
+    the lock belongs to the model: a ModelKey, or a tool or wrapper holding one in
+    `model_key` / `_model_key`, gets the lock of that key. An owner running several
+    registry models (`ensemble_keys`) gets a lock over all of them, taken in a fixed
+    key order so owners of overlapping ensembles cannot deadlock. Any other owner gets
+    a lock of its own, which is dropped when the owner is garbage collected.
+
+    Args:
+    owner (Any): A ModelKey, or the object that holds the model (usually a tool).
+
+    Returns:
+    Union[threading.Lock, _ModelGroupLock]: The lock for this model or these models.
+    """
+    keys = _lock_keys(owner)
+    with _model_locks_lock:
+        if len(keys) == 1:
+            return _key_lock(keys[0])
+        if keys:
+            group = _group_locks.get(keys)
+            if group is None:
+                group = _group_locks[keys] = _ModelGroupLock([_key_lock(k) for k in keys])
+            return group
+
+        lock = _object_locks.get(id(owner))
+        if lock is None:
+            lock = _object_locks[id(owner)] = threading.Lock()
+            # Pruned before the id can be reused by a new object
+            weakref.finalize(owner, _drop_object_lock, id(owner))
+        return lock
+
+
+def _drop_object_lock(owner_id: int) -> None:
+    with _model_locks_lock:
+        _object_locks.pop(owner_id, None)
+
+
+def _async_model_lock(lock: Union[threading.Lock, _ModelGroupLock]) -> asyncio.Lock:
+    """Get the event loop lock queued in front of a model lock."""
+    loop = asyncio.get_running_loop()
+    with _model_locks_lock:
+        locks = _async_locks.get(loop)
+        if locks is None:
+            locks = _async_locks[loop] = weakref.WeakKeyDictionary()
+        async_lock = locks.get(lock)
+        if async_lock is None:
+            async_lock = locks[lock] = asyncio.Lock()
+        return async_lock
+
+
+async def run_inference(
+    func: Callable[..., Any], *args: Any, lock_owner: Any = None, **kwargs: Any
+) -> Any:
+    """
+    Run a blocking inference function on the shared executor without blocking the event loop.
+
+    Calls on the same model wait for each other on the event loop before they are
+    dispatched, so queued calls never occupy executor workers that other models could
+    use. The dispatched call still takes model_lock(lock_owner) to exclude callers on
+    other threads.
+
+    Args:
+    func (Callable[..., Any]): The blocking function, typically a tool's _run.
+    *args (Any): Positional arguments for func.
+    lock_owner (Any, optional): If given, the call holds model_lock(lock_owner) while it runs.
+    **kwargs (Any): Keyword arguments for func.
+
+    Returns:
+    Any: The return value of func.
+    """
+    loop = asyncio.get_running_loop()
+    if lock_owner is None:
+        return await loop.run_in_executor(
+            get_inference_executor(), functools.partial(func, *args, **kwargs)
+        )
+
+    lock = model_lock(lock_owner)
+
+    def call_locked() -> Any:
+        with lock:
+            return func(*args, **kwargs)
+
+    async with _async_model_lock(lock):
+        return await loop.run_in_executor(get_inference_executor(), call_locked)
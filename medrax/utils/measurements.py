@@ -0,0 +1,212 @@
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from medrax.utils.organ_metrics import _Axis, _crop_axes
+
+# Pixel size assumed when the image has no DICOM spacing, in mm
+DEFAULT_PIXEL_SPACING_MM = 0.2
+# Cardiothoracic ratio above which the heart is considered enlarged on a PA film
+CTR_THRESHOLD = 0.5
+
+Spacing = Tuple[float, float]
+
+# Organ of each PSPNet output channel
+PSPNET_ORGANS = (
+    "Left Clavicle",
+    "Right Clavicle",
+    "Left Scapula",
+    "Right Scapula",
+    "Left Lung",
+    "Right Lung",
+    "Left Hilus Pulmonis",
+    "Right Hilus Pulmonis",
+    "Heart",
+    "Aorta",
+    "Facies Diaphragmatica",
+    "Mediastinum",
+    "Weasand",
+    "Spine",
+)
+
+# Organs the measurements use, and their position in the measured stack; both lungs
+# together come last
+_MEASURED = ("Heart", "Left Lung", "Right Lung", "Mediastinum", "Facies Diaphragmatica")
+_HEART, _LEFT_LUNG, _RIGHT_LUNG, _MEDIASTINUM, _DIAPHRAGM, _LUNGS = range(6)
+
+
+def pixel_spacing_from_dicom(dicom_path: Union[str, Path]) -> Optional[Spacing]:
+    """
+    Read the physical pixel size of a DICOM image.
+
+    Uses PixelSpacing, or ImagerPixelSpacing (the detector plane, which CR/DX
+    radiographs often carry instead) when it is missing.
+
+    Args:
+    dicom_path (Union[str, Path]): Path to a DICOM file.
+
+    Returns:
+    Optional[Spacing]: (row, column) spacing in mm, or None if the file has neither tag.
+    """
+    import pydicom
+
+    dcm = pydicom.dcmread(str(dicom_path), stop_before_pixels=True)
+    spacing = getattr(dcm, "PixelSpacing", None) or getattr(dcm, "ImagerPixelSpacing", None)
+    if not spacing:
+        return None
+    row, col = (float(x) for x in spacing[:2])
+    return row, col
+
+
+def _edges(masks: np.ndarray, axis: _Axis, dim: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    First and last image pixel of every mask line along one axis.
+
+    Args:
+    masks (np.ndarray): Boolean masks of shape (K, h, w).
+    axis (_Axis): Mapping of the mask axis `dim` (1 = rows, 2 = columns) onto the image.
+    dim (int): Axis of masks to scan along.
+
+    Returns:
+    Tuple[np.ndarray, np.ndarray, np.ndarray]: Start (inclusive) and end (exclusive) image
+        coordinates per mask line, and whether the line has any pixel.
+    """
+    size = masks.shape[dim]
+    present = masks.any(axis=dim)
+    first = masks.argmax(axis=dim)
+    last = size - 1 - np.flip(masks, axis=dim).argmax(axis=dim)
+    start = axis.offset + axis.first[first]
+    end = axis.offset + axis.first[last] + axis.count[last]
+    return start, end, present
+
+
+def chest_measurements(
+    masks: np.ndarray,
+    organs: Sequence[str],
+    image_shape: Tuple[int, int],
+    pixel_spacing: Optional[Spacing] = None,
+) -> Dict[str, Any]:
+    """
+    Derive cardiothoracic measurements from model-space organ masks.
+
+    Masks are measured as if upsampled onto the original image (see align_masks), from
+    per-row and per-column extents of the model-space masks, so the cost does not
+    depend on the image size.
+
+    - Cardiothoracic ratio: horizontal extent of the heart over the widest row of the
+      lung fields (inner thoracic diameter). Only meaningful on PA films.
+    - Lung fields: area, width and height of each lung, and their symmetry.
+    - Mediastinal width: widest row of the mediastinum.
+    - Diaphragm: top of each hemidiaphragm, split at the midline between the lungs,
+      and their height difference.
+
+    Measurements of missing organs are None.
+
+    Args:
+    masks (np.ndarray): Boolean masks of shape (K, h, w) in model space.
+    organs (Sequence[str]): Organ name of each mask, as in the segmentation tools.
+    image_shape (Tuple[int, int]): (H, W) of the original image.
+    pixel_spacing (Optional[Spacing]): (row, column) pixel size in mm, e.g. from
+        pixel_spacing_from_dicom. Defaults to DEFAULT_PIXEL_SPACING_MM for both.
+
+    Returns:
+    Dict[str, Any]: cardiothoracic_ratio, cardiac/thoracic/mediastinal widths in mm,
+        cardiomegaly_suggested (ratio above CTR_THRESHOLD), per-lung area, width and
+        height with their symmetry, hemidiaphragm tops (image rows) with their height
+        difference, the pixel spacing used, and whether it was assumed (no DICOM spacing).
+    """
+    row_mm, col_mm = pixel_spacing or (DEFAULT_PIXEL_SPACING_MM, DEFAULT_PIXEL_SPACING_MM)
+    masks = np.asarray(masks, dtype=bool)
+    rows, cols = _crop_axes(masks.shape[1:], image_shape)
+    index = {name: k for k, name in enumerate(organs)}
+    empty = np.zeros(masks.shape[1:], dtype=bool)
+
+    # The measured organs plus both lungs together; mask pixels dropped by downsampling
+    # do not reach the image
+    stack = np.stack([masks[index[name]] if name in index else empty for name in _MEASURED])
+    stack = np.concatenate([stack, (stack[_LEFT_LUNG] | stack[_RIGHT_LUNG])[None]])
+    stack &= (rows.count > 0)[:, None] & (cols.count > 0)[None, :]
+    present = stack.any(axis=(1, 2))
+
+    # Horizontal extent of every mask row and vertical extent of every mask column
+    x_start, x_end, in_row = _edges(stack, cols, 2)
+    y_start, y_end, in_col = _edges(stack, rows, 1)
+    col_area = np.einsum("kij,i->kj", stack.astype(np.int64), rows.count)
+    areas = col_area @ cols.count
+    # Image x of the center of every mask column
+    col_centers = cols.offset + cols.first + (cols.count - 1) / 2
+
+    def width(k: int) -> int:
+        return int(x_end[k][in_row[k]].max() - x_start[k][in_row[k]].min())
+
+    def height(k: int) -> int:
+        return int(y_end[k][in_col[k]].max() - y_start[k][in_col[k]].min())
+
+    def widest_row(k: int) -> int:
+        return int(np.where(in_row[k], x_end[k] - x_start[k], 0).max())
+
+    # Cardiothoracic ratio
+    cardiac_width = width(_HEART) if present[_HEART] else None
+    thoracic_width = widest_row(_LUNGS) if present[_LUNGS] else None
+    ctr = cardiac_width / thoracic_width if cardiac_width and thoracic_width else None
+
+    # Lung fields
+    lungs: Dict[str, Any] = {}
+    for name, k in (("Left Lung", _LEFT_LUNG), ("Right Lung", _RIGHT_LUNG)):
+        lungs[name] = (
+            {
+                "area_cm2": round(float(areas[k]) * row_mm * col_mm / 100, 2),
+                "width_mm": round(width(k) * col_mm, 1),
+                "height_mm": round(height(k) * row_mm, 1),
+            }
+            if present[k]
+            else None
+        )
+    lungs["symmetry"] = None
+    if present[_LEFT_LUNG] and present[_RIGHT_LUNG]:
+        left, right = lungs["Left Lung"], lungs["Right Lung"]
+        lung_areas = areas[[_LEFT_LUNG, _RIGHT_LUNG]]
+        lungs["symmetry"] = {
+            "area_ratio_right_to_left": round(float(areas[_RIGHT_LUNG] / areas[_LEFT_LUNG]), 4),
+            "area_symmetry": round(float(lung_areas.min() / lung_areas.max()), 4),
+            "height_difference_mm": round(right["height_mm"] - left["height_mm"], 1),
+        }
+
+    # Diaphragm: top of the mask on each side of the midline between the lung centroids
+    diaphragm = None
+    if present[_DIAPHRAGM] and present[_LEFT_LUNG] and present[_RIGHT_LUNG]:
+        left_x, right_x = (
+            float(col_area[k] * cols.count @ col_centers / areas[k])
+            for k in (_LEFT_LUNG, _RIGHT_LUNG)
+        )
+        midline = (left_x + right_x) / 2
+        on_left = (col_centers < midline) == (left_x < midline)
+        covered = in_col[_DIAPHRAGM]
+        tops = {
+            side: int(y_start[_DIAPHRAGM][columns].min()) if columns.any() else None
+            for side, columns in (("left", covered & on_left), ("right", covered & ~on_left))
+        }
+        if tops["left"] is not None and tops["right"] is not None:
+            # Image rows grow downwards
+            higher = {-1: "left", 0: None, 1: "right"}[int(np.sign(tops["left"] - tops["right"]))]
+            diaphragm = {
+                "left_dome_y": tops["left"],
+                "right_dome_y": tops["right"],
+                "dome_height_difference_mm": round(abs(tops["left"] - tops["right"]) * row_mm, 1),
+                "higher_side": higher,
+            }
+
+    return {
+        "cardiothoracic_ratio": round(ctr, 4) if ctr is not None else None,
+        "cardiac_width_mm": round(cardiac_width * col_mm, 1) if cardiac_width else None,
+        "thoracic_width_mm": round(thoracic_width * col_mm, 1) if thoracic_width else None,
+        "cardiomegaly_suggested": ctr > CTR_THRESHOLD if ctr is not None else None,
+        "lungs": lungs,
+        "mediastinal_width_mm": (
+            round(widest_row(_MEDIASTINUM) * col_mm, 1) if present[_MEDIASTINUM] else None
+        ),
+        "diaphragm": diaphragm,
+        "pixel_spacing_mm": [row_mm, col_mm],
+        "pixel_spacing_assumed": pixel_spacing is None,
+    }
@@ -0,0 +1,96 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class PrefetchJob:
+    """
+    Handle to a set of analyses started speculatively for one image.
+
+    Attributes:
+    futures (Dict[str, Future]): Pending or finished analyses by name.
+    """
+
+    def __init__(self, futures: Dict[str, Future]):
+        self.futures = futures
+
+    def cancel(self) -> None:
+        """
+        Cancel analyses that have not started yet.
+
+        Analyses already running cannot be interrupted; they finish in the background.
+        """
+        for future in self.futures.values():
+            future.cancel()
+
+    def result(self, name: str, timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        Get the result of a prefetched analysis.
+
+        Waits for an analysis that is already running. An analysis that is still
+        queued is cancelled instead, so the caller can run it right away.
+
+        Args:
+        name (str): Name of the analysis.
+        timeout (float, optional): Maximum time to wait in seconds. Defaults to None.
+
+        Returns:
+        Optional[Any]: The result, or None if the analysis was not prefetched, was
+            cancelled, failed or timed out.
+        """
+        future = self.futures.get(name)
+        if future is None or future.cancel():
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception:  # cancelled, failed or timed out
+            return None
+
+    def done(self) -> bool:
+        """Check whether all analyses finished or were cancelled."""
+        return all(future.done() for future in self.futures.values())
+
+
+class Prefetcher:
+    """
+    Runs analyses in the background before anyone asked for them.
+
+    Used to start cheap models as soon as an image is uploaded, so their results are
+    ready when the first question arrives.
+
+    Attributes:
+    max_workers (int): Maximum number of analyses running at the same time.
+    """
+
+    def __init__(self, max_workers: int = 1):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def submit(self, tasks: Dict[str, Callable[[], Any]]) -> PrefetchJob:
+        """
+        Start analyses in the background.
+
+        Args:
+        tasks (Dict[str, Callable[[], Any]]): Analyses to run, by name.
+
+        Returns:
+        PrefetchJob: Handle to wait for or cancel the analyses.
+        """
+        executor = self._get_executor()
+        return PrefetchJob({name: executor.submit(task) for name, task in tasks.items()})
+
+    def shutdown(self) -> None:
+        """Cancel queued analyses and stop the worker threads."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="medrax-prefetch"
+                )
+            return self._executor
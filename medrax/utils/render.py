@@ -0,0 +1,432 @@
+import io
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from medrax.utils.organ_metrics import align_masks
+
+RENDER_BACKENDS = ("pil", "matplotlib")
+IMAGE_FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+
+Box = Tuple[float, float, float, float]
+
+
+@dataclass
+class RenderOptions:
+    """
+    Output settings of segmentation and grounding visualizations.
+
+    Attributes:
+    backend (str): "pil" composites with NumPy and PIL; "matplotlib" draws the figure
+        the tools used before. Defaults to "pil".
+    max_size (Optional[int]): Longer side of the output in pixels; None keeps the
+        original resolution. Ignored by the matplotlib backend. Defaults to 1024.
+    image_format (str): "png", "jpeg" or "webp". Defaults to "png".
+    quality (int): JPEG/WebP quality (1-95). Defaults to 90.
+    png_compress_level (int): zlib level of PNG output (0-9); low levels encode
+        much faster for slightly larger files. Defaults to 1.
+    alpha (float): Opacity of mask fills. Defaults to 0.3.
+    contour_width (int): Width of mask contours in output pixels; 0 disables them.
+        Defaults to 2.
+    line_width (int): Width of bounding box outlines in output pixels. Defaults to 3.
+    font_size (Optional[int]): Label font size; None scales it with the output. Defaults to None.
+    dpi (int): Resolution of the matplotlib backend. Defaults to 150.
+    """
+
+    backend: str = "pil"
+    max_size: Optional[int] = 1024
+    image_format: str = "png"
+    quality: int = 90
+    png_compress_level: int = 1
+    alpha: float = 0.3
+    contour_width: int = 2
+    line_width: int = 3
+    font_size: Optional[int] = None
+    dpi: int = 150
+
+    def __post_init__(self):
+        if self.backend not in RENDER_BACKENDS:
+            raise ValueError(
+                f"Unsupported render backend: {self.backend}. Supported: {list(RENDER_BACKENDS)}"
+            )
+        if self.image_format not in IMAGE_FORMATS:
+            raise ValueError(
+                f"Unsupported image format: {self.image_format}. Supported: {list(IMAGE_FORMATS)}"
+            )
+
+    @property
+    def extension(self) -> str:
+        """File extension of the encoded output, e.g. ".png"."""
+        return ".jpg" if self.image_format == "jpeg" else f".{self.image_format}"
+
+
+def rainbow(count: int) -> np.ndarray:
+    """
+    Get evenly spaced colors of matplotlib's "rainbow" colormap without importing matplotlib.
+
+    Args:
+    count (int): Number of colors.
+
+    Returns:
+    np.ndarray: uint8 array of shape (count, 3).
+    """
+    x = np.linspace(0, 1, count)
+    rgb = np.stack([np.abs(2 * x - 0.5), np.sin(np.pi * x), np.cos(np.pi * x / 2)], axis=-1)
+    return np.round(np.clip(rgb, 0, 1) * 255).astype(np.uint8)
+
+
+def output_shape(shape: Tuple[int, int], max_size: Optional[int]) -> Tuple[int, int]:
+    """Shrink (H, W) so the longer side is at most max_size, keeping the aspect ratio."""
+    height, width = shape[:2]
+    if not max_size or max(height, width) <= max_size:
+        return height, width
+    scale = max_size / max(height, width)
+    return max(1, round(height * scale)), max(1, round(width * scale))
+
+
+def to_rgb(image: np.ndarray, shape: Optional[Tuple[int, int]] = None) -> np.ndarray:
+    """
+    Convert a grayscale or RGB image to uint8 RGB, optionally resized.
+
+    Grayscale images are stretched to their min-max range, like imshow with cmap="gray".
+
+    Args:
+    image (np.ndarray): Image of shape (H, W) or (H, W, 3), any dtype.
+    shape (Optional[Tuple[int, int]]): Output (H, W). Defaults to the input size.
+
+    Returns:
+    np.ndarray: Writable uint8 array of shape (H', W', 3).
+    """
+    image = np.asarray(image)
+    if image.ndim == 2:
+        # Resize first, then stretch the smaller image with the range of the full one
+        low, high = float(image.min()), float(image.max())
+        img = Image.fromarray(image if image.dtype == np.uint8 else image.astype(np.float32))
+    else:
+        img = Image.fromarray(np.ascontiguousarray(image[..., :3], dtype=np.uint8))
+    if shape is not None and img.size != (shape[1], shape[0]):
+        img = img.resize((shape[1], shape[0]), Image.BILINEAR, reducing_gap=2.0)
+    if image.ndim == 3:
+        return np.array(img.convert("RGB"))
+
+    scale = 255.0 / (high - low) if high > low else 0.0
+    gray = ((np.asarray(img, dtype=np.float32) - low) * scale).round().astype(np.uint8)
+    return np.repeat(gray[:, :, None], 3, axis=2)
+
+
+def _contour(mask: np.ndarray, width: int) -> np.ndarray:
+    """Pixels of a mask within width pixels of its boundary."""
+    inner = mask.copy()
+    for _ in range(width):
+        eroded = inner.copy()
+        eroded[1:] &= inner[:-1]
+        eroded[:-1] &= inner[1:]
+        eroded[:, 1:] &= inner[:, :-1]
+        eroded[:, :-1] &= inner[:, 1:]
+        inner = eroded
+    return mask & ~inner
+
+
+def _font(options: RenderOptions, shape: Tuple[int, int]) -> ImageFont.ImageFont:
+    size = options.font_size or max(10, round(max(shape) / 64))
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has a single bitmap font
+        return ImageFont.load_default()
+
+
+def _draw_label(
+    draw: ImageDraw.ImageDraw,
+    xy: Tuple[float, float],
+    text: str,
+    color: Tuple[int, ...],
+    font: ImageFont.ImageFont,
+    anchor: str = "mm",
+) -> Tuple[int, int, int, int]:
+    """Draw text on a translucent white box and return the box."""
+    left, top, right, bottom = draw.textbbox(xy, text, font=font, anchor=anchor)
+    pad = max(2, (bottom - top) // 4)
+    box = (left - pad, top - pad, right + pad, bottom + pad)
+    draw.rounded_rectangle(box, radius=pad, fill=(255, 255, 255, 180))
+    draw.text(xy, text, fill=tuple(color), font=font, anchor=anchor)
+    return box
+
+
+def _annotate(
+    rgb: np.ndarray,
+    options: RenderOptions,
+    labels: Sequence[Tuple[Tuple[float, float], str, Tuple[int, ...]]] = (),
+    legend: Sequence[Tuple[str, Tuple[int, ...]]] = (),
+    title: Optional[str] = None,
+) -> np.ndarray:
+    """Draw point labels, a legend and a title onto an RGB image."""
+    if not (labels or legend or title):
+        return rgb
+    img = Image.fromarray(rgb)
+    layer = Image.new("RGBA", img.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(layer)
+    font = _font(options, rgb.shape[:2])
+    margin = max(4, rgb.shape[1] // 100)
+
+    top = margin
+    if title:
+        top = _draw_label(draw, (margin, margin), title, (0, 0, 0), font, anchor="lt")[3] + margin
+    for name, color in legend:
+        box = _draw_label(draw, (margin, top), name, color, font, anchor="lt")
+        top = box[3] + margin // 2
+    for xy, name, color in labels:
+        _draw_label(draw, xy, name, color, font)
+
+    return np.array(Image.alpha_composite(img.convert("RGBA"), layer).convert("RGB"))
+
+
+def overlay_masks(
+    image: np.ndarray,
+    masks: np.ndarray,
+    names: Sequence[str],
+    options: Optional[RenderOptions] = None,
+    centroids: Optional[Dict[str, Tuple[float, float]]] = None,
+    legend: bool = False,
+    title: Optional[str] = None,
+) -> np.ndarray:
+    """
+    Composite model-space segmentation masks onto an X-ray.
+
+    Masks are aligned once, directly at the output resolution (see align_masks), and
+    blended in place, each with its own rainbow color, fill opacity and contour.
+
+    Args:
+    image (np.ndarray): Original grayscale image of shape (H, W).
+    masks (np.ndarray): Boolean masks of shape (K, h, w) in model space.
+    names (Sequence[str]): Name of each mask.
+    options (Optional[RenderOptions]): Output settings. Defaults to RenderOptions().
+    centroids (Optional[Dict[str, Tuple[float, float]]]): (y, x) image coordinates to
+        label each mask at; masks without an entry are not labelled.
+    legend (bool): Whether to list the non-empty masks in the top-left corner.
+    title (Optional[str]): Caption drawn above the legend.
+
+    Returns:
+    np.ndarray: uint8 RGB array of shape (H', W', 3), H' and W' bounded by options.max_size.
+    """
+    options = options or RenderOptions()
+    shape = output_shape(image.shape, options.max_size)
+    rgb = to_rgb(image, shape)
+    packed = align_masks(masks, image.shape, shape)
+    colors = rainbow(len(names))
+    scale = shape[0] / image.shape[0]
+
+    # Few distinct organ combinations occur, so blend each combination once and look it up
+    values, inverse = np.unique(packed, return_inverse=True)
+    present = (values[:, None] >> np.arange(len(names), dtype=values.dtype)) & 1 > 0
+    keep = np.ones(len(values), dtype=np.float32)
+    tint = np.zeros((len(values), 3), dtype=np.float32)
+    for bit, color in enumerate(colors):
+        rows = present[:, bit]
+        tint[rows] = tint[rows] * (1 - options.alpha) + color * options.alpha
+        keep[rows] *= 1 - options.alpha
+    inverse = inverse.reshape(packed.shape)
+    rgb = np.round(rgb * keep[inverse][:, :, None] + tint[inverse]).astype(np.uint8)
+
+    labels, entries = [], []
+    for bit in np.flatnonzero(present.any(axis=0)):
+        name, color = names[bit], colors[bit]
+        if options.contour_width:
+            rgb[_contour((packed >> bit) & 1 > 0, options.contour_width)] = color
+        entries.append((name, tuple(int(c) for c in color)))
+        if centroids and name in centroids:
+            cy, cx = centroids[name]
+            labels.append(((cx * scale, cy * scale), name, entries[-1][1]))
+
+    return _annotate(rgb, options, labels, entries if legend else (), title)
+
+
+def overlay_boxes(
+    image: np.ndarray,
+    boxes: Sequence[Box],
+    options: Optional[RenderOptions] = None,
+    color: Tuple[int, int, int] = (255, 0, 0),
+    title: Optional[str] = None,
+) -> np.ndarray:
+    """
+    Draw bounding boxes onto an X-ray.
+
+    Args:
+    image (np.ndarray): Grayscale (H, W) or RGB (H, W, 3) image.
+    boxes (Sequence[Box]): (x1, y1, x2, y2) boxes relative to the image size (0-1).
+    options (Optional[RenderOptions]): Output settings. Defaults to RenderOptions().
+    color (Tuple[int, int, int]): Outline color. Defaults to red.
+    title (Optional[str]): Caption drawn in the top-left corner.
+
+    Returns:
+    np.ndarray: uint8 RGB array of shape (H', W', 3), H' and W' bounded by options.max_size.
+    """
+    options = options or RenderOptions()
+    shape = output_shape(image.shape, options.max_size)
+    img = Image.fromarray(to_rgb(image, shape))
+    draw = ImageDraw.Draw(img)
+    height, width = shape
+    for x1, y1, x2, y2 in boxes:
+        draw.rectangle(
+            (x1 * width, y1 * height, x2 * width, y2 * height),
+            outline=color,
+            width=options.line_width,
+        )
+    return _annotate(np.array(img), options, title=title)
+
+
+def encode_image(rgb: np.ndarray, options: Optional[RenderOptions] = None) -> bytes:
+    """
+    Encode an RGB array with the format and encoder settings of options.
+
+    Args:
+    rgb (np.ndarray): uint8 array of shape (H, W, 3).
+    options (Optional[RenderOptions]): Output settings. Defaults to RenderOptions().
+
+    Returns:
+    bytes: Encoded image.
+    """
+    options = options or RenderOptions()
+    buffer = io.BytesIO()
+    params = (
+        {"compress_level": options.png_compress_level}
+        if options.image_format == "png"
+        else {"quality": options.quality}
+    )
+    Image.fromarray(rgb).save(buffer, format=IMAGE_FORMATS[options.image_format], **params)
+    return buffer.getvalue()
+
+
+def _figure_bytes(fig, options: RenderOptions) -> bytes:
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    fig.savefig(
+        buffer,
+        format=options.image_format,
+        bbox_inches="tight",
+        dpi=options.dpi,
+        pil_kwargs=None if options.image_format == "png" else {"quality": options.quality},
+    )
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def _matplotlib_masks(
+    image: np.ndarray,
+    masks: np.ndarray,
+    names: Sequence[str],
+    options: RenderOptions,
+    centroids: Optional[Dict[str, Tuple[float, float]]],
+    legend: bool,
+    title: Optional[str],
+) -> bytes:
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(10, 10))
+    extent = [0, image.shape[1], image.shape[0], 0]
+    ax.imshow(image, cmap="gray", extent=extent)
+
+    colors = rainbow(len(names)) / 255
+    packed = align_masks(masks, image.shape)
+    for bit, (name, color) in enumerate(zip(names, colors)):
+        mask = (packed >> bit) & 1 > 0
+        if not mask.any():
+            continue
+        overlay = np.zeros((*image.shape, 4))
+        overlay[mask] = (*color, options.alpha)
+        ax.imshow(overlay, extent=extent)
+        if legend:
+            ax.plot([], [], color=color, label=name, linewidth=3)
+        if centroids and name in centroids:
+            cy, cx = centroids[name]
+            ax.annotate(
+                name,
+                (cx, cy),
+                color=color,
+                fontsize=8,
+                ha="center",
+                bbox=dict(boxstyle="round,pad=0.3", fc="white", alpha=0.7),
+            )
+
+    if title:
+        ax.set_title(title)
+    if legend:
+        ax.legend(bbox_to_anchor=(1.05, 1), loc="upper left")
+    ax.axis("off")
+    return _figure_bytes(fig, options)
+
+
+def _matplotlib_boxes(
+    image: np.ndarray,
+    boxes: Sequence[Box],
+    options: RenderOptions,
+    color: Tuple[int, int, int],
+    title: Optional[str],
+) -> bytes:
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(12, 12))
+    ax.imshow(image, cmap="gray")
+    height, width = image.shape[:2]
+    for x1, y1, x2, y2 in boxes:
+        ax.add_patch(
+            plt.Rectangle(
+                (x1 * width, y1 * height),
+                (x2 - x1) * width,
+                (y2 - y1) * height,
+                fill=False,
+                color=np.asarray(color) / 255,
+                linewidth=2,
+            )
+        )
+    if title:
+        ax.set_title(title, pad=20)
+    ax.axis("off")
+    return _figure_bytes(fig, options)
+
+
+def render_masks(
+    image: np.ndarray,
+    masks: np.ndarray,
+    names: Sequence[str],
+    options: Optional[RenderOptions] = None,
+    centroids: Optional[Dict[str, Tuple[float, float]]] = None,
+    legend: bool = False,
+    title: Optional[str] = None,
+) -> bytes:
+    """
+    Render and encode a segmentation overlay with the backend of options.
+
+    Takes the same arguments as overlay_masks.
+
+    Returns:
+    bytes: Encoded image in options.image_format.
+    """
+    options = options or RenderOptions()
+    if options.backend == "matplotlib":
+        return _matplotlib_masks(image, masks, names, options, centroids, legend, title)
+    rgb = overlay_masks(image, masks, names, options, centroids, legend, title)
+    return encode_image(rgb, options)
+
+
+def render_boxes(
+    image: np.ndarray,
+    boxes: Sequence[Box],
+    options: Optional[RenderOptions] = None,
+    color: Tuple[int, int, int] = (255, 0, 0),
+    title: Optional[str] = None,
+) -> bytes:
+    """
+    Render and encode a bounding box overlay with the backend of options.
+
+    Takes the same arguments as overlay_boxes.
+
+    Returns:
+    bytes: Encoded image in options.image_format.
+    """
+    options = options or RenderOptions()
+    if options.backend == "matplotlib":
+        return _matplotlib_boxes(image, boxes, options, color, title)
+    return encode_image(overlay_boxes(image, boxes, options, color, title), options)
@@ -0,0 +1,237 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from medrax.utils.organ_metrics import align_masks
+
+MASK_FORMATS = ("rle", "npz")
+MASK_RESOLUTIONS = ("original", "model")
+
+Rle = Dict[str, Any]
+
+
+def _counts_to_string(counts: Sequence[int]) -> str:
+    """Compress run lengths into the COCO RLE string (LEB128-like, 5 bits per char)."""
+    chars = []
+    for i, count in enumerate(counts):
+        x = int(count) - (int(counts[i - 2]) if i > 2 else 0)
+        more = True
+        while more:
+            c = x & 0x1F
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            chars.append(chr(c + 48))
+    return "".join(chars)
+
+
+def _string_to_counts(string: str) -> List[int]:
+    """Inverse of _counts_to_string."""
+    counts: List[int] = []
+    p = 0
+    while p < len(string):
+        x = k = 0
+        more = True
+        while more:
+            c = ord(string[p]) - 48
+            x |= (c & 0x1F) << (5 * k)
+            more = bool(c & 0x20)
+            p += 1
+            k += 1
+            if not more and c & 0x10:
+                x |= -1 << (5 * k)
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return counts
+
+
+def _runs(boundaries: np.ndarray, size: int) -> List[int]:
+    """Run lengths of a column-major mask from the flat indices where its value changes."""
+    edges = np.concatenate(([0], boundaries, [size]))
+    return np.diff(edges).tolist()
+
+
+def encode_masks(packed: np.ndarray, count: int, compress: bool = True) -> List[Rle]:
+    """
+    Encode every mask of a bit-packed mask image as COCO run-length encoding.
+
+    Runs are taken in column-major order and start with a (possibly empty) run of
+    zeros, as in pycocotools; compressed counts are the same string pycocotools
+    produces. The image is scanned once for all masks.
+
+    Args:
+    packed (np.ndarray): Bit-packed image of shape (H, W) from align_masks; bit k is mask k.
+    count (int): Number of masks packed into the image.
+    compress (bool, optional): Whether counts are the compact COCO string instead of a
+        list of ints. Defaults to True.
+
+    Returns:
+    List[Rle]: One {"size": [H, W], "counts": ...} dict per mask.
+    """
+    height, width = packed.shape
+    flat = np.asarray(packed).T.ravel()
+    size = flat.size
+    # Flat index of every pixel that differs from the previous one, and which bits flip there
+    changed = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    flips = flat[changed] ^ flat[changed - 1]
+    first = flat[0] if size else 0
+
+    rles = []
+    for bit in range(count):
+        boundaries = changed[(flips >> bit) & 1 > 0]
+        if size and (first >> bit) & 1:
+            # Counts start with the zero run, which is empty here
+            boundaries = np.concatenate(([0], boundaries))
+        counts = _runs(boundaries, size)
+        rles.append(
+            {
+                "size": [height, width],
+                "counts": _counts_to_string(counts) if compress else counts,
+            }
+        )
+    return rles
+
+
+def encode_mask(mask: np.ndarray, compress: bool = True) -> Rle:
+    """
+    Encode one binary mask as COCO run-length encoding.
+
+    Args:
+    mask (np.ndarray): Mask of shape (H, W); nonzero pixels are foreground.
+    compress (bool, optional): Whether counts are the compact COCO string. Defaults to True.
+
+    Returns:
+    Rle: {"size": [H, W], "counts": ...}.
+    """
+    return encode_masks((np.asarray(mask) != 0).astype(np.uint8), 1, compress)[0]
+
+
+def decode_mask(rle: Rle) -> np.ndarray:
+    """
+    Decode a COCO run-length encoding to a boolean mask.
+
+    Args:
+    rle (Rle): {"size": [H, W], "counts": str or list of ints}.
+
+    Returns:
+    np.ndarray: Boolean mask of shape (H, W).
+    """
+    height, width = rle["size"]
+    counts = rle["counts"]
+    if isinstance(counts, (str, bytes)):
+        counts = _string_to_counts(counts.decode() if isinstance(counts, bytes) else counts)
+    values = np.arange(len(counts)) % 2 == 1
+    flat = np.repeat(values, counts)
+    if flat.size != height * width:
+        raise ValueError(f"RLE counts cover {flat.size} pixels, expected {height * width}")
+    return flat.reshape(width, height).T
+
+
+def mask_area(rle: Rle) -> int:
+    """
+    Count the foreground pixels of a COCO run-length encoding without decoding it.
+
+    Args:
+    rle (Rle): {"size": [H, W], "counts": str or list of ints}.
+
+    Returns:
+    int: Number of foreground pixels.
+    """
+    counts = rle["counts"]
+    if isinstance(counts, (str, bytes)):
+        counts = _string_to_counts(counts.decode() if isinstance(counts, bytes) else counts)
+    return int(sum(counts[1::2]))
+
+
+def save_masks_npz(
+    path: Union[str, Path], packed: np.ndarray, names: Sequence[str], **extra: Any
+) -> Path:
+    """
+    Write a bit-packed mask image and its mask names to a compressed .npz file.
+
+    Args:
+    path (Union[str, Path]): Output file.
+    packed (np.ndarray): Bit-packed image of shape (H, W) from align_masks; bit k is names[k].
+    names (Sequence[str]): Name of each mask.
+    **extra: Further arrays to store, e.g. pixel_spacing_mm.
+
+    Returns:
+    Path: The written file.
+    """
+    path = Path(path)
+    np.savez_compressed(path, packed=packed, names=np.array(list(names)), **extra)
+    return path
+
+
+def load_masks_npz(path: Union[str, Path]) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Read masks written by save_masks_npz.
+
+    Args:
+    path (Union[str, Path]): The .npz file.
+
+    Returns:
+    Tuple[Dict[str, np.ndarray], Dict[str, Any]]: Boolean (H, W) mask per name, and the
+        extra arrays stored with them.
+    """
+    with np.load(path) as data:
+        packed = data["packed"]
+        names = [str(name) for name in data["names"]]
+        extra = {key: data[key] for key in data.files if key not in ("packed", "names")}
+    masks = {name: (packed >> bit) & 1 > 0 for bit, name in enumerate(names)}
+    return masks, extra
+
+
+def export_masks(
+    masks: np.ndarray,
+    names: Sequence[str],
+    image_shape: Tuple[int, int],
+    mask_format: str = "rle",
+    resolution: str = "original",
+    npz_path: Optional[Union[str, Path]] = None,
+) -> Dict[str, Any]:
+    """
+    Package model-space segmentation masks for clients that measure them themselves.
+
+    At "original" resolution masks are aligned onto the image as in align_masks; at
+    "model" resolution they cover the center square crop the model saw.
+
+    Args:
+    masks (np.ndarray): Boolean masks of shape (K, h, w) in model space.
+    names (Sequence[str]): Name of each mask.
+    image_shape (Tuple[int, int]): (H, W) of the original image.
+    mask_format (str, optional): "rle" for COCO RLE per mask, "npz" for a bit-packed
+        .npz file. Defaults to "rle".
+    resolution (str, optional): "original" or "model". Defaults to "original".
+    npz_path (Optional[Union[str, Path]]): Where to write the "npz" format.
+
+    Returns:
+    Dict[str, Any]: format, resolution, size and image_size, plus "masks" (name to RLE)
+        for "rle" or "path" for "npz".
+    """
+    if mask_format not in MASK_FORMATS:
+        raise ValueError(f"Unsupported mask format: {mask_format}. Supported: {list(MASK_FORMATS)}")
+    if resolution not in MASK_RESOLUTIONS:
+        raise ValueError(
+            f"Unsupported mask resolution: {resolution}. Supported: {list(MASK_RESOLUTIONS)}"
+        )
+
+    shape = tuple(image_shape) if resolution == "original" else tuple(masks.shape[1:])
+    packed = align_masks(masks, shape)
+    payload: Dict[str, Any] = {
+        "format": mask_format,
+        "resolution": resolution,
+        "size": list(shape),
+        "image_size": list(image_shape),
+    }
+    if mask_format == "rle":
+        payload["masks"] = dict(zip(names, encode_masks(packed, len(names))))
+    else:
+        if npz_path is None:
+            raise ValueError("npz_path is required for the npz mask format")
+        path = save_masks_npz(npz_path, packed, names, image_size=np.array(image_shape))
+        payload["path"] = str(path)
+    return payload
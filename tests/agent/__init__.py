@@ -0,0 +1,3 @@
+"""
+Agent Tests Package
+"""
@@ -0,0 +1,280 @@
+"""
+Agent Tests - Tool execution and workflow behaviour
+
+These tests drive the agent with lightweight fake tools instead of the
+deep learning models.
+"""
+
+import asyncio
+import time
+from typing import Type
+
+from pydantic import BaseModel, Field
+from langchain_core.messages import AIMessage
+from langchain_core.tools import BaseTool
+
+
+class SleepInput(BaseModel):
+    """Input for the sleeping test tool."""
+
+    image_path: str = Field(..., description="Path to an image")
+
+
+class SleepTool(BaseTool):
+    """Tool that sleeps for a fixed time and echoes its input."""
+
+    name: str = "sleep_tool"
+    description: str = "Sleeps and echoes the image path."
+    args_schema: Type[BaseModel] = SleepInput
+    delay: float = 0.2
+
+    def _run(self, image_path: str, run_manager=None):
+        time.sleep(self.delay)
+        return {"name": self.name, "image_path": image_path}, {"analysis_status": "completed"}
+
+
+class FakeModel:
+    """Minimal stand-in for a chat model that supports bind_tools."""
+
+    def __init__(self, responses=None):
+        self.responses = list(responses or [])
+
+    def bind_tools(self, tools):
+        return self
+
+    def invoke(self, messages):
+        return self.responses.pop(0)
+
+    async def ainvoke(self, messages):
+        return self.responses.pop(0)
+
+
+def _make_agent(tmp_path, responses=None, **kwargs):
+    from medrax.agent import Agent
+
+    tools = [SleepTool(name="tool_a"), SleepTool(name="tool_b"), SleepTool(name="tool_c")]
+    return Agent(FakeModel(responses), tools=tools, log_dir=str(tmp_path), **kwargs)
+
+
+def _tool_call_state(*names):
+    calls = [
+        {"name": name, "args": {"image_path": f"{name}.png"}, "id": f"call_{i}"}
+        for i, name in enumerate(names)
+    ]
+    return {"messages": [AIMessage(content="", tool_calls=calls)]}
+
+
+class TestExecuteTools:
+    """Test tool execution inside the agent."""
+
+    def test_parallel_execution_keeps_order(self, tmp_path):
+        """Concurrent calls return messages in call order."""
+        agent = _make_agent(tmp_path, parallel_tools=True)
+
+        start = time.perf_counter()
+        result = agent.execute_tools(_tool_call_state("tool_a", "tool_b", "tool_c"))
+        elapsed = time.perf_counter() - start
+
+        messages = result["messages"]
+        assert [m.tool_call_id for m in messages] == ["call_0", "call_1", "call_2"]
+        assert [m.name for m in messages] == ["tool_a", "tool_b", "tool_c"]
+        assert elapsed < 0.5
+
+    def test_same_tool_calls_are_serialized(self, tmp_path):
+        """Two calls to one tool never overlap."""
+        agent = _make_agent(tmp_path, parallel_tools=True)
+
+        start = time.perf_counter()
+        agent.execute_tools(_tool_call_state("tool_a", "tool_a"))
+        elapsed = time.perf_counter() - start
+
+        assert elapsed >= 0.4
+
+    def test_reports_wall_time(self, tmp_path):
+        """Each tool message carries its wall time."""
+        agent = _make_agent(tmp_path)
+
+        result = agent.execute_tools(_tool_call_state("tool_a", "unknown_tool"))
+
+        durations = [m.response_metadata["duration_ms"] for m in result["messages"]]
+        assert durations[0] >= 200
+        assert result["messages"][1].content == "invalid tool, please retry"
+
+
+class TestAsyncAgent:
+    """Test the asynchronous workflow path."""
+
+    def test_aexecute_tools_runs_concurrently(self, tmp_path):
+        """Async tool calls are gathered and keep call order."""
+        agent = _make_agent(tmp_path, parallel_tools=True)
+
+        start = time.perf_counter()
+        result = asyncio.run(agent.aexecute_tools(_tool_call_state("tool_a", "tool_b", "tool_c")))
+        elapsed = time.perf_counter() - start
+
+        assert [m.tool_call_id for m in result["messages"]] == ["call_0", "call_1", "call_2"]
+        assert elapsed < 0.5
+
+    def test_astream_runs_full_turn(self, tmp_path):
+        """astream drives process -> execute -> process without the sync API."""
+        from langgraph.checkpoint.memory import MemorySaver
+
+        responses = [
+            _tool_call_state("tool_a")["messages"][0],
+            AIMessage(content="done"),
+        ]
+        agent = _make_agent(tmp_path, responses=responses, checkpointer=MemorySaver())
+
+        async def collect():
+            return [event async for event in agent.astream([], thread_id="t1")]
+
+        events = asyncio.run(collect())
+
+        assert [next(iter(event)) for event in events] == ["process", "execute", "process"]
+        assert events[-1]["process"]["messages"][-1].content == "done"
+
+
+class TestToolCallLog:
+    """Test the background tool call log writer."""
+
+    def test_records_are_appended_as_jsonl(self, tmp_path):
+        """Steps in the same second append instead of overwriting."""
+        from medrax.agent import iter_tool_call_logs
+
+        agent = _make_agent(tmp_path)
+        agent.execute_tools(_tool_call_state("tool_a"))
+        agent.execute_tools(_tool_call_state("tool_b"))
+        agent.log_writer.flush()
+
+        records = list(iter_tool_call_logs(tmp_path))
+        assert [r["name"] for r in records] == ["tool_a", "tool_b"]
+        assert records[0]["duration_ms"] >= 200
+
+    def test_large_content_stored_out_of_line(self, tmp_path):
+        """Large payloads go to a compressed blob and are restored on read."""
+        import json
+        from medrax.agent import ToolCallLogWriter, iter_tool_call_logs
+
+        writer = ToolCallLogWriter(tmp_path, inline_content_limit=100)
+        writer.write({"name": "viz", "content": "x" * 1000})
+        writer.close()
+
+        raw = json.loads((tmp_path / "tool_calls.jsonl").read_text())
+        assert "content" not in raw and raw["content_bytes"] == 1000
+        assert next(iter_tool_call_logs(tmp_path))["content"] == "x" * 1000
+
+    def test_large_artifact_stored_out_of_line(self, tmp_path):
+        """Raw artifacts are serialized by the writer and moved to a blob like content."""
+        import json
+
+        import numpy as np
+
+        from medrax.agent import ToolCallLogWriter, iter_tool_call_logs
+
+        artifact = ({"masks": np.zeros((2, 100), dtype=np.uint8)}, {"bbox": (1, 2, 3, 4)})
+        writer = ToolCallLogWriter(tmp_path, inline_content_limit=100)
+        writer.write({"name": "seg", "content": "{}", "artifact": artifact})
+        writer.close()
+
+        raw = json.loads((tmp_path / "tool_calls.jsonl").read_text())
+        assert "artifact" not in raw and raw["artifact_ref"].startswith("blobs/")
+        restored = json.loads(next(iter_tool_call_logs(tmp_path))["artifact"])
+        assert restored == [{"masks": [[0] * 100] * 2}, {"bbox": [1, 2, 3, 4]}]
+
+    def test_agent_serializes_artifacts_off_the_request_thread(self, tmp_path, monkeypatch):
+        """The agent queues raw artifacts; the writer thread serializes them."""
+        import threading
+
+        import medrax.agent.tool_log as tool_log
+
+        threads = []
+        serialize = tool_log.tool_result_log
+        monkeypatch.setattr(
+            tool_log,
+            "tool_result_log",
+            lambda artifact: threads.append(threading.current_thread().name) or serialize(artifact),
+        )
+        agent = _make_agent(tmp_path)
+
+        agent.execute_tools(_tool_call_state("tool_a"))
+        agent.log_writer.flush()
+
+        assert threads == ["medrax-tool-log"]
+
+    def test_size_based_rotation(self, tmp_path):
+        """The active file is rotated once it exceeds max_bytes."""
+        from medrax.agent import ToolCallLogWriter, iter_tool_call_logs
+
+        writer = ToolCallLogWriter(tmp_path, max_bytes=10, batch_size=1)
+        for i in range(3):
+            writer.write({"name": f"tool_{i}", "content": "result"})
+            writer.flush()
+        writer.close()
+
+        assert len(list(tmp_path.glob("tool_calls_*.jsonl"))) == 2
+        assert [r["name"] for r in iter_tool_call_logs(tmp_path)] == ["tool_0", "tool_1", "tool_2"]
+
+
+class TestToolArtifacts:
+    """Test the split between LLM content and UI artifact."""
+
+    def test_llm_gets_json_summary_ui_gets_artifact(self, tmp_path):
+        import json
+
+        import numpy as np
+
+        from medrax.agent.artifacts import tool_result_content
+
+        result = (
+            {"Effusion": np.float32(0.123456), "segmentation_image_path": "temp/viz.png"},
+            {"image_path": "a.png", "analysis_status": "completed", "error_traceback": "..."},
+        )
+
+        summary = json.loads(tool_result_content(result))
+
+        assert summary == {
+            "output": {"Effusion": 0.1235},
+            "metadata": {"image_path": "a.png", "analysis_status": "completed"},
+        }
+
+    def test_long_summaries_stay_valid_json(self):
+        """Summaries over the limit are shortened structurally, not cut mid-JSON."""
+        import json
+
+        from medrax.agent.artifacts import tool_result_content
+
+        output = {"report": "x" * 5000, "scores": {f"organ_{i}": 0.5 for i in range(500)}}
+        content = tool_result_content((output, {"ids": list(range(2000))}), max_chars=1000)
+
+        summary = json.loads(content)
+        assert len(content) <= 1000
+        assert summary["output"]["report"].endswith("characters]")
+        assert summary["metadata"]["ids"][0] == 0
+
+    def test_tool_message_carries_artifact(self, tmp_path):
+        import json
+
+        agent = _make_agent(tmp_path)
+
+        message = agent.execute_tools(_tool_call_state("tool_a"))["messages"][0]
+
+        assert message.artifact == (
+            {"name": "tool_a", "image_path": "tool_a.png"},
+            {"analysis_status": "completed"},
+        )
+        assert json.loads(message.content)["output"]["image_path"] == "tool_a.png"
+
+    def test_artifact_survives_checkpoint_serializer(self):
+        import numpy as np
+        from langchain_core.messages import ToolMessage
+        from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+        from medrax.agent.artifacts import tool_result_artifact
+
+        artifact = tool_result_artifact(({"Effusion": np.float32(0.5)}, {"shape": (2, 2)}))
+        message = ToolMessage(content="x", tool_call_id="1", artifact=artifact)
+        serde = JsonPlusSerializer()
+
+        restored = serde.loads_typed(serde.dumps_typed({"messages": [message]}))
+
+        assert restored["messages"][0].artifact[0] == {"Effusion": 0.5}
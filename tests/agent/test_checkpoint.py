@@ -0,0 +1,133 @@
+"""
+Checkpoint Tests - Bounded SQLite checkpointer
+"""
+
+import asyncio
+import base64
+import os
+import time
+
+import pytest
+import numpy as np
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+pytest.importorskip("langgraph.checkpoint.sqlite")
+
+from medrax.agent.checkpoint import BoundedSqliteSaver  # noqa: E402
+from tests.agent.test_agent import _make_agent  # noqa: E402
+
+
+def _image_message():
+    data = base64.b64encode(os.urandom(300_000)).decode("utf-8")
+    return HumanMessage(
+        content=[{"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{data}"}}]
+    )
+
+
+def _run_turn(agent, thread_id, messages):
+    config = {"configurable": {"thread_id": thread_id}}
+    return agent.workflow.invoke({"messages": messages}, config)
+
+
+@pytest.fixture
+def saver(tmp_path):
+    saver = BoundedSqliteSaver(tmp_path / "checkpoints.sqlite", maintenance_interval_s=None)
+    yield saver
+    saver.close()
+
+
+class TestBoundedSqliteSaver:
+    """Test persistence and eviction of conversation threads."""
+
+    def test_state_survives_reopen(self, tmp_path):
+        path = tmp_path / "checkpoints.sqlite"
+        image = _image_message()
+        saver = BoundedSqliteSaver(path, maintenance_interval_s=None)
+        agent = _make_agent(tmp_path, [AIMessage(content="a")], checkpointer=saver)
+        _run_turn(agent, "t1", [HumanMessage(content="hi"), image])
+        saver.close()
+
+        reopened = BoundedSqliteSaver(path, maintenance_interval_s=None)
+        state = reopened.get_tuple({"configurable": {"thread_id": "t1"}})
+        messages = state.checkpoint["channel_values"]["messages"]
+        reopened.close()
+
+        assert [m.content for m in messages][-1] == "a"
+        assert messages[1].content == image.content
+
+    def test_large_content_stored_once(self, tmp_path, saver):
+        image = _image_message()
+        agent = _make_agent(
+            tmp_path, [AIMessage(content=str(i)) for i in range(3)], checkpointer=saver
+        )
+        _run_turn(agent, "t1", [image])
+        _run_turn(agent, "t1", [HumanMessage(content="again")])
+        _run_turn(agent, "t1", [HumanMessage(content="and again")])
+
+        stats = saver.stats()
+        assert stats["blobs"] == 1
+        assert stats["db_bytes"] < 2 * len(image.content[0]["image_url"]["url"])
+
+    def test_large_artifacts_stored_once(self, tmp_path, saver):
+        masks = np.random.default_rng(0).integers(0, 2, (14, 128, 128), dtype=np.uint8)
+        artifact = (
+            {"metrics": {f"organ_{i}": {"area": i * 1.5} for i in range(14)}},
+            {"masks": masks},
+        )
+        call = {"name": "tool_a", "args": {"image_path": "a.png"}, "id": "call_0"}
+        history = [
+            AIMessage(content="", tool_calls=[call]),
+            ToolMessage(content="{}", tool_call_id="call_0", name="tool_a", artifact=artifact),
+        ]
+        agent = _make_agent(
+            tmp_path, [AIMessage(content=str(i)) for i in range(3)], checkpointer=saver
+        )
+        _run_turn(agent, "t1", [HumanMessage(content="hi"), *history])
+        _run_turn(agent, "t1", [HumanMessage(content="again")])
+        _run_turn(agent, "t1", [HumanMessage(content="and again")])
+
+        assert saver.stats()["blobs"] == 1
+        assert saver.stats()["db_bytes"] < 2 * masks.nbytes
+        state = saver.get_tuple({"configurable": {"thread_id": "t1"}})
+        restored = state.checkpoint["channel_values"]["messages"][2].artifact
+        assert restored[0] == artifact[0]
+        assert np.array_equal(restored[1]["masks"], masks)
+
+    def test_max_threads_evicts_least_recently_used(self, tmp_path):
+        saver = BoundedSqliteSaver(
+            tmp_path / "checkpoints.sqlite", max_threads=2, maintenance_interval_s=None
+        )
+        agent = _make_agent(
+            tmp_path, [AIMessage(content=str(i)) for i in range(3)], checkpointer=saver
+        )
+        for thread_id in ("t1", "t2", "t3"):
+            _run_turn(agent, thread_id, [HumanMessage(content="hi")])
+
+        assert saver.get_tuple({"configurable": {"thread_id": "t1"}}) is None
+        assert saver.get_tuple({"configurable": {"thread_id": "t3"}}) is not None
+        assert saver.stats()["threads"] == 2
+        saver.close()
+
+    def test_maintenance_evicts_idle_threads_and_content(self, tmp_path, saver):
+        saver.thread_ttl_s = 0.05
+        agent = _make_agent(tmp_path, [AIMessage(content="a")], checkpointer=saver)
+        _run_turn(agent, "t1", [_image_message()])
+        time.sleep(0.1)
+
+        saver.blobs.conn.execute("UPDATE blobs SET created_at = 0")
+        saver.blobs.conn.commit()
+        result = saver.run_maintenance()
+
+        assert result == {"evicted_threads": 1, "deleted_blobs": 1}
+        assert saver.stats()["threads"] == 0
+
+    def test_async_api(self, tmp_path, saver):
+        agent = _make_agent(tmp_path, [AIMessage(content="a")], checkpointer=saver)
+
+        async def collect():
+            return [e async for e in agent.astream([HumanMessage(content="hi")], "t1")]
+
+        events = asyncio.run(collect())
+
+        assert events[-1]["process"]["messages"][-1].content == "a"
+        assert saver.get_tuple({"configurable": {"thread_id": "t1"}}) is not None
@@ -0,0 +1,166 @@
+"""
+Compaction Tests - Token-budgeted conversation history
+"""
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from medrax.agent.compaction import (
+    CARRIED_IMAGES_TEXT,
+    IMAGE_PATH_PREFIX,
+    IMAGE_PLACEHOLDER,
+    approximate_token_count,
+    compact_messages,
+)
+
+
+def _image_message(data="AAAA"):
+    return HumanMessage(
+        content=[{"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{data}"}}]
+    )
+
+
+def _turn(i, tool_content="x" * 8000, image="AAAA"):
+    call = {"name": "tool_a", "args": {"image_path": "a.png"}, "id": f"call_{i}"}
+    return [
+        HumanMessage(content=f"question {i}"),
+        _image_message(image),
+        AIMessage(content="", tool_calls=[call]),
+        ToolMessage(content=tool_content, tool_call_id=f"call_{i}", name="tool_a"),
+        AIMessage(content=f"answer {i}"),
+    ]
+
+
+def _assert_tool_calls_paired(messages):
+    call_ids = {c["id"] for m in messages if isinstance(m, AIMessage) for c in m.tool_calls}
+    result_ids = {m.tool_call_id for m in messages if isinstance(m, ToolMessage)}
+    assert call_ids == result_ids
+
+
+class TestCompactMessages:
+    """Test compaction of the history sent to the LLM."""
+
+    def test_within_budget_is_unchanged(self):
+        """Histories that fit are returned as is."""
+        messages = _turn(0)
+        assert compact_messages(messages, 100_000, approximate_token_count) is messages
+
+    def test_old_images_replaced_first(self):
+        """Images of earlier turns become text references; the latest turn is kept."""
+        messages = _turn(0, tool_content="") + _turn(1, tool_content="")
+        budget = approximate_token_count(messages) - 500
+
+        compacted = compact_messages(messages, budget, approximate_token_count)
+
+        assert len(compacted) == len(messages)
+        assert compacted[1].content[0] == {"type": "text", "text": IMAGE_PLACEHOLDER}
+        assert compacted[6].content[0]["type"] == "image_url"
+        assert messages[1].content[0]["type"] == "image_url"
+
+    def test_last_copy_of_an_image_is_kept(self):
+        """An image sent only once is not replaced, since the LLM has no other copy."""
+        messages = _turn(0, image="AAAA") + _turn(1, tool_content="", image="BBBB")
+        budget = approximate_token_count(messages) - 500
+
+        compacted = compact_messages(
+            messages, budget, approximate_token_count, tool_content_chars=100
+        )
+
+        assert len(compacted) == len(messages)
+        assert compacted[1].content == messages[1].content
+        assert "truncated" in compacted[3].content
+
+    def test_images_of_dropped_turns_are_carried(self):
+        """Dropping a turn keeps its image in a message in front of the history."""
+        messages = _turn(0, image="AAAA") + _turn(1, image="BBBB") + _turn(2, image="BBBB")
+        budget = approximate_token_count(_turn(2)) + 1100
+
+        compacted = compact_messages(messages, budget, approximate_token_count)
+
+        assert compacted[0].content[0] == {"type": "text", "text": CARRIED_IMAGES_TEXT}
+        assert compacted[0].content[1:] == messages[1].content
+        assert compacted[1].content == "question 2"
+        assert approximate_token_count(compacted) <= budget
+        _assert_tool_calls_paired(compacted)
+
+    def test_image_paths_of_dropped_turns_are_kept(self):
+        """The path note of an upload outlives its turn, even when its image does not fit."""
+        messages = [HumanMessage(content="image_path: /data/cxr.png")] + _turn(0) + _turn(1)
+        budget = approximate_token_count(_turn(1)) + 50
+
+        compacted = compact_messages(messages, budget, approximate_token_count)
+
+        assert compacted[0].content == [{"type": "text", "text": "image_path: /data/cxr.png"}]
+        assert compacted[1].content == "question 1"
+        _assert_tool_calls_paired(compacted)
+
+    def test_old_tool_results_truncated(self):
+        """Large tool results of earlier turns are truncated but kept."""
+        messages = _turn(0) + _turn(1)
+        budget = approximate_token_count(messages) - 2500
+
+        compacted = compact_messages(
+            messages, budget, approximate_token_count, tool_content_chars=100
+        )
+
+        assert len(compacted) == len(messages)
+        assert "truncated" in compacted[3].content
+        assert compacted[8].content == messages[8].content
+        _assert_tool_calls_paired(compacted)
+
+    def test_drops_oldest_turns_keeping_pairs(self):
+        """Whole turns are dropped when truncation is not enough."""
+        messages = _turn(0) + _turn(1) + _turn(2)
+        budget = approximate_token_count(_turn(2)) + 50
+
+        compacted = compact_messages(messages, budget, approximate_token_count)
+
+        assert compacted[0].content == "question 2"
+        assert compacted[-1].content == "answer 2"
+        assert approximate_token_count(compacted) <= budget
+        _assert_tool_calls_paired(compacted)
+
+
+class TestAgentCompaction:
+    """Test that the agent compacts the history before calling the model."""
+
+    def test_process_request_sends_compacted_history(self, tmp_path):
+        from tests.agent.test_agent import _make_agent
+
+        agent = _make_agent(
+            tmp_path, responses=[AIMessage(content="done")], max_context_tokens=2000
+        )
+        sent = []
+        agent.model.invoke = lambda messages: sent.append(messages) or AIMessage(content="done")
+
+        history = _turn(0) + _turn(1) + [HumanMessage(content="latest")]
+        agent.process_request({"messages": history})
+
+        assert sent[0][-1].content == "latest"
+        assert approximate_token_count(sent[0]) <= 2000
+        _assert_tool_calls_paired(sent[0])
+        assert history[1].content[0]["type"] == "image_url"
+
+    def test_tools_get_the_path_of_a_dropped_upload(self, tmp_path):
+        from tests.agent.test_agent import _make_agent
+
+        def call_tool_on_upload(messages):
+            texts = [m.content for m in messages if isinstance(m.content, str)] + [
+                b["text"]
+                for m in messages
+                if isinstance(m.content, list)
+                for b in m.content
+                if b.get("type") == "text"
+            ]
+            path = next(t for t in texts if t.startswith(IMAGE_PATH_PREFIX))
+            call = {"name": "tool_a", "args": {"image_path": path[len(IMAGE_PATH_PREFIX) :]}}
+            return AIMessage(content="", tool_calls=[{**call, "id": "call_new"}])
+
+        agent = _make_agent(tmp_path, max_context_tokens=2000)
+        agent.model.invoke = call_tool_on_upload
+        upload = HumanMessage(content=f"{IMAGE_PATH_PREFIX}/data/cxr.png")
+        history = [upload] + _turn(0) + _turn(1) + [HumanMessage(content="segment it again")]
+
+        response = agent.process_request({"messages": history})["messages"]
+        result = agent.execute_tools({"messages": response})["messages"][0]
+
+        assert result.artifact[0]["image_path"] == "/data/cxr.png"
@@ -221,6 +221,190 @@ class TestServiceContainer:
         assert image_id.startswith("img_")
         assert container.image_storage.get(image_id) is not None
 
+    def test_register_image_starts_prefetch(self, tmp_path):
+        """Registered images are classified in the background and served from there."""
+        from medrax.mcp.application.services import (
+            ClassificationService,
+            MedRAXServiceContainer,
+        )
+
+        class FakeResult:
+            def to_dict(self):
+                return {"classifications": {"Effusion": 0.9}}
+
+        class FakeClassifier:
+            supported_pathologies = ["Effusion"]
+            calls = 0
+
+            def classify(self, image_path, pathologies=None, threshold=0.5):
+                FakeClassifier.calls += 1
+                return FakeResult()
+
+        container = MedRAXServiceContainer(lazy_load=True, prefetch=["classification"])
+        container._classification_service = ClassificationService(
+            FakeClassifier(), container.image_storage, prefetch=container.prefetch
+        )
+        test_file = tmp_path / "test.png"
+        test_file.write_bytes(b"fake image data")
+
+        image_id = container.register_image(str(test_file))
+        first = container.classification.classify(image_id)
+        second = container.classification.classify(image_id)
+
+        assert first == second == {"classifications": {"Effusion": 0.9}}
+        assert FakeClassifier.calls == 1
+
+    def test_unknown_prefetch_analysis(self):
+        """Unsupported prefetch names are rejected."""
+        from medrax.mcp.application.services import MedRAXServiceContainer
+        from medrax.mcp.domain.exceptions import ValidationError
+
+        with pytest.raises(ValidationError):
+            MedRAXServiceContainer(prefetch=["report"])
+
+
+class TestBatchClassification:
+    """Test batched classification with per-image error isolation."""
+
+    def _wrapper(self):
+        import torch
+
+        from medrax.mcp.infrastructure.classifier import ClassifierWrapper
+
+        class MeanModel(torch.nn.Module):
+            """Predicts the image mean for every pathology and records batch sizes."""
+
+            input_resolution = 32
+
+            def __init__(self):
+                super().__init__()
+                self.batch_sizes = []
+
+            def forward(self, x):
+                self.batch_sizes.append(x.shape[0])
+                return x.mean(dim=(1, 2, 3))[:, None].repeat(1, 18)
+
+        wrapper = ClassifierWrapper(device="cpu")
+        wrapper._model = MeanModel()
+        wrapper._initialized = True
+        return wrapper
+
+    def _image(self, path, value, size=64):
+        import numpy as np
+        from PIL import Image
+
+        Image.fromarray(np.full((size, size), value, dtype=np.uint8)).save(path)
+        return path
+
+    def test_batches_match_single_image_results(self, tmp_path):
+        """Batched results equal single-image results, in input order."""
+        paths = [
+            self._image(tmp_path / f"cxr_{i}.png", 40 * i, size=48 + 8 * i) for i in range(5)
+        ]
+        wrapper = self._wrapper()
+
+        batch = wrapper.classify_batch(paths, batch_size=2)
+        single = [wrapper.classify(path) for path in paths]
+
+        assert wrapper._model.batch_sizes[:3] == [2, 2, 1]
+        for batch_result, single_result in zip(batch, single):
+            assert batch_result.pathologies == pytest.approx(single_result.pathologies)
+        assert [r.image_path for r in batch] == [str(p) for p in paths]
+
+    def test_bad_images_fail_alone(self, tmp_path):
+        """Missing and unreadable images fail without affecting the rest of the batch."""
+        from medrax.mcp.domain.entities import AnalysisStatus
+
+        good = self._image(tmp_path / "good.png", 128)
+        corrupt = tmp_path / "corrupt.png"
+        corrupt.write_bytes(b"not an image")
+        missing = tmp_path / "missing.png"
+
+        results = self._wrapper().classify_batch([good, corrupt, missing, good])
+
+        assert [r.status for r in results] == [
+            AnalysisStatus.COMPLETED,
+            AnalysisStatus.FAILED,
+            AnalysisStatus.FAILED,
+            AnalysisStatus.COMPLETED,
+        ]
+        assert "not found" in results[2].error
+
+    def test_concurrent_calls_share_forward_passes(self, tmp_path):
+        """Concurrent classify calls are grouped into batches and get their own results."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        paths = [self._image(tmp_path / f"cxr_{i}.png", 20 * i) for i in range(8)]
+        wrapper = self._wrapper()
+        wrapper._max_latency_ms = 200.0
+        expected = [r.pathologies for r in wrapper.classify_batch(paths)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(wrapper.classify, paths))
+
+        for result, pathologies in zip(results, expected):
+            assert result.pathologies == pytest.approx(pathologies)
+        stats = wrapper.batching_stats
+        assert stats["requests"] == 8
+        assert stats["batches"] < 8
+        assert 0 < stats["mean_batch_fill"] <= 1
+        assert stats["max_queue_wait_ms"] >= stats["mean_queue_wait_ms"] >= 0
+
+    def test_failed_forward_fails_waiting_calls(self, tmp_path):
+        """A forward pass error is returned to every call of its batch."""
+        from medrax.mcp.domain.entities import AnalysisStatus
+
+        wrapper = self._wrapper()
+
+        def broken(x):
+            raise RuntimeError("out of memory")
+
+        wrapper._model.forward = broken
+
+        result = wrapper.classify(self._image(tmp_path / "cxr.png", 128))
+
+        assert result.status == AnalysisStatus.FAILED
+        assert result.error == "out of memory"
+
+    def test_batches_wait_for_the_shared_model_lock(self, tmp_path):
+        """classify_batch does not run while a tool holds the lock of the same model."""
+        import threading
+
+        from medrax.models import ModelKey
+        from medrax.utils.inference import model_lock
+
+        wrapper = self._wrapper()
+        wrapper._model_key = ModelKey.create("densenet121-res224-all", "cpu")
+        path = self._image(tmp_path / "a.png", 100)
+
+        done = threading.Event()
+        with model_lock(wrapper._model_key):
+            thread = threading.Thread(
+                target=lambda: wrapper.classify_batch([path]) and done.set()
+            )
+            thread.start()
+            assert not done.wait(0.3)
+        thread.join(5)
+
+        assert done.is_set()
+        wrapper._model_key = None
+
+    def test_service_reports_unknown_ids(self, tmp_path):
+        """Unknown image IDs are reported per image; known ones are classified."""
+        from medrax.mcp.application.services import ClassificationService
+        from medrax.mcp.infrastructure.image_storage import InMemoryImageStorage
+
+        storage = InMemoryImageStorage()
+        image_id = storage.store(self._image(tmp_path / "cxr.png", 128)).id
+        service = ClassificationService(self._wrapper(), storage)
+
+        response = service.classify_batch([image_id, "img_unknown"], pathologies=["Effusion"])
+
+        assert (response["total"], response["completed"], response["failed"]) == (2, 1, 1)
+        assert response["results"][0]["image_id"] == image_id
+        assert list(response["results"][0]["classifications"]) == ["Effusion"]
+        assert response["results"][1]["status"] == "failed"
+
 
 # Check if MCP is installed
 def _check_mcp_installed():
@@ -231,6 +415,148 @@ def _check_mcp_installed():
         return False
 
 
+class TestSegmentationMasks:
+    """Test mask output of the segmentation wrapper and service."""
+
+    def _service(self, tmp_path):
+        import torch
+
+        from medrax.mcp.application.services import SegmentationService
+        from medrax.mcp.infrastructure.image_storage import InMemoryImageStorage
+        from medrax.mcp.infrastructure.segmentation import SegmentationWrapper
+
+        class BlockModel(torch.nn.Module):
+            """Segments a fixed block as the left lung and a smaller one as the heart."""
+
+            def forward(self, x):
+                logits = torch.full((x.shape[0], 14, 512, 512), -5.0)
+                logits[:, 4, 100:300, 50:200] = 5.0
+                logits[:, 8, 200:350, 200:350] = 5.0
+                return logits
+
+        wrapper = SegmentationWrapper(device="cpu", temp_dir=tmp_path)
+        wrapper._model = BlockModel()
+        wrapper._initialized = True
+        return SegmentationService(wrapper, InMemoryImageStorage())
+
+    def _register(self, service, tmp_path, shape=(300, 240)):
+        import numpy as np
+        from PIL import Image
+
+        path = tmp_path / "cxr.png"
+        Image.fromarray(np.random.default_rng(0).integers(0, 255, shape, dtype=np.uint8)).save(path)
+        return service._storage.store(path).id
+
+    def test_rle_masks_match_organ_metrics(self, tmp_path):
+        """Decoded original-resolution masks have the reported areas and bounding boxes."""
+        import numpy as np
+
+        from medrax.utils.rle import decode_mask
+
+        service = self._service(tmp_path)
+        image_id = self._register(service, tmp_path)
+
+        result = service.segment(image_id, organs=["Left Lung", "Heart"], return_masks=True)
+
+        assert result["masks"]["format"] == "rle"
+        assert result["masks"]["size"] == [300, 240]
+        for organ in ["Left Lung", "Heart"]:
+            mask = decode_mask(result["masks"]["masks"][organ])
+            rows, cols = np.nonzero(mask)
+            metrics = result["organ_metrics"][organ]
+            assert mask.sum() == metrics["area_pixels"]
+            assert [rows.min(), cols.min(), rows.max() + 1, cols.max() + 1] == metrics["bbox"]
+
+    def test_npz_masks_at_model_resolution(self, tmp_path):
+        """The npz artifact holds one bit per organ at the model input size."""
+        from medrax.utils.rle import load_masks_npz
+
+        service = self._service(tmp_path)
+        image_id = self._register(service, tmp_path)
+
+        result = service.segment(
+            image_id, return_masks=True, mask_format="npz", mask_resolution="model"
+        )
+
+        masks, extra = load_masks_npz(result["masks"]["path"])
+        assert len(masks) == 14
+        assert masks["Left Lung"].shape == (512, 512)
+        assert masks["Left Lung"].sum() == 200 * 150
+        assert not masks["Spine"].any()
+        assert list(extra["image_size"]) == [300, 240]
+
+    def test_masks_are_opt_in_and_validated(self, tmp_path):
+        """Masks are only returned on request, with a supported format."""
+        from medrax.mcp.domain.exceptions import ValidationError
+
+        service = self._service(tmp_path)
+        image_id = self._register(service, tmp_path)
+
+        assert "masks" not in service.segment(image_id, organs=["Heart"])
+        with pytest.raises(ValidationError):
+            service.segment(image_id, return_masks=True, mask_format="png")
+        with pytest.raises(ValidationError):
+            service.segment(image_id, return_masks=True, mask_resolution="thumbnail")
+
+
+class TestMeasurements:
+    """Test the cardiothoracic measurement service."""
+
+    def _service(self, tmp_path):
+        from medrax.mcp.application.services import MeasurementService
+
+        segmentation = TestSegmentationMasks()._service(tmp_path)
+        return (
+            MeasurementService(segmentation._segmenter, segmentation._storage),
+            segmentation,
+        )
+
+    def test_spacing_from_dicom_metadata(self, tmp_path):
+        """Images converted from DICOM are measured with their recorded pixel spacing."""
+        service, _ = self._service(tmp_path)
+        image_id = TestSegmentationMasks()._register(service, tmp_path)
+
+        assumed = service.measure(image_id)
+        service._storage.get(image_id).metadata["pixel_spacing"] = [0.1, 0.1]
+        measured = service.measure(image_id)
+
+        assert assumed["pixel_spacing_assumed"] is True
+        assert measured["pixel_spacing_mm"] == [0.1, 0.1]
+        assert measured["pixel_spacing_assumed"] is False
+        left = measured["measurements"]["lungs"]["Left Lung"]
+        assert left["width_mm"] * 2 == assumed["measurements"]["lungs"]["Left Lung"]["width_mm"]
+
+    def test_reuses_segmentation_forward_pass(self, tmp_path):
+        """Measuring an image that was segmented does not run the model again."""
+        service, segmentation = self._service(tmp_path)
+        image_id = TestSegmentationMasks()._register(service, tmp_path)
+
+        from medrax.models import get_forward_cache
+
+        get_forward_cache().clear()
+        try:
+            segmentation.segment(image_id)
+            result = service.measure(image_id)
+        finally:
+            get_forward_cache().clear()
+
+        assert result["forward_cached"] is True
+
+    def test_validation(self, tmp_path):
+        """Bad spacing and thresholds are rejected."""
+        from medrax.mcp.domain.exceptions import ValidationError
+
+        service, _ = self._service(tmp_path)
+        image_id = TestSegmentationMasks()._register(service, tmp_path)
+
+        with pytest.raises(ValidationError):
+            service.measure(image_id, pixel_spacing=[0.2])
+        with pytest.raises(ValidationError):
+            service.measure(image_id, pixel_spacing=[0.2, -0.2])
+        with pytest.raises(ValidationError):
+            service.measure(image_id, threshold=1.5)
+
+
 class TestMCPServerCreation:
     """Test MCP server creation."""
     
@@ -0,0 +1,126 @@
+"""
+Tests for the multi-weight classifier ensemble.
+"""
+
+import threading
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from medrax.models import get_model_registry
+
+PATHOLOGIES = {
+    "all": ["Atelectasis", "Cardiomegaly", "Effusion"],
+    "nih": ["Atelectasis", "", "Effusion"],
+    "rsna": ["", "", "Pneumonia"],
+}
+
+
+@pytest.fixture
+def fake_densenet(monkeypatch):
+    """DenseNets that predict a constant per weights name and record their threads."""
+    import torchxrayvision as xrv
+
+    threads = []
+
+    class FakeDenseNet(torch.nn.Module):
+        input_resolution = 32
+
+        def __init__(self, weights):
+            super().__init__()
+            self.pathologies = PATHOLOGIES[weights]
+            self.value = {"all": 0.2, "nih": 0.4, "rsna": 0.9}[weights]
+
+        def forward(self, x):
+            threads.append(threading.current_thread().name)
+            return torch.full((x.shape[0], 3), self.value)
+
+    monkeypatch.setattr(xrv.models, "DenseNet", FakeDenseNet)
+    return threads
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "cxr.png"
+    Image.fromarray(np.full((40, 40), 100, dtype=np.uint8)).save(path)
+    return str(path)
+
+
+def _release(tool):
+    for key in tool.ensemble_keys:
+        get_model_registry().release(key)
+    tool.model_key = None
+
+
+def test_ensemble_averages_over_models_predicting_each_pathology(fake_densenet, image):
+    from medrax.tools.classification import ChestXRayClassifierTool
+
+    tool = ChestXRayClassifierTool(device="cpu", ensemble_weights=["all", "nih", "rsna"])
+    try:
+        output, metadata = tool._run(image)
+    finally:
+        _release(tool)
+
+    assert output == pytest.approx(
+        {"Atelectasis": 0.3, "Cardiomegaly": 0.2, "Effusion": 0.3, "Pneumonia": 0.9}
+    )
+    assert metadata["ensemble"]["weights"] == ["all", "nih", "rsna"]
+    assert metadata["ensemble"]["per_model"]["nih"] == pytest.approx(
+        {"Atelectasis": 0.4, "Effusion": 0.4}
+    )
+    assert all(name.startswith("medrax-ensemble") for name in fake_densenet)
+
+
+def test_ensemble_batch_matches_single_images(fake_densenet, image, tmp_path):
+    from medrax.tools.classification import ChestXRayClassifierTool
+
+    other = tmp_path / "other.png"
+    Image.fromarray(np.full((48, 40), 30, dtype=np.uint8)).save(other)
+    tool = ChestXRayClassifierTool(device="cpu", ensemble_weights=["all", "nih"])
+    try:
+        batch = tool.classify_batch([image, str(other), str(tmp_path / "missing.png")])
+        single = tool._run(image)
+    finally:
+        _release(tool)
+
+    assert batch[0][0] == pytest.approx(single[0])
+    assert batch[1][1]["analysis_status"] == "completed"
+    assert batch[2][1]["analysis_status"] == "failed"
+    # One call per model per batch of two readable images
+    assert len(fake_densenet) == 2 + 2
+
+
+def test_single_model_output_is_unchanged(fake_densenet, image):
+    from medrax.tools.classification import ChestXRayClassifierTool
+
+    tool = ChestXRayClassifierTool(model_name="nih", device="cpu")
+    try:
+        output, metadata = tool._run(image)
+    finally:
+        _release(tool)
+
+    assert output == pytest.approx({"Atelectasis": 0.4, "Effusion": 0.4})
+    assert "ensemble" not in metadata
+    assert tool.executor is None
+
+
+def test_batch_waits_for_the_shared_models(fake_densenet, image):
+    from medrax.tools.classification import ChestXRayClassifierTool
+    from medrax.utils.inference import model_lock
+
+    tool = ChestXRayClassifierTool(device="cpu", ensemble_weights=["all", "nih"])
+    results = []
+    try:
+        # Another caller is running the second model
+        with model_lock(tool.ensemble_keys[1]):
+            worker = threading.Thread(target=lambda: results.append(tool.classify_batch([image])))
+            worker.start()
+            worker.join(0.5)
+            assert fake_densenet == [] and not results
+        worker.join(5)
+    finally:
+        _release(tool)
+
+    assert results[0][0][1]["analysis_status"] == "completed"
@@ -0,0 +1,111 @@
+"""
+Tests for reusing segmentation forward passes across organ subsets.
+"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from medrax.models import ForwardCache, get_forward_cache, get_model_registry
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "cxr.png"
+    Image.fromarray(np.random.default_rng(0).integers(0, 255, (300, 240), dtype=np.uint8)).save(
+        path
+    )
+    return str(path)
+
+
+@pytest.fixture
+def fake_pspnet(monkeypatch):
+    """PSPNet returning fixed lung and heart blocks and counting its forward passes."""
+    import torchxrayvision as xrv
+
+    calls = []
+
+    class FakePSPNet(torch.nn.Module):
+        def forward(self, x):
+            calls.append(x.shape)
+            logits = torch.full((1, 14, 512, 512), -4.0)
+            logits[:, 4, 100:300, 50:200] = 2.0
+            logits[:, 5, 100:300, 300:450] = 0.5
+            logits[:, 8, 200:350, 200:350] = 3.0
+            return logits
+
+    monkeypatch.setattr(xrv.baseline_models.chestx_det, "PSPNet", FakePSPNet)
+    get_forward_cache().clear()
+    yield calls
+    get_forward_cache().clear()
+
+
+def test_outputs_are_computed_once_per_image_and_model(image):
+    cache = ForwardCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return torch.arange(6.0).reshape(2, 3)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.outputs(image, "model-a", compute)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(cached for _, cached in results) == [False, True, True, True]
+    value, cached = cache.outputs(image, "model-a", compute)
+    assert cached and value.dtype == torch.float32 and torch.equal(value, compute())
+    assert not cache.outputs(image, "model-b", compute)[1]
+
+
+def test_tool_reuses_forward_pass_for_other_organs(fake_pspnet, image, tmp_path):
+    from medrax.tools.segmentation import ChestXRaySegmentationTool
+
+    tool = ChestXRaySegmentationTool(device="cpu", temp_dir=tmp_path)
+    try:
+        heart, heart_meta = tool._run(image, organs=["Heart"])
+        lungs, lungs_meta = tool._run(image, organs=["Left Lung", "Right Lung"])
+        everything, _ = tool._run(image)
+    finally:
+        get_model_registry().release(tool.model_key)
+        tool.model_key = None
+
+    assert len(fake_pspnet) == 1
+    assert heart_meta["forward_cached"] is False
+    assert lungs_meta["forward_cached"] is True
+    assert set(lungs["metrics"]) == {"Left Lung", "Right Lung"}
+    assert everything["metrics"]["Heart"] == heart["metrics"]["Heart"]
+    assert everything["metrics"]["Left Lung"] == lungs["metrics"]["Left Lung"]
+
+
+def test_mcp_thresholds_reuse_forward_pass(fake_pspnet, image, tmp_path):
+    from pathlib import Path
+
+    from medrax.mcp.infrastructure.segmentation import SegmentationWrapper
+
+    wrapper = SegmentationWrapper(device="cpu", temp_dir=tmp_path)
+    try:
+        default = wrapper.segment(Path(image), organs=["Left Lung", "Right Lung"])
+        strict = wrapper.segment(Path(image), organs=["Left Lung", "Right Lung"], threshold=0.7)
+    finally:
+        get_model_registry().release(wrapper._model_key)
+        wrapper._model_key = None
+
+    assert len(fake_pspnet) == 1
+    assert not default.forward_cached and strict.forward_cached
+    # sigmoid(0.5) = 0.62: the right lung is only segmented at the default threshold
+    assert default.organs_segmented == ["Left Lung", "Right Lung"]
+    assert strict.organs_segmented == ["Left Lung"]
+    assert strict.organs["Left Lung"] == default.organs["Left Lung"]
@@ -0,0 +1,112 @@
+"""
+Tests for the ONNX Runtime inference backend.
+"""
+
+import pytest
+import torch
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+
+from medrax.models import onnx_backend  # noqa: E402
+from medrax.models.onnx_backend import OnnxOptions, OnnxParityError, load_onnx_model  # noqa: E402
+
+
+class TinyNet(torch.nn.Module):
+    """Small convolutional classifier standing in for DenseNet."""
+
+    input_resolution = 16
+
+    def __init__(self):
+        super().__init__()
+        self.conv = torch.nn.Conv2d(1, 4, 3)
+        self.fc = torch.nn.Linear(4, 3)
+
+    def forward(self, x):
+        x = torch.relu(self.conv(x / 1024)).mean(dim=(2, 3))
+        return torch.sigmoid(self.fc(x))
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    return TinyNet().eval()
+
+
+class TestOnnxBackend:
+    """Test export, caching and parity checking."""
+
+    def test_matches_torch_with_dynamic_batch(self, model, tmp_path):
+        onnx_model = load_onnx_model(
+            "tiny", model, (1, 16, 16), OnnxOptions(cache_dir=str(tmp_path)),
+            attributes=("input_resolution",),
+        )
+        x = torch.rand(5, 1, 16, 16) * 2048 - 1024
+
+        with torch.inference_mode():
+            expected = model(x)
+
+        assert torch.allclose(onnx_model(x), expected, atol=1e-5)
+        assert onnx_model.input_resolution == 16
+
+    def test_export_is_cached_by_weights(self, model, tmp_path, monkeypatch):
+        options = OnnxOptions(cache_dir=str(tmp_path))
+        exports = []
+        export = onnx_backend.export_onnx
+        monkeypatch.setattr(
+            onnx_backend, "export_onnx", lambda *args: exports.append(1) or export(*args)
+        )
+
+        first = load_onnx_model("tiny", model, (1, 16, 16), options)
+        second = load_onnx_model("tiny", model, (1, 16, 16), options)
+        with torch.no_grad():
+            model.fc.bias.add_(1.0)
+        third = load_onnx_model("tiny", model, (1, 16, 16), options)
+
+        assert len(exports) == 2
+        assert first.path == second.path != third.path
+        assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+            [first.path.name, third.path.name]
+        )
+
+    def test_parity_failure_keeps_nothing(self, model, tmp_path):
+        options = OnnxOptions(cache_dir=str(tmp_path), parity_atol=-1.0)
+
+        with pytest.raises(OnnxParityError):
+            load_onnx_model("tiny", model, (1, 16, 16), options)
+
+        assert list(tmp_path.iterdir()) == []
+
+
+def test_classifier_tool_runs_on_onnx(tmp_path, monkeypatch):
+    """The classifier tool gives the same probabilities on both backends."""
+    import numpy as np
+    import torchxrayvision as xrv
+    from PIL import Image
+
+    from medrax.tools.classification import ChestXRayClassifierTool
+
+    class FakeDenseNet(TinyNet):
+        def __init__(self, weights):
+            torch.manual_seed(0)
+            super().__init__()
+            self.fc = torch.nn.Linear(4, 18)
+
+    monkeypatch.setattr(xrv.models, "DenseNet", FakeDenseNet)
+    image = tmp_path / "cxr.png"
+    Image.fromarray(np.random.default_rng(0).integers(0, 255, (40, 40), dtype=np.uint8)).save(image)
+
+    torch_tool = ChestXRayClassifierTool(model_name="fake", device="cpu")
+    onnx_tool = ChestXRayClassifierTool(
+        model_name="fake",
+        device="cpu",
+        backend="onnx",
+        onnx_options=OnnxOptions(cache_dir=str(tmp_path / "onnx")),
+    )
+
+    expected, _ = torch_tool._run(str(image))
+    actual, metadata = onnx_tool._run(str(image))
+
+    assert metadata["analysis_status"] == "completed"
+    assert actual == pytest.approx(expected, abs=1e-5)
+    assert onnx_tool.model_key.backend == "onnx"
@@ -0,0 +1,115 @@
+"""
+Tests for the shared preprocessing cache.
+"""
+
+import threading
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from medrax.models import preprocessing
+from medrax.models.preprocessing import (
+    PreprocessCache,
+    classifier_input,
+    read_xray,
+    segmentation_input,
+)
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Count file decodes."""
+    calls = []
+    decode = preprocessing.decode_xray
+    monkeypatch.setattr(
+        preprocessing, "decode_xray", lambda path: calls.append(path) or decode(path)
+    )
+    return calls
+
+
+def _image(path, size=(80, 64), seed=0):
+    pixels = np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8)
+    Image.fromarray(pixels).save(path)
+    return path
+
+
+def _classifier(img):
+    return classifier_input(preprocessing.normalize_xray(img), 32)
+
+
+def _segmenter(img):
+    return segmentation_input(preprocessing.normalize_xray(img), 48)
+
+
+class TestPreprocessCache:
+    """Test decode-once sharing, compact storage and the byte budget."""
+
+    def test_decodes_once_for_all_models(self, tmp_path, decodes):
+        path = _image(tmp_path / "cxr.png")
+        cache = PreprocessCache()
+
+        for _ in range(3):
+            classifier = cache.model_input(path, "densenet-32", _classifier)
+            segmenter = cache.model_input(path, "pspnet-48", _segmenter)
+        raw = cache.decode(path)
+
+        assert len(decodes) == 1
+        assert classifier.shape == (1, 32, 32) and segmenter.shape == (1, 48, 48)
+        assert raw.dtype == np.uint8 and not raw.flags.writeable
+        assert cache.stats()["entries"] == 3
+
+    def test_inputs_are_float16_upcast_on_use(self, tmp_path):
+        path = _image(tmp_path / "cxr.png")
+        cache = PreprocessCache()
+
+        first = cache.model_input(path, "densenet-32", _classifier)
+        first += 1
+        second = cache.model_input(path, "densenet-32", _classifier)
+
+        expected = classifier_input(read_xray(path), 32)
+        assert second.dtype == torch.float32
+        assert torch.allclose(second, expected, atol=1.0, rtol=1e-3)
+        assert cache.stats()["current_bytes"] == 80 * 64 + 32 * 32 * 2
+
+    def test_keyed_by_content(self, tmp_path, decodes):
+        cache = PreprocessCache()
+        a = _image(tmp_path / "a.png")
+        b = _image(tmp_path / "b.png")
+        c = _image(tmp_path / "c.png", seed=1)
+
+        cache.model_input(a, "densenet-32", _classifier)
+        cache.model_input(b, "densenet-32", _classifier)
+        cache.model_input(c, "densenet-32", _classifier)
+
+        assert decodes == [a, c]
+
+    def test_evicts_under_byte_budget(self, tmp_path):
+        cache = PreprocessCache(max_bytes=2 * 80 * 64)
+        for seed in range(3):
+            cache.decode(_image(tmp_path / f"{seed}.png", seed=seed))
+
+        stats = cache.stats()
+        assert stats["entries"] == 2 and stats["evictions"] == 1
+
+    def test_concurrent_requests_compute_once(self, tmp_path, decodes):
+        path = _image(tmp_path / "cxr.png")
+        cache = PreprocessCache()
+        calls = []
+
+        def slow(img):
+            calls.append(1)
+            threading.Event().wait(0.05)
+            return _classifier(img)
+
+        threads = [
+            threading.Thread(target=cache.model_input, args=(path, "densenet-32", slow))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1 and len(decodes) == 1
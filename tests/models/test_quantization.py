@@ -0,0 +1,173 @@
+"""
+Tests for INT8 static quantization and the fp32/INT8 accuracy helpers.
+"""
+
+import numpy as np
+import pytest
+import skimage.io
+import torch
+
+from medrax.models.quantization import (
+    QuantizationOptions,
+    load_quantized_model,
+    mask_dice,
+    probability_drift,
+    quantize_modules,
+)
+
+pytestmark = pytest.mark.skipif(
+    not torch.backends.quantized.supported_engines
+    or torch.backends.quantized.supported_engines == ["none"],
+    reason="no INT8 quantization engine",
+)
+
+
+class DataDependent(torch.nn.Module):
+    """Branches on tensor values, which FX cannot trace."""
+
+    def forward(self, x):
+        return x if x.sum() > 0 else -x
+
+
+class TinyNet(torch.nn.Module):
+    """Small convolutional classifier standing in for DenseNet."""
+
+    def __init__(self):
+        super().__init__()
+        self.features = torch.nn.Sequential(
+            torch.nn.Conv2d(1, 8, 3, padding=1),
+            torch.nn.ReLU(),
+            torch.nn.Conv2d(8, 8, 3, padding=1),
+            torch.nn.ReLU(),
+        )
+        self.gate = DataDependent()
+        self.fc = torch.nn.Linear(8, 3)
+
+    def forward(self, x):
+        x = self.gate(self.features(x / 1024)).mean(dim=(2, 3))
+        return torch.sigmoid(self.fc(x))
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    return TinyNet().eval()
+
+
+@pytest.fixture
+def calibration_dir(tmp_path):
+    directory = tmp_path / "calibration"
+    directory.mkdir()
+    rng = np.random.default_rng(0)
+    for i in range(5):
+        skimage.io.imsave(
+            directory / f"{i}.png", rng.integers(0, 256, (16, 16), dtype=np.uint8)
+        )
+    (directory / "notes.txt").write_text("not an image")
+    return directory
+
+
+def _preprocess(path):
+    img = skimage.io.imread(path).astype(np.float32) / 255 * 2048 - 1024
+    return torch.from_numpy(img)[None]
+
+
+class TestQuantizeModules:
+    """Test per-submodule FX quantization."""
+
+    def test_untraceable_modules_stay_fp32(self, model):
+        x = torch.rand(4, 1, 16, 16) * 2048 - 1024
+        with torch.no_grad():
+            expected = model(x)
+
+        quantized = quantize_modules(model, ("features", "gate"), x[:1], [x])
+
+        assert quantized == ["features"]
+        assert isinstance(model.gate, DataDependent)
+        assert any(".quantized" in type(m).__module__ for m in model.features.modules())
+        with torch.no_grad():
+            assert torch.allclose(model(x), expected, atol=0.05)
+
+
+class TestLoadQuantizedModel:
+    """Test calibration from a folder and the on-disk cache."""
+
+    def test_cache_round_trip(self, calibration_dir, tmp_path):
+        options = QuantizationOptions(
+            calibration_dir=str(calibration_dir), cache_dir=str(tmp_path / "cache"), batch_size=2
+        )
+        torch.manual_seed(0)
+        first = load_quantized_model(
+            "tiny", TinyNet().eval(), ("features",), (1, 16, 16), _preprocess, options
+        )
+
+        calls = []
+        torch.manual_seed(0)
+        second = load_quantized_model(
+            "tiny", TinyNet().eval(), ("features",), (1, 16, 16),
+            lambda path: calls.append(path) or _preprocess(path), options,
+        )
+
+        x = torch.rand(3, 1, 16, 16) * 2048 - 1024
+        with torch.no_grad():
+            assert torch.equal(first(x), second(x))
+        assert calls == []
+        assert len(list((tmp_path / "cache").iterdir())) == 1
+
+    def test_new_calibration_set_is_a_new_entry(self, calibration_dir, tmp_path):
+        cache_dir = tmp_path / "cache"
+        options = QuantizationOptions(calibration_dir=str(calibration_dir), cache_dir=str(cache_dir))
+        torch.manual_seed(0)
+        load_quantized_model(
+            "tiny", TinyNet().eval(), ("features",), (1, 16, 16), _preprocess, options
+        )
+
+        skimage.io.imsave(calibration_dir / "5.png", np.full((16, 16), 200, dtype=np.uint8))
+        torch.manual_seed(0)
+        load_quantized_model(
+            "tiny", TinyNet().eval(), ("features",), (1, 16, 16), _preprocess, options
+        )
+
+        assert len(list(cache_dir.iterdir())) == 2
+
+    def test_requires_calibration_images(self, model, tmp_path):
+        with pytest.raises(ValueError, match="calibration_dir"):
+            load_quantized_model(
+                "tiny", model, ("features",), (1, 16, 16), _preprocess, QuantizationOptions()
+            )
+        with pytest.raises(ValueError, match="No calibration images"):
+            load_quantized_model(
+                "tiny", model, ("features",), (1, 16, 16), _preprocess,
+                QuantizationOptions(calibration_dir=str(tmp_path)),
+            )
+
+
+class TestAccuracyReport:
+    """Test the fp32/INT8 comparison helpers."""
+
+    def test_probability_drift_and_auc(self):
+        pytest.importorskip("sklearn")
+        reference = np.array([[0.9, 0.2], [0.8, 0.3], [0.1, 0.4], [0.2, 0.5]])
+        quantized = reference + np.array([[0.0, 0.1], [-0.2, 0.0], [0.0, 0.0], [0.7, 0.0]])
+        labels = np.array([[1, np.nan], [1, 1], [0, 1], [0, 1]])
+
+        report = probability_drift(reference, quantized, ["A", "B"], labels)
+
+        assert report["A"]["max_abs_drift"] == pytest.approx(0.7)
+        assert report["A"]["mean_abs_drift"] == pytest.approx(0.225)
+        assert report["A"]["auc_fp32"] == 1.0
+        assert report["A"]["auc_int8"] == 0.75
+        assert report["A"]["auc_delta"] == -0.25
+        # Only positives are known for B, so AUC is undefined
+        assert report["B"]["auc_fp32"] is None
+
+    def test_mask_dice(self):
+        reference = np.zeros((1, 2, 4, 4), dtype=bool)
+        quantized = np.zeros((1, 2, 4, 4), dtype=bool)
+        reference[0, 0, :2] = True
+        quantized[0, 0, :1] = True
+
+        dice = mask_dice(reference, quantized)
+
+        assert dice[0, 0] == pytest.approx(2 * 4 / (8 + 4))
+        assert dice[0, 1] == 1.0
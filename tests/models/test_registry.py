@@ -0,0 +1,130 @@
+"""
+Tests for the process-wide model registry.
+"""
+
+import threading
+import time
+
+import pytest
+import torch
+
+from medrax.models import ModelKey, ModelRegistry, get_model_registry
+
+
+class TestModelRegistry:
+    """Test loading, sharing and unloading of models."""
+
+    def test_same_key_shares_one_instance(self):
+        registry = ModelRegistry()
+        key = ModelKey.create("densenet", "cpu")
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return object()
+
+        first = registry.acquire(key, loader)
+        second = registry.acquire(ModelKey.create("densenet", torch.device("cpu")), loader)
+
+        assert first is second
+        assert len(loads) == 1
+        assert registry.refcount(key) == 2
+
+    def test_key_fields_separate_instances(self):
+        registry = ModelRegistry()
+        keys = [
+            ModelKey.create("m", "cpu"),
+            ModelKey.create("m", "cpu", dtype=torch.bfloat16),
+            ModelKey.create("m", "cpu", quantization="int8"),
+            ModelKey.create("other", "cpu"),
+        ]
+
+        models = [registry.acquire(key, object) for key in keys]
+
+        assert len({id(model) for model in models}) == 4
+
+    def test_unloads_after_last_release(self):
+        registry = ModelRegistry()
+        key = ModelKey.create("m", "cpu")
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return object()
+
+        registry.acquire(key, loader)
+        registry.acquire(key, loader)
+        registry.release(key)
+        assert registry.loaded() == [{**key._asdict(), "refs": 1}]
+
+        registry.release(key)
+        assert registry.loaded() == []
+
+        registry.acquire(key, loader)
+        assert len(loads) == 2
+
+    def test_concurrent_acquire_loads_once(self):
+        registry = ModelRegistry()
+        key = ModelKey.create("slow", "cpu")
+        loads = []
+
+        def loader():
+            loads.append(1)
+            time.sleep(0.05)
+            return object()
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(registry.acquire(key, loader)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(loads) == 1
+        assert len({id(model) for model in results}) == 1
+        assert registry.refcount(key) == 4
+
+    def test_failed_load_is_not_held(self):
+        registry = ModelRegistry()
+        key = ModelKey.create("broken", "cpu")
+
+        def loader():
+            raise RuntimeError("weights missing")
+
+        with pytest.raises(RuntimeError):
+            registry.acquire(key, loader)
+
+        assert registry.refcount(key) == 0
+
+
+def test_tool_and_mcp_wrapper_share_densenet(monkeypatch):
+    """The LangChain tool and the MCP wrapper load the DenseNet weights once."""
+    import torchxrayvision as xrv
+
+    from medrax.mcp.infrastructure.classifier import ClassifierWrapper
+    from medrax.tools.classification import ChestXRayClassifierTool
+
+    loads = []
+
+    class FakeDenseNet(torch.nn.Module):
+        def __init__(self, weights):
+            super().__init__()
+            loads.append(weights)
+
+    monkeypatch.setattr(xrv.models, "DenseNet", FakeDenseNet)
+
+    tool = ChestXRayClassifierTool(model_name="fake-weights", device="cpu")
+    wrapper = ClassifierWrapper(model_name="fake-weights", device="cpu")
+    wrapper._ensure_initialized()
+
+    assert wrapper._model is tool.model
+    assert loads == ["fake-weights"]
+    assert get_model_registry().refcount(tool.model_key) == 2
+
+    del wrapper
+    assert get_model_registry().refcount(tool.model_key) == 1
+    get_model_registry().release(tool.model_key)
+    tool.model_key = None
@@ -0,0 +1,129 @@
+"""
+Tests for running the segmentation model at lower input resolutions.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from medrax.models import (
+    check_segmentation_resolution,
+    get_forward_cache,
+    get_model_registry,
+    pspnet_logits,
+)
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "cxr.png"
+    Image.fromarray(np.random.default_rng(0).integers(0, 255, (600, 480), dtype=np.uint8)).save(
+        path
+    )
+    return str(path)
+
+
+class FakeNetwork(torch.nn.Module):
+    """Inner network predicting a heart block at fixed relative coordinates of its input."""
+
+    def __init__(self):
+        super().__init__()
+        self.inputs = []
+
+    def forward(self, x):
+        self.inputs.append(x)
+        size = x.shape[-1]
+        logits = torch.full((x.shape[0], 14, size, size), -4.0)
+        logits[:, 8, size // 4 : size // 2, size // 8 : size // 2] = 3.0
+        return logits
+
+
+class FakePSPNet(torch.nn.Module):
+    """Mirrors TorchXRayVision's PSPNet, which resizes every input to 512."""
+
+    def __init__(self):
+        super().__init__()
+        self.model = FakeNetwork()
+        self.transform = lambda x: x * 2
+
+    def forward(self, x):
+        x = torch.nn.functional.interpolate(x.repeat(1, 3, 1, 1), size=(512, 512))
+        return self.model(self.transform((x + 1024) / 2048))
+
+
+@pytest.fixture
+def fake_pspnet(monkeypatch):
+    import torchxrayvision as xrv
+
+    monkeypatch.setattr(xrv.baseline_models.chestx_det, "PSPNet", FakePSPNet)
+    get_forward_cache().clear()
+    yield
+    get_forward_cache().clear()
+
+
+@pytest.mark.parametrize("size", [256, 384, 512])
+def test_logits_cover_the_input_grid(size):
+    model = FakePSPNet()
+    x = torch.full((2, 1, size, size), 1024.0)
+
+    logits = pspnet_logits(model, x)
+
+    (seen,) = model.model.inputs
+    assert logits.shape == (2, 14, size, size)
+    assert seen.shape == (2, 3, size, size) and torch.all(seen == 2.0)
+
+
+def test_invalid_resolutions():
+    check_segmentation_resolution(256)
+    check_segmentation_resolution(512, backend="onnx")
+    with pytest.raises(ValueError, match="resolution 300"):
+        check_segmentation_resolution(300)
+    with pytest.raises(ValueError, match="onnx"):
+        check_segmentation_resolution(256, backend="onnx")
+
+
+def test_tool_masks_align_at_every_resolution(fake_pspnet, image, tmp_path):
+    from medrax.tools.segmentation import ChestXRaySegmentationTool
+
+    metrics = {}
+    for resolution in (256, 384, 512):
+        tool = ChestXRaySegmentationTool(
+            device="cpu", temp_dir=tmp_path, resolution=resolution, mask_format="rle"
+        )
+        try:
+            output, metadata = tool._run(image, organs=["Heart"])
+        finally:
+            get_model_registry().release(tool.model_key)
+            tool.model_key = None
+        assert metadata["model_size"] == (resolution, resolution)
+        assert not metadata["forward_cached"]
+        assert output["masks"]["size"] == [600, 480]
+        metrics[resolution] = output["metrics"]["Heart"]
+
+    # The 480x480 center crop starts at row 60: rows 180-300, columns 60-240 (exclusive)
+    for heart in metrics.values():
+        assert heart["bbox"] == (180, 60, 300, 240)
+        assert heart["area_pixels"] == 120 * 180
+
+    with pytest.raises(ValueError, match="resolution"):
+        ChestXRaySegmentationTool(device="cpu", temp_dir=tmp_path, resolution=320)
+
+
+def test_mcp_model_resolution_masks(fake_pspnet, image, tmp_path):
+    from medrax.mcp.infrastructure.segmentation import SegmentationWrapper
+
+    wrapper = SegmentationWrapper(device="cpu", temp_dir=tmp_path, resolution=256)
+    try:
+        result = wrapper.segment(
+            Path(image), organs=["Heart"], return_masks=True, mask_resolution="model"
+        )
+    finally:
+        get_model_registry().release(wrapper._model_key)
+        wrapper._model_key = None
+
+    assert result.organs_segmented == ["Heart"]
+    assert result.masks["size"] == [256, 256]
+    assert result.organs["Heart"]["bbox"] == [180, 60, 300, 240]
@@ -0,0 +1,82 @@
+"""
+Interface Tests - Image messages sent to the LLM
+"""
+
+import base64
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("gradio")
+
+from interface import ChatInterface, SessionState  # noqa: E402
+
+
+@pytest.fixture
+def xray_png(tmp_path):
+    path = tmp_path / "xray.png"
+    Image.fromarray(np.random.randint(0, 255, (2048, 1536), dtype=np.uint8)).save(path)
+    return str(path)
+
+
+def _decode(message):
+    url = message["content"][0]["image_url"]["url"]
+    return Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1])))
+
+
+class TestImageMessages:
+    """Test that images reach the LLM once per thread, downscaled."""
+
+    def test_image_sent_once_per_thread(self, tmp_path, xray_png, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        interface = ChatInterface(agent=None, tools_dict={}, llm_image_max_size=512)
+
+        session = SessionState()
+        first = interface._image_messages(xray_png, session)
+        second = interface._image_messages(xray_png, session)
+        session.new_thread()
+        other_thread = interface._image_messages(xray_png, session)
+
+        assert len(first) == 2
+        assert second == []
+        assert len(other_thread) == 2
+
+    def test_llm_copy_is_downscaled_jpeg(self, tmp_path, xray_png, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        interface = ChatInterface(agent=None, tools_dict={}, llm_image_max_size=512)
+
+        image = _decode(interface._image_messages(xray_png, SessionState())[1])
+
+        assert image.format == "JPEG"
+        assert max(image.size) == 512
+        assert Image.open(xray_png).size == (1536, 2048)
+
+    def test_renamed_copy_only_announces_path(self, tmp_path, xray_png, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        interface = ChatInterface(agent=None, tools_dict={})
+        copy_path = tmp_path / "copy.png"
+        copy_path.write_bytes(open(xray_png, "rb").read())
+
+        session = SessionState()
+        interface._image_messages(xray_png, session)
+        messages = interface._image_messages(str(copy_path), session)
+
+        assert messages == [{"role": "user", "content": f"image_path: {copy_path}"}]
+
+
+class TestSessions:
+    """Test that browser sessions do not share state."""
+
+    def test_sessions_are_independent(self, tmp_path, xray_png, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        interface = ChatInterface(agent=None, tools_dict={})
+        first, second = SessionState(), SessionState()
+
+        interface.handle_upload(xray_png, first)
+
+        assert first.thread_id != second.thread_id
+        assert first.original_file_path is not None
+        assert second.original_file_path is None
+        assert interface._image_messages(first.original_file_path, second) != []
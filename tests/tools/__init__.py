@@ -0,0 +1,3 @@
+"""
+Tools Tests Package
+"""
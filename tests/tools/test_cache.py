@@ -0,0 +1,178 @@
+"""
+Tool Cache Tests - Content-addressed result caching
+
+These tests use a lightweight fake tool instead of the deep learning models.
+"""
+
+import time
+from typing import List, Optional, Type
+
+import pytest
+
+from pydantic import BaseModel, Field
+from langchain_core.tools import BaseTool
+
+
+class FakeInput(BaseModel):
+    """Input for the fake segmentation tool."""
+
+    image_path: str = Field(..., description="Path to an image")
+    organs: Optional[List[str]] = Field(None, description="Organs to segment")
+
+
+class FakeTool(BaseTool):
+    """Tool that counts its calls."""
+
+    name: str = "fake_segmentation"
+    description: str = "Counts calls."
+    args_schema: Type[BaseModel] = FakeInput
+    calls: int = 0
+    delay: float = 0.0
+
+    def _run(self, image_path: str, organs: Optional[List[str]] = None, run_manager=None):
+        time.sleep(self.delay)
+        self.calls += 1
+        return {"calls": self.calls}, {"image_path": image_path, "analysis_status": "completed"}
+
+
+def _write(path, data=b"same image bytes"):
+    path.write_bytes(data)
+    return str(path)
+
+
+class TestToolResultCache:
+    """Test the tool result cache."""
+
+    def test_renamed_upload_hits(self, tmp_path):
+        """The key uses image content, so a renamed copy hits."""
+        from medrax.tools.cache import CachedTool, ToolResultCache
+
+        tool = FakeTool()
+        cached = CachedTool(tool, ToolResultCache())
+
+        cached.invoke({"image_path": _write(tmp_path / "a.png")})
+        output, metadata = cached.invoke({"image_path": _write(tmp_path / "b.png"), "organs": None})
+
+        assert tool.calls == 1
+        assert metadata["cached"] is True
+        assert metadata["image_path"].endswith("b.png")
+        assert cached.cache.stats()["per_tool"]["fake_segmentation"] == {"hits": 1, "misses": 1}
+
+    def test_different_args_miss(self, tmp_path):
+        """Different arguments or image content are separate entries."""
+        from medrax.tools.cache import CachedTool, ToolResultCache
+
+        tool = FakeTool()
+        cached = CachedTool(tool, ToolResultCache())
+        path = _write(tmp_path / "a.png")
+
+        cached.invoke({"image_path": path})
+        cached.invoke({"image_path": path, "organs": ["Heart"]})
+        cached.invoke({"image_path": _write(tmp_path / "c.png", b"other bytes")})
+
+        assert tool.calls == 3
+
+    def test_disk_tier_survives_restart(self, tmp_path):
+        """A new cache over the same directory serves earlier results."""
+        from medrax.tools.cache import CachedTool, ToolResultCache
+
+        path = _write(tmp_path / "a.png")
+        CachedTool(FakeTool(), ToolResultCache(disk_dir=str(tmp_path / "cache"))).invoke(
+            {"image_path": path}
+        )
+
+        tool = FakeTool()
+        CachedTool(tool, ToolResultCache(disk_dir=str(tmp_path / "cache"))).invoke(
+            {"image_path": path}
+        )
+
+        assert tool.calls == 0
+
+    def test_reconfigured_tool_misses_after_restart(self, tmp_path):
+        """Results computed under another tool configuration are not served from disk."""
+        from medrax.tools.cache import CachedTool, ToolResultCache
+
+        class ConfiguredTool(FakeTool):
+            resolution: int = 512
+
+            @property
+            def cache_fingerprint(self):
+                return {"resolution": self.resolution}
+
+        path = _write(tmp_path / "a.png")
+        for resolution, calls in [(512, 1), (256, 1), (512, 0)]:
+            tool = ConfiguredTool(resolution=resolution)
+            CachedTool(tool, ToolResultCache(disk_dir=str(tmp_path / "cache"))).invoke(
+                {"image_path": path}
+            )
+            assert tool.calls == calls
+
+    def test_opt_out(self):
+        """Tools marked as not cacheable are left unwrapped."""
+        from medrax.tools.cache import CachedTool, ToolResultCache, cache_tools
+
+        class Generator(FakeTool):
+            cacheable: bool = False
+
+        tools = cache_tools({"a": FakeTool(), "b": Generator()}, ToolResultCache())
+
+        assert isinstance(tools["a"], CachedTool)
+        assert isinstance(tools["b"], Generator)
+
+    def test_lru_byte_budget(self):
+        """The in-memory tier evicts least recently used entries."""
+        from medrax.utils.cache import LRUCache
+
+        cache = LRUCache(max_bytes=10, sizeof=len)
+        cache.put("a", "12345")
+        cache.put("b", "12345")
+        cache.get("a")
+        cache.put("c", "12345")
+
+        assert "a" in cache and "c" in cache and "b" not in cache
+        assert cache.stats()["evictions"] == 1
+
+    def test_failed_compute_releases_pending_lock(self):
+        """A computation that raises does not leave its per-key lock behind."""
+        from medrax.utils.cache import LRUCache
+
+        cache = LRUCache(max_bytes=10, sizeof=len)
+        with pytest.raises(ZeroDivisionError):
+            cache.get_or_compute("a", lambda: 1 / 0)
+
+        assert not cache._pending and "a" not in cache
+
+
+class TestPrefetch:
+    """Test speculative pre-analysis through the tool cache."""
+
+    def test_call_during_prefetch_reuses_result(self, tmp_path):
+        """A call that arrives while the prefetch runs waits for it instead of recomputing."""
+        from medrax.tools.cache import CachedTool, ToolResultCache
+        from medrax.utils import Prefetcher
+
+        tool = FakeTool(delay=0.2)
+        cached = CachedTool(tool, ToolResultCache())
+        image_path = _write(tmp_path / "a.png")
+
+        job = Prefetcher().submit({"seg": lambda: cached.invoke({"image_path": image_path})})
+        time.sleep(0.05)
+        output, metadata = cached.invoke({"image_path": image_path})
+
+        assert job.result("seg") is not None
+        assert tool.calls == 1
+        assert metadata["cached"] is True
+
+    def test_cancel_skips_queued_analyses(self):
+        """Cancelling a job drops analyses that have not started."""
+        from medrax.utils import Prefetcher
+
+        prefetcher = Prefetcher(max_workers=1)
+        ran = []
+        first = prefetcher.submit({"slow": lambda: time.sleep(0.2) or ran.append("slow")})
+        second = prefetcher.submit({"next": lambda: ran.append("next")})
+        second.cancel()
+        first.result("slow")
+
+        assert ran == ["slow"]
+        assert second.result("next") is None
@@ -0,0 +1,78 @@
+"""
+Tests for the shared inference executor and per-model locks.
+"""
+
+import asyncio
+import gc
+import threading
+
+import pytest
+
+from medrax.models import ModelKey
+from medrax.utils import inference
+from medrax.utils.inference import configure_inference_executor, model_lock, run_inference
+
+
+class Owner:
+    """Stand-in for a tool holding a model."""
+
+
+@pytest.fixture
+def two_workers():
+    configure_inference_executor(2)
+    yield
+    configure_inference_executor(4)
+
+
+def test_queued_calls_do_not_starve_other_models(two_workers):
+    busy, other = Owner(), Owner()
+    release = threading.Event()
+    running = []
+
+    def blocked(n):
+        running.append(n)
+        release.wait(5)
+        return n
+
+    async def main():
+        queued = [asyncio.create_task(run_inference(blocked, n, lock_owner=busy)) for n in range(4)]
+        # Only one call of the busy model takes a worker; the other model gets the second
+        result = await asyncio.wait_for(run_inference(lambda: "done", lock_owner=other), 2)
+        assert running == [0]
+        release.set()
+        return result, await asyncio.gather(*queued)
+
+    assert asyncio.run(main()) == ("done", [0, 1, 2, 3])
+
+
+def test_owner_locks_are_dropped_with_the_owner():
+    owner = Owner()
+    owner_id = id(owner)
+    lock = model_lock(owner)
+
+    assert model_lock(owner) is lock
+    del owner
+    gc.collect()
+    assert owner_id not in inference._object_locks
+
+
+def test_owners_of_one_registry_model_share_its_lock():
+    key = ModelKey.create("densenet121-res224-all", "cpu")
+    tool, wrapper, other = Owner(), Owner(), Owner()
+    tool.model_key = key
+    wrapper._model_key = key
+
+    assert model_lock(tool) is model_lock(wrapper) is model_lock(key)
+    assert model_lock(other) is not model_lock(key)
+
+
+def test_ensembles_lock_every_model_in_key_order():
+    keys = [ModelKey.create(name, "cpu") for name in ("densenet-a", "densenet-b", "densenet-c")]
+    forward, backward = Owner(), Owner()
+    forward.ensemble_keys = keys
+    backward.ensemble_keys = keys[::-1]
+
+    assert model_lock(forward) is model_lock(backward)
+    with model_lock(forward):
+        assert all(model_lock(key).locked() for key in keys)
+    assert not any(model_lock(key).locked() for key in keys)
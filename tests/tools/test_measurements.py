@@ -0,0 +1,145 @@
+"""
+Tests for the cardiothoracic measurements derived from segmentation masks.
+"""
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from medrax.models import get_forward_cache, get_model_registry
+from medrax.utils.measurements import PSPNET_ORGANS, chest_measurements, pixel_spacing_from_dicom
+from medrax.utils.organ_metrics import align_masks
+
+
+def _chest(size=64):
+    """Model-space masks of a schematic chest, with the right lung on the image left."""
+    masks = np.zeros((14, size, size), dtype=bool)
+    organ = {name: k for k, name in enumerate(PSPNET_ORGANS)}
+    masks[organ["Right Lung"], 10:50, 6:28] = True
+    masks[organ["Left Lung"], 12:50, 36:58] = True
+    masks[organ["Left Lung"], 30:50, 30:36] = True
+    masks[organ["Heart"], 30:48, 20:44] = True
+    masks[organ["Mediastinum"], 10:40, 26:38] = True
+    masks[organ["Facies Diaphragmatica"], 48:54, 6:30] = True
+    masks[organ["Facies Diaphragmatica"], 50:56, 34:58] = True
+    return masks
+
+
+def _aligned(masks, shape, name):
+    return (align_masks(masks, shape) >> PSPNET_ORGANS.index(name)) & 1 > 0
+
+
+@pytest.mark.parametrize("shape", [(640, 512), (300, 250), (40, 90)])
+def test_measurements_match_aligned_masks(shape):
+    masks = _chest()
+
+    result = chest_measurements(masks, PSPNET_ORGANS, shape, pixel_spacing=(0.5, 0.25))
+
+    heart = _aligned(masks, shape, "Heart")
+    lungs = _aligned(masks, shape, "Left Lung") | _aligned(masks, shape, "Right Lung")
+    heart_cols = np.flatnonzero(heart.any(axis=0))
+    cardiac = heart_cols[-1] + 1 - heart_cols[0]
+    thoracic = max(
+        np.flatnonzero(row)[-1] + 1 - np.flatnonzero(row)[0] for row in lungs if row.any()
+    )
+    assert result["cardiac_width_mm"] == round(cardiac * 0.25, 1)
+    assert result["thoracic_width_mm"] == round(thoracic * 0.25, 1)
+    assert result["cardiothoracic_ratio"] == round(cardiac / thoracic, 4)
+
+    left = _aligned(masks, shape, "Left Lung")
+    area = round(float(left.sum()) * 0.5 * 0.25 / 100, 2)
+    assert result["lungs"]["Left Lung"]["area_cm2"] == area
+    rows = np.flatnonzero(left.any(axis=1))
+    assert result["lungs"]["Left Lung"]["height_mm"] == round((rows[-1] + 1 - rows[0]) * 0.5, 1)
+    assert result["pixel_spacing_mm"] == [0.5, 0.25]
+    assert result["pixel_spacing_assumed"] is False
+
+
+def test_schematic_chest():
+    result = chest_measurements(_chest(), PSPNET_ORGANS, (640, 512))
+
+    # 8 image pixels per mask pixel at 0.2 mm: heart 24, thorax 52, mediastinum 12 pixels wide
+    assert result["cardiothoracic_ratio"] == round(24 / 52, 4)
+    assert result["cardiac_width_mm"] == 38.4
+    assert result["mediastinal_width_mm"] == 19.2
+    assert result["cardiomegaly_suggested"] is False
+    assert result["lungs"]["symmetry"]["height_difference_mm"] == 3.2
+    # Right dome at mask row 48, left at 50, below a 64 pixel offset of the center crop
+    assert result["diaphragm"] == {
+        "left_dome_y": 464,
+        "right_dome_y": 448,
+        "dome_height_difference_mm": 3.2,
+        "higher_side": "right",
+    }
+    assert result["pixel_spacing_assumed"] is True
+
+
+def test_missing_organs_are_none():
+    masks = _chest()
+    masks[PSPNET_ORGANS.index("Heart")] = False
+    masks[PSPNET_ORGANS.index("Right Lung")] = False
+
+    result = chest_measurements(masks, PSPNET_ORGANS, (512, 512))
+
+    assert result["cardiothoracic_ratio"] is None and result["cardiomegaly_suggested"] is None
+    assert result["lungs"]["Right Lung"] is None and result["lungs"]["symmetry"] is None
+    assert result["diaphragm"] is None
+    assert result["lungs"]["Left Lung"] is not None
+
+
+def test_pixel_spacing_from_dicom(tmp_path):
+    pydicom = pytest.importorskip("pydicom")
+    from pydicom.dataset import FileMetaDataset
+
+    def write(name, **tags):
+        ds = pydicom.Dataset()
+        ds.file_meta = FileMetaDataset()
+        ds.file_meta.TransferSyntaxUID = pydicom.uid.ExplicitVRLittleEndian
+        ds.file_meta.MediaStorageSOPClassUID = pydicom.uid.DigitalXRayImageStorageForPresentation
+        ds.file_meta.MediaStorageSOPInstanceUID = pydicom.uid.generate_uid()
+        for tag, value in tags.items():
+            setattr(ds, tag, value)
+        path = tmp_path / name
+        ds.save_as(path, enforce_file_format=True)
+        return path
+
+    assert pixel_spacing_from_dicom(write("a.dcm", PixelSpacing=[0.139, 0.143])) == (0.139, 0.143)
+    assert pixel_spacing_from_dicom(write("b.dcm", ImagerPixelSpacing=[0.2, 0.2])) == (0.2, 0.2)
+    assert pixel_spacing_from_dicom(write("c.dcm", Modality="DX")) is None
+
+
+def test_tool_reuses_segmentation_forward_pass(monkeypatch, tmp_path):
+    import torchxrayvision as xrv
+
+    from medrax.tools.measurements import ChestXRayMeasurementTool
+    from medrax.tools.segmentation import ChestXRaySegmentationTool
+
+    calls = []
+
+    class FakePSPNet(torch.nn.Module):
+        def forward(self, x):
+            calls.append(x.shape)
+            masks = torch.from_numpy(_chest()).float()[None]
+            return torch.nn.functional.interpolate(masks, size=(512, 512)) * 8 - 4
+
+    monkeypatch.setattr(xrv.baseline_models.chestx_det, "PSPNet", FakePSPNet)
+    get_forward_cache().clear()
+    path = tmp_path / "cxr.png"
+    Image.fromarray(np.random.default_rng(0).integers(0, 255, (640, 512), dtype=np.uint8)).save(
+        path
+    )
+
+    segmentation = ChestXRaySegmentationTool(device="cpu", temp_dir=tmp_path)
+    measurement = ChestXRayMeasurementTool(device="cpu")
+    try:
+        segmentation._run(str(path))
+        output, metadata = measurement._run(str(path))
+    finally:
+        for tool in (segmentation, measurement):
+            get_model_registry().release(tool.model_key)
+            tool.model_key = None
+        get_forward_cache().clear()
+
+    assert len(calls) == 1 and metadata["forward_cached"] is True
+    assert output == chest_measurements(_chest(), PSPNET_ORGANS, (640, 512))
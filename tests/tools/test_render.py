@@ -0,0 +1,128 @@
+"""
+Tests for the NumPy/PIL overlay renderer of the segmentation and grounding tools.
+"""
+
+import io
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from medrax.utils.organ_metrics import align_masks
+from medrax.utils.render import (
+    RenderOptions,
+    overlay_boxes,
+    overlay_masks,
+    rainbow,
+    render_boxes,
+    render_masks,
+)
+
+
+@pytest.fixture
+def image():
+    return np.tile(np.linspace(0, 200, 300).astype(np.uint8), (240, 1))
+
+
+@pytest.fixture
+def masks():
+    masks = np.zeros((3, 64, 64), dtype=bool)
+    masks[0, 10:30, 10:30] = True
+    masks[1, 20:40, 20:40] = True
+    return masks
+
+
+def test_rainbow_matches_matplotlib():
+    cm = pytest.importorskip("matplotlib.cm")
+
+    expected = cm.rainbow(np.linspace(0, 1, 14))[:, :3] * 255
+
+    assert np.abs(rainbow(14).astype(float) - expected).max() <= 2
+
+
+def test_overlay_blends_each_mask_over_the_aligned_region(image, masks):
+    options = RenderOptions(max_size=None, contour_width=0)
+
+    rgb = overlay_masks(image, masks, ["a", "b", "c"], options)
+
+    packed = align_masks(masks, image.shape)
+    colors = rainbow(3).astype(float)
+    gray = np.round(image.astype(float) * 255 / image.max())
+    expected = np.repeat(gray[:, :, None], 3, axis=2)
+    for bit in range(3):
+        inside = (packed >> bit) & 1 > 0
+        expected[inside] = expected[inside] * 0.7 + colors[bit] * 0.3
+    assert rgb.shape == (*image.shape, 3) and rgb.dtype == np.uint8
+    assert np.abs(rgb.astype(float) - expected).max() <= 1
+
+
+def test_contours_and_labels_change_only_pixels_near_masks(image, masks):
+    plain = overlay_masks(image, masks, ["a", "b", "c"], RenderOptions(contour_width=0))
+    outlined = overlay_masks(image, masks, ["a", "b", "c"], RenderOptions(contour_width=2))
+
+    changed = np.any(plain != outlined, axis=-1)
+    packed = align_masks(masks, image.shape)
+    assert changed.any() and np.all(packed[changed] > 0)
+
+    labelled = overlay_masks(
+        image, masks, ["a", "b", "c"], RenderOptions(), centroids={"a": (60.0, 110.0)}
+    )
+    assert np.any(labelled != outlined)
+
+
+def test_output_is_bounded_by_max_size(image, masks):
+    rgb = overlay_masks(image, masks, ["a", "b", "c"], RenderOptions(max_size=100))
+    boxes = overlay_boxes(image, [(0.1, 0.1, 0.5, 0.5)], RenderOptions(max_size=100))
+
+    assert rgb.shape == (80, 100, 3)
+    assert boxes.shape == (80, 100, 3)
+
+
+def test_boxes_are_drawn_in_relative_coordinates(image):
+    rgb = overlay_boxes(image, [(0.5, 0.5, 1.0, 1.0)], RenderOptions(max_size=None))
+
+    red = (rgb[:, :, 0] == 255) & (rgb[:, :, 1] == 0)
+    rows, cols = np.nonzero(red)
+    assert rows.min() == 120 and cols.min() == 150
+
+
+@pytest.mark.parametrize("image_format, pil_format", [("png", "PNG"), ("jpeg", "JPEG")])
+def test_encoder_settings(image, masks, image_format, pil_format):
+    options = RenderOptions(image_format=image_format, max_size=128)
+
+    encoded = render_masks(image, masks, ["a", "b", "c"], options, legend=True, title="t")
+
+    with Image.open(io.BytesIO(encoded)) as img:
+        assert img.format == pil_format and img.size == (128, 102)
+    assert options.extension == (".png" if image_format == "png" else ".jpg")
+
+
+def test_matplotlib_backend_is_still_available(image, masks):
+    pytest.importorskip("matplotlib")
+    options = RenderOptions(backend="matplotlib", dpi=30)
+
+    for encoded in (
+        render_masks(image, masks, ["a", "b", "c"], options, legend=True),
+        render_boxes(image, [(0.1, 0.1, 0.5, 0.5)], options, title="Located: x"),
+    ):
+        with Image.open(io.BytesIO(encoded)) as img:
+            assert img.format == "PNG"
+
+
+def test_invalid_options():
+    with pytest.raises(ValueError, match="render backend"):
+        RenderOptions(backend="cairo")
+    with pytest.raises(ValueError, match="image format"):
+        RenderOptions(image_format="bmp")
+
+
+def test_pil_renderer_does_not_import_matplotlib():
+    code = (
+        "import sys, numpy as np\n"
+        "from medrax.utils.render import render_masks\n"
+        "render_masks(np.zeros((32, 32), np.uint8), np.ones((1, 8, 8), bool), ['a'])\n"
+        "assert 'matplotlib' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,219 @@
+"""
+Tests for the report generator tool, on tiny randomly initialized ViT-BERT models.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from transformers import (
+    BertConfig,
+    BertTokenizer,
+    ViTConfig,
+    ViTImageProcessor,
+    VisionEncoderDecoderConfig,
+    VisionEncoderDecoderModel,
+)
+
+import medrax.models.preprocessing as preprocessing
+import medrax.tools.report_generation as report_generation
+from medrax.models.preprocessing import get_preprocess_cache
+
+VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "lungs", "clear", "heart", "normal", "size"]
+
+
+def _tiny_model(image_size, seed):
+    torch.manual_seed(seed)
+    encoder = ViTConfig(
+        image_size=image_size,
+        patch_size=8,
+        hidden_size=32,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        intermediate_size=64,
+    )
+    decoder = BertConfig(
+        vocab_size=len(VOCAB),
+        hidden_size=32,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        intermediate_size=64,
+        is_decoder=True,
+        add_cross_attention=True,
+    )
+    config = VisionEncoderDecoderConfig.from_encoder_decoder_configs(encoder, decoder)
+    config.pad_token_id, config.bos_token_id, config.eos_token_id = 0, 2, 3
+    return VisionEncoderDecoderModel(config)
+
+
+@pytest.fixture
+def tool(monkeypatch, tmp_path):
+    """Report generator whose findings model reads 32x32 inputs and impression model 48x48."""
+    vocab = tmp_path / "vocab.txt"
+    vocab.write_text("\n".join(VOCAB))
+
+    def size(name):
+        return 32 if "findings" in name else 48
+
+    class Models:
+        @staticmethod
+        def from_pretrained(name, cache_dir=None):
+            return _tiny_model(size(name), seed=size(name))
+
+    class Tokenizers:
+        @staticmethod
+        def from_pretrained(name, cache_dir=None):
+            return BertTokenizer(str(vocab))
+
+    class Processors:
+        @staticmethod
+        def from_pretrained(name, cache_dir=None):
+            return ViTImageProcessor(size={"height": size(name), "width": size(name)})
+
+    monkeypatch.setattr(report_generation, "VisionEncoderDecoderModel", Models)
+    monkeypatch.setattr(report_generation, "BertTokenizer", Tokenizers)
+    monkeypatch.setattr(report_generation, "ViTImageProcessor", Processors)
+    get_preprocess_cache().clear()
+    tool = report_generation.ChestXRayReportGeneratorTool(cache_dir=str(tmp_path), device="cpu")
+    yield tool
+    tool.executor.shutdown()
+    get_preprocess_cache().clear()
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "cxr.png"
+    Image.fromarray(np.random.default_rng(0).integers(0, 255, (80, 64), dtype=np.uint8)).save(path)
+    return str(path)
+
+
+def _sequential(tool, image, section):
+    processor, model, tokenizer = tool._section(section)
+    pixels = tool._process_image(image, processor, model)
+    with torch.inference_mode():
+        ids = model.generate(pixels, generation_config=tool.generation_configs[section])
+    return tokenizer.batch_decode(ids, skip_special_tokens=True)[0]
+
+
+def test_concurrent_sections_match_sequential(tool, image, monkeypatch):
+    decoded = []
+    decode_rgb = preprocessing.decode_rgb
+    monkeypatch.setattr(
+        preprocessing, "decode_rgb", lambda path: decoded.append(path) or decode_rgb(path)
+    )
+
+    def no_rebuild(**kwargs):
+        raise AssertionError("generation configs are built once per tool")
+
+    monkeypatch.setattr(report_generation, "GenerationConfig", no_rebuild)
+
+    report, metadata = tool._run(image)
+
+    assert metadata["analysis_status"] == "completed"
+    assert metadata["sections_generated"] == ["findings", "impression"]
+    assert decoded == [image]
+    assert report == (
+        "CHEST X-RAY REPORT\n\n"
+        f"FINDINGS:\n{_sequential(tool, image, 'findings')}\n\n"
+        f"IMPRESSION:\n{_sequential(tool, image, 'impression')}"
+    )
+
+
+def test_processor_input_matches_pil_rgb(tool, tmp_path):
+    # A color JPEG, whose channels differ, resized by both processors
+    path = tmp_path / "cxr.jpg"
+    pixels = np.random.default_rng(1).integers(0, 255, (80, 64, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(path)
+
+    for section in ("findings", "impression"):
+        processor, model, _ = tool._section(section)
+        expected = processor(Image.open(path).convert("RGB"), return_tensors="pt").pixel_values
+        for _ in range(2):
+            assert torch.equal(tool._process_image(str(path), processor, model), expected)
+
+
+def test_single_section(tool, image):
+    report, metadata = tool._run(image, sections=["impression"])
+
+    assert metadata["sections_generated"] == ["impression"]
+    assert report == f"CHEST X-RAY REPORT\n\nIMPRESSION:\n{_sequential(tool, image, 'impression')}"
+
+    _, metadata = tool._run(image, sections=[])
+    assert metadata["sections_generated"] == ["findings", "impression"]
+
+
+def _images(tmp_path, count):
+    paths = []
+    for k in range(count):
+        path = tmp_path / f"cxr{k}.png"
+        pixels = np.random.default_rng(k).integers(0, 255, (80, 64), dtype=np.uint8)
+        Image.fromarray(pixels).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def test_batches_match_single_image_reports(tool, tmp_path):
+    paths = _images(tmp_path, 5)
+    paths.insert(2, str(tmp_path / "missing.png"))
+
+    results = list(tool.generate_reports(paths, batch_size=2, num_workers=2))
+
+    assert [metadata["image_path"] for _, metadata in results] == paths
+    assert results[2][1]["analysis_status"] == "failed"
+    for path, (report, metadata) in zip(paths, results):
+        if path.endswith("missing.png"):
+            continue
+        assert report == tool._run(path)[0]
+        assert metadata["findings"] == _sequential(tool, path, "findings")
+
+
+def test_cli_resumes_from_partial_output(tool, tmp_path):
+    from medrax.reports import main
+
+    paths = _images(tmp_path, 3)
+    manifest = tmp_path / "worklist.txt"
+    manifest.write_text("# tonight\ncxr0.png\nmissing.png\n\ncxr1.png\n")
+    output = tmp_path / "out" / "reports.jsonl"
+    args = ["--manifest", str(manifest), "--output", str(output), "--device", "cpu"]
+
+    main(args + ["--sections", "impression", "--batch-size", "2"])
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [r["analysis_status"] for r in records] == ["completed", "failed", "completed"]
+    assert records[0]["impression"] == _sequential(tool, paths[0], "impression")
+    assert "findings" not in records[0]
+
+    # An interrupted run leaves a partial line; the failed study and the new one are redone
+    manifest.write_text(manifest.read_text() + "cxr2.png\n")
+    with open(output, "a") as f:
+        f.write('{"image_path": "cut')
+    main(args + ["--sections", "impression"])
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    names = [Path(r["image_path"]).name for r in records]
+    assert names == ["cxr0.png", "missing.png", "cxr1.png", "missing.png", "cxr2.png"]
+    assert records[-1]["analysis_status"] == "completed"
+
+
+def test_cli_redoes_studies_missing_requested_sections(tool, tmp_path):
+    from medrax.reports import main
+
+    _images(tmp_path, 2)
+    output = tmp_path / "reports.jsonl"
+    args = ["--images", str(tmp_path), "--output", str(output), "--device", "cpu"]
+
+    main(args + ["--sections", "impression"])
+    main(args + ["--sections", "impression"])
+    assert len(output.read_text().splitlines()) == 2
+
+    # Impression-only reports do not cover findings, so both studies are redone
+    main(args + ["--sections", "findings", "impression"])
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [r["sections_generated"] for r in records] == [["impression"]] * 2 + [
+        ["findings", "impression"]
+    ] * 2
+
+    main(args + ["--sections", "findings"])
+    assert len(output.read_text().splitlines()) == 4
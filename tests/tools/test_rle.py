@@ -0,0 +1,85 @@
+"""
+Tests for the COCO RLE and bit-packed .npz mask encodings.
+"""
+
+import numpy as np
+import pytest
+
+from medrax.utils.organ_metrics import align_masks
+from medrax.utils.rle import (
+    decode_mask,
+    encode_mask,
+    encode_masks,
+    export_masks,
+    load_masks_npz,
+    mask_area,
+    save_masks_npz,
+)
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_round_trip(compress):
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        height, width = rng.integers(1, 24, 2)
+        mask = rng.random((height, width)) < rng.random()
+
+        rle = encode_mask(mask, compress=compress)
+
+        assert rle["size"] == [height, width]
+        assert np.array_equal(decode_mask(rle), mask)
+        assert mask_area(rle) == mask.sum()
+
+
+def test_counts_follow_coco_conventions():
+    mask = np.array([[1, 0, 0], [1, 1, 0]], dtype=bool)
+
+    # Column-major runs, starting with an (empty) run of zeros
+    assert encode_mask(mask, compress=False)["counts"] == [0, 2, 1, 1, 2]
+    assert encode_mask(mask)["counts"] == "021O1"
+    assert encode_mask(np.zeros((2, 3)))["counts"] == "6"
+    assert encode_mask(np.ones((40, 40)), compress=False)["counts"] == [0, 1600]
+
+
+def test_packed_masks_encode_like_single_masks():
+    rng = np.random.default_rng(1)
+    masks = rng.random((14, 32, 32)) < 0.3
+    masks[2] = True
+    masks[3] = False
+    packed = align_masks(masks, (90, 70))
+
+    for bit, rle in enumerate(encode_masks(packed, len(masks))):
+        assert rle == encode_mask((packed >> bit) & 1)
+
+
+def test_npz_round_trip(tmp_path):
+    masks = np.zeros((3, 16, 16), dtype=bool)
+    masks[0, 2:5, 3:9] = True
+    masks[2] = True
+    packed = align_masks(masks, (40, 30))
+
+    path = save_masks_npz(tmp_path / "masks.npz", packed, ["a", "b", "c"], spacing=np.array(0.2))
+    loaded, extra = load_masks_npz(path)
+
+    assert list(loaded) == ["a", "b", "c"]
+    for bit, name in enumerate(loaded):
+        assert np.array_equal(loaded[name], (packed >> bit) & 1 > 0)
+    assert float(extra["spacing"]) == 0.2
+
+
+def test_export_masks_resolutions(tmp_path):
+    masks = np.zeros((2, 16, 16), dtype=bool)
+    masks[1, 4:8, 4:12] = True
+
+    original = export_masks(masks, ["a", "b"], (40, 30))
+    model = export_masks(masks, ["a", "b"], (40, 30), resolution="model")
+
+    assert original["size"] == [40, 30] and model["size"] == [16, 16]
+    assert mask_area(model["masks"]["b"]) == 32
+    assert np.array_equal(
+        decode_mask(original["masks"]["b"]), (align_masks(masks, (40, 30)) >> 1) & 1 > 0
+    )
+    with pytest.raises(ValueError, match="npz_path"):
+        export_masks(masks, ["a", "b"], (40, 30), mask_format="npz")
+    with pytest.raises(ValueError, match="mask format"):
+        export_masks(masks, ["a", "b"], (40, 30), mask_format="png")